@@ -0,0 +1,56 @@
+"""
+An open-source software to estimate habitat suitability:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+import sys
+from src import job_server
+
+
+def main():
+    """
+    This is the client of the HABBY server (started with "python habby_cmd.py SERVER"). The command is written as
+    for habby_cmd.py (for example "python habby_client.py LOAD_TELEMAC file.slf") and it is executed by the
+    server on the project of the server. The log of the command is printed while the command runs. The option port=x
+    gives the port of the server. The command STOP_SERVER stops the server.
+
+    Only the python standard library is loaded here, so the client starts quickly. The exit code is 0 if the command
+    was executed without error and 1 otherwise.
+    """
+    port = job_server.default_port
+    all_arg = []
+    for opt in sys.argv:
+        if opt[:5] == 'port=':
+            try:
+                port = int(opt[5:])
+            except ValueError:
+                print('Error: the port should be an int (port=x).')
+                return 1
+        else:
+            all_arg.append(opt)
+
+    if len(all_arg) < 2:
+        print('Error: the command to send to the HABBY server is missing.')
+        return 1
+    if all_arg[1] == 'STOP_SERVER':
+        job_server.stop_server(port)
+        return 0
+    if job_server.submit(all_arg, port):
+        return 0
+    else:
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+An open-source software to estimate habitat suitability:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+import time
+start_time = time.time()
+import sys
+import os
+import multiprocessing
+from src import func_for_cmd
+from src import job_server
+# time to load python modules of HABBY and check that pyplot is not loaded by them (see the option show_time)
+startup_time = time.time() - start_time
+pyplot_at_startup = 'matplotlib.pyplot' in sys.modules
+
+
+def main():
+    """
+    This is the main for HABBY on the command line (without the GUI). It can call restart (read a list of command
+    from a file) or read a command written on the cmd or apply a command to a type of file (key word ALL before the
+    command and name of the file with asterisk). For more complicated case, one can directly do a python script using
+    the function from HABBY. The command SERVER starts a HABBY server which executes the commands sent by the
+    script habby_client.py (see src/job_server.py).
+
+    The modules of the GUI (PyQt5) and matplotlib.pyplot are not loaded here, so that HABBY can be used on a computer
+    without display. pyplot is only loaded by the commands which create a figure. The options path_prj=x, name_prj=x
+    and path_bio=x can be given anywhere in the command. With the option show_time, the startup time and the time
+    of the command are printed at the end.
+    """
+
+    # get path and project name
+    namedir = 'result_cmd3'
+    path_bio = './biology'
+    version = 0.24
+    path_prj = ''
+    name_prj = ''
+    show_time = False
+    for opt in sys.argv[1:]:
+        if opt[:9] == 'path_prj=':
+            path_prj = opt[9:]
+        elif opt[:9] == 'name_prj=':
+            name_prj = opt[9:]
+        elif opt[:9] == 'path_bio=':
+            path_bio = opt[9:]
+        elif opt == 'show_time':
+            show_time = True
+    sys.argv = [opt for opt in sys.argv if opt[:9] not in ['path_prj=', 'name_prj=', 'path_bio=']
+                and opt != 'show_time']
+
+    # find the best path_prj (the project of the GUI is only looked for if the project is not given)
+    proj_def = False
+    if not path_prj or not name_prj:
+        [name_prj_set, path_prj_set] = get_project_settings(version)
+        if not path_prj_set or not os.path.isdir(path_prj_set):
+            path_prj_set = os.path.join(os.path.abspath('output_cmd'), namedir)
+            name_prj_set = 'DefaultProj'
+            proj_def = not path_prj
+        if not path_prj:
+            path_prj = path_prj_set
+        if not name_prj:
+            name_prj = name_prj_set
+    if proj_def:
+        print('Warning: Could not find a project path. Saved data in '
+              + path_prj
+              + '. Habby needs write permission \n.')
+
+    # create an empty project if not existing before
+    filename_empty = os.path.abspath('src_GUI/empty_proj.xml')
+    if not os.path.isdir(path_prj):
+        os.makedirs(path_prj)
+    if not os.path.isfile(os.path.join(path_prj, name_prj + '.xml')):
+        func_for_cmd.copyfile(filename_empty,
+                              os.path.join(path_prj, name_prj + '.xml'))
+
+    # check if enough argument
+    if len(sys.argv) == 0 or len(sys.argv) == 1:
+        print(" Not enough argument was given. \
+                At least one argument should be given")
+        return
+
+    b = time.time()
+    if sys.argv[1] == 'RESTART':
+        incremental = len(sys.argv) == 4 and sys.argv[3] == 'incremental'
+        if len(sys.argv) != 3 and not incremental:
+            print('Error: the RESTART command needs the name of \
+                  the restart file as input.')
+            return
+        func_for_cmd.habby_restart(sys.argv[2], name_prj, path_prj,
+                                   path_bio, incremental)
+    elif sys.argv[1] == 'SERVER':
+        port = job_server.default_port
+        workers = 2
+        try:
+            for opt in sys.argv[2:]:
+                if opt[:5] == 'port=':
+                    port = int(opt[5:])
+                elif opt[:8] == 'workers=':
+                    workers = int(opt[8:])
+        except ValueError:
+            print('Error: the options of the command SERVER should be of the form port=x and workers=x (x an int).')
+            return
+        job_server.serve(name_prj, path_prj, path_bio, port, workers)
+    elif sys.argv[1] == 'ALL':
+        if len(sys.argv) < 2:
+            print('Error: the ALL command needs at least one argument.')
+        all_arg = ['habby_cmd.py'] + sys.argv[2:]
+        func_for_cmd.habby_on_all(all_arg, name_prj, path_prj, path_bio)
+    else:
+        all_arg = sys.argv
+        func_for_cmd.all_command(all_arg, name_prj, path_prj, path_bio)
+
+    if show_time:
+        print('Startup time: ' + str(round(startup_time, 3)) + ' sec (pyplot loaded at startup: '
+              + str(pyplot_at_startup) + ', Qt widgets loaded: ' + str('PyQt5.QtWidgets' in sys.modules) + ')')
+        print('Time of the command: ' + str(round(time.time() - b, 3)) + ' sec')
+
+
+def get_project_settings(version):
+    """
+    This function gets the name and the path of the last project opened with the GUI. These settings are saved by
+    PyQt5 (QSettings), so PyQt5.QtCore is loaded here (it does not need a display). If PyQt5 is not installed, no
+    project is found.
+
+    :param version: the version of HABBY
+    :return: the name and the path of the project (None if not found)
+    """
+    try:
+        from PyQt5.QtCore import QSettings
+    except ImportError:
+        return None, None
+    settings = QSettings('irstea', 'HABBY' + str(version))
+    return settings.value('name_prj'), settings.value('path_prj')
+
+
+if __name__ == '__main__':
+    # necessary to freeze the application with parallel process
+    multiprocessing.freeze_support()
+    main()
@@ -21,13 +21,9 @@ import numpy as np
 import bisect
 from io import StringIO
 import sys
-import time
-from matplotlib.pyplot import axis, plot, step, figure, xlim, ylim, xlabel, ylabel, title, figure, text, legend, \
-    show, subplot, fill_between, rcParams, savefig, close, rcParams,suptitle
-import matplotlib as mpl
 from src import manage_grid_8
 from src import load_hdf5
-from src_GUI import output_fig_GUI
+from src import fig_option
 
 
 def open_hec_hec_ras_and_create_grid(name_hdf5, path_hdf5, name_prj, path_prj, model_type, namefile, pathfile,
@@ -63,13 +59,14 @@ def open_hec_hec_ras_and_create_grid(name_hdf5, path_hdf5, name_prj, path_prj, m
     if not print_cmd:
         sys.stdout = mystdout = StringIO()
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
 
     # load the hec-ra data (the function is just below)
     [coord_pro, vh_pro, nb_pro_reach, sim_name] = open_hecras(namefile[0], namefile[1], pathfile[0], pathfile[1], path_im,
                                                     save_fig1d, fig_opt)
     # manager error
     if save_fig1d:  # to avoid problem with matplotlib
+        from matplotlib.pyplot import close
         close()
     if coord_pro == [-99] or len(vh_pro) <1:
         print('Error: HEC-RAS data not loaded')
@@ -1414,6 +1411,9 @@ def figure_xml(data_profile, coord_pro_old, coord_r, xy_h_all, zone_v_all,  pro,
     useful). If the figure gets too complicated, this can be taken away by changing the two lines which finish
     with height or velocity as comment.  We add some titles and save the figures.
     """
+    import matplotlib as mpl
+    from matplotlib.pyplot import axis, plot, step, figure, xlim, ylim, xlabel, ylabel, title, text, legend, \
+        show, subplot, fill_between, rcParams, savefig, suptitle
     rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     rcParams['font.size'] = fig_opt['font_size']
     rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -1499,13 +1499,13 @@ def figure_xml(data_profile, coord_pro_old, coord_r, xy_h_all, zone_v_all,  pro,
         xlim([np.min(xz[:, 0]-1)*0.95, np.max(xz[:, 0])*1.05])
         m += 1
         if format == 0 or format == 1:
-            savefig(os.path.join(path_im, "HEC_profile_"+str(i) + '_day' + time.strftime("%d_%m_%Y_at_%H_%M_%S")+
+            savefig(os.path.join(path_im, "HEC_profile_"+str(i) + '_day' + fig_option.get_time_stamp()+
                                  '.png'), dpi=fig_opt['resolution'])
         if format == 0 or format == 3:
-            savefig(os.path.join(path_im, "HEC_profile_"+str(i) + '_day' + time.strftime("%d_%m_%Y_at_%H_%M_%S")+
+            savefig(os.path.join(path_im, "HEC_profile_"+str(i) + '_day' + fig_option.get_time_stamp()+
                                  '.pdf'), dpi=fig_opt['resolution'])
         if format == 2:
-            savefig(os.path.join(path_im, "HEC_profile_" + str(i) + '_day' + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+            savefig(os.path.join(path_im, "HEC_profile_" + str(i) + '_day' + fig_option.get_time_stamp() +
                                  '.jpg'), dpi=fig_opt['resolution'])
 
     # plot the profile in the (x,y) plane
@@ -1562,13 +1562,13 @@ def figure_xml(data_profile, coord_pro_old, coord_r, xy_h_all, zone_v_all,  pro,
     axis('equal')  # if right angle are needed
     legend(fancybox=True, framealpha=0.5)
     if format == 0 or format == 1:
-        savefig(os.path.join(path_im, "HEC_all_pro_"+time.strftime("%d_%m_%Y_at_%H_%M_%S")+".png"),
+        savefig(os.path.join(path_im, "HEC_all_pro_"+fig_option.get_time_stamp()+".png"),
                 dpi=fig_opt['resolution'], transparent=True)
     if format == 0 or format == 3:
-        savefig(os.path.join(path_im, "HEC_all_pro_"+time.strftime("%d_%m_%Y_at_%H_%M_%S")+".pdf"),
+        savefig(os.path.join(path_im, "HEC_all_pro_"+fig_option.get_time_stamp()+".pdf"),
                 dpi=fig_opt['resolution'], transparent=True)
     if format == 2:
-        savefig(os.path.join(path_im, "HEC_all_pro_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"),
+        savefig(os.path.join(path_im, "HEC_all_pro_" + fig_option.get_time_stamp() + ".jpg"),
                 dpi=fig_opt['resolution'], transparent=True)
     show()
 
@@ -17,17 +17,19 @@ https://github.com/YannIrstea/habby
 import os
 import re
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib as mpl
 import sqlite3
 import time
+from copy import deepcopy
 from src import load_hdf5
-from src_GUI import output_fig_GUI
+from src import fig_option
 try:
     import xml.etree.cElementTree as ET
 except ImportError:
     import xml.etree.ElementTree as ET
 
+# the preference curves kept in memory by xml file (see keep_pref()), None if the files are always read
+pref_kept = None
+
 
 def load_evha_curve(filename, path):
     """
@@ -135,6 +137,7 @@ def test_evah_xml_pref(path_xml, path_evha):
     :param path_evha: the path to the evha folder which contains the PRF files
 
     """
+    import matplotlib.pyplot as plt
 
     # get filename evha
     filenames = load_hdf5.get_all_filename(path_evha, '.PRF')
@@ -246,10 +249,12 @@ def figure_pref(height, vel, sub, code_fish, name_fish,
     :param get_fig: usually False, If True return the figure
         (to modfied it more)
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     mpl.rcParams['pdf.fonttype'] = 42
     if not get_fig:
         if not fig_opt:
-            fig_opt = output_fig_GUI.create_default_figoption()
+            fig_opt = fig_option.create_default_figoption()
         plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
         plt.rcParams['font.size'] = fig_opt['font_size']
         if fig_opt['font_size'] > 7:
@@ -747,6 +752,8 @@ def plot_hydrosignature(xmlfile):
 
     :param xmlfile: the path and name of the xmlfile
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     # open the file
     try:
@@ -839,6 +846,44 @@ def plot_hydrosignature(xmlfile):
     cbar.ax.set_ylabel('Relative area [%]')
 
 
+def keep_pref(keep=True):
+    """
+    This function chooses if the preference curves read by get_pref() are kept in memory. It is used by the HABBY
+    server (see src/job_server.py), which calculates the habitat for many commands with the same preference files.
+
+    :param keep: If True, the preference curves are kept in memory. If False, they are read for each command.
+    """
+    global pref_kept
+    if keep:
+        pref_kept = dict()
+    else:
+        pref_kept = None
+
+
+def get_pref(xmlfile):
+    """
+    This function gives the preference curves of a xml file as read_pref(). If keep_pref() was called, the curves
+    are only read again if the xml file was modified since the last reading.
+
+    :param xmlfile: the path and name to the xml file (string)
+    :return: height, vel, sub, code_fish, name_fish, stade
+    """
+    if pref_kept is None:
+        return read_pref(xmlfile)
+    try:
+        stat = os.stat(xmlfile)
+    except OSError:
+        return read_pref(xmlfile)
+    key = (stat.st_mtime, stat.st_size)
+    if xmlfile not in pref_kept or pref_kept[xmlfile][0] != key:
+        pref = read_pref(xmlfile)
+        if pref[0] == [-99]:
+            return pref
+        pref_kept[xmlfile] = (key, pref)
+    # a copy as the curves could be modified by the calculation
+    return deepcopy(pref_kept[xmlfile][1])
+
+
 def read_pref(xmlfile):
     """
     This function reads the preference curve from the xml file and
@@ -1024,6 +1069,8 @@ def create_pdf(xmlfiles, stages_chosen, path_bio, path_im_bio, path_out,
         (usually other_outputs)
     :param fig_opt: the figure options (contain the chosen language)
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     plt.close()
     plt.rcParams['figure.figsize'] = 21, 29.7  # a4
     plt.rcParams['font.size'] = 24
@@ -1174,7 +1221,7 @@ def main():
     path_out = r'C:\Users\diane.von-gunten\HABBY\biology'
     xmlfiles = ['ABL01.xml', 'ABL01.xml', 'BAM01.xml']
     stages = ['adult', 'juvenile', 'fry']
-    fig_opt = output_fig_GUI.create_default_figoption()
+    fig_opt = fig_option.create_default_figoption()
     fig_opt['language'] = 1
     create_pdf(xmlfiles, stages, path_bio, '', path_out, fig_opt)
 
@@ -16,23 +16,22 @@ https://github.com/YannIrstea/habby
 """
 import os
 import numpy as np
+import h5py
 import bisect
 import time
 import sys
 from io import StringIO
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-from matplotlib.collections import PatchCollection
-from matplotlib.patches import Polygon
+from multiprocessing import Pool, current_process
 from src import load_hdf5
 from src import bio_info
-import shapefile
+from src import shapefile_bulk
 from src import new_create_vtk
-from src_GUI import output_fig_GUI
+from src import fig_option
 
 
 def calc_hab_and_output(hdf5_file, path_hdf5, pref_list, stages_chosen,  name_fish, name_fish_sh, run_choice, path_bio,
-                        path_txt, path_shp, path_para, path_im, q=[], print_cmd=False, fig_opt={}, path_im_bio='', xmlfiles=[]):
+                        path_txt, path_shp, path_para, path_im, q=[], print_cmd=False, fig_opt={}, path_im_bio='', xmlfiles=[],
+                        workers=1):
 
     """
     This function calculates the habitat and create the outputs for the habitat calculation. The outputs are: text
@@ -57,9 +56,13 @@ def calc_hab_and_output(hdf5_file, path_hdf5, pref_list, stages_chosen,  name_fi
     :param print_cmd: if True the print command is directed in the cmd, False if directed to the GUI
     :param fig_opt: the options to crete the figure if save_fig1d is True
     :param xmlfiles: the list of the xml file (only useful to get the preference curve report, so not used by habby_cmd)
+    :param workers: the number of process used for the habitat calculation (see calc_hab()). 1 by default.
 
     ** Technical comments**
 
+    The merge file is opened only once for the calculation and all the outputs (see load_hdf5.open_hdf5_session()).
+    It is opened in read-only mode, except at the end to add the habitat data to it.
+
     This function redirect the sys.stdout. The point of doing this is because this function will be call by the GUI or
     by the cmd. If it is called by the GUI, we want the output to be redirected to the windows for the log under HABBY.
     If it is called by the cmd, we want the print function to be sent to the command line. We make the switch here.
@@ -68,107 +71,115 @@ def calc_hab_and_output(hdf5_file, path_hdf5, pref_list, stages_chosen,  name_fi
     if not print_cmd:
         sys.stdout = mystdout = StringIO()
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
 
-    # calcuation habitat
-    [vh_all_t_sp, vel_c_all_t, height_c_all_t, area_all, spu_all, area_c_all] = \
-        calc_hab(hdf5_file, path_hdf5, pref_list, stages_chosen, path_bio, run_choice)
-    b = time.time()
+    # the merge file is opened once (read-only) for the calculation and all the outputs
+    load_hdf5.open_hdf5_session(hdf5_file, path_hdf5)
+    try:
 
-    if vh_all_t_sp == [-99] or isinstance(name_fish[0], int):
-        if q:
-            sys.stdout = sys.__stdout__
-            q.put([mystdout, [-99], [-99], [-99], [-99], [-99]])
-            return
-        else:
-            return
+        # calcuation habitat
+        [vh_all_t_sp, vel_c_all_t, height_c_all_t, area_all, spu_all, area_c_all] = \
+            calc_hab(hdf5_file, path_hdf5, pref_list, stages_chosen, path_bio, run_choice, workers=workers)
+        b = time.time()
 
-    # to get which output must be created
-    if fig_opt['text_output'] == 'True':  # from the xml, string only
-        create_text = True
-    else:
-        create_text = False
-    if fig_opt['shape_output'] == 'True':  # from the xml, string only
-        create_shape = True
-    else:
-        create_shape = False
-    if fig_opt['paraview'] == 'True':  # from the xml, string only
-        create_para = True
-    else:
-        create_para = False
-    if fig_opt['fish_info'] == 'True':  # from the xml, string only
-        create_info = True
-    else:
-        create_info = False
-    if fig_opt['erase_id'] == 'True':
-        erase_id = True
-    else:
-        erase_id = False
+        if vh_all_t_sp == [-99] or isinstance(name_fish[0], int):
+            if q:
+                sys.stdout = sys.__stdout__
+                q.put([mystdout, [-99], [-99], [-99], [-99], [-99]])
+                return
+            else:
+                return
 
-    # prepare name for the output (there is more or less one form by output)
-    all_name = ''
-    for id, n in enumerate(name_fish):
-        name_fish[id] = n + '_' + stages_chosen[id]
-        all_name += name_fish_sh[id]
-    if len(hdf5_file) > 25:
-        name_base = hdf5_file[:25] + '_' + all_name
-        name_base2 = hdf5_file[:25]
-    else:
-        name_base = hdf5_file[:-3] + '_' + all_name
-        name_base2 = hdf5_file[:-3]
-
-    # get the time step name
-    # get time step name if they exists
-    sim_name = load_hdf5.load_timestep_name(hdf5_file, path_hdf5)
-
-    # text output
-    if create_text:
-        save_hab_txt(hdf5_file, path_hdf5, vh_all_t_sp, vel_c_all_t, height_c_all_t, name_fish, path_txt, name_base,
-                     sim_name, erase_id)
-    save_spu_txt(area_all, spu_all, name_fish, path_txt, name_base, sim_name, fig_opt['language'], erase_id)
-
-    # shape output
-    if create_shape:
-        if run_choice == 2:
-            perc = True
+        # to get which output must be created
+        if fig_opt['text_output'] == 'True':  # from the xml, string only
+            create_text = True
         else:
-            perc = False
-        save_hab_shape(hdf5_file, path_hdf5, vh_all_t_sp, vel_c_all_t, height_c_all_t,
-                       name_fish_sh, path_shp, name_base, sim_name, save_perc=perc, erase_id=erase_id)
-
-    # paraview outputs
-    if create_para:
-        new_create_vtk.habitat_to_vtu(name_base, path_para, path_hdf5, hdf5_file, vh_all_t_sp, height_c_all_t,
-                                      vel_c_all_t, name_fish, erase_id)
-        new_create_vtk.save_slf(hdf5_file, path_hdf5, path_para, True, output_name=name_base, habitat=vh_all_t_sp)
-
-    # pdf with information on the fish
-    if create_info and len(xmlfiles) > 0:
-        bio_info.create_pdf(xmlfiles, stages_chosen, path_bio, path_im_bio, path_txt, fig_opt)
-
-    # figure done always
-    # 2d figure and histogram of hydraulic data for certain timesteps
-    timestep = fig_opt['time_step']
-    if not isinstance(timestep, (list, tuple)):
-        timestep = timestep.split(',')
-    try:
-        timestep = list(map(int, timestep))
-    except ValueError:
-        print('Error: Time step was not recognized. \n')
-        return
-    if -1 in timestep and len(vh_all_t_sp[0]) == 2 and 1 in timestep:
-        del timestep[1]
-
-    # figure
-    save_vh_fig_2d(hdf5_file, path_hdf5, vh_all_t_sp, path_im, name_fish, name_base2, fig_opt, timestep, sim_name,
-                   erase_id=erase_id)
-    plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_all, fig_opt, path_im, timestep,
-                    name_base2, sim_name, erase_id)
-    plot_hist_biology(vh_all_t_sp, area_c_all, name_fish, fig_opt, path_im, timestep, name_base2, sim_name, erase_id)
-    # 1d figure (done on the main thread, so not necessary)
-    # save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt)
-
-    # saving hdf5 data of the habitat value
+            create_text = False
+        if fig_opt['shape_output'] == 'True':  # from the xml, string only
+            create_shape = True
+        else:
+            create_shape = False
+        if fig_opt['paraview'] == 'True':  # from the xml, string only
+            create_para = True
+        else:
+            create_para = False
+        if fig_opt['fish_info'] == 'True':  # from the xml, string only
+            create_info = True
+        else:
+            create_info = False
+        if fig_opt['erase_id'] == 'True':
+            erase_id = True
+        else:
+            erase_id = False
+
+        # prepare name for the output (there is more or less one form by output)
+        all_name = ''
+        for id, n in enumerate(name_fish):
+            name_fish[id] = n + '_' + stages_chosen[id]
+            all_name += name_fish_sh[id]
+        if len(hdf5_file) > 25:
+            name_base = hdf5_file[:25] + '_' + all_name
+            name_base2 = hdf5_file[:25]
+        else:
+            name_base = hdf5_file[:-3] + '_' + all_name
+            name_base2 = hdf5_file[:-3]
+
+        # get the time step name
+        # get time step name if they exists
+        sim_name = load_hdf5.load_timestep_name(hdf5_file, path_hdf5)
+
+        # text output
+        if create_text:
+            save_hab_txt(hdf5_file, path_hdf5, vh_all_t_sp, vel_c_all_t, height_c_all_t, name_fish, path_txt, name_base,
+                         sim_name, erase_id, fig_opt.get('text_format', 'txt'))
+        save_spu_txt(area_all, spu_all, name_fish, path_txt, name_base, sim_name, fig_opt['language'], erase_id)
+
+        # shape output
+        if create_shape:
+            if run_choice == 2:
+                perc = True
+            else:
+                perc = False
+            save_hab_shape(hdf5_file, path_hdf5, vh_all_t_sp, vel_c_all_t, height_c_all_t,
+                           name_fish_sh, path_shp, name_base, sim_name, save_perc=perc, erase_id=erase_id)
+
+        # paraview outputs
+        if create_para:
+            new_create_vtk.habitat_to_vtu(name_base, path_para, path_hdf5, hdf5_file, vh_all_t_sp, height_c_all_t,
+                                          vel_c_all_t, name_fish, erase_id, fig_opt.get('paraview_format', 'vtu'))
+            new_create_vtk.save_slf(hdf5_file, path_hdf5, path_para, True, output_name=name_base, habitat=vh_all_t_sp)
+
+        # pdf with information on the fish
+        if create_info and len(xmlfiles) > 0:
+            bio_info.create_pdf(xmlfiles, stages_chosen, path_bio, path_im_bio, path_txt, fig_opt)
+
+        # figure done always
+        # 2d figure and histogram of hydraulic data for certain timesteps
+        timestep = fig_opt['time_step']
+        if not isinstance(timestep, (list, tuple)):
+            timestep = timestep.split(',')
+        try:
+            timestep = list(map(int, timestep))
+        except ValueError:
+            print('Error: Time step was not recognized. \n')
+            return
+        if -1 in timestep and len(vh_all_t_sp[0]) == 2 and 1 in timestep:
+            del timestep[1]
+
+        # figure
+        save_vh_fig_2d(hdf5_file, path_hdf5, vh_all_t_sp, path_im, name_fish, name_base2, fig_opt, timestep, sim_name,
+                       erase_id=erase_id)
+        plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_all, fig_opt, path_im, timestep,
+                        name_base2, sim_name, erase_id)
+        plot_hist_biology(vh_all_t_sp, area_c_all, name_fish, fig_opt, path_im, timestep, name_base2, sim_name, erase_id)
+        # 1d figure (done on the main thread, so not necessary)
+        # save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt)
+    finally:
+        # the session is always closed (even if an output failed), so that a stale file is not kept open by the
+        # processes which execute many commands (ALL jobs=x, HABBY server)
+        load_hdf5.close_hdf5_session(hdf5_file, path_hdf5)
+
+    # saving hdf5 data of the habitat value (the file is re-opened to be modified)
     load_hdf5.add_habitat_to_merge(hdf5_file, path_hdf5, vh_all_t_sp, vel_c_all_t, height_c_all_t,
                                    name_fish)
 
@@ -187,29 +198,30 @@ def calc_hab_and_output(hdf5_file, path_hdf5, pref_list, stages_chosen,  name_fi
         return
 
 
-def calc_hab(merge_name, path_merge, bio_names, stages, path_bio, opt):
+def calc_hab(merge_name, path_merge, bio_names, stages, path_bio, opt, stacked=False, workers=1):
     """
     This function calculates the habitat value. It loads substrate and hydrology data from an hdf5 files and it loads
     the biology data from the xml files. It is possible to have more than one stage by xml file (usually the three
     stages are in the xml files). There are more than one method to calculte the habitat so the parameter opt indicate
     which metho to use. 0-> usde coarser substrate, 1 -> use dominant substrate
 
+    All the species and stages are calculated together by calc_hab_norm_multi(). Each xml file is only read once,
+    even if more than one stage of this file is chosen.
+
     :param merge_name: the name of the hdf5 with the results
     :param path_merge: the path to the merged file
     :param bio_names: the name of the xml biological data
     :param stages: the stage chosen (youngs, adults, etc.). List with the same length as bio_names.
     :param path_bio: The path to the biological folder (with all files given in bio_names
     :param opt: an int fron 0 to n. Gives which calculation method should be used
+    :param stacked: If True, the habitat value and the spu are returned as given by calc_hab_norm_multi() (one
+           array with all species by reach and by time step). If False, they are given by species.
+    :param workers: If larger than one, the time steps are calculated in parallel by a pool of processes of this
+           size (see calc_hab_norm_parallel()). The results are identical to the serial case (workers=1, the default).
+           In a daemonic process (the jobs of ALL jobs=x and of the HABBY server), the calculation is serial.
     :return: the habiatat value for all species, all time, all reach, all cells.
     """
     failload = [-99], [-99], [-99], [-99], [-99], [-99]
-    vh_all_t_sp = []
-    spu_all_t_sp = []
-    vel_c_att_t = []
-    height_c_all_t = []
-    area_all_t = []  # area by reach
-    area_c_all_t = []  # area by cell for each reach each time step
-    found_stage = 0
 
     if len(bio_names) != len(stages):
         print('Error: Number of stage and species is not coherent. \n')
@@ -219,6 +231,10 @@ def calc_hab(merge_name, path_merge, bio_names, stages, path_bio, opt):
         print('Error: No fish species chosen. \n')
         return failload
 
+    if opt not in [0, 1, 2, 3]:
+        print('Error: the calculation method is not found. \n')
+        return failload
+
     # load merge
     # test if file exists in load_hdf5_hyd
     [ikle_all_t, point_all, inter_vel_all, inter_height_all, substrate_all_pg, substrate_all_dom] = \
@@ -226,112 +242,143 @@ def calc_hab(merge_name, path_merge, bio_names, stages, path_bio, opt):
     if ikle_all_t == [[-99]]:
         return failload
 
-    a = time.time()
+    # load the preference curves of all species and stages
+    [pref_height_all, pref_vel_all, pref_sub_all] = load_pref_all(bio_names, stages, path_bio)
+    if pref_height_all == [-99]:
+        return failload
+
+    # substrate and options for each calculation method
+    percent = False
+    take_sub = True
+    if opt == 0:  # pg
+        sub = substrate_all_pg
+    elif opt == 1:  # dom
+        sub = substrate_all_dom
+    elif opt == 2:  # percentage
+        sub = load_hdf5.load_sub_percent(merge_name, path_merge)
+        if len(sub) == 1:
+            print('Error: Substrate data in percentage form is not found. Habitat by percentage cannot be'
+                  ' computed. \n')
+            return failload
+        percent = True
+    else:
+        sub = substrate_all_dom
+        take_sub = False
+
+    # calcul (one function for all calculation options)
+    # a daemonic process (ALL jobs=x, HABBY server) cannot start the processes of the pool
+    if workers > 1 and current_process().daemon:
+        print('Warning: the time steps cannot be calculated in parallel in a job of the command ALL or of the HABBY '
+              'server. The option workers=x is not used.\n')
+        workers = 1
+    if workers > 1:
+        [vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
+            calc_hab_norm_parallel(ikle_all_t, point_all, inter_vel_all, inter_height_all, sub, pref_vel_all,
+                                   pref_height_all, pref_sub_all, percent, take_sub, workers)
+    else:
+        # the data by cell (velocity, height, area) only depends on the merge file, not on the species
+        cell_geo = calc_cell_geometry(ikle_all_t, point_all, inter_vel_all, inter_height_all)
+        [vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
+            calc_hab_norm_multi(ikle_all_t, point_all, inter_vel_all, inter_height_all, sub, pref_vel_all,
+                                pref_height_all, pref_sub_all, percent, take_sub, cell_geo)
+    if vh_all_t == [-99]:
+        return failload
+
+    if stacked:
+        return vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t
+
+    [vh_all_t_sp, spu_all_t_sp] = unstack_hab(vh_all_t, spu_all_t, len(pref_vel_all))
+
+    return vh_all_t_sp, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t_sp, area_c_all_t
+
+
+def load_pref_all(bio_names, stages, path_bio):
+    """
+    This function loads the preference curves of the chosen species and stages. Each xml file is only read once,
+    even if more than one stage of this file is chosen.
+
+    :param bio_names: the name of the xml biological data
+    :param stages: the stage chosen (youngs, adults, etc.). List with the same length as bio_names.
+    :param path_bio: The path to the biological folder (with all files given in bio_names)
+    :return: the preference for the height, the velocity and the substrate (one list by stage in the order of the
+             stages found in the xml files)
+    """
+    failload = [-99], [-99], [-99]
+    pref_height_all = []
+    pref_vel_all = []
+    pref_sub_all = []
+    pref_xml = dict()
+    found_stage = 0
 
     for idx, bio_name in enumerate(bio_names):
 
-        # load bio data
+        # load bio data (only once by xml file)
         xmlfile = os.path.join(path_bio, bio_name)
-        [pref_height, pref_vel, pref_sub, code_fish, name_fish, stade_bios] = bio_info.read_pref(xmlfile)
+        if xmlfile not in pref_xml:
+            pref_xml[xmlfile] = bio_info.get_pref(xmlfile)
+        [pref_height, pref_vel, pref_sub, code_fish, name_fish, stade_bios] = pref_xml[xmlfile]
         if pref_height == [-99]:
             print('Error: preference file could not be loaded. \n')
             return failload
 
         for idx2, stade_bio in enumerate(stade_bios):
-
             if stages[idx] == stade_bio:
                 found_stage += 1
-                pref_height = pref_height[idx2]
-                pref_vel = pref_vel[idx2]
-                pref_sub = pref_sub[idx2]
-
-                # calcul (one function for each calculation options)
-                if opt == 0:  # pg
-                    # optmization possibility: feed_back the vel_c_att_t and height_c_all_t and area_all_t
-                    [vh_all_t,  vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
-                        calc_hab_norm(ikle_all_t, point_all, inter_vel_all, inter_height_all, substrate_all_pg,
-                                      pref_vel, pref_height, pref_sub)
-                elif opt == 1:  # dom
-                    [vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
-                        calc_hab_norm(ikle_all_t, point_all, inter_vel_all,inter_height_all, substrate_all_dom,
-                                      pref_vel, pref_height, pref_sub)
-                elif opt == 2:  # percentage
-                    sub_per = load_hdf5.load_sub_percent(merge_name, path_merge)
-                    if len(sub_per) == 1:
-                        print('Error: Substrate data in percentage form is not found. Habitat by percentage cannot be'
-                              ' computed. \n')
-                        return failload
-                    [vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
-                        calc_hab_norm(ikle_all_t, point_all, inter_vel_all, inter_height_all, sub_per,
-                                      pref_vel, pref_height, pref_sub, True)
-                elif opt == 3:
-                    [vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
-                        calc_hab_norm(ikle_all_t, point_all, inter_vel_all, inter_height_all, substrate_all_dom,
-                                      pref_vel, pref_height, pref_sub, False, False)
-                else:
-                    print('Error: the calculation method is not found. \n')
-                    return failload
-                vh_all_t_sp.append(vh_all_t)
-                spu_all_t_sp.append(spu_all_t)
+                pref_height_all.append(pref_height[idx2])
+                pref_vel_all.append(pref_vel[idx2])
+                pref_sub_all.append(pref_sub[idx2])
 
         if found_stage == 0:
             print('Error: the name of the fish stage are not coherent \n')
             return failload
 
-    b = time.time()
-
-    return vh_all_t_sp, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t_sp, area_c_all_t
+    return pref_height_all, pref_vel_all, pref_sub_all
 
 
-def calc_hab_norm(ikle_all_t, point_all_t, vel, height, sub, pref_vel, pref_height, pref_sub, percent=False,
-                  take_sub =True):
+def calc_cell_geometry(ikle_all_t, point_all_t, vel, height):
     """
-    This function calculates the habitat suitiabilty index (f(H)xf(v)xf(sub)) for each and the SPU which is the sum of
-    all habitat suitability index weighted by the cell area for each reach. It is called by clac_hab_norm.
+    This function calculates the data by cell which only depends on the merge file: the velocity and the height
+    by cell (mean of the three nodes) and the area of the cells (Heron's formula). As this data is the same for all
+    species and stages, it is computed once by merge file in calc_hab() and given to calc_hab_norm() for each
+    species.
+
+    The result is a dictionary with the following keys. Each value is a list by time step and by reach in the same
+    form than the outputs of calc_hab_norm(). The first time step is the whole profile and has no data.
+
+    *   valid: True if the connectivity table of the reach is well-formed
+    *   v_cell: the velocity by cell
+    *   h_cell: the water height by cell
+    *   area_c: the area of each cell
+    *   area_reach: the total area of the reach
 
     :param ikle_all_t: the connectivity table for all time step, all reach
     :param point_all_t: the point of the grid
-    :param vel: the velocity data for all time step, all reach
-    :param height: the water height data for all time step, all reach
-    :param sub: the substrate data (can be coarser or dominant substrate based on function's call)
-    :param pref_vel: the preference index for the velcoity (for one life stage)
-    :param pref_sub: the preference index for the substrate  (for one life stage)
-    :param pref_height: the preference index for the height  (for one life stage)
-    :param percent: If True, the variable sub is in percent form, not in the form dominant/coarser
-    :param take_sub: If False, the substrate data is neglected.
-    :return: vh of one life stage, area, habitat value
-
+    :param vel: the velocity data for all time step, all reach (by node)
+    :param height: the water height data for all time step, all reach (by node)
+    :return: the cell geometry (dict)
     """
 
-    if len(height) != len(vel) or len(height) != len(sub):
-        return [-99], [-99], [-99], [-99], [-99], [-99]
-    s_pref_c = 1
-
-    vh_all_t = [[]]  # time step 0 is whole profile, no data
-    spu_all_t = [[]]
-    area_all_t = [[]]
-    height_c_all_t = [[[-1]]]
-    vel_c_att_t = [[[-1]]]
-    area_c_all_t = [[[-1]]]
+    cell_geo = dict()
+    cell_geo['valid'] = [[]]  # time step 0 is whole profile, no data
+    cell_geo['area_reach'] = [[]]
+    cell_geo['h_cell'] = [[[-1]]]
+    cell_geo['v_cell'] = [[[-1]]]
+    cell_geo['area_c'] = [[[-1]]]
 
     for t in range(1, len(height)):  # time step 0 is whole profile
-        vh_all = []
+        valid = []
         height_c = []
         vel_c = []
         area_all = []
         area_c_all = []
-        spu_all = []
         height_t = height[t]
         vel_t = vel[t]
-        sub_t = sub[t]
         ikle_t = ikle_all_t[t]
         point_t = point_all_t[t]
         # if failed before
         if vel_t[0][0] == -99:
-            vh_all = [[-99]]
             vel_c = [[-99]]
             height_c = [[-99]]
-            area = [[-99]]
         else:
             for r in range(0, len(height_t)):
 
@@ -339,27 +386,23 @@ def calc_hab_norm(ikle_all_t, point_all_t, vel, height, sub, pref_vel, pref_heig
                 ikle = np.array(ikle_t[r])
                 h = np.array(height_t[r])
                 v = np.array(vel_t[r])
-                s = np.array(sub_t[r])
                 p = np.array(point_t[r])
 
                 if len(ikle) == 0:
                     print('Warning: The connectivity table was not well-formed for one reach (1) \n')
-                    vh = [-99]
-                    v_cell = [-99]
-                    h_cell = [-99]
-                    area_reach = [-99]
-                    spu_reach = -99
-                    area = [-99]
+                    ok = False
                 elif len(ikle[0]) < 3:
                     print('Warning: The connectivity table was not well-formed for one reach (2) \n')
-                    vh = [-99]
+                    ok = False
+                else:
+                    ok = True
+
+                if not ok:
                     v_cell = [-99]
                     h_cell = [-99]
                     area_reach = [-99]
-                    spu_reach = -99
                     area = [-99]
                 else:
-
                     # get data by cells
                     v1 = v[ikle[:, 0]]
                     v2 = v[ikle[:, 1]]
@@ -384,20 +427,138 @@ def calc_hab_norm(ikle_all_t, point_all_t, vel, height, sub, pref_vel, pref_heig
                     area[area < 0] = 0  # -1e-11, -2e-12, etc because some points are so close
                     area = area**0.5
                     area_reach = np.sum(area)
-                    # get pref value
-                    h_pref_c = find_pref_value(h_cell, pref_height)
-                    v_pref_c = find_pref_value(v_cell, pref_vel)
+
+                valid.append(ok)
+                vel_c.append(v_cell)
+                height_c.append(h_cell)
+                area_all.append(area_reach)
+                area_c_all.append(area)
+
+        cell_geo['valid'].append(valid)
+        cell_geo['v_cell'].append(vel_c)
+        cell_geo['h_cell'].append(height_c)
+        cell_geo['area_reach'].append(area_all)
+        cell_geo['area_c'].append(area_c_all)
+
+    return cell_geo
+
+
+def calc_hab_norm(ikle_all_t, point_all_t, vel, height, sub, pref_vel, pref_height, pref_sub, percent=False,
+                  take_sub =True, cell_geo=None):
+    """
+    This function calculates the habitat suitiabilty index (f(H)xf(v)xf(sub)) for each and the SPU which is the sum of
+    all habitat suitability index weighted by the cell area for each reach. It is the case with one life stage of
+    calc_hab_norm_multi().
+
+    :param ikle_all_t: the connectivity table for all time step, all reach
+    :param point_all_t: the point of the grid
+    :param vel: the velocity data for all time step, all reach
+    :param height: the water height data for all time step, all reach
+    :param sub: the substrate data (can be coarser or dominant substrate based on function's call)
+    :param pref_vel: the preference index for the velcoity (for one life stage)
+    :param pref_sub: the preference index for the substrate  (for one life stage)
+    :param pref_height: the preference index for the height  (for one life stage)
+    :param percent: If True, the variable sub is in percent form, not in the form dominant/coarser
+    :param take_sub: If False, the substrate data is neglected.
+    :param cell_geo: the velocity, height and area by cell from calc_cell_geometry(). If not given, it is calculated
+           here. It is given by calc_hab() so that it is only calculated once for all species.
+    :return: vh of one life stage, area, habitat value
+
+    """
+
+    [vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t] = \
+        calc_hab_norm_multi(ikle_all_t, point_all_t, vel, height, sub, [pref_vel], [pref_height], [pref_sub],
+                            percent, take_sub, cell_geo)
+    if vh_all_t == [-99]:
+        return [-99], [-99], [-99], [-99], [-99], [-99]
+    [vh_all_t_sp, spu_all_t_sp] = unstack_hab(vh_all_t, spu_all_t, 1)
+
+    return vh_all_t_sp[0], vel_c_att_t, height_c_all_t, area_all_t, spu_all_t_sp[0], area_c_all_t
+
+
+def calc_hab_norm_multi(ikle_all_t, point_all_t, vel, height, sub, pref_vel_all, pref_height_all, pref_sub_all,
+                        percent=False, take_sub=True, cell_geo=None):
+    """
+    This function calculates the habitat suitiabilty index (f(H)xf(v)xf(sub)) and the SPU for many life stages
+    (of one or more species) in one pass. The data by cell (velocity, height, area) is taken once for all stages
+    and the substrate preference is only evaluated on the substrate values which exist in the reach (usually
+    the eight classes of the cemagref code).
+
+    The habitat value is given for each time step and each reach as an array with one line by stage and one
+    column by cell. The SPU is given for each time step as an array with one line by stage and one column by reach.
+    The time step 0 is the whole profile and has no data. The function unstack_hab() can be used to get the habitat
+    value and the spu by stage as given by calc_hab_norm().
+
+    :param ikle_all_t: the connectivity table for all time step, all reach
+    :param point_all_t: the point of the grid
+    :param vel: the velocity data for all time step, all reach
+    :param height: the water height data for all time step, all reach
+    :param sub: the substrate data (can be coarser or dominant substrate based on function's call)
+    :param pref_vel_all: the preference index for the velcoity (list with one preference by life stage)
+    :param pref_height_all: the preference index for the height (list with one preference by life stage)
+    :param pref_sub_all: the preference index for the substrate (list with one preference by life stage)
+    :param percent: If True, the variable sub is in percent form, not in the form dominant/coarser
+    :param take_sub: If False, the substrate data is neglected.
+    :param cell_geo: the velocity, height and area by cell from calc_cell_geometry(). If not given, it is calculated
+           here.
+    :return: vh of all life stages, velocity by cell, height by cell, area by reach, spu of all life stages,
+             area by cell
+    """
+
+    if len(height) != len(vel) or len(height) != len(sub):
+        return [-99], [-99], [-99], [-99], [-99], [-99]
+    nb_sp = len(pref_vel_all)
+
+    if cell_geo is None:
+        cell_geo = calc_cell_geometry(ikle_all_t, point_all_t, vel, height)
+    vel_c_att_t = cell_geo['v_cell']
+    height_c_all_t = cell_geo['h_cell']
+    area_all_t = cell_geo['area_reach']
+    area_c_all_t = cell_geo['area_c']
+
+    # the substrate preference for each class in the percentage case
+    if percent:
+        s_pref_class = find_pref_value_multi(np.arange(1.0, 9.0), pref_sub_all)
+
+    vh_all_t = [[]]  # time step 0 is whole profile, no data
+    spu_all_t = [np.zeros((nb_sp, 0))]
+
+    for t in range(1, len(height)):  # time step 0 is whole profile
+        vh_all = []
+        spu_all = np.zeros((nb_sp, 0))
+        sub_t = sub[t]
+        # if failed before
+        if vel[t][0][0] == -99:
+            vh_all = [np.zeros((nb_sp, 1)) - 99]
+        else:
+            nb_reach = len(height[t])
+            spu_all = np.zeros((nb_sp, nb_reach))
+            for r in range(0, nb_reach):
+
+                if not cell_geo['valid'][t][r]:
+                    vh = np.zeros((nb_sp, 1)) - 99
+                    spu_all[:, r] = -99
+                else:
+                    s = np.array(sub_t[r])
+                    v_cell = vel_c_att_t[t][r]
+                    h_cell = height_c_all_t[t][r]
+                    area = area_c_all_t[t][r]
+
+                    # get pref value (one line by stage)
+                    h_pref_c = find_pref_value_multi(h_cell, pref_height_all)
+                    v_pref_c = find_pref_value_multi(v_cell, pref_vel_all)
                     if percent:
                         for st in range(0, 8):
                             s0 = s[:, st]
-                            sthere = np.zeros((len(s0),)) + st+1
-                            s_pref_st = find_pref_value(sthere, pref_sub)
+                            s_pref_st = s_pref_class[:, st:st+1]
                             if st == 0:
                                 s_pref_c = s_pref_st * s0 / 100
                             else:
                                 s_pref_c += s0/100*s_pref_st
                     else:
-                        s_pref_c = find_pref_value(s, pref_sub)
+                        # few different substrate values, the preference is evaluated once by value
+                        s_val, s_ind = np.unique(s, return_inverse=True)
+                        s_pref_c = find_pref_value_multi(s_val, pref_sub_all)[:, s_ind.ravel()]
                     try:
                         if take_sub:
                             vh = h_pref_c * v_pref_c * s_pref_c
@@ -406,26 +567,120 @@ def calc_hab_norm(ikle_all_t, point_all_t, vel, height, sub, pref_vel, pref_heig
                         vh = np.round(vh, 7)  # necessary for  shapefile, do not get above 8 digits of precision
                     except ValueError:
                         print('Error: One time step misses substrate, velocity or water height value \n')
-                        vh = [-99]
-                    spu_reach = np.sum(vh*area)
+                        vh = np.zeros((nb_sp, 1)) - 99
+                    for sp in range(0, nb_sp):
+                        spu_all[sp, r] = np.sum(vh[sp] * area)
 
-                vh_all.append(list(vh))
-                vel_c.append(v_cell)
-                height_c.append(h_cell)
-                area_all.append(area_reach)
-                area_c_all.append(area)
-                spu_all.append(spu_reach)
+                vh_all.append(vh)
 
         vh_all_t.append(vh_all)
-        vel_c_att_t.append(vel_c)
-        height_c_all_t.append(height_c)
         spu_all_t.append(spu_all)
-        area_all_t.append(area_all)
-        area_c_all_t.append(area_c_all)
 
     return vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t
 
 
+def calc_hab_norm_parallel(ikle_all_t, point_all_t, vel, height, sub, pref_vel_all, pref_height_all, pref_sub_all,
+                           percent=False, take_sub=True, workers=2):
+    """
+    This function calculates the same habitat values than calc_hab_norm_multi(), but the time steps are sent to a pool
+    of processes. Each time step is independant and is calculated by calc_hab_one_timestep(). Pool.map() keeps the
+    order of the time steps so the results are identical to the serial case.
+
+    The warnings of the calculation are printed by the child processes, so they are not redirected to the GUI.
+
+    :param ikle_all_t: the connectivity table for all time step, all reach
+    :param point_all_t: the point of the grid
+    :param vel: the velocity data for all time step, all reach
+    :param height: the water height data for all time step, all reach
+    :param sub: the substrate data (can be coarser or dominant substrate based on function's call)
+    :param pref_vel_all: the preference index for the velcoity (list with one preference by life stage)
+    :param pref_height_all: the preference index for the height (list with one preference by life stage)
+    :param pref_sub_all: the preference index for the substrate (list with one preference by life stage)
+    :param percent: If True, the variable sub is in percent form, not in the form dominant/coarser
+    :param take_sub: If False, the substrate data is neglected.
+    :param workers: the number of processes
+    :return: the same outputs than calc_hab_norm_multi()
+    """
+
+    if len(height) != len(vel) or len(height) != len(sub):
+        return [-99], [-99], [-99], [-99], [-99], [-99]
+    nb_sp = len(pref_vel_all)
+
+    # one task by time step (time step 0 is whole profile)
+    tasks = []
+    for t in range(1, len(height)):
+        tasks.append([ikle_all_t[t], point_all_t[t], vel[t], height[t], sub[t], pref_vel_all, pref_height_all,
+                      pref_sub_all, percent, take_sub])
+
+    if len(tasks) > 0:
+        with Pool(processes=min(workers, len(tasks))) as pool:
+            res_all_t = pool.map(calc_hab_one_timestep, tasks)
+    else:
+        res_all_t = []
+
+    # gather the results in the same form than calc_hab_norm_multi()
+    vh_all_t = [[]]
+    vel_c_att_t = [[[-1]]]
+    height_c_all_t = [[[-1]]]
+    area_all_t = [[]]
+    spu_all_t = [np.zeros((nb_sp, 0))]
+    area_c_all_t = [[[-1]]]
+    for res in res_all_t:
+        vh_all_t.append(res[0])
+        vel_c_att_t.append(res[1])
+        height_c_all_t.append(res[2])
+        area_all_t.append(res[3])
+        spu_all_t.append(res[4])
+        area_c_all_t.append(res[5])
+
+    return vh_all_t, vel_c_att_t, height_c_all_t, area_all_t, spu_all_t, area_c_all_t
+
+
+def calc_hab_one_timestep(task):
+    """
+    This function calculates the habitat value for one time step. It is used by calc_hab_norm_parallel() on the
+    processes of the pool, so it only takes one argument (a list with the data of the time step and the options
+    of calc_hab_norm_multi()). The time step is given to calc_hab_norm_multi() as the first time step after an empty
+    whole profile.
+
+    :param task: the list [ikle, point, vel, height, sub, pref_vel_all, pref_height_all, pref_sub_all, percent,
+           take_sub] for one time step
+    :return: the outputs of calc_hab_norm_multi() for this time step
+    """
+    [ikle_t, point_t, vel_t, height_t, sub_t, pref_vel_all, pref_height_all, pref_sub_all, percent, take_sub] = task
+
+    res = calc_hab_norm_multi([[], ikle_t], [[], point_t], [[], vel_t], [[], height_t], [[], sub_t], pref_vel_all,
+                              pref_height_all, pref_sub_all, percent, take_sub)
+
+    return [r[1] for r in res]
+
+
+def unstack_hab(vh_all_t, spu_all_t, nb_sp):
+    """
+    This function takes the habitat value and the spu as given by calc_hab_norm_multi() (one array for all stages)
+    and gives them by stage, in the form used by the outputs (vh_all_t_sp[stage][time step][reach][cell] and
+    spu_all_t_sp[stage][time step][reach]).
+
+    :param vh_all_t: the habitat value by time step and by reach (array stages x cells)
+    :param spu_all_t: the spu by time step (array stages x reaches)
+    :param nb_sp: the number of stages
+    :return: the habitat value and the spu by stage
+    """
+    vh_all_t_sp = []
+    spu_all_t_sp = []
+
+    for sp in range(0, nb_sp):
+        vh_sp = [[]]  # time step 0 is whole profile, no data
+        spu_sp = [[]]
+        for t in range(1, len(vh_all_t)):
+            vh_sp.append([list(vh[sp]) for vh in vh_all_t[t]])
+            spu_sp.append(list(spu_all_t[t][sp]))
+        vh_all_t_sp.append(vh_sp)
+        spu_all_t_sp.append(spu_sp)
+
+    return vh_all_t_sp, spu_all_t_sp
+
+
 def find_pref_value(data, pref):
     """
     This function finds the preference value associated with the data for each cell. For this, it finds the last
@@ -481,8 +736,88 @@ def find_pref_value(data, pref):
     return pref_data
 
 
+def find_pref_value_array(data, pref):
+    """
+    This function finds the preference value associated with the data for each cell. It gives the same result than
+    find_pref_value(), but all the cells are treated together with numpy instead of one by one with bisect. The
+    preference curve is cut in segment (one linear function by segment) and np.searchsorted is used to find the
+    segment of each cell.
+
+    As in find_pref_value(), the data lower than the first point of the preference curve is extrapolated with the
+    first segment, the data higher than the last point gets the last preference value and the small errors of the
+    linear interpolation are corrected to stay between 0 and 1. The warnings are only printed once by call (and not
+    once by cell).
+
+    :param data: the data on the cells (for one time step, on reach), numpy array or list
+    :param pref: the pref data [pref, class data]
+    :return: the preference value by cell (numpy array)
+    """
+
+    pref = np.array(pref, dtype=np.float64)
+    pref_f = pref[1]  # the preferene value
+    pref_d = pref[0]  # the data linked with it
+    data = np.asarray(data)
+    nb_pref = len(pref_d)
+
+    # last point of the preference curve under the data (same as bisect.bisect -1)
+    indh = np.searchsorted(pref_d, data, side='right') - 1
+    indh[indh < 0] = 0
+    pref_data = pref_f[indh]
+
+    if nb_pref < 2:
+        return pref_data
+
+    # linear function for each segment of the preference curve
+    dmin = pref_d[:-1]
+    dmax = pref_d[1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a1 = (pref_f[1:] - pref_f[:-1]) / (dmax - dmin)
+        b1 = pref_f[:-1] - a1 * dmin
+
+    # cells which are interpolated (the others get the preference value of the point)
+    inter = indh < nb_pref - 1
+    inter[inter] = dmax[indh[inter]] != dmin[indh[inter]]
+    ind_seg = indh[inter]
+    data_inter = data[inter]
+    pref_inter = a1[ind_seg] * data_inter + b1[ind_seg]
+
+    # the linear interpolation sometimes creates value like -5.55e-17
+    outside = (pref_inter < 0) | (pref_inter > 1)
+    if np.any(outside):
+        to_zero = outside & (pref_inter > -1e-3) & (pref_inter < 0)
+        to_one = outside & (pref_inter > 1) & (pref_inter < 1 + 1e10)
+        pref_inter[to_zero] = 0
+        pref_inter[to_one] = 1
+        wrong = outside & ~to_zero & ~to_one
+        if np.any(wrong):
+            if np.any(data_inter[wrong] < 0):
+                print('Warning: Water or heigth data is smaller than zero. \n')
+            if np.any(~(data_inter[wrong] < 0)):
+                print('Warning: preference data is not between 0 and 1. \n')
+    pref_data[inter] = pref_inter
+
+    return pref_data
+
+
+def find_pref_value_multi(data, pref_all):
+    """
+    This function evaluates more than one preference curve on the same data. It is useful when the same cells are
+    used for many species or stages. It uses find_pref_value_array() for each preference curve.
+
+    :param data: the data on the cells (for one time step, on reach)
+    :param pref_all: a list of pref data, each one in the form [pref, class data]
+    :return: a numpy array of the preference values (one line by preference curve, one column by cell)
+    """
+    data = np.asarray(data)
+    pref_data = np.zeros((len(pref_all), len(data)))
+    for i, pref in enumerate(pref_all):
+        pref_data[i] = find_pref_value_array(data, pref)
+
+    return pref_data
+
+
 def save_hab_txt(name_merge_hdf5, path_hdf5, vh_data, vel_data, height_data, name_fish, path_txt, name_base,
-                 sim_name=[], erase_id=False):
+                 sim_name=[], erase_id=False, text_format='txt'):
     """
     This function print the text output. We create one set of text file by time step. Each Reach is separated by the
     key work REACH follwoed by the reach number (strating from 0). There are three files by time steps: one file which
@@ -494,6 +829,16 @@ def save_hab_txt(name_merge_hdf5, path_hdf5, vh_data, vel_data, height_data, nam
     The name and the form of the files do not change with the chosen language. The idea is that these files are quite big
     and that they will mostly be used by computer program. So it is easier for the user if the name and form is coherent.
 
+    The same tables can be saved in binary files, which are smaller and much faster to write and to read for big
+    grids (text_format, from the figure option of the same name):
+
+    * 'npz': one numpy file (.npz) by table and by time step, with the same name as the text file. Each column of the
+      table is an array of the npz file, with the name of the column in the text file (reach, x, y, cell1, velocity,
+      VH0, etc.). The result file also contains the name of the fish (name_fish). The reaches are one after the other.
+    * 'hdf5': one hdf5 file for all time steps (habitat_table_name_base.h5) with one group by table (xy, gridcell
+      and result). Each column is a dataset of the group, with the added columns timestep and reach. The name of the
+      time steps, the fish names and the units are attributes of the groups.
+
     :param name_merge_hdf5: the name of the hdf5 merged file
     :param path_hdf5: the path to the hydrological hdf5 data
     :param vel_data: the velocity by reach by time step on the cell (not node!)
@@ -504,115 +849,186 @@ def save_hab_txt(name_merge_hdf5, path_hdf5, vh_data, vel_data, height_data, nam
     :param name_base: a string on which to base the name of the files
     :param sim_name: the name of the simulation/time step (list of strings)
     :param erase_id: If True, we erase old text file from identical hydraulic model
+    :param text_format: 'txt' (default), 'npz' or 'hdf5'
     """
 
-    [ikle, point, blob, blob, sub_pg_data, sub_dom_data] = \
-        load_hdf5.load_hdf5_hyd(name_merge_hdf5, path_hdf5, True)
-    if ikle == [-99]:
+    if text_format not in ['txt', 'npz', 'hdf5']:
+        print('Warning: the format ' + str(text_format) + ' of the text output is not known. Text files are used.\n')
+        text_format = 'txt'
+
+    # the grid and the substrate are read one time step at the time
+    hdf5 = load_hdf5.get_hydro_hdf5(name_merge_hdf5, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99:
         return
 
     if not os.path.exists(path_txt):
         print('Error: the path to save the text file do not exists. \n')
+        hdf5.close()
         return
 
-    if len(sim_name) > 0 and len(sim_name) != len(ikle) - 1:
+    if len(sim_name) > 0 and len(sim_name) != hdf5.nb_timestep:
         sim_name = []
 
+    # the name of the columns
+    nb_fish = len(name_fish)
+    col_xy = ['reach', 'x', 'y']
+    col_grid = ['reach', 'cell1', 'cell2', 'cell3']
+    col_result = ['reach', 'cells', 'velocity', 'height', 'coarser_substrate', 'dominant_substrate'] \
+        + ['VH' + str(i) for i in range(0, nb_fish)]
+    col_table = {'xy': col_xy, 'gridcell': col_grid, 'result': col_result}
+    unit_result = ['[]', '[]', '[m/s]', '[m]', '[Code_Cemagref]', '[Code_Cemagref]'] \
+        + [n.replace(' ', '_') for n in name_fish]  # so space/tab is only a separator
+
+    # one hdf5 file for all time steps
+    file_table = None
+    if text_format == 'hdf5':
+        name_table = get_hab_txt_name('habitat_table', '', name_base, '.h5', erase_id, path_txt)
+        if name_table is None:
+            hdf5.close()
+            return
+        file_table = h5py.File(name_table, 'w')
+        for name_g in ['xy', 'gridcell', 'result']:
+            group = file_table.create_group(name_g)
+            group.attrs['sim_name'] = [str(n).encode('utf-8') for n in sim_name]
+            for c in ['timestep'] + col_table[name_g]:
+                dtype = np.int64 if c in ['timestep', 'reach', 'cells', 'cell1', 'cell2', 'cell3'] else np.float64
+                group.create_dataset(c, (0,), dtype=dtype, maxshape=(None,), chunks=(65536,))
+        file_table['result'].attrs['units'] = [u.encode('utf-8') for u in unit_result[2:6]]
+        file_table['result'].attrs['name_fish'] = [n.encode('utf-8') for n in name_fish]
+
     # we do not print the first time step with the whole profile
-    nb_reach = len(ikle[0])
-    for t in range(1, len(ikle)):
-        ikle_here = ikle[t][0]
-        if len(ikle_here) < 2:
+    nb_reach = hdf5.nb_reach
+    for t, data_t in hdf5.iter_timestep(True):
+        ikle_here = data_t['ikle'][0]
+        if ikle_here is None or len(ikle_here) < 2:
             print('Warning: One time step failed. \n')
-        else:
-            # choose the name of the text file
-            if not erase_id:
-                if not sim_name:
-                    name1 = 'xy_' + 't_' + str(t) + '_' + name_base + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") \
-                            + '.txt'
-                    name2 = 'gridcell_' + 't_' + str(t)+ '_' + name_base + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") \
-                            + '.txt'
-                    name3 = 'result_' + 't_' + str(t) + '_' + name_base + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") \
-                            + '.txt'
-                else:
-                    name1 = 'xy_' + 't_' + sim_name[t-1] + '_' + name_base + '_' + \
-                            time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.txt'
-                    name2 = 'gridcell_' + 't_' + sim_name[t-1] + '_' + name_base + '_' + \
-                            time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.txt'
-                    name3 = 'result_' + 't_' + sim_name[t-1] + '_' + name_base + '_' + \
-                            time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.txt'
-            else:
-                if not sim_name:
-                    name1 = 'xy_' + 't_' + str(t) + '_' + name_base + '.txt'
-                    name2 = 'gridcell_' + 't_' + str(t) + '_' + name_base + '.txt'
-                    name3 = 'result_' + 't_' + str(t) + '_' + name_base + '.txt'
-                else:
-                    name1 = 'xy_' + 't_' + sim_name[t - 1] + '_' + name_base + '.txt'
-                    name2 = 'gridcell_' + 't_' + sim_name[t - 1] + '_' + name_base + '.txt'
-                    name3 = 'result_' + 't_' + sim_name[t - 1] + '_' + name_base + '.txt'
-                try:
-                    if os.path.isfile(os.path.join(path_txt, name1)):
-                        os.remove(os.path.join(path_txt, name1))
-                    if os.path.isfile(os.path.join(path_txt, name2)):
-                        os.remove(os.path.join(path_txt, name2))
-                    if os.path.isfile(os.path.join(path_txt, name3)):
-                        os.remove(os.path.join(path_txt, name3))
-                except PermissionError:
-                    print('Error: Could not modfiy the text file. Might be open in another prgram\n')
+            continue
+
+        # the columns of the three tables by reach
+        xy_r = []
+        grid_r = []
+        result_r = []
+        for r in range(0, nb_reach):
+            ikle_here = np.asarray(data_t['ikle'][r]).reshape(-1, 3)
+            p_here = np.asarray(data_t['point_all'][r])
+            v_here = np.asarray(vel_data[t][r])
+            nb_c = len(v_here)
+            vh_here = []
+            for j in range(0, nb_fish):
+                vh_here.append(np.asarray(vh_data[j][t][r]))
+                if len(vh_here[j]) < nb_c:
+                    print('Error: Results could not be written to text file. \n')
+                    hdf5.close()
+                    if file_table is not None:
+                        file_table.close()
                     return
-            name1 = os.path.join(path_txt, name1)
-            name2 = os.path.join(path_txt, name2)
-            name3 = os.path.join(path_txt, name3)
-
-            # grid
-            with open(name2,'wt', encoding='utf-8') as f:
-                for r in range(0,  nb_reach):
-                    ikle_here = ikle[t][r]
-                    f.write('REACH ' + str(r)+'\n')
-                    f.write('reach\tcell1\tcell2\tcell3'+'\n')
-                    for c in ikle_here:
-                        f.write(str(r) + '\t' + str(c[0]) + '\t' + str(c[1]) + '\t' + str(c[2]) + '\n')
-            # point
-            with open(name1, 'wt', encoding='utf-8') as f:
-                for r in range(0,  nb_reach):
-                    p_here = point[t][r]
-                    f.write('REACH ' + str(r)+'\n')
-                    f.write('reach\tx\ty'+'\n')
-                    for p in p_here:
-                        f.write(str(r) + '\t' + str(p[0]) + '\t' + str(p[1])+'\n')
-
-            # result
-            with open(name3, 'wt', encoding='utf-8') as f:
-                for r in range(0, nb_reach):
-                    v_here = vel_data[t][r]
-                    h_here = height_data[t][r]
-                    sub_pg = sub_pg_data[t][r]
-                    sub_dom = sub_dom_data[t][r]
-                    f.write('REACH ' + str(r) + '\n')
-                    # header 1
-                    header = 'reach\tcells\tvelocity\theight\tcoarser_substrate\tdominant_substrate'
-                    for i in range(0, len(name_fish)):
-                        header += '\tVH'+str(i)
-                    header += '\n'
-                    f.write(header)
-                    # header 2
-                    header = '[]\t[]\t[m/s]\t[m]\t[Code_Cemagref]\t[Code_Cemagref]'
-                    for i in name_fish:
-                        i = i.replace(' ', '_')  # so space/tab is only a separator
-                        header += '\t' + i
-                    header += '\n'
-                    f.write(header)
-                    # data
-                    for i in range(0, len(v_here)):
-                        vh_str = ''
-                        for j in range(0, len(name_fish)):
-                            try:
-                                vh_str += str(vh_data[j][t][r][i]) + '\t'
-                            except IndexError:
-                                print('Error: Results could not be written to text file. \n')
-                                return
-                        f.write(str(r) + '\t' + str(i) + '\t' + str(v_here[i]) + '\t' + str(h_here[i]) + '\t' +
-                                str(sub_pg[i]) + '\t' + str(sub_dom[i]) + '\t' + vh_str + '\n')
+            xy_r.append([np.full((len(p_here),), r), p_here[:, 0], p_here[:, 1]])
+            grid_r.append([np.full((len(ikle_here),), r), ikle_here[:, 0], ikle_here[:, 1], ikle_here[:, 2]])
+            result_r.append([np.full((nb_c,), r), np.arange(nb_c), v_here, np.asarray(height_data[t][r]),
+                             np.asarray(data_t['sub_pg'][r]), np.asarray(data_t['sub_dom'][r])]
+                            + [vh[:nb_c] for vh in vh_here])
+
+        if text_format == 'hdf5':
+            for name_g, table_r in [('xy', xy_r), ('gridcell', grid_r), ('result', result_r)]:
+                group = file_table[name_g]
+                columns = [np.concatenate(c) for c in zip(*table_r)]
+                columns = [np.full((len(columns[0]),), t)] + columns
+                for c, data_c in zip(['timestep'] + col_table[name_g], columns):
+                    dset = group[c]
+                    n0 = dset.shape[0]
+                    dset.resize((n0 + len(data_c),))
+                    dset[n0:] = data_c
+            continue
+
+        # choose the name of the files
+        if not sim_name:
+            t_name = str(t)
+        else:
+            t_name = sim_name[t - 1]
+        ext = '.' + text_format
+        name1 = get_hab_txt_name('xy', t_name, name_base, ext, erase_id, path_txt)
+        name2 = get_hab_txt_name('gridcell', t_name, name_base, ext, erase_id, path_txt)
+        name3 = get_hab_txt_name('result', t_name, name_base, ext, erase_id, path_txt)
+        if name1 is None or name2 is None or name3 is None:
+            hdf5.close()
+            return
+
+        if text_format == 'npz':
+            np.savez(name1, **dict(zip(col_xy, [np.concatenate(c) for c in zip(*xy_r)])))
+            np.savez(name2, **dict(zip(col_grid, [np.concatenate(c) for c in zip(*grid_r)])))
+            result = dict(zip(col_result, [np.concatenate(c) for c in zip(*result_r)]))
+            result['name_fish'] = np.array(name_fish, dtype=str)
+            np.savez(name3, **result)
+            continue
+
+        # grid
+        with open(name2, 'wt', encoding='utf-8') as f:
+            for r in range(0, nb_reach):
+                f.write('REACH ' + str(r) + '\n')
+                f.write('\t'.join(col_grid) + '\n')
+                write_txt_columns(f, grid_r[r])
+        # point
+        with open(name1, 'wt', encoding='utf-8') as f:
+            for r in range(0, nb_reach):
+                f.write('REACH ' + str(r) + '\n')
+                f.write('\t'.join(col_xy) + '\n')
+                write_txt_columns(f, xy_r[r])
+        # result (each line ends with a tab)
+        with open(name3, 'wt', encoding='utf-8') as f:
+            for r in range(0, nb_reach):
+                f.write('REACH ' + str(r) + '\n')
+                f.write('\t'.join(col_result) + '\n')
+                f.write('\t'.join(unit_result) + '\n')
+                write_txt_columns(f, result_r[r], '\t')
+
+    if file_table is not None:
+        file_table.close()
+    hdf5.close()
+
+
+def get_hab_txt_name(name_table, t_name, name_base, ext, erase_id, path_txt):
+    """
+    This function gives the name of one file of the text output (see save_hab_txt()). If erase_id is True, the old
+    file with the same name is erased. Otherwise, the time stamp is added to the name.
+
+    :param name_table: the name of the table (xy, gridcell, result)
+    :param t_name: the name of the time step (no time step if empty)
+    :param name_base: a string on which to base the name of the files
+    :param ext: the extension of the file
+    :param erase_id: If True, we erase old text file from identical hydraulic model
+    :param path_txt: the path where to save the text file
+    :return: the name of the file (with the path) or None if the old file could not be erased
+    """
+    name = name_table + '_'
+    if t_name:
+        name += 't_' + t_name + '_'
+    name += name_base
+    if not erase_id:
+        name += '_' + fig_option.get_time_stamp()
+    name = os.path.join(path_txt, name + ext)
+    if erase_id and os.path.isfile(name):
+        try:
+            os.remove(name)
+        except PermissionError:
+            print('Error: Could not modfiy the text file. Might be open in another prgram\n')
+            return None
+    return name
+
+
+def write_txt_columns(f, columns, end=''):
+    """
+    This function writes a table in a text file, one line by row and the columns separated by tab. Each column is
+    converted to python numbers (tolist()) and then to text in one go, which gives the same text as the function str()
+    on the numpy numbers but is much faster than writing the file cell by cell.
+
+    :param f: the text file (open)
+    :param columns: the columns of the table (list of np.array of the same length)
+    :param end: a string added at the end of each line
+    """
+    if len(columns) == 0 or len(columns[0]) == 0:
+        return
+    columns_str = [list(map(str, np.asarray(c).tolist())) for c in columns]
+    f.write((end + '\n').join(map('\t'.join, zip(*columns_str))) + end + '\n')
 
 
 def save_spu_txt(area_all, spu_all, name_fish, path_txt, name_base, sim_name=[], lang=0, erase_id=False):
@@ -635,9 +1051,9 @@ def save_spu_txt(area_all, spu_all, name_fish, path_txt, name_base, sim_name=[],
 
     if not erase_id:
         if lang == 0:
-            name = 'wua_' + name_base + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.txt'
+            name = 'wua_' + name_base + '_' + fig_option.get_time_stamp() + '.txt'
         else:
-            name = 'spu_' + name_base + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.txt'
+            name = 'spu_' + name_base + '_' + fig_option.get_time_stamp() + '.txt'
     else:
         if lang == 0:
             name = 'wua_' + name_base + '.txt'
@@ -722,85 +1138,68 @@ def save_hab_shape(name_merge_hdf5, path_hdf5, vh_data, vel_data, height_data, n
     :param save_perc: It true the substrate in percentage will be added to the shapefile
     :param erase_id: If True, we erase old text file from identical hydraulic model
     """
-    [ikle, point, blob, blob, sub_pg_data, sub_dom_data] = \
-        load_hdf5.load_hdf5_hyd(name_merge_hdf5, path_hdf5, True)
-    if ikle == [[-99]]:
+    # the grid and the substrate are read one time step at the time
+    hdf5 = load_hdf5.get_hydro_hdf5(name_merge_hdf5, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99:
         return
 
-    if len(sim_name) > 0 and len(sim_name) != len(ikle) - 1:
+    if len(sim_name) > 0 and len(sim_name) != hdf5.nb_timestep:
         sim_name = []
 
-    if save_perc:
-        sub_per_data = load_hdf5.load_sub_percent(name_merge_hdf5, path_hdf5)
-
     # we do not print the first time step with the whole profile
-    nb_reach = len(ikle[0])
-    for t in range(1, len(ikle)):
-        ikle_here = ikle[t][0]
-        if len(ikle_here) < 2:
+    nb_reach = hdf5.nb_reach
+    for t, data_t in hdf5.iter_timestep(True):
+        ikle_here = data_t['ikle'][0]
+        if ikle_here is None or len(ikle_here) < 2:
             print('Warning: One time step failed. \n')
         else:
-            w = shapefile.Writer(shapefile.POLYGON)
-            w.autoBalance = 1
-
-            # get the triangle
-            for r in range(0, nb_reach):
-                ikle_r = ikle[t][r]
-                point_here = point[t][r]
-                for i in range(0, len(ikle_r)):
-                    p1 = list(point_here[ikle_r[i][0]])
-                    p2 = list(point_here[ikle_r[i][1]])
-                    p3 = list(point_here[ikle_r[i][2]])
-                    w.poly(parts=[[p1, p2, p3, p1]])  # the double [[]] is important or it bugs, but why?
-
+            # attribute (one array by field, for all reaches)
+            field_names = []
+            field_data = []
             if t > 0:
-                # attribute
-                for n in name_fish_sh:
-                    w.field('hv'+n, 'F')
-                w.field('velocity', 'F')
-                w.field('water heig', 'F')
-                w.field('conveyance', 'F')
-                w.field('sub_coarser', 'F')
-                w.field('sub_dom', 'F')
+                field_names = ['hv' + n for n in name_fish_sh] + ['velocity', 'water heig', 'conveyance',
+                                                                   'sub_coarser', 'sub_dom']
+                field_data = [[] for f in field_names]
                 if save_perc:
-                    for i in range(0, 8):  # cemagref code
-                        w.field('sub_cl_'+str(i+1), 'F')
-
-                # fill attribute
+                    field_names += ['sub_cl_' + str(i + 1) for i in range(0, 8)]  # cemagref code
+                    field_data += [[] for i in range(0, 8)]
                 for r in range(0, nb_reach):
-                    vel = vel_data[t][r]
-                    height = height_data[t][r]
-                    sub_pg = sub_pg_data[t][r]
-                    sub_dom = sub_dom_data[t][r]
+                    nb_cell = len(data_t['ikle'][r])
+                    vel = np.asarray(vel_data[t][r])[:nb_cell]
+                    height = np.asarray(height_data[t][r])[:nb_cell]
+                    data_r = []
+                    for j in range(0, len(name_fish_sh)):
+                        try:
+                            data_r.append(np.asarray(vh_data[j][t][r])[:nb_cell])
+                        except IndexError:
+                            data_r.append([])
+                    if len(vel) == len(height):
+                        conveyance = vel * height
+                    else:
+                        conveyance = []
+                    data_r += [vel, height, conveyance, data_t['sub_pg'][r][:nb_cell],
+                               data_t['sub_dom'][r][:nb_cell]]
+                    if any([len(d) != nb_cell for d in data_r]):
+                        print('Error: Results could not be written to shape file \n')
+                        hdf5.close()
+                        return
                     if save_perc:
-                        sub_per = sub_per_data[t][r]
-                    ikle_r = ikle[t][r]
-                    for i in range(0, len(ikle_r)):
-                        data_here = ()
-                        for j in range(0, len(name_fish_sh)):
-                            try:
-                                data_here +=(vh_data[j][t][r][i],)
-                            except IndexError:
-                                print('Error: Results could not be written to shape file \n')
-                                return
-                        data_here += vel[i], height[i], vel[i]*height[i], sub_pg[i], sub_dom[i]
-                        if save_perc:
-                            for j in range(0, 8):
-                                try:
-                                    data_here += (sub_per[i][j],)
-                                except IndexError:
-                                    print(' Warnign: Substrate data by percentage could not be found. '
-                                          'Shapefile not created.\n')
-                                    return
-                        # the * pass tuple to function argument
-                        w.record(*data_here)
-
-            w.autoBalance = 1
+                        sub_per = hdf5.sub_percent(t, r)
+                        if sub_per is None or len(sub_per) < nb_cell:
+                            print(' Warnign: Substrate data by percentage could not be found. '
+                                  'Shapefile not created.\n')
+                            hdf5.close()
+                            return
+                        data_r += [sub_per[:nb_cell, j] for j in range(0, 8)]
+                    for j in range(0, len(field_names)):
+                        field_data[j].append(data_r[j])
+                field_data = [np.concatenate(d) for d in field_data]
+
             if not erase_id:
                 if not sim_name:
-                    name1 = name_base + '_t_' + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.shp'
+                    name1 = name_base + '_t_' + str(t) + '_' + fig_option.get_time_stamp() + '.shp'
                 else:
-                    name1 = name_base + '_t_' + sim_name[t-1] + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.shp'
+                    name1 = name_base + '_t_' + sim_name[t-1] + '_' + fig_option.get_time_stamp() + '.shp'
             else:
                 if not sim_name:
                     name1 = name_base + '_t_' + str(t) + '.shp'
@@ -811,9 +1210,12 @@ def save_hab_shape(name_merge_hdf5, path_hdf5, vh_data, vel_data, height_data, n
                         os.remove(os.path.join(path_shp, name1))
                     except PermissionError:
                         print('Error: The shapefile is currently open in an other program. Could not be re-written \n')
+                        hdf5.close()
                         return
 
-            w.save(os.path.join(path_shp, name1))
+            shapefile_bulk.write_tri_shapefile(os.path.join(path_shp, name1), data_t['ikle'], data_t['point_all'],
+                                               field_names, field_data)
+    hdf5.close()
 
 
 def save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt={}, sim_name=[], erase_id=False,
@@ -832,9 +1234,11 @@ def save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt={
     :param erase_id: If True, figure from identical simuation are erased
     :param do_save: If False, the figure is not saved, but the figure is returned to be used for something else
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     if fig_opt['font_size'] > 7:
@@ -914,7 +1318,7 @@ def save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt={
             else:
                 plt.title('Habitat value for the Reach ' + str(r))
             if not erase_id:
-                name = 'WUA_' + name_base + '_Reach_' + str(r) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                name = 'WUA_' + name_base + '_Reach_' + str(r) + '_' + fig_option.get_time_stamp()
             else:
                 name = 'WUA_' + name_base + '_Reach_' + str(r)
                 test = remove_image(name, path_im, format1)
@@ -1013,7 +1417,7 @@ def save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt={
                     plt.xticks(t_all[::10], sim_name[::10], rotation=rot)
             plt.tight_layout()
             if not erase_id:
-                name = 'WUA_' + name_base + '_Reach_' + str(r) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                name = 'WUA_' + name_base + '_Reach_' + str(r) + '_' + fig_option.get_time_stamp()
             else:
                 name = 'WUA_' + name_base + '_Reach_' + str(r)
                 test = remove_image(name, path_im, format1)
@@ -1088,7 +1492,7 @@ def save_hab_fig_spu(area_all, spu_all, name_fish, path_im, name_base, fig_opt={
                 else:
                     plt.xticks(t_all[::10], sim_name[::10], rotation=rot)
             if not erase_id:
-                name = 'WUA_' + name_base + '_All_Reach_'+ time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                name = 'WUA_' + name_base + '_All_Reach_'+ fig_option.get_time_stamp()
             else:
                 name = 'WUA_' + name_base + '_All_Reach_'
                 test = remove_image(name, path_im, format1)
@@ -1124,9 +1528,13 @@ def save_vh_fig_2d(name_merge_hdf5, path_hdf5, vh_all_t_sp, path_im, name_fish,
     :param save_fig: If True the figure is saved
 
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Polygon
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -1135,11 +1543,14 @@ def save_vh_fig_2d(name_merge_hdf5, path_hdf5, vh_all_t_sp, path_im, name_fish,
     mpl.rcParams['pdf.fonttype'] = 42  # to make them editable in Adobe Illustrator
 
     b= 0
-    # get grid data from hdf5
-    [ikle_all_t, point_all_t, blob, blob, sub_pg_data, sub_dom_data] = \
-        load_hdf5.load_hdf5_hyd(name_merge_hdf5, path_hdf5, True)
-    if ikle_all_t == [-99]:
+    # get grid data from hdf5 (only for the time steps which are plotted)
+    hdf5 = load_hdf5.get_hydro_hdf5(name_merge_hdf5, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99:
         return
+    grid_t = dict()
+    for t in time_step:
+        grid_t[t] = hdf5.get_timestep(t)
+    hdf5.close()
     # format name fish
     for id, n in enumerate(name_fish):
         name_fish[id] = n.replace('_', ' ')
@@ -1154,14 +1565,14 @@ def save_vh_fig_2d(name_merge_hdf5, path_hdf5, vh_all_t_sp, path_im, name_fish,
         rt = 0
 
         for t in time_step:
-            try:
-                ikle_t = ikle_all_t[t]
+            if grid_t[t] is not None:
+                ikle_t = grid_t[t]['ikle']
                 all_ok = True
-            except IndexError:
+            else:
                 print('Warning: Figure not created for one time step as the time step was not found \n')
-                all_ok = False  # continue is not ok in try
+                all_ok = False
             if all_ok:
-                point_t = point_all_t[t]
+                point_t = grid_t[t]['point_all']
                 if abs(t) < len(vh_all_t):
                     vh_t = vh_all_t[t]
                     fig, ax = plt.subplots(1)  # new figure
@@ -1265,16 +1676,16 @@ def save_vh_fig_2d(name_merge_hdf5, path_hdf5, vh_all_t_sp, path_im, name_fish,
                         if not erase_id:
                             if not sim_name :
                                 name_fig = 'HSI_' + name_fish[sp] +  '_' + name_base + '_t_' + str(t) + '_' +\
-                                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                                           fig_option.get_time_stamp()
                             elif t-1 >= 0 and sim_name[t - 1]:
                                 name_fig = 'HSI_' + name_fish[sp] + '_' + name_base + '_t_' + sim_name[t - 1] + '_' +\
-                                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                                           fig_option.get_time_stamp()
                             elif t == -1:
                                 name_fig = 'HSI_' + name_fish[sp] + '_' + name_base + '_t_' + sim_name[-1] + '_' + \
-                                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                                           fig_option.get_time_stamp()
                             else:
                                 name_fig = 'HSI_' + name_fish[sp] + '_' + name_base + '_t_' + str(t) + '_' + \
-                                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                                           fig_option.get_time_stamp()
                         else:
                             if not sim_name:
                                 name_fig = 'HSI_' + name_fish[sp] + '_' + name_base + '_t_' + str(t)
@@ -1317,8 +1728,10 @@ def plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_al
     :param sim_name: the name of the time steps when not 0,1,2,3
     :param erase_id: If True, we erase a figure with an identical name
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -1329,25 +1742,26 @@ def plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_al
     if max(timestep)-1 > len(sim_name):
         sim_name = []
 
-    [ikle, point, blob, blob, sub_pg_data, sub_dom_data] = \
-        load_hdf5.load_hdf5_hyd(hdf5_file, path_hdf5, True)
-    if ikle == [[-99]]:
+    # the data is read only for the plotted time steps
+    hdf5 = load_hdf5.get_hydro_hdf5(hdf5_file, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99:
         return
 
     # we do not print the first time step with the whole profile
 
     for t in timestep:
-        try:
-            ikle_here = ikle[t][0]
-        except IndexError:
+        data_t = hdf5.get_timestep(t, True)
+        if data_t is None:
             print('Error: Figure not created. Number of time step was not coherent with hydrological info.\n')
+            hdf5.close()
             return
-        if len(ikle_here) < 2:  # time step failed
+        ikle_here = data_t['ikle'][0]
+        if ikle_here is None or len(ikle_here) < 2:  # time step failed
             pass
         else:
             vel_all = vel_c_all_t[t]
             height_all = height_c_all_t[t]
-            sub_pg_all = sub_pg_data[t]
+            sub_pg_all = data_t['sub_pg']
             area_all = area_c_all_t[t]
 
             for r in range(0, len(vel_all)):  # each reach
@@ -1442,16 +1856,16 @@ def plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_al
             if not erase_id:
                 if not sim_name:
                     name = 'Hist_Hydro' + name_base + '_t_' + str(t) + '_All_Reach_' + \
-                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                           fig_option.get_time_stamp()
                 elif t-1 >=0:
                     name = 'Hist_Hydro' + name_base + '_t_' + sim_name[t-1] + '_All_Reach_' + \
-                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                           fig_option.get_time_stamp()
                 elif t ==-1:
                     name = 'Hist_Hydro' + name_base + '_t_' + sim_name[-1] + '_All_Reach_' + \
-                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                           fig_option.get_time_stamp()
                 else:
                     name = 'Hist_Hydro' + name_base + '_t_' + str(t) + '_All_Reach_' + \
-                           time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                           fig_option.get_time_stamp()
             else:
                 if not sim_name:
                     name = 'Hist_Hydro' + name_base + '_t_' + str(t) + '_All_Reach'
@@ -1463,6 +1877,7 @@ def plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_al
                     name = 'Hist_Hydro' + name_base + '_t_' + str(t) + '_All_Reach'
                 test = remove_image(name, path_im, format1)
                 if not test:
+                    hdf5.close()
                     return
             if format1 == 0 or format1 == 1:
                 plt.savefig(os.path.join(path_im, name + '.png'), dpi=fig_opt['resolution'], transparent=True)
@@ -1470,6 +1885,7 @@ def plot_hist_hydro(hdf5_file, path_hdf5, vel_c_all_t, height_c_all_t, area_c_al
                 plt.savefig(os.path.join(path_im, name + '.pdf'), dpi=fig_opt['resolution'], transparent=True)
             if format1 == 2:
                 plt.savefig(os.path.join(path_im, name + '.jpg'), dpi=fig_opt['resolution'], transparent=True)
+    hdf5.close()
 
 
 def plot_hist_biology(vh_all_t_sp, area_c_all_t, name_fish, fig_opt, path_im, timestep, name_base, sim_name=[],
@@ -1488,11 +1904,13 @@ def plot_hist_biology(vh_all_t_sp, area_c_all_t, name_fish, fig_opt, path_im, ti
     :param sim_name: the name of the time steps when not 0,1,2,3
     :param erase_id: If True, we erase a figure with an identical name
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     spu_all = []
     area_all = []
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -1566,16 +1984,16 @@ def plot_hist_biology(vh_all_t_sp, area_c_all_t, name_fish, fig_opt, path_im, ti
                 if not erase_id:
                     if not sim_name:
                         name = 'Hist_Spu_' + name_base + str(s+1) + '_t_' + str(t) + '_All_Reach_' + \
-                               time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                               fig_option.get_time_stamp()
                     elif t - 1 >= 0:
                         name = 'Hist_Spu_' + name_base + str(s+1)+ '_t_' + sim_name[t - 1] + '_All_Reach_' + \
-                               time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                               fig_option.get_time_stamp()
                     elif t == -1:
                         name = 'Hist_Spu_' + name_base + str(s+1)+ '_t_' + sim_name[-1] + '_All_Reach_' + \
-                               time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                               fig_option.get_time_stamp()
                     else:
                         name = 'Hist_Spu_' + name_base + str(s+1)+ '_t_' + str(t) + '_All_Reach_' + \
-                               time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                               fig_option.get_time_stamp()
                 else:
                     if not sim_name:
                         name = 'Hist_Spu_' + name_base + str(s+1) + '_t_' + str(t) + '_All_Reach'
@@ -15,8 +15,6 @@ https://github.com/YannIrstea/habby
 
 """
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib as mpl
 import time
 import bisect
 
@@ -303,6 +301,8 @@ def plot_dist_vit(v_pro, coord_pro, xhzv_data, plot_timestep, pro, name_pro=[],
     :param xy_h: output from hec-ras used to test dist_vitesse
 
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     mpl.rcParams['ps.fonttype'] = 42
     mpl.rcParams['pdf.fonttype'] = 42
 
@@ -17,10 +17,7 @@ https://github.com/YannIrstea/habby
 import numpy as np
 import xml.etree.ElementTree as ET
 import os
-import matplotlib.pyplot as plt
-import time
-from src_GUI import output_fig_GUI
-import matplotlib as mpl
+from src import fig_option
 
 
 def estimhab(qmes, width, height, q50, qrange, substrat, path_bio, fish_xml, path_im, pict=False, fig_opt={},
@@ -64,8 +61,10 @@ def estimhab(qmes, width, height, q50, qrange, substrat, path_bio, fish_xml, pat
     Then, we calculate the habitat values (VH and SPU). Finally, we plot the results in a figure and we save it as
     a text file.
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     if pict:
         plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
         plt.rcParams['font.size'] = fig_opt['font_size']
@@ -162,7 +161,7 @@ def estimhab(qmes, width, height, q50, qrange, substrat, path_bio, fish_xml, pat
         SPU_f = VH_f*w_all*100
         if pict:
             if not fig_opt:
-                fig_opt = output_fig_GUI.create_default_figoption()
+                fig_opt = fig_option.create_default_figoption()
 
             plt.subplot(2, 1, 1)
             plt.grid(True)
@@ -199,8 +198,8 @@ def estimhab(qmes, width, height, q50, qrange, substrat, path_bio, fish_xml, pat
 
         # name with date and time
         if not erase1:
-            name_pict = "Estimhab_" + time.strftime("%d_%m_%Y_at_%H_%M_%S")
-            name_input = "Estimhab_input_" + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+            name_pict = "Estimhab_" + fig_option.get_time_stamp()
+            name_input = "Estimhab_input_" + fig_option.get_time_stamp()
         # name without data and time, erase old files
         else:
             name_pict = "Estimhab"
@@ -17,7 +17,6 @@ https://github.com/YannIrstea/habby
 
 import numpy as np
 import os
-import matplotlib.pyplot as plt
 from copy import deepcopy
 
 
@@ -104,6 +103,7 @@ def load_top(path, name_evha):
     :param name_evha: The name of the evha project
     :return: the coordinates of the points, the water height, the type of point
     """
+    import matplotlib.pyplot as plt
     failload = [-99], [-99], [-99]
     xy = []
     p_type = []
@@ -24,6 +24,7 @@
 # ***********************************************************************************
 
 import struct
+import zlib
 import numpy as np
 import sys
 
@@ -53,49 +54,45 @@ def writeBlockSize(stream, block_size):
     fmt = _get_byte_order_char() + 'Q' # Write size as unsigned long long == 64 bits unsigned integer
     stream.write(struct.pack(fmt, block_size))
 
-def writeArrayToFile(stream, data):
-    #stream.flush() # this should not be necessary          
+def arrayToBytes(data):
+    """ Returns the binary representation of one array, in FORTRAN order as expected by VTK. """
     assert (data.ndim == 1 or data.ndim == 3)
-    fmt = _get_byte_order_char() + str(data.size) + np_to_struct[data.dtype.name]  # > for big endian
-
     # Check if array is contiguous
     assert (data.flags['C_CONTIGUOUS'] or data.flags['F_CONTIGUOUS'])
-    
-    # NOTE: VTK expects data in FORTRAN order
-    # This is only needed when a multidimensional array has C-layout
-    dd = np.ravel(data, order='F')
+    dtype = data.dtype.newbyteorder('=')
+    return np.ravel(data, order='F').astype(dtype, copy=False).tobytes()
 
-    bin = struct.pack(fmt, *dd)
-    stream.write(bin)
-    
-# ==============================================================================
-def writeArraysToFile(stream, x, y, z):
+def arraysToBytes(x, y, z):
+    """ Returns the binary representation of the components of a vector field (x0, y0, z0, x1, y1, ...). """
     # Check if arrays have same shape and data type
     assert ( x.size == y.size == z.size ), "Different array sizes."
     assert ( x.dtype.itemsize == y.dtype.itemsize == z.dtype.itemsize ), "Different item sizes."
-  
-    nitems = x.size
-    itemsize = x.dtype.itemsize
+    dtype = x.dtype.newbyteorder('=')
+    xyz = np.empty((x.size, 3), dtype=dtype)
+    xyz[:, 0] = np.ravel(x, order='F')
+    xyz[:, 1] = np.ravel(y, order='F')
+    xyz[:, 2] = np.ravel(z, order='F')
+    return xyz.tobytes()
 
-    fmt = _get_byte_order_char() + str(1) + np_to_struct[x.dtype.name]  # > for big endian
-    
-    # Check if arrays are contiguous
-    assert (x.flags['C_CONTIGUOUS'] or x.flags['F_CONTIGUOUS'])
-    assert (y.flags['C_CONTIGUOUS'] or y.flags['F_CONTIGUOUS'])
-    assert (z.flags['C_CONTIGUOUS'] or z.flags['F_CONTIGUOUS'])
-    
+def compressBlock(data_bytes, block_size = 32768):
+    """ Returns the data compressed with zlib as written by the vtkZLibDataCompressor of VTK (with UInt64 headers):
+        number of blocks, size of the blocks, size of the last block (0 if it is full), size of each compressed
+        block, then the compressed blocks.
+    """
+    nbytes = len(data_bytes)
+    blocks = [zlib.compress(data_bytes[i:i + block_size]) for i in range(0, nbytes, block_size)]
+    fmt = _get_byte_order_char() + str(3 + len(blocks)) + 'Q'
+    header = struct.pack(fmt, len(blocks), block_size, nbytes % block_size, *[len(b) for b in blocks])
+    return header + b''.join(blocks)
+
+def writeArrayToFile(stream, data):
+    #stream.flush() # this should not be necessary
+    # NOTE: VTK expects data in FORTRAN order
+    # This is only needed when a multidimensional array has C-layout
+    stream.write(arrayToBytes(data))
     
+# ==============================================================================
+def writeArraysToFile(stream, x, y, z):
     # NOTE: VTK expects data in FORTRAN order
     # This is only needed when a multidimensional array has C-layout
-    xx = np.ravel(x, order='F')
-    yy = np.ravel(y, order='F')
-    zz = np.ravel(z, order='F')    
-        
-    # eliminate this loop by creating a composed array.
-    for i in range(nitems):
-        bx = struct.pack(fmt, xx[i])
-        by = struct.pack(fmt, yy[i])
-        bz = struct.pack(fmt, zz[i])
-        stream.write(bx)
-        stream.write(by)
-        stream.write(bz)
+    stream.write(arraysToBytes(x, y, z))
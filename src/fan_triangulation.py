@@ -0,0 +1,139 @@
+"""
+This file is part of the free software:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+import itertools
+import numpy as np
+
+
+def get_ragged_table(ikle):
+    """
+    This function transforms a connectivity table with cells of different size in two arrays: the points of all
+    cells one after the other and the number of points by cell. The table can be a list of list (or of np.array)
+    or a np.array padded with negative values (as in hec-ras). The negative values are not kept in both cases.
+
+    :param ikle: the connectivity table
+    :return: the points of all cells (np.array of int) and the number of points by cell (np.array of int)
+    """
+    if isinstance(ikle, np.ndarray) and ikle.ndim == 2:
+        ikle = ikle.astype(np.int64)
+        is_p = ikle >= 0
+        return ikle[is_p], np.sum(is_p, axis=1)
+
+    nb_p = np.array([len(c) for c in ikle], dtype=np.int64)
+    ind_p = np.fromiter(itertools.chain.from_iterable(ikle), dtype=np.int64, count=np.sum(nb_p))
+    is_p = ind_p >= 0
+    if not np.all(is_p):
+        cell = np.repeat(np.arange(len(nb_p)), nb_p)
+        nb_p = np.bincount(cell[is_p], minlength=len(nb_p))
+        ind_p = ind_p[is_p]
+    return ind_p, nb_p
+
+
+def get_cell_center(ind_p, nb_p, coord_p):
+    """
+    This function finds the center point of each cell, the number of point of a cell can change. The center of a
+    cell without point is nan.
+
+    :param ind_p: the points of all cells one after the other (see get_ragged_table())
+    :param nb_p: the number of points by cell
+    :param coord_p: the coordinates of the points
+    :return: the coordinates of the center of the cells (np.array)
+    """
+    coord_p = np.asarray(coord_p)
+    coord_c = np.zeros((len(nb_p), 2))
+    start = np.cumsum(nb_p) - nb_p
+    # the points are added in the order of the cell (the k-th point of all cells together)
+    for k in range(0, np.max(nb_p, initial=0)):
+        has_k = nb_p > k
+        coord_c[has_k] += coord_p[ind_p[start[has_k] + k], :2]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        coord_c /= nb_p[:, np.newaxis]
+    return coord_c
+
+
+def fan_triangles(ind_p, nb_p, nb_point, first_in_place=True, center_first=False):
+    """
+    This function splits the cells with more than three points in triangles. Each side of the cell makes a
+    triangle with a new point at the center of the cell (a triangle fan). The triangular cells are kept and the
+    cells with less than three points are removed.
+
+    :param ind_p: the points of all cells one after the other (see get_ragged_table())
+    :param nb_p: the number of points by cell
+    :param nb_point: the number of points of the grid. The new point of the k-th split cell is nb_point + k.
+    :param first_in_place: If True, the first triangle of each cell takes the place of the cell and the other
+           triangles are added at the end (as in rubar and hec-ras). If False, the triangles of each cell are
+           given together.
+    :param center_first: If True, the new point is the first point of the triangles, otherwise the last one.
+    :return: the connectivity table of the triangles (np.array of shape (nb_tri, 3)), the original cell of each
+             triangle and the cells which were split (in the order of the new points).
+
+    **Technical comments**
+
+    The triangle of the side s of a cell is [p_s, p_s+1, new point] (the last side goes back to p_0), so that the
+    triangles have the orientation of the cell. The data of the original cells can be given to the triangles in
+    one go with the second output (data[parent]).
+    """
+    ind_p = np.asarray(ind_p, dtype=np.int64)
+    nb_p = np.asarray(nb_p, dtype=np.int64)
+    start = np.cumsum(nb_p) - nb_p
+    poly = np.flatnonzero(nb_p > 3)
+    ind_center = np.zeros((len(nb_p),), dtype=np.int64)
+    ind_center[poly] = nb_point + np.arange(len(poly))
+
+    # one triangle by side for the polygons, one triangle for the triangles, nothing for the others
+    nb_tri = np.where(nb_p > 3, nb_p, (nb_p == 3).astype(np.int64))
+    parent = np.repeat(np.arange(len(nb_p)), nb_tri)
+    side = np.arange(len(parent)) - np.repeat(np.cumsum(nb_tri) - nb_tri, nb_tri)
+    if first_in_place:
+        order = np.argsort(side > 0, kind='mergesort')
+        parent = parent[order]
+        side = side[order]
+
+    is_poly = nb_p[parent] > 3
+    ikle = np.empty((len(parent), 3), dtype=np.int64)
+    ikle[:, 0] = ind_p[start[parent] + side]
+    ikle[:, 1] = ind_p[start[parent] + (side + 1) % nb_p[parent]]
+    ikle[:, 2] = np.where(is_poly, ind_center[parent], ind_p[start[parent] + 2])
+    if center_first:
+        ikle[is_poly] = ikle[is_poly][:, [2, 0, 1]]
+    return ikle, parent, poly
+
+
+def split_cells(ikle, coord_c, coord_p):
+    """
+    This function transforms a "mixed" grid (with triangles, 4-sided cells, pentagons, etc.) to a triangular grid
+    using a triangle fan around the center of each cell with more than three points (see fan_triangles()). The
+    first triangle of each cell takes the place of the cell and the other triangles are added at the end. The center
+    of the triangles made from a polygon is the mean of their three points. The cells with less than three points are
+    removed.
+
+    :param ikle: the connectivity table (list or np.array padded with negative values, see get_ragged_table())
+    :param coord_c: the coordinate of the centroid of the cell, used as the new point
+    :param coord_p: the points of the grid
+    :return: the triangular connectivity table, the coordinates of the center of the triangles, the points of the
+             grid (with the new points at the end) and the original cell of each triangle.
+    """
+    [ind_p, nb_p] = get_ragged_table(ikle)
+    coord_c = np.array(coord_c, dtype=np.float64).reshape(-1, 2)
+    coord_p = np.array(coord_p, dtype=np.float64)
+    [ikle_tri, parent, poly] = fan_triangles(ind_p, nb_p, len(coord_p))
+    coord_p = np.concatenate((coord_p, coord_c[poly]))
+
+    coord_c_tri = coord_c[parent]
+    is_poly = nb_p[parent] > 3
+    p_tri = ikle_tri[is_poly]
+    coord_c_tri[is_poly] = (coord_p[p_tri[:, 0]] + coord_p[p_tri[:, 1]] + coord_p[p_tri[:, 2]]) / 3
+    return ikle_tri, coord_c_tri, coord_p, parent
@@ -0,0 +1,269 @@
+"""
+This file is part of the free software:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
+import os
+import time
+import uuid
+from contextlib import nullcontext
+
+# an identifier added to the time stamp of the outputs (see set_run_id())
+run_id = ''
+# a lock shared by the processes which modify the same xml project file (see set_prj_lock())
+prj_lock = None
+
+
+def set_run_id(new_run_id):
+    """
+    This function sets the identifier of the run which is added to the time stamp in the name of the outputs. It is
+    used by the command ALL so that two commands executed in the same second (one after the other or in parallel) do
+    not write the same file.
+
+    :param new_run_id: the identifier of the run (a string, '' to only use the time stamp)
+    """
+    global run_id
+    run_id = new_run_id
+
+
+def create_run_id(name):
+    """
+    This function creates an identifier of run (see set_run_id()) which is unique: the given name followed by a
+    random string. The number of a job is not enough, as two commands ALL, a command ALL and the HABBY server or two
+    HABBY servers can run on the same project in the same second.
+
+    :param name: the beginning of the identifier (for example the number of the job)
+    :return: the identifier of the run (a string)
+    """
+    return name + '_' + uuid.uuid4().hex[:8]
+
+
+def get_time_stamp():
+    """
+    This function gives the time stamp used in the name of the outputs (day_month_year_at_hour_minute_second),
+    followed by the identifier of the run if one was given by set_run_id().
+
+    :return: the time stamp (string)
+    """
+    if run_id:
+        return time.strftime("%d_%m_%Y_at_%H_%M_%S") + '_' + run_id
+    else:
+        return time.strftime("%d_%m_%Y_at_%H_%M_%S")
+
+
+def set_prj_lock(lock):
+    """
+    This function sets the lock used when the xml project file is modified (see lock_prj()). It is given to each
+    process when the commands are executed in parallel (command ALL with the option jobs=x), so that two processes
+    do not modify the xml project file at the same time.
+
+    :param lock: a multiprocessing.Lock() (or None if there is only one process)
+    """
+    global prj_lock
+    prj_lock = lock
+
+
+def lock_prj():
+    """
+    This function gives the lock of the xml project file, to be used as "with lock_prj():" around the reading and the
+    writing of the xml project file. It does nothing if no lock was given by set_prj_lock().
+
+    :return: the lock (or a context manager which does nothing)
+    """
+    if prj_lock is None:
+        return nullcontext()
+    else:
+        return prj_lock
+
+
+def write_prj(doc, fname):
+    """
+    This function writes the xml project file. The file is first written with another name and then renamed, so
+    that a process which reads the project file does not find a file which is half written.
+
+    :param doc: the xml tree (ElementTree) of the project
+    :param fname: the name of the xml project file (with the path)
+    """
+    fname_tmp = fname + '.' + str(os.getpid()) + '.tmp'
+    doc.write(fname_tmp)
+    os.replace(fname_tmp, fname)
+
+
+def set_lang_fig(nb_lang, path_prj, name_prj):
+    """
+    This function write in the xml file in which langugage the figures should be done. This is kept in the
+    group of attribute in the Figure_Option
+    :param lang: An int indicating the langugage (0 for english, 1 for french,...)
+    :param path_prj: the path to the project
+    :param name_prj: the name of the project
+    """
+
+    # save the data in the xml file
+    # open the xml project file
+    fname = os.path.join(path_prj, name_prj + '.xml')
+    # save the name and the path in the xml .prj file
+    if not os.path.isfile(fname):
+        #print('Error: project is not found \n')
+        return
+    else:
+        with lock_prj():
+            doc = ET.parse(fname)
+            root = doc.getroot()
+            child1 = root.find(".//Figure_Option")
+            if child1 is not None:  # modify existing option
+                langfig1 = root.find(".//LangFig")
+                if langfig1 is None:
+                    langfig1 = ET.SubElement(child1, "LangFig")
+                langfig1.text = str(nb_lang)
+                write_prj(doc, fname)
+
+
+def load_fig_option(path_prj, name_prj):
+    """
+    This function loads the figure option saved in the xml file and create a dictionnary will be given to the functions
+    which create the figures to know the different options chosen by the user. If the options are not written, this
+    function uses data by default which are in the fonction create_default_fig_options().
+
+    :param path_prj: the path to the xml project file
+    :param name_prj: the name to this file
+    :return: the dictionary containing the figure options
+
+    """
+
+    fig_dict = create_default_figoption()
+    fname = os.path.join(path_prj, name_prj + '.xml')
+    if not os.path.isfile(fname) and name_prj != '':  # no project exists
+        pass
+    elif name_prj == '':
+        pass
+    elif not os.path.isfile(fname):  # the project is not found
+        print('Warning: No project file (.xml) found.\n')
+    else:
+        doc = ET.parse(fname)
+        root = doc.getroot()
+        child1 = root.find(".//Figure_Option")
+        if child1 is not None:  # modify existing option
+            width1 = root.find(".//Width")
+            height1 = root.find(".//Height")
+            colormap1 = root.find(".//ColorMap1")
+            colormap2 = root.find(".//ColorMap2")
+            fontsize1 = root.find(".//FontSize")
+            linewidth1 = root.find(".//LineWidth")
+            grid1 = root.find(".//Grid")
+            time1 = root.find(".//TimeStep")
+            raw1 = root.find(".//PlotRawData")
+            format1 = root.find(".//Format")
+            marker1 = root.find(".//Marker")
+            reso1 = root.find(".//Resolution")
+            fish1 = root.find(".//FishNameType")
+            text1 = root.find(".//TextOutput")
+            shape1 = root.find(".//ShapeOutput")
+            para1 = root.find(".//ParaviewOutput")
+            paraformat1 = root.find(".//ParaviewFormat")
+            textformat1 = root.find(".//TextFormat")
+            langfig1 = root.find(".//LangFig")
+            hopt1 = root.find(".//MinHeight")
+            fishinfo1 = root.find(".//FishInfo")
+            erase1 = root.find(".//EraseId")
+            try:
+                if width1 is not None:
+                    fig_dict['width'] = float(width1.text)
+                if height1 is not None:
+                    fig_dict['height'] = float(height1.text)
+                if colormap1 is not None:
+                    fig_dict['color_map1'] = colormap1.text
+                if colormap2 is not None:
+                    fig_dict['color_map2'] = colormap2.text
+                if fontsize1 is not None:
+                    fig_dict['font_size'] = int(fontsize1.text)
+                if linewidth1 is not None:
+                    fig_dict['line_width'] = int(linewidth1.text)
+                if grid1 is not None:
+                    fig_dict['grid'] = grid1.text
+                if time1 is not None:
+                    fig_dict['time_step'] = time1.text # -99 is all
+                if raw1 is not None:
+                    fig_dict['raw_data'] = raw1.text
+                if format1 is not None:
+                    fig_dict['format'] = format1.text
+                if marker1 is not None:
+                    fig_dict['marker'] = marker1.text
+                if reso1 is not None:
+                    fig_dict['resolution'] = int(reso1.text)
+                if fish1 is not None:
+                    fig_dict['fish_name_type'] = fish1.text
+                if text1 is not None:
+                    fig_dict['text_output'] = text1.text
+                if shape1 is not None:
+                    fig_dict['shape_output'] = shape1.text
+                if para1 is not None:
+                    fig_dict['paraview'] = para1.text
+                if paraformat1 is not None:
+                    fig_dict['paraview_format'] = paraformat1.text
+                if textformat1 is not None:
+                    fig_dict['text_format'] = textformat1.text
+                if langfig1 is not None:
+                    fig_dict['language'] = int(langfig1.text)
+                if hopt1 is not None:
+                    fig_dict['min_height_hyd'] = float(hopt1.text)
+                if fish1 is not None:
+                    fig_dict['fish_info'] = fishinfo1.text
+                if erase1 is not None:
+                    fig_dict['erase_id'] = erase1.text
+            except ValueError:
+                print('Error: Figure Options are not of the right type.\n')
+
+    fig_dict['time_step'] = fig_dict['time_step'].split(',')
+    try:
+        fig_dict['time_step'] = list(map(int, fig_dict['time_step']))
+    except ValueError:
+        print('Error: Time step could not be read in the options')  # sendLog not read yet
+
+    return fig_dict
+
+
+def create_default_figoption():
+    """
+    This function creates the default dictionnary of option for the figure.
+    """
+    fig_dict = {}
+    fig_dict['height'] = 7
+    fig_dict['width'] = 10
+    fig_dict['color_map1'] = 'coolwarm'
+    fig_dict['color_map2'] = 'jet'
+    fig_dict['font_size'] = 12
+    fig_dict['line_width'] = 1
+    fig_dict['grid'] = 'False'
+    fig_dict['time_step'] = '1,-1'
+    fig_dict['raw_data'] = 'False'
+    fig_dict['format'] = 3
+    fig_dict['resolution'] = 800
+    fig_dict['fish_name_type'] = 0
+    fig_dict['text_output'] = 'False'
+    fig_dict['text_format'] = 'txt'  # 'txt', 'npz' (one file by table and time step) or 'hdf5' (one file)
+    fig_dict['shape_output'] = 'False'
+    fig_dict['paraview'] = 'False'
+    fig_dict['paraview_format'] = 'vtu'  # 'vtu' (one file by time step) or 'vtkhdf' (one file for all time steps)
+    fig_dict['fish_info'] = 'True'
+    # this is dependant on the language of the application not the user choice in the output tab
+    fig_dict['language'] = 0  # 0 english, 1 french
+    fig_dict['min_height_hyd'] = 0.001  # water height under 1mm is not accounted for
+    fig_dict['marker'] = 'False'
+    fig_dict['erase_id'] = 'True'
+
+    return fig_dict
@@ -21,13 +21,9 @@ except ImportError:
 from src import load_hdf5
 import h5py
 import os
-import time
 import numpy as np
 from src import stathab_c
-from scipy import stats
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-from src_GUI import output_fig_GUI
+from src import fig_option
 
 
 def save_fstress(path_hdf5, path_prj, name_prj, name_bio, path_bio, riv_name, data_hydro, qrange, fish_list):
@@ -47,7 +43,7 @@ def save_fstress(path_hdf5, path_prj, name_prj, name_bio, path_bio, riv_name, da
     """
 
     # create the hdf5 file
-    fname_no_path = 'FStress_'+ name_prj + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S")  + '.h5'
+    fname_no_path = 'FStress_'+ name_prj + '_' + fig_option.get_time_stamp()  + '.h5'
     fname = os.path.join(path_hdf5, fname_no_path)
     file = h5py.File(fname, 'w')
 
@@ -93,17 +89,18 @@ def save_fstress(path_hdf5, path_prj, name_prj, name_bio, path_bio, riv_name, da
     if not os.path.isfile(fnamep):
         print("The project is not saved. Save the project in the Start tab before saving FStress data")
     else:
-        doc = ET.parse(fnamep)
-        root = doc.getroot()
-        tree = ET.ElementTree(root)
-        child = root.find(".//FStress_data")
-        # test if there is already estimhab data in the project
-        if child is None:
-            child = ET.SubElement(root, "FStress_data")
-            child.text = fname_no_path
-        else:
-            child.text = fname_no_path
-        tree.write(fnamep)
+        with fig_option.lock_prj():
+            doc = ET.parse(fnamep)
+            root = doc.getroot()
+            tree = ET.ElementTree(root)
+            child = root.find(".//FStress_data")
+            # test if there is already estimhab data in the project
+            if child is None:
+                child = ET.SubElement(root, "FStress_data")
+                child.text = fname_no_path
+            else:
+                child.text = fname_no_path
+            fig_option.write_prj(tree, fnamep)
 
 
 def read_fstress_hdf5(hdf5_name, hdf5_path):
@@ -392,6 +389,7 @@ def denstress(k,m, nbst):
     :param nbst: the number of stress class in the distribution
     :return: the stress disitrbution for the (m,k) parameters
     """
+    from scipy import stats
 
     diststress = np.zeros(nbst,)
 
@@ -424,7 +422,7 @@ def write_txt(qmod_all, vh_all, name_inv, path_txt, name_river, timestamp=True):
         qmod = qmod_all[i]
         vh = vh_all[i]
         if timestamp:
-            fname = os.path.join(path_txt, 'Fstress_'+ r + time.strftime("%d_%m_%Y_at_%H_%M_%S") +'_rre.txt')
+            fname = os.path.join(path_txt, 'Fstress_'+ r + fig_option.get_time_stamp() +'_rre.txt')
         else:
             fname = os.path.join(path_txt, 'Fstress_' + r + '_rre.txt')
             if os.path.isfile(fname):
@@ -437,13 +435,13 @@ def write_txt(qmod_all, vh_all, name_inv, path_txt, name_river, timestamp=True):
             header_txt += '[]\t'
         np.savetxt(fname, vh, delimiter='\t', header=header_txt)
         if timestamp:
-            fname = os.path.join(path_txt, 'Fstress_' + r + time.strftime("%d_%m_%Y_at_%H_%M_%S")+ '_discharge.txt')
+            fname = os.path.join(path_txt, 'Fstress_' + r + fig_option.get_time_stamp()+ '_discharge.txt')
         else:
             fname = os.path.join(path_txt, 'Fstress_' + r + '_discharge.txt')
             if os.path.isfile(fname):
                 os.remove(fname)
         np.savetxt(fname, qmod, delimiter='\t', header='discharge [m3/sec]')
-    # fname = os.path.join(path_txt, 'Fstress_' + r + time.strftime("%d_%m_%Y_at_%H_%M_%S")+ '_code_inv.txt')
+    # fname = os.path.join(path_txt, 'Fstress_' + r + fig_option.get_time_stamp()+ '_code_inv.txt')
     # name_inv_str = ''
     # for i in range(0, len(name_inv)):
     #     name_inv_str += name_inv[i] + "\n"
@@ -464,9 +462,11 @@ def figure_fstress(qmod_all, vh_all, name_inv, path_im, name_river, fig_opt = {}
     :param fig_opt: the figure option in a dictionnary
 
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -496,13 +496,13 @@ def figure_fstress(qmod_all, vh_all, name_inv, path_im, name_river, fig_opt = {}
         lgd = plt.legend(bbox_to_anchor=(1.60, 1), loc='upper right', ncol=1)
         if format == 0 or format == 1:
             name_fig = os.path.join(path_im, 'Fstress_' + r +
-                                    "_suitability_index" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png')
+                                    "_suitability_index" + fig_option.get_time_stamp() + '.png')
         if format == 0 or format == 3:
             name_fig = os.path.join(path_im, 'Fstress_' + r +
-                                    "_suitability_index" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf')
+                                    "_suitability_index" + fig_option.get_time_stamp() + '.pdf')
         if format == 2:
             name_fig = os.path.join(path_im, 'Fstress_' + r +
-                                    "_suitability_index" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.jpg')
+                                    "_suitability_index" + fig_option.get_time_stamp() + '.jpg')
         fig.savefig(os.path.join(path_im, name_fig), bbox_extra_artists=(lgd,), bbox_inches='tight',
                     dpi=fig_opt['resolution'], transparent=True)
         i += 1
@@ -519,9 +519,11 @@ def fstress_test(qmod_all, vh_all, name_inv, name_river,  path_rre, fig_opt={}):
     :param name_river: the name of the river
     :param path_rre: the path to the C output
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -561,6 +563,7 @@ def main():
     """
     This is not the main() of HABBY. This local function is used to test the Fstress model.
     """
+    import matplotlib.pyplot as plt
 
     path_prj = r'D:\Diane_work\dummy_folder\DefaultProj'
     name_prj = 'blob'
@@ -14,16 +14,19 @@ Licence CeCILL v2.1
 https://github.com/YannIrstea/habby
 
 """
+import sys
 import numpy as np
 import os
 import time
 import glob
+import json
+import hashlib
+import traceback
+from contextlib import redirect_stdout
+from multiprocessing import Pool, Lock
 import difflib
-import matplotlib
 import filecmp
 from copy import deepcopy
-matplotlib.use("qt5agg")
-import matplotlib.pyplot as plt
 from src import selafin_habby1
 from src import mascaret
 from src import Hec_ras06
@@ -43,7 +46,7 @@ from src import bio_info
 from src import mesh_grid2
 from src import lammi
 from src import hydraulic_chronic
-from src_GUI import output_fig_GUI
+from src import fig_option
 
 
 def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, erase_id=True):
@@ -100,27 +103,36 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
         print('\n')
         print("LOAD_HECRAS_1D: load the hec-ras data in 1D. Input: name of .geo, name of the data file, interpolation "
               "choice,(number of profile to add), (output name)")
-        print("LOAD_HECRAS_2D: load the hec-ras data in 2D. Input: name of the .h5 file, (output name)")
+        print("LOAD_HECRAS_2D: load the hec-ras data in 2D. Input: name of the .h5 file, (output name), "
+              "(timestep=x), (time=x)")
         print('LOAD_HYDRO_HDF5: load an hydrological hdf5. Input: the name of the hdf5 (with the path)')
         print("LOAD_MASCARET: load the mascaret data. Input: name of the three inputs files - xcas, geo, opt, "
               "manning coefficient, interpolation choice, (number of profile to add), (output name), (nb_point_vel=x)")
-        print("LOAD_RIVER_2D: load the river 2d data. Input: folder containing the cdg file, (output name)")
+        print("LOAD_RIVER_2D: load the river 2d data. Input: folder containing the cdg file, (output name), "
+              "(timestep=x). The time steps are the cdg files in alphabetical order.")
         print("LOAD_RUBAR_1D: load the Rubar data in 1D. Input: name of input file .rbe, name of the profile input "
               "file, manning coefficient, interpolation choice, (number of profile to add), (output name),"
               "(nb_point_vel=x)")
         print("LOAD_RUBAR_2D: load the Rubar data in 2D. Input: name of .dat or .mai file, name of input .tps file "
-              "(output name)")
+              "(output name), (timestep=x), (time=x)")
         print("LOAD_SW2D: load the SW2D dataD. Input: name of .geo file, name of input .res file "
               "(output name)")
         print("LOAD_IBER2D: load the IBER2D dataD. Input: name of .dat file, name of input .rep files "
               "(output name)")
-        print("LOAD_TELEMAC: load the telemac data. Input: name of the .res file, (output name)")
+        print("LOAD_TELEMAC: load the telemac data. Input: name of the .res file, (output name), (timestep=x), "
+              "(time=x)")
+        print("With the 2D models, only some time steps can be loaded with the options timestep=x and time=x. "
+              "timestep=x gives the index of the time steps (starting at 0), separated by a comma, such as "
+              "timestep=0,4,7:10 or timestep=::5 for one time step every five time steps. time=tmin:tmax gives a "
+              "range of time in the unit of the model. Only the chosen time steps are read.")
         print("LOAD_LAMMI: load lammi data. Input: the name of the folder containing transect.txt and facies.txt and "
               "the name of the folder with the HydroSim result, (output name)")
 
         print('\n')
         print('MERGE_GRID_SUB: merge the hydrological and substrate grid together. Input: the name of the hydrological hdf5'
-              ', the name of the substrate hdf5, the default data for the substrate (in cemagref code), (output name)')
+              ', the name of the substrate hdf5, the default data for the substrate (in cemagref code), (output name),'
+              ' (incremental=True). With the option incremental=True, the merge of the whole profile is re-used for '
+              'the time steps, which is quicker when there are many time steps.')
         print('LOAD_SUB_SHP: load the substrate from a shapefile. Input: filename of the shapefile,'
               'code_type as Cemagref or Sandre, (dominant_case as 1 or -1)')
         print('LOAD_SUB_TXT: load the substrate from a text file. Input: filename of the texte file,'
@@ -142,10 +154,20 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
               'will be used. To get the calculation on more than one fish species, separate the names of '
               'the xml biological files by a comma without a space between the command and the filenames. '
               'Input: pathname of merge file, name of xml prefence file with no path, stage_chosen,'
-              ' run_choice.' )
+              ' run_choice, (workers=x), (text_format=x), (paraview_format=x). The option workers=x calculates '
+              'the time steps in parallel on x processes (1 by default). The options text_format=x and '
+              'paraview_format=x give the format of the text output (txt, npz or hdf5) and of the paraview output '
+              '(vtu or vtkhdf). By default, the formats of the figure options of the project are used.' )
         print('HYDRO_CHRONIC: hydrological chronicle. Create a new merge file for the chosen output discharge. The'
               'output discharges should be in the range of the input discharge. Input: list of the names of the merge '
               'file without path , list of input discharge, list of output discharge, minimum water height')
+        print('HAB_CHRONIC: habitat chronicle. Calculate the SPU at the modelled discharges and interpolate it '
+              'linearly at the output discharges. Only a text file with the SPU by output discharge and by reach '
+              'is created (no merge file). Input: list of the names of the merge file without path, list of input '
+              'discharge, list of output discharge (or a text file with one discharge by line), name of xml '
+              'preference files, stage_chosen, run_choice (as in RUN_HABITAT), (min_height=x), (spu_tol=x). '
+              'With spu_tol=x, the habitat is calculated on the interpolated grid (as in HYDRO_CHRONIC) between the '
+              'modelled discharges where the SPU changes by more than x (relative change).')
         print('RUN_FSTRESS: Run the fstress model. Input: the path to the files list_riv, deb, and qwh.txt and'
               ' (path where to save output)')
         print("RUN_STATHAB: Run the stathab model. Input: the path to the folder with the different input files, "
@@ -159,20 +181,30 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
         print('\n')
         print("RESTART: Relauch HABBY based on a list of command in a text file (restart file) Input: the name of file"
-              " (with the path).")
+              " (with the path), (incremental). With the keyword incremental, the commands whose input files and "
+              "arguments did not change since the last restart are not executed again and their outputs are kept.")
         print("ALL: if the keywork ALL is followed by a command from HABBY, the command will be applied to all file"
               " in a folder. The name of the input file should be in the form: path_to_folder/*.ext with the "
-              "right extension as ext. No output name should be given.")
+              "right extension as ext. No output name should be given. With the option jobs=x, the commands are "
+              "executed in parallel on x processes, with a log file by command and a summary in the folder log_ALL.")
+        print("SERVER: Start a HABBY server which executes the commands sent with habby_client.py (for example "
+              "python habby_client.py LOAD_TELEMAC file.slf) on the project of the server. The modules and the "
+              "preference files stay loaded between two commands. Options: port=x, workers=x (number of commands "
+              "executed at the same time, 2 by default). The command STOP_SERVER sent by habby_client.py stops the "
+              "server.")
         print("COMPARE_TEST: Call the small function which compare the files in two folders. Useful to test habby "
               "output. Input: The path to the folder with the reference file, the path to the folder with the "
               "files to check")
 
         print('\n')
         print('list of options which can be added after the command: (1) path_prj= path to project, (2) '
-              'name_prj= name of the project, (3) path_bio: the path to the biological files')
+              'name_prj= name of the project, (3) path_bio: the path to the biological files, (4) show_time: print '
+              'the startup time and the time of the command')
 
 # ------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_TELEMAC':
+        # the chosen time steps (optional)
+        [timestep_sel, time_sel, all_arg] = get_timestep_option(all_arg)
         # check
         if not 2 < len(all_arg) < 5:
             print('The function LOAD_TELEMAC needs one or two inputs, the .res file name and the output name.')
@@ -195,7 +227,7 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
             path_hdf5 = path_prj
 
         selafin_habby1.load_telemac_and_cut_grid(name_hdf5, namefilet, pathfilet, name_prj, path_prj, 'TELEMAC',2,
-                                                 path_hdf5,[], True)
+                                                 path_hdf5,[], True, timestep_sel=timestep_sel, time_sel=time_sel)
 
 # ------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_HECRAS_1D':
@@ -255,6 +287,8 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
 # --------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_HECRAS_2D':
+        # the chosen time steps (optional)
+        [timestep_sel, time_sel, all_arg] = get_timestep_option(all_arg)
         if not 2 < len(all_arg) < 5:
             print('The function LOAD_HECRAS_2D needs one or two inputs, the .res file name and the output name.')
             return
@@ -273,11 +307,13 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
         else:
             name_hdf5 = 'Hydro_HECRAS2D_' + os.path.splitext(namefile)[0]
             path_hdf5 = path_prj
-        hec_ras2D.load_hec_ras_2d_and_cut_grid(name_hdf5, filename, pathfile, name_prj, path_prj, 'HECRAS2D', 2,
-                                               path_hdf5, [], True)
+        hec_ras2D.load_hec_ras_2d_and_cut_grid(name_hdf5, namefile, pathfile, name_prj, path_prj, 'HECRAS2D', 2,
+                                               path_hdf5, [], True, timestep_sel=timestep_sel, time_sel=time_sel)
 
 # ------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_RUBAR_2D':
+        # the chosen time steps (optional)
+        [timestep_sel, time_sel, all_arg] = get_timestep_option(all_arg)
         if not 3 < len(all_arg) < 6:
             print('The function LOAD_RUBAR_2D needs two to three inputs. Call LIST_COMMAND for more '
                   'information.')
@@ -303,7 +339,8 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
             path_hdf5 = os.path.dirname(namepath_hdf5)
 
         rubar.load_rubar2d_and_create_grid(name_hdf5, geofile, tpsfile, pathgeo, pathtps, '.', name_prj, path_prj,
-                                           'RUBAR2D', 2, path_hdf5,[], False)
+                                           'RUBAR2D', 2, path_hdf5,[], False, timestep_sel=timestep_sel,
+                                           time_sel=time_sel)
 
 # ------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_SW2D':
@@ -454,6 +491,11 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
 # --------------------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_RIVER_2D':
+        # the chosen time steps (optional)
+        [timestep_sel, time_sel, all_arg] = get_timestep_option(all_arg)
+        if time_sel:
+            print('Error: The time of the time steps is not known with River2D. Use the option timestep=x.')
+            return
         if not 2 < len(all_arg) < 5:
             print('The function LOAD_RIVER_2D needs one or two inputs. Call LIST_COMMAND for more '
                   'information.')
@@ -485,7 +527,7 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
             path_hdf5 = os.path.dirname(namepath_hdf5)
 
         river2d.load_river2d_and_cut_grid(name_hdf5, filenames, paths, name_prj, path_prj, 'RIVER2D', 2,
-                                          path_hdf5, [], True)
+                                          path_hdf5, [], True, timestep_sel=timestep_sel)
 
 # -------------------------------------------------------------------------------------------
     elif all_arg[1] == 'LOAD_RUBAR_1D':
@@ -702,7 +744,7 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
         if riv_int == 0:
             [mystathab.fish_chosen, coeff_all] = stathab_c.load_pref('Pref_latin.txt', path_bio2)
             mystathab.stathab_calc(path_bio2)
-            fig_opt = output_fig_GUI.create_default_figoption()
+            fig_opt = fig_option.create_default_figoption()
             fig_opt['erase_id'] = 'True'
             mystathab.fig_opt = fig_opt
             mystathab.savetxt_stathab()
@@ -730,6 +772,7 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
             mystathab.savetxt_stathab()
             mystathab.savefig_stahab(False)
 
+        import matplotlib.pyplot as plt
         plt.show()
 
     # -----------------------------------------------------------------------------------
@@ -862,6 +905,19 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
     # ----------------------------------------------------------------
     elif all_arg[1] == 'MERGE_GRID_SUB':
+        # re-use the merge of the whole profile for the time steps (optional). The list of the caller is not
+        # modified (restart, ALL, server)
+        all_arg = list(all_arg)
+        incremental = False
+        for i in range(2, len(all_arg)):
+            if all_arg[i][:12] == 'incremental=':
+                if all_arg[i][12:] == 'True':
+                    incremental = True
+                elif all_arg[i][12:] != 'False':
+                    print('The option incremental should be of the form incremental=True or incremental=False')
+                    return
+                del all_arg[i]
+                break
 
         if not 4 < len(all_arg) < 7:
             print('MERGE_GRID_SUB needs between three and four inputs. See LIST_COMMAND for more information.')
@@ -935,7 +991,8 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
         # in two function to be able to control the name
         [ikle_both, point_all_both, sub_pg_all_both, sub_dom_all_both, vel_all_both, height_all_both] = \
-            mesh_grid2.merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, path_prj)
+            mesh_grid2.merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, path_prj,
+                                            incremental=incremental)
 
         if ikle_both == [-99]:
             print('Error: data not merged.')
@@ -1052,6 +1109,34 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
     # --------------------------------------------------------------------------------
     elif all_arg[1] == 'RUN_HABITAT':
+        # get the number of process and the format of the text and paraview outputs (optional). The formats are
+        # taken from the project if not given. The list of the caller is not modified (restart, ALL, server)
+        all_arg = list(all_arg)
+        workers = 1
+        fig_opt_prj = fig_option.load_fig_option(path_prj, name_prj)
+        text_format = fig_opt_prj['text_format']
+        paraview_format = fig_opt_prj['paraview_format']
+        for i in range(len(all_arg) - 1, 1, -1):
+            if all_arg[i][:8] == 'workers=':
+                try:
+                    workers = int(all_arg[i][8:])
+                except ValueError:
+                    print('The number of workers is not an int. Should be of the form workers=x')
+                    return
+                del all_arg[i]
+            elif all_arg[i][:12] == 'text_format=':
+                text_format = all_arg[i][12:]
+                if text_format not in ['txt', 'npz', 'hdf5']:
+                    print('Error: the format of the text output should be txt, npz or hdf5 (text_format=x)')
+                    return
+                del all_arg[i]
+            elif all_arg[i][:16] == 'paraview_format=':
+                paraview_format = all_arg[i][16:]
+                if paraview_format not in ['vtu', 'vtkhdf']:
+                    print('Error: the format of the paraview output should be vtu or vtkhdf (paraview_format=x)')
+                    return
+                del all_arg[i]
+
         if not 4 < len(all_arg) < 8:
             print('RUN_HAB_COARSE needs between four and five inputs. See LIST_COMMAND for more information.')
             return
@@ -1084,35 +1169,7 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
         # create name_fish (the name of fish and stage to be calculated)
         # addapt bionames and stage
-        stage_chosen = all_arg[4]
-        name_fish = []
-        stage2 = []
-        bio_name2 = []
-        [latin_name, stages_all] = bio_info.get_stage(bio_names, path_bio)
-        latin_name = list(set(latin_name))
-        if stage_chosen == 'all':
-            for l in range(0, len(latin_name)):
-                for s in stages_all[l]:
-                    if len(latin_name[l]) > 10:
-                        name_fish.extend([latin_name[l][:10]])
-                    else:
-                        name_fish.extend([latin_name[l]])
-                    stage2.extend([s])
-                    bio_name2.extend([bio_names[l]])
-        else:
-            stage_chosen = stage_chosen.split(',')
-            for l in range(0, len(latin_name)):
-                for s in stages_all[l]:
-                    for sc in stage_chosen:
-                        if s in sc:
-                            if len(latin_name[l]) > 5:
-                                name_fish.extend([latin_name[l][:5]])
-                            else:
-                                name_fish.extend([latin_name[l]])
-                            stage2.extend([s])
-                            bio_name2.extend([bio_names[l]])
-        stages = stage2
-        bio_names = bio_name2
+        [name_fish, stages, bio_names] = get_fish_stage(bio_names, all_arg[4], path_bio)
 
         try:
             run_choice = int(all_arg[5])
@@ -1120,16 +1177,19 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
             print('Error: the choice of run should be an int between 0, 1,2 (usually 0 is used)')
             return
 
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
         fig_opt['text_output'] = 'True'
         fig_opt['shape_output'] = 'True'
         fig_opt['paraview'] = 'True'
         fig_opt['erase_id'] = 'True'
+        fig_opt['text_format'] = text_format
+        fig_opt['paraview_format'] = paraview_format
 
         # run calculation
         # we calculate hab on all the stage in xml preference files
         calcul_hab.calc_hab_and_output(merge_name, path_merge, bio_names, stages, name_fish, name_fish, run_choice,
-                                       path_bio, path_prj, path_prj, path_prj, path_prj, [], True, fig_opt)
+                                       path_bio, path_prj, path_prj, path_prj, path_prj, [], True, fig_opt,
+                                       workers=workers)
 
     # --------------------------------------------------------------------------------------
     elif all_arg[1] == 'CREATE_RAND_SUB':
@@ -1182,6 +1242,65 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
 
         hydraulic_chronic.chronic_hydro(merge_files, path_merges, discharge_in, discharge_out, name_prj, path_prj, minh)
 
+    # ------------------------------------------------------------------------
+    elif all_arg[1] == 'HAB_CHRONIC':
+        # options (the list of the caller is not modified: restart, ALL, server)
+        all_arg = list(all_arg)
+        minh = 0.0
+        spu_tol = -1
+        for i in range(len(all_arg) - 1, 1, -1):
+            try:
+                if all_arg[i][:11] == 'min_height=':
+                    minh = float(all_arg[i][11:])
+                    del all_arg[i]
+                elif all_arg[i][:8] == 'spu_tol=':
+                    spu_tol = float(all_arg[i][8:])
+                    del all_arg[i]
+            except ValueError:
+                print('Error: the options min_height and spu_tol should be of the form min_height=x and spu_tol=x '
+                      'with x a float.')
+                return
+
+        if not len(all_arg) == 8:
+            print('HAB_CHRONIC needs six inputs. See LIST_COMMAND for more information.')
+            return
+
+        merge_files = all_arg[2].split(',')
+        path_merges = []
+        for m in merge_files:
+            path_merges.append(path_prj)
+
+        try:
+            discharge_in = list(map(float, all_arg[3].split(',')))
+        except ValueError:
+            print('Error: Discharge input should be a list of float separated by a comma.')
+            return
+        # the discharge output can be given in a text file (one discharge by line) as a chronicle is long
+        try:
+            if os.path.isfile(all_arg[4]):
+                discharge_out = list(np.loadtxt(all_arg[4], ndmin=1))
+            else:
+                discharge_out = list(map(float, all_arg[4].split(',')))
+        except ValueError:
+            print('Error: Discharge output should be a list of float separated by a comma or a text file with one '
+                  'discharge by line.')
+            return
+
+        bio_names = all_arg[5].split(',')
+        for i in range(0, len(bio_names)):  # in case there is spaces
+            bio_names[i] = bio_names[i].strip()
+        [name_fish, stages, bio_names] = get_fish_stage(bio_names, all_arg[6], path_bio)
+
+        try:
+            run_choice = int(all_arg[7])
+        except ValueError:
+            print('Error: the choice of run should be an int between 0, 1,2 (usually 0 is used)')
+            return
+
+        hydraulic_chronic.chronic_habitat(merge_files, path_merges, discharge_in, discharge_out, bio_names, stages,
+                                          path_bio, run_choice, name_fish, path_prj, minh, spu_tol,
+                                          erase_id=erase_id)
+
     # ---------------------------------------------------------------------------
     elif all_arg[1] == 'ADD_HYDRO_HDF5':
         if len(all_arg) < 4:
@@ -1300,7 +1419,7 @@ def all_command(all_arg, name_prj, path_prj, path_bio, option_restart=False, era
         print('Command not recognized. Try LIST_COMMAND to see available commands.')
 
 
-def habby_restart(file_comm,name_prj, path_prj, path_bio):
+def habby_restart(file_comm,name_prj, path_prj, path_bio, incremental=False):
     """
     This function reads a list of command from a text file called file_comm. It then calls all_command one each line
     which does contain the symbol ":" . If the lines contains the symbol ":", it considered as an input.
@@ -1308,10 +1427,17 @@ def habby_restart(file_comm,name_prj, path_prj, path_bio):
     an human can read them more easily. Space does not matters here. We try to write the restart file created
     automatically by HABBY in a "nice" layout, but it just to  read it more easily.
 
+    With the option incremental, the input files (with their hash), the arguments and the output files of each
+    command are saved in the project folder (see save_restart_state()). When the restart file is executed again, a
+    command is skipped if its arguments and the content of its input files did not change and if its outputs are
+    still there. As the outputs of a command are the inputs of the next commands, only the commands which depends on
+    a modified file are executed again (like a build system).
+
     :param file_comm: a string wehich gives the name of the restart file (with the path)
     :param name_prj: the name of the project, created by default by the main()
     :param path_prj: the path to the project created by default bu the main()
     :param path_bio: the path to the project
+    :param incremental: If True, the commands which inputs did not change are not executed again
 
     """
 
@@ -1331,6 +1457,8 @@ def habby_restart(file_comm,name_prj, path_prj, path_bio):
 
     l = 0
     a = time.time()
+    nb_skip = 0
+    nb_command = dict()  # number of times each command was found (a command can be written twice)
     for c in all_data_restart:
         if ":" not in c:
             print('-------------------------------------------------------------------')
@@ -1367,7 +1495,12 @@ def habby_restart(file_comm,name_prj, path_prj, path_bio):
                     if len(arg1) > 0:
                         all_arg_c.append(arg1[1].strip())
                     lc += 1
-                habby_on_all(all_arg_c, name_prj, path_prj, path_bio)
+                if incremental:
+                    key = get_restart_key(['ALL'] + all_arg_c[1:], nb_command)
+                    if run_incremental(key, all_arg_c, name_prj, path_prj, path_bio, True):
+                        nb_skip += 1
+                else:
+                    habby_on_all(all_arg_c, name_prj, path_prj, path_bio)
             else: # command
                 all_arg_c = ['habby_cmd.py',c.strip()]
                 lc = l+1
@@ -1377,13 +1510,256 @@ def habby_restart(file_comm,name_prj, path_prj, path_bio):
                     if len(arg1) > 0:
                         all_arg_c.append(arg1[1].strip())
                     lc += 1
-                all_command(all_arg_c, name_prj, path_prj, path_bio, True)
-                plt.close()
+                if incremental:
+                    key = get_restart_key(all_arg_c[1:], nb_command)
+                    if run_incremental(key, all_arg_c, name_prj, path_prj, path_bio, False):
+                        nb_skip += 1
+                else:
+                    all_command(all_arg_c, name_prj, path_prj, path_bio, True)
+                # pyplot is only loaded by the commands which create a figure
+                if 'matplotlib.pyplot' in sys.modules:
+                    sys.modules['matplotlib.pyplot'].close()
             print('DONE')
             print('-------------------------------------------------------------------')
         l +=1
     b = time.time()
     print(str(l) + ' commands executed in ' + str(b-a)+'sec')
+    if incremental:
+        print(str(nb_skip) + ' commands skipped as their inputs did not change.')
+
+
+def get_restart_key(all_arg_c, nb_command):
+    """
+    This function gives the name under which a command of the restart file is saved in the restart state (see
+    run_incremental()). It is the command with its arguments, followed by the number of times the same command was
+    already found in the restart file.
+
+    :param all_arg_c: the command and its arguments
+    :param nb_command: a dictionary with the number of times each command was found (modified here)
+    :return: the name of the command in the restart state
+    """
+    key = ' '.join(all_arg_c)
+    nb_command[key] = nb_command.get(key, 0) + 1
+    return key + ' #' + str(nb_command[key])
+
+
+def run_incremental(key, all_arg_c, name_prj, path_prj, path_bio, is_all):
+    """
+    This function executes one command of the restart file in the incremental mode (see habby_restart()). The
+    command is skipped if the restart state of the project has the same input files (compared with their hash), if
+    the outputs saved in the restart state were not modified or erased and if the options of the project (see
+    get_option_id()) did not change. Otherwise, the command is executed and its inputs, its outputs and the options
+    are saved in the restart state. The outputs are the files of the project folder which are
+    created or modified by the command (the outputs written outside of the project folder are not followed). A
+    command which prints an error or which does not create any output is always executed again.
+
+    :param key: the name of the command in the restart state (see get_restart_key())
+    :param all_arg_c: the arguments of the command, as for all_command()
+    :param name_prj: the name of the project
+    :param path_prj: the path to the project
+    :param path_bio: the path to the biological files
+    :param is_all: If True, the command is an ALL command (see habby_on_all())
+    :return: True if the command was skipped
+    """
+    state = load_restart_state(path_prj)
+    old = state.get(key)
+    inputs = get_command_inputs(all_arg_c, path_prj, path_bio)
+    # the name of the output can be an argument of the command, but it is not an input
+    if old is not None:
+        inputs = [f for f in inputs if f not in old['outputs']]
+
+    # check if the command can be skipped
+    option_id = get_option_id(path_prj, name_prj)
+    if old is not None and sorted(old['inputs']) == inputs and old.get('options') == option_id:
+        new_inputs = dict((f, get_file_id(f, old['inputs'][f])) for f in inputs)
+        same_input = all(new_inputs[f][2] == old['inputs'][f][2] for f in inputs)
+        same_output = True
+        for f in old['outputs']:
+            try:
+                stat = os.stat(f)
+            except OSError:
+                same_output = False
+                break
+            if [stat.st_size, stat.st_mtime] != old['outputs'][f]:
+                same_output = False
+                break
+        if same_input and same_output:
+            print('Skipped: the inputs did not change since the last restart. The outputs are kept:')
+            for f in old['outputs']:
+                print(f)
+            # the time of modification of the inputs could have changed
+            old['inputs'] = new_inputs
+            save_restart_state(path_prj, state)
+            return True
+    else:
+        new_inputs = dict((f, get_file_id(f)) for f in inputs)
+
+    # execute the command (the errors are counted to know if the outputs can be used next time)
+    before = get_output_state(path_prj, name_prj)
+    out = ErrorCounter(sys.stdout)
+    with redirect_stdout(out):
+        if is_all:
+            habby_on_all(all_arg_c, name_prj, path_prj, path_bio)
+        else:
+            all_command(all_arg_c, name_prj, path_prj, path_bio, True)
+    after = get_output_state(path_prj, name_prj)
+    outputs = dict((f, after[f]) for f in after if before.get(f) != after[f])
+
+    state = load_restart_state(path_prj)
+    if out.nb_error == 0 and outputs:
+        new_inputs = dict((f, new_inputs[f]) for f in new_inputs if f not in outputs)
+        state[key] = {'inputs': new_inputs, 'outputs': outputs, 'options': option_id}
+    elif key in state:
+        del state[key]
+    save_restart_state(path_prj, state)
+    return False
+
+
+def get_command_inputs(all_arg_c, path_prj, path_bio):
+    """
+    This function finds the input files of a command of the restart file. Each argument of the command is looked for
+    as given, in the input folder of the restart, in the project folder and in the biological folder (the files can
+    be separated by a comma). If the argument is a folder, the files of this folder are inputs. If it contains the
+    symbols * or # (command ALL), all the matching files are inputs.
+
+    :param all_arg_c: the arguments of the command, as for all_command()
+    :param path_prj: the path to the project
+    :param path_bio: the path to the biological files
+    :return: the input files (sorted list of absolute path)
+    """
+    path_input = os.path.join(os.path.dirname(path_prj), 'input')
+    inputs = set()
+    for arg in all_arg_c[2:]:
+        for a in arg.split(','):
+            a = a.strip()
+            if not a:
+                continue
+            if '*' in a or '#' in a:
+                names = glob.glob(a.replace('#', '*'))
+            else:
+                names = [a, os.path.join(path_input, os.path.basename(a)), os.path.join(path_prj, a),
+                         os.path.join(path_bio, a)]
+            for name in names:
+                if os.path.isfile(name):
+                    inputs.add(os.path.abspath(name))
+                elif os.path.isdir(name) and name == a:
+                    for f in os.listdir(name):
+                        if os.path.isfile(os.path.join(name, f)):
+                            inputs.add(os.path.abspath(os.path.join(name, f)))
+    return sorted(inputs)
+
+
+def get_file_id(filename, old_id=None):
+    """
+    This function gives the size, the time of modification and the hash (sha1) of a file. If the size and the time
+    of modification are the same as in old_id, the hash is not calculated again (as it can be long for the big
+    hydraulic files).
+
+    :param filename: the name of the file (with the path)
+    :param old_id: the size, time of modification and hash from the last restart (or None)
+    :return: [size, time of modification, hash]
+    """
+    stat = os.stat(filename)
+    if old_id is not None and old_id[:2] == [stat.st_size, stat.st_mtime]:
+        return old_id
+    sha = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha.update(block)
+    return [stat.st_size, stat.st_mtime, sha.hexdigest()]
+
+
+def get_option_id(path_prj, name_prj):
+    """
+    This function gives the hash (sha1) of the options saved in the xml project file (see
+    fig_option.load_fig_option()), for example min_height_hyd, erase_id, text_format or paraview_format. These options
+    change the outputs of the commands, but the xml project file is not an input of the incremental restart (it is
+    modified by every command).
+
+    :param path_prj: the path to the project
+    :param name_prj: the name of the project
+    :return: the hash of the options
+    """
+    fig_opt = fig_option.load_fig_option(path_prj, name_prj)
+    return hashlib.sha1(json.dumps(fig_opt, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def get_output_state(path_prj, name_prj):
+    """
+    This function gives the size and the time of modification of all the files in the project folder, except the
+    xml project file, the restart state and the log files, which are modified by every command.
+
+    :param path_prj: the path to the project
+    :param name_prj: the name of the project
+    :return: a dictionary with the absolute name of the files as keys and [size, time of modification] as values
+    """
+    not_output = [os.path.abspath(os.path.join(path_prj, name_prj + '.xml')),
+                  os.path.abspath(os.path.join(path_prj, 'restart_state.json'))]
+    file_state = dict()
+    for root, dirs, files in os.walk(os.path.abspath(path_prj)):
+        dirs[:] = [d for d in dirs if d not in ['log_ALL', 'log_server']]
+        for f in files:
+            name = os.path.join(root, f)
+            if name in not_output or os.path.splitext(f)[1] in ['.log', '.tmp']:
+                continue
+            try:
+                stat = os.stat(name)
+            except OSError:
+                continue
+            file_state[name] = [stat.st_size, stat.st_mtime]
+    return file_state
+
+
+def load_restart_state(path_prj):
+    """
+    This function loads the restart state of the project (the file restart_state.json in the project folder), which
+    gives the inputs and the outputs of the commands executed by the incremental restart.
+
+    :param path_prj: the path to the project
+    :return: a dictionary with the name of the commands as keys (see get_restart_key())
+    """
+    filename = os.path.join(path_prj, 'restart_state.json')
+    if not os.path.isfile(filename):
+        return dict()
+    try:
+        with open(filename, 'rt') as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        print('Warning: the restart state of the project could not be read. All commands are executed.')
+        return dict()
+
+
+def save_restart_state(path_prj, state):
+    """
+    This function saves the restart state of the project (see load_restart_state()).
+
+    :param path_prj: the path to the project
+    :param state: the restart state (dictionary)
+    """
+    filename = os.path.join(path_prj, 'restart_state.json')
+    with open(filename + '.tmp', 'wt') as f:
+        json.dump(state, f, indent=1)
+    os.replace(filename + '.tmp', filename)
+
+
+class ErrorCounter:
+    """
+    This class is used as sys.stdout to print the output of a command and count the lines starting with 'Error'.
+    """
+    def __init__(self, stdout):
+        self.stdout = stdout
+        self.nb_error = 0
+        self.new_line = True
+
+    def write(self, text):
+        for line in text.splitlines(True):
+            if self.new_line and line.strip()[:5] == 'Error':
+                self.nb_error += 1
+            self.new_line = line.endswith('\n')
+        return self.stdout.write(text)
+
+    def flush(self):
+        self.stdout.flush()
 
 
 def habby_on_all(all_arg, name_prj, path_prj, path_bio, option_restart=False):
@@ -1397,9 +1773,14 @@ def habby_on_all(all_arg, name_prj, path_prj, path_bio, option_restart=False):
     It is better to not add an output name. Indeed default name for output includes the input file name, which
     is practical if different files are given as input. If the default
     is overided, the same name will be applied, only the time stamps will be different. To be sure to not overwrite a
-    file, this function waits one second between each command. Only the input argument should containts the string '\*'.
+    file, the number of the command and a random string are added after the time stamp in the name of the outputs
+    (see fig_option.create_run_id()). Only the input argument should containts the string '\*'.
     Otherwise, other commands would be treated as input files.
 
+    With the option jobs=x, the commands are executed in parallel on x processes. In this case, the output of each
+    command is written in a log file in the folder log_ALL of the project and a summary of all commands (state, time,
+    number of errors, input files) is printed and saved in the same folder.
+
     If there is more than one type of input, it is important that the name of the file are the same (or at least
     that there are in the same alphabetical order). If the variable # is used instead of \*, the function will be
     applied to all second file one by one. So if we have two substrate file and two hydro file, name with \* will result
@@ -1414,6 +1795,7 @@ def habby_on_all(all_arg, name_prj, path_prj, path_bio, option_restart=False):
     For example, it is better to write 'MERGE\*.h5' as just '\*.h5' if the folder contains hydraulic and merge files.
 
     :param all_arg: the list of argument (sys.argv without the argument ALL so [sys.argv[0], sys.argv[2], sys.argv[n]])
+           The option jobs=x can be in the list.
     :param name_prj: the name of the project, created by default by the main()
     :param path_prj: the path to the project created by default bu the main()
     :param path_bio: the path to the project
@@ -1424,6 +1806,20 @@ def habby_on_all(all_arg, name_prj, path_prj, path_bio, option_restart=False):
     # if you just read the docstring here, do not forgot that \ is an espcae character for sphinx and * is a special
     # character: \* = *
 
+    # get the number of process (optional)
+    jobs = 1
+    for i in range(2, len(all_arg)):
+        if all_arg[i][:5] == 'jobs=':
+            try:
+                jobs = int(all_arg[i][5:])
+            except ValueError:
+                print('Error: The number of jobs is not an int. Should be of the form jobs=x')
+                return
+            all_arg = all_arg[:i] + all_arg[i+1:]
+            break
+    if jobs < 1:
+        jobs = 1
+
     # get argv with *. (input name)
     input_folder = []
     place_ind = []
@@ -1476,28 +1872,176 @@ def habby_on_all(all_arg, name_prj, path_prj, path_bio, option_restart=False):
         return
 
     # now get through each files
-    for i in range(0, len(all_files[0])):
-        all_arg_here = all_arg
+    nb_job = len(all_files[0])
+    all_arg_job = []
+    for i in range(0, nb_job):
+        # a copy by command as the options are removed from the list by all_command
+        all_arg_here = list(all_arg)
 
         # get the file for this command
         # careful files should be in order
         for j in range(0, nb_type):
             all_arg_here[place_ind[j]] = os.path.join(dirname, all_files[j][i])
-
-        # just to check
-        print('Execute command ' + all_arg_here[1] + ' on:')
-        for i in place_ind:
-            print(all_arg_here[i])
-
-        # execute the command
+        all_arg_job.append(all_arg_here)
+
+    if jobs == 1:
+        for i in range(0, nb_job):
+            all_arg_here = all_arg_job[i]
+
+            # just to check
+            print('Execute command ' + all_arg_here[1] + ' on:')
+            for k in place_ind:
+                print(all_arg_here[k])
+
+            # execute the command (the run id avoids to over-write the output of the last command)
+            a = time.time()
+            fig_option.set_run_id(fig_option.create_run_id('job' + str(i)))
+            all_command(all_arg_here, name_prj, path_prj, path_bio, option_restart, erase_id=True)
+            t = time.time() - a
+            print('Command executed in ' + str(t) + ' sec.')
+            print('----------------------------------------------------------------------')
+        fig_option.set_run_id('')
+    else:
+        # the output of each command is written in a log file
+        time_batch = fig_option.create_run_id(fig_option.get_time_stamp())
+        path_log = os.path.join(path_prj, 'log_ALL')
+        if not os.path.isdir(path_log):
+            os.makedirs(path_log)
+        tasks = []
+        for i in range(0, nb_job):
+            name_log = os.path.join(path_log, 'ALL_' + time_batch + '_job' + str(i) + '.log')
+            tasks.append((i, all_arg_job[i], [all_arg_job[i][k] for k in place_ind], name_prj, path_prj, path_bio,
+                          option_restart, name_log))
+
+        print('Execute command ' + all_arg[1] + ' on ' + str(nb_job) + ' inputs with ' + str(min(jobs, nb_job))
+              + ' processes. The log of each command is in ' + path_log)
         a = time.time()
-        all_command(all_arg_here, name_prj, path_prj, path_bio, option_restart, erase_id=True)
+        # the xml project file is modified by the commands, one process at the time
+        lock = Lock()
+        with Pool(processes=min(jobs, nb_job), initializer=fig_option.set_prj_lock, initargs=(lock,)) as pool:
+            results = pool.map(run_all_job, tasks)
         t = time.time() - a
-        print('Command executed in ' + str(t) + ' sec.')
+
+        # aggregated summary
+        summary = ['Summary of the command ALL ' + ' '.join(all_arg[1:]), '']
+        nb_ok = 0
+        for [i, ok, t_job, nb_error, name_log] in results:
+            if ok:
+                nb_ok += 1
+                status = 'done'
+            else:
+                status = 'failed'
+            summary.append('job' + str(i) + ': ' + status + ' in ' + str(round(t_job, 2)) + ' sec, '
+                           + str(nb_error) + ' error(s). Input: ' + ', '.join(tasks[i][2]) + '. Log: ' + name_log)
+        summary.append('')
+        summary.append(str(nb_ok) + ' of ' + str(nb_job) + ' commands done in ' + str(round(t, 2)) + ' sec.')
+        with open(os.path.join(path_log, 'ALL_' + time_batch + '_summary.txt'), 'wt') as f:
+            f.write('\n'.join(summary) + '\n')
+        print('\n'.join(summary))
         print('----------------------------------------------------------------------')
 
-        # avoid risk of over-wrting
-        time.sleep(1)
+
+def run_all_job(task):
+    """
+    This function executes one command of the command ALL in a separate process (see habby_on_all()). The output
+    of the command is written in a log file. The run id (see fig_option.create_run_id()) is the number of the job
+    followed by a random string, so that the outputs of two commands executed in the same second have different
+    names. No figure is shown as the
+    matplotlib backend agg is used.
+
+    :param task: a tuple with the number of the job, the arguments of the command, the input files, the name of the
+           project, the path to the project, the path to the biology, option_restart and the name of the log file
+    :return: the number of the job, True if the command did not raise an exception, the time of the command, the
+             number of lines starting with 'Error' in the log and the name of the log
+    """
+    [i, all_arg_here, input_files, name_prj, path_prj, path_bio, option_restart, name_log] = task
+    if 'matplotlib' in sys.modules:
+        import matplotlib
+        matplotlib.use('agg')
+    else:
+        os.environ['MPLBACKEND'] = 'agg'
+    fig_option.set_run_id(fig_option.create_run_id('job' + str(i)))
+
+    ok = True
+    a = time.time()
+    with open(name_log, 'wt') as f:
+        f.write('Execute command ' + all_arg_here[1] + ' on:\n' + '\n'.join(input_files) + '\n')
+        with redirect_stdout(f):
+            try:
+                all_command(all_arg_here, name_prj, path_prj, path_bio, option_restart, erase_id=True)
+            except Exception:
+                ok = False
+                print('Error: the command raised an exception.')
+                traceback.print_exc(file=f)
+        t = time.time() - a
+        f.write('Command executed in ' + str(t) + ' sec.\n')
+
+    with open(name_log, 'rt') as f:
+        nb_error = sum(1 for line in f if line.strip()[:5] == 'Error')
+    return i, ok, t, nb_error, name_log
+
+
+def get_fish_stage(bio_names, stage_chosen, path_bio):
+    """
+    This function finds the fish and the stages to be calculated from the xml preference files and the stages chosen
+    by the user (RUN_HABITAT and HAB_CHRONIC).
+
+    :param bio_names: the name of the xml preference files
+    :param stage_chosen: the chosen stage separated by a comma or 'all'
+    :param path_bio: the path to the biological folder
+    :return: the name of the fish, the stages and the xml files (one by stage)
+    """
+    name_fish = []
+    stage2 = []
+    bio_name2 = []
+    [latin_name, stages_all] = bio_info.get_stage(bio_names, path_bio)
+    latin_name = list(set(latin_name))
+    if stage_chosen == 'all':
+        for l in range(0, len(latin_name)):
+            for s in stages_all[l]:
+                if len(latin_name[l]) > 10:
+                    name_fish.extend([latin_name[l][:10]])
+                else:
+                    name_fish.extend([latin_name[l]])
+                stage2.extend([s])
+                bio_name2.extend([bio_names[l]])
+    else:
+        stage_chosen = stage_chosen.split(',')
+        for l in range(0, len(latin_name)):
+            for s in stages_all[l]:
+                for sc in stage_chosen:
+                    if s in sc:
+                        if len(latin_name[l]) > 5:
+                            name_fish.extend([latin_name[l][:5]])
+                        else:
+                            name_fish.extend([latin_name[l]])
+                        stage2.extend([s])
+                        bio_name2.extend([bio_names[l]])
+    return name_fish, stage2, bio_name2
+
+
+def get_timestep_option(all_arg):
+    """
+    This function gets the options timestep=x and time=x of the hydraulic loaders (LOAD_TELEMAC, LOAD_HECRAS_2D,
+    LOAD_RUBAR_2D and LOAD_RIVER_2D). The list of the caller is not modified (restart, ALL, server), a copy
+    without the options is returned.
+
+    :param all_arg: the list of argument (sys.argv more or less)
+    :return: the chosen time steps by index and the chosen range of time as strings (see
+             load_hdf5.get_timestep_selection()), empty strings if the options are not given, and the arguments
+             without the options
+    """
+    all_arg = list(all_arg)
+    timestep_sel = ''
+    time_sel = ''
+    for i in range(len(all_arg) - 1, 1, -1):
+        if all_arg[i][:9] == 'timestep=':
+            timestep_sel = all_arg[i][9:]
+            del all_arg[i]
+        elif all_arg[i][:5] == 'time=':
+            time_sel = all_arg[i][5:]
+            del all_arg[i]
+    return timestep_sel, time_sel, all_arg
 
 
 def load_manning_txt(filename_path):
@@ -17,23 +17,26 @@ https://github.com/YannIrstea/habby
 import h5py
 import os
 import numpy as np
-import matplotlib.pyplot as plt
 import time
 import sys
 from io import StringIO
 from src import manage_grid_8
 from src import load_hdf5
-from src_GUI import output_fig_GUI
+from src import fan_triangulation
+from src import fig_option
 
 
 def load_hec_ras_2d_and_cut_grid(name_hdf5, filename, path, name_prj, path_prj, model_type, nb_dim, path_hdf5, q=[],
-                                 print_cmd=False, fig_opt={}):
+                                 print_cmd=False, fig_opt={}, timestep_sel='', time_sel=''):
     """
     This function calls load_hec_ras_2d and the cut_2d_grid function. Hence, it loads the data,
     pass it from cell to node (as data output in hec-ras is by cells) and it cut the grid to
     get only the wetted area. This was done before in the HEC_RAS2D Class in hydro_gui_2.py, but it was necessary to
     create a separate function to called this task in a second thread to avoid freezing the GUI.
 
+    The chosen time steps are read, cut and saved in the hdf5 file one by one (see load_hdf5.HydroHdf5Writer), so
+    only one time step is in memory at the time.
+
     :param name_hdf5: the base name of the created hdf5 (string)
     :param filename: the name of the file containg the results of HEC-RAS in 2D. (string)
     :param path: the path where the file is (string)
@@ -45,6 +48,8 @@ def load_hec_ras_2d_and_cut_grid(name_hdf5, filename, path, name_prj, path_prj,
     :param q: used by the second thread to get the error back to the GUI at the end of the thread
     :param print_cmd: If True will print the error and warning to the cmd. If False, send it to the GUI.
     :param fig_opt: the figure option, used here to get the minimum water height to have a wet node (can be > 0)
+    :param timestep_sel: the chosen time steps by index (see load_hdf5.get_timestep_selection()). All by default.
+    :param time_sel: the chosen range of time as tmin:tmax (see load_hdf5.get_timestep_selection())
 
     ** Technical comments**
 
@@ -55,69 +60,67 @@ def load_hec_ras_2d_and_cut_grid(name_hdf5, filename, path, name_prj, path_prj,
     """
     # minimum water height
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     minwh = fig_opt['min_height_hyd']
 
-    # create the empy output
-    inter_vel_all_t = []
-    inter_h_all_t = []
-
-    # load hec-ras data
+    # load hec-ras grid
     if not print_cmd:
         sys.stdout = mystdout = StringIO()
-    [vel_cell, height_cell, elev_min, coord_p, coord_c, ikle, timesteps] = load_hec_ras2d(filename, path)
-    if isinstance(vel_cell[0], int):
-        if vel_cell == [-99]:
-            print("Error: HEC-RAS2D data could not be loaded.")
-            if q:
-                sys.stdout = sys.__stdout__
-                q.put(mystdout)
-                return
-            else:
-                return
+    hec_data = open_hec_ras2d(filename, path)
+    ind_t = [-99]
+    if hec_data != [-99]:
+        ind_t = load_hdf5.get_timestep_selection(hec_data['nb_timestep'], timestep_sel, time_sel,
+                                                 hec_data['time'])
+    hdf5 = None
+    if ind_t != [-99]:
+        hdf5 = load_hdf5.HydroHdf5Writer(name_hdf5, name_prj, path_prj, model_type, path_hdf5)
+    if hdf5 is None or hdf5.file is None:
+        print("Error: HEC-RAS2D data could not be loaded.")
+        if hec_data != [-99]:
+            hec_data['file'].close()
+        if q:
+            sys.stdout = sys.__stdout__
+            q.put(mystdout)
+            return
+        else:
+            return
 
     # mimic the "whole" profile for 1D model (t=0)
-    point_all_t = [coord_p]
-    point_c_all_t = [coord_c]
-    ikle_all_t = [ikle]
-    inter_h_all_t.append([])
-    inter_vel_all_t.append([])
+    coord_p = hec_data['coord_p']
+    coord_c = hec_data['coord_c']
+    ikle = hec_data['ikle']
+    hdf5.add_timestep(ikle, coord_p, coord_c)
 
-    # cut the data and pass it to node
+    # cut the data and pass it to node, time step by time step
     warn1 = True
-    for t in range(0, len(vel_cell)):
+    vtx_all = []
+    wts_all = []
+    for t in ind_t:
+        [vel_cell, height_cell] = load_hec_ras2d_timestep(hec_data, t)
         # cell to node data
-        if t == 0:
-            [v_node, h_node, vtx_all, wts_all] = manage_grid_8.pass_grid_cell_to_node_lin(point_all_t[0],
-                                                                point_c_all_t[0], vel_cell[t], height_cell[t], warn1)
-        else:
-            [v_node, h_node, vtx_all, wts_all] = manage_grid_8.pass_grid_cell_to_node_lin(point_all_t[0],
-                                        point_c_all_t[0], vel_cell[t], height_cell[t], warn1, vtx_all, wts_all)
-            # to study the difference in average, do no forget to comment sys.stdout = mystdout = StringIO()
-            # other wise you get zero for all.
+        [v_node, h_node, vtx_all, wts_all] = manage_grid_8.pass_grid_cell_to_node_lin(coord_p, coord_c, vel_cell,
+                                                                height_cell, warn1, vtx_all, wts_all, path_hdf5)
         warn1 = False
         ikle_f = []
         point_f = []
         v_f = []
         h_f = []
-        for f in range(0, len(ikle_all_t[0])):  # by reach (or water area)
+        for f in range(0, len(ikle)):  # by reach (or water area)
             # cut grid to wet area
-            [ikle2, point_all, water_height, velocity] = manage_grid_8.cut_2d_grid(ikle_all_t[0][f],
-                                                                                   point_all_t[0][f], h_node[f],
+            [ikle2, point_all, water_height, velocity] = manage_grid_8.cut_2d_grid(ikle[f], coord_p[f], h_node[f],
                                                                                    v_node[f], minwh)
             ikle_f.append(ikle2)
             point_f.append(point_all)
             h_f.append(water_height)
             v_f.append(velocity)
-        inter_h_all_t.append(h_f)
-        inter_vel_all_t.append(v_f)
-        point_all_t.append(point_f)
-        point_c_all_t.append([[]])
-        ikle_all_t.append(ikle_f)
+        hdf5.add_timestep(ikle_f, point_f, [[]], v_f, h_f)
 
     # save data
-    load_hdf5.save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle_all_t, point_all_t, point_c_all_t,
-                        inter_vel_all_t, inter_h_all_t, sim_name=timesteps)
+    timesteps = hec_data['timestep_name']
+    if timesteps:
+        timesteps = [timesteps[t] for t in ind_t]
+    hdf5.close(sim_name=timesteps)
+    hec_data['file'].close()
 
     if not print_cmd:
         sys.stdout = sys.__stdout__
@@ -170,6 +173,40 @@ def load_hec_ras2d(filename, path):
 
     To get Hec-Ras data by nodes, it is necessary to intepolate the data. There is a function to do this in
     manage_grid_8.
+
+    The file is read with open_hec_ras2d() and load_hec_ras2d_timestep(), which can also be used to read the time
+    steps one by one.
+    """
+    hec_data = open_hec_ras2d(filename, path)
+    if hec_data == [-99]:
+        return [-99], [-99], [-99], [-99], [-99], [-99], [-99]
+
+    # get data time step by time step
+    vel_t_all = []
+    water_depth_t_all = []
+    for t in range(0, hec_data['nb_timestep']):
+        [vel_t, water_depth_t] = load_hec_ras2d_timestep(hec_data, t)
+        vel_t_all.append(vel_t)
+        water_depth_t_all.append(water_depth_t)
+    hec_data['file'].close()
+
+    return vel_t_all, water_depth_t_all, hec_data['elev'], hec_data['coord_p'], hec_data['coord_c'], \
+        hec_data['ikle'], hec_data['timestep_name']
+
+
+def open_hec_ras2d(filename, path):
+    """
+    This function opens the hdf file of HEC-RAS 2D and loads the grid of each 2D flow area. The grid is made
+    triangular (see get_triangular_grid_hecras()). The velocity and the water depth are not loaded here, they are
+    read one time step at the time by load_hec_ras2d_timestep().
+
+    :param filename: the name of the file containg the results of HEC-RAS in 2D. (string)
+    :param path: the path where the file is (string)
+    :return: a dict with the open hdf file (file), the triangular grid by flow area (ikle, coord_p, coord_c), the
+             minimum elevation of the original cells (elev), the original cell of each triangular cell (ind_cell),
+             the data needed to get the velocity from the faces (cells_face, nb_face, face_unit_vec), the path of
+             the results by flow area (path_result), the number of time steps, the time (in days, empty if not
+             found) and the name of the time steps. [-99] if the file could not be loaded.
     """
     filename_path = os.path.join(path, filename)
 
@@ -181,14 +218,8 @@ def load_hec_ras2d(filename, path):
         print('Warning: The file does not seem to be of Hec-ras2D (hdf) type.')
 
     # initialization
-    coord_p_all = []
-    coord_c_all = []
-    elev_all = []
-    ikle_all = []
-    vel_c_all = []
-    water_depth_c_all = []
-    vel_t_all = []
-    water_depth_t_all = []
+    hec_data = dict(coord_p=[], coord_c=[], elev=[], ikle=[], ind_cell=[], cells_face=[], nb_face=[],
+                    face_unit_vec=[], path_result=[])
 
     # open file
     if os.path.isfile(filename_path):
@@ -196,10 +227,11 @@ def load_hec_ras2d(filename, path):
             file2D = h5py.File(filename_path, 'r')
         except OSError:
             print("Error: unable to open the hdf file.")
-            return [-99], [-99], [-99], [-99], [-99], [-99], [-99]
+            return [-99]
     else:
         print('Error: The hdf5 file does not exist.')
-        return [-99], [-99], [-99], [-99], [-99], [-99], [-99]
+        return [-99]
+    hec_data['file'] = file2D
 
     # geometry and grid data
     try:
@@ -207,8 +239,10 @@ def load_hec_ras2d(filename, path):
         name_area = np.array(geometry_base["Names"])
     except KeyError:
         print('Error: Name of flow area could not be extracted. Check format of the hdf file.')
-        return [-99], [-99], [-99], [-99], [-99], [-99], [-99]
+        file2D.close()
+        return [-99]
         # print(list(geometry.items()))
+    path_results = '/Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series'
     try:
         for i in range(0, len(name_area)):
             name_area_i = str(name_area[i].strip())
@@ -220,78 +254,94 @@ def load_hec_ras2d(filename, path):
             coord_c = np.array(geometry["Cells Center Coordinate"])
             ikle = np.array(geometry["Cells FacePoint Indexes"])
             elev = np.array(geometry["Cells Minimum Elevation"])
-            elev_all.append(elev)
-            coord_p_all.append(coord_p)
-            coord_c_all.append(coord_c)
-            ikle_all.append(ikle)
+            hec_data['elev'].append(elev)
+            hec_data['coord_p'].append(coord_p)
+            hec_data['coord_c'].append(coord_c)
+            hec_data['ikle'].append(ikle)
+            # velocity is given on the side of the cells.
+            # It is to be averaged to find the norm of speed in the middle of the cells.
+            cells_face_all = np.array(geometry["Cells Face and Orientation Values"])
+            where_is_cells_face = np.array(geometry["Cells Face and Orientation Info"])
+            face_unit_vec = np.array(geometry["Faces NormalUnitVector and Length"])
+            hec_data['cells_face'].append(cells_face_all[:, 0])
+            hec_data['nb_face'].append(where_is_cells_face[:, 1])
+            hec_data['face_unit_vec'].append(face_unit_vec[:, :2])
+            hec_data['path_result'].append(path_results + '/2D Flow Areas/' + name_area_i[2:-1])
     except KeyError:
         print('Error: Geometry data could not be extracted. Check format of the hdf file.')
-        return [-99],[-99], [-99], [-99], [-99], [-99], [-99]
-
-    # water depth
-    for i in range(0, len(name_area)):
-        name_area_i = str(name_area[i].strip())
-        path_h5_geo = '/Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series/2D Flow Areas'\
-                      + '/' + name_area_i[2:-1]
-        result = file2D[path_h5_geo]
-        water_depth = np.array(result['Depth'])
-        water_depth_c_all.append(water_depth)
-
-    # velocity
-    nbtstep = 0
-    for i in range(0, len(name_area)):
-        # velocity is given on the side of the cells.
-        # It is to be averaged to find the norm of speed in the middle of the cells.
-        cells_face_all = np.array(geometry["Cells Face and Orientation Values"])
-        cells_face = cells_face_all[:, 0]
-        where_is_cells_face = np.array(geometry["Cells Face and Orientation Info"])
-        where_is_cells_face1 = where_is_cells_face[:,1]
-        face_unit_vec = np.array(geometry["Faces NormalUnitVector and Length"])
-        face_unit_vec = face_unit_vec[:, :2]
-        velocity = np.array(result["Face Velocity"])
-        new_vel = np.hstack((face_unit_vec, velocity.T))  # for optimization (looking for face is slow)
-        lim_b = 0
-        nbtstep = velocity.shape[0]
-        vel_c = np.zeros((len(coord_c_all[i]), nbtstep))
-        for c in range(0, len(coord_c_all[i])):
-            # find face
-            nb_face = where_is_cells_face1[c]
-            lim_a = lim_b
-            lim_b = lim_a + nb_face
-            face = cells_face[lim_a:lim_b]
-            data_face = new_vel[face, :]
-            data_face_t = data_face[:, 2:].T
-            add_vec_x = np.sum(data_face_t*data_face[:, 0], axis=1)
-            add_vec_y = np.sum(data_face_t*data_face[:, 1], axis=1)
-            vel_c[c, :] = (1.0/nb_face) * np.sqrt(add_vec_x**2 + add_vec_y**2)
-        vel_c_all.append(vel_c)
+        file2D.close()
+        return [-99]
 
-    # get data time step by time step
-    for t in range(0, nbtstep):
-        water_depth_t = []
-        vel_t = []
-        for i in range(0, len(name_area)):
-            water_depth_t.append(water_depth_c_all[i][t])
-            vel_t.append(vel_c_all[i][:, t])
-        water_depth_t_all.append(water_depth_t)
-        vel_t_all.append(vel_t)
+    # number of time step
+    try:
+        hec_data['nb_timestep'] = file2D[hec_data['path_result'][0]]['Depth'].shape[0]
+    except (KeyError, IndexError):
+        print('Error: The results could not be extracted. Check format of the hdf file.')
+        file2D.close()
+        return [-99]
 
-    # name of the time step
+    # name of the time step and time
     timesteps = []
     try:
-        timesteps = list(file2D["/Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series"
-                                "/Time Date Stamp"])
+        timesteps = list(file2D[path_results + "/Time Date Stamp"])
     except KeyError:
         pass
     for idx, t in enumerate(timesteps):
         timesteps[idx] = t.decode('utf-8')
         timesteps[idx] = timesteps[idx].replace(':', '-')
+    hec_data['timestep_name'] = timesteps
+    try:
+        hec_data['time'] = np.array(file2D[path_results + "/Time"])
+    except KeyError:
+        hec_data['time'] = []
 
     # get a triangular grid as hec-ras output are not triangular
-    [ikle_all, coord_c_all, coord_p_all, vel_t_all2, water_depth_t_all2] = get_triangular_grid_hecras(
-        ikle_all, coord_c_all, coord_p_all, vel_t_all, water_depth_t_all)
+    # the data of the original cells is given to the new cells with ind_cell (the original cell of each triangle)
+    for i in range(0, len(name_area)):
+        [ikle_i, coord_c_i, coord_p_i, ind_cell] = fan_triangulation.split_cells(
+            hec_data['ikle'][i], hec_data['coord_c'][i], hec_data['coord_p'][i])
+        hec_data['ikle'][i] = ikle_i
+        hec_data['coord_c'][i] = coord_c_i
+        hec_data['coord_p'][i] = coord_p_i
+        hec_data['ind_cell'].append(ind_cell)
+
+    return hec_data
 
-    return vel_t_all2, water_depth_t_all2, elev_all, coord_p_all, coord_c_all, ikle_all, timesteps
+
+def load_hec_ras2d_timestep(hec_data, t):
+    """
+    This function reads the velocity and the water depth of one time step in the hdf file of HEC-RAS 2D. The data
+    is given on the triangular grid created by open_hec_ras2d().
+
+    :param hec_data: the dict created by open_hec_ras2d()
+    :param t: the time step
+    :return: the velocity and the water depth by cell, by flow area (list of np.array)
+    """
+    vel_t = []
+    water_depth_t = []
+    for i in range(0, len(hec_data['ikle'])):
+        result = hec_data['file'][hec_data['path_result'][i]]
+        water_depth = np.array(result['Depth'][t])
+        velocity = np.array(result['Face Velocity'][t])
+
+        # sum of the velocity vectors of the faces by cell (the faces of a cell are consecutive in cells_face)
+        nb_face = hec_data['nb_face'][i]
+        lim = np.zeros((len(nb_face) + 1,), dtype=np.int64)
+        lim[1:] = np.cumsum(nb_face)
+        face = hec_data['cells_face'][i][:lim[-1]]
+        face_unit_vec = hec_data['face_unit_vec'][i]
+        add_vec_x = np.zeros((len(nb_face),))
+        add_vec_y = np.zeros((len(nb_face),))
+        with_face = nb_face > 0
+        if len(face) > 0:
+            add_vec_x[with_face] = np.add.reduceat(velocity[face] * face_unit_vec[face, 0], lim[:-1][with_face])
+            add_vec_y[with_face] = np.add.reduceat(velocity[face] * face_unit_vec[face, 1], lim[:-1][with_face])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            vel_c = (1.0 / nb_face) * np.sqrt(add_vec_x ** 2 + add_vec_y ** 2)
+
+        vel_t.append(vel_c[hec_data['ind_cell'][i]])
+        water_depth_t.append(water_depth[hec_data['ind_cell'][i]])
+    return vel_t, water_depth_t
 
 
 def get_triangular_grid_hecras(ikle_all, coord_c_all, point_all, h, v):
@@ -299,8 +349,7 @@ def get_triangular_grid_hecras(ikle_all, coord_c_all, point_all, h, v):
     In Hec-ras, it is possible to have non-triangular cells, often rectangular cells This function transform the
     "mixed" grid to a triangular grid. For this,
     it uses the centroid of each cell with more than three side and it create a triangle by side (linked with the
-    center of the cell). A similar function exists in rubar.py, but, as there are only one reach in rubar
-    and because ikle is different in hec-ras, it was hard to merge both functions together.
+    center of the cell). The triangulation is done in fan_triangulation.py, which is also used for rubar.
 
     This function can only be used if the original grid is the same for all time steps. The grid created is dfferent
     for each time steps.
@@ -320,92 +369,20 @@ def get_triangular_grid_hecras(ikle_all, coord_c_all, point_all, h, v):
 
     # initilization
     for t in range(0, nbtime):
-        empty = [None] * nb_reach
-        v_all.append(empty)
-        h_all.append(empty)
+        v_all.append([None] * nb_reach)
+        h_all.append([None] * nb_reach)
 
     # create the new grid for each reach
+    # in hec-ras, the permieter cells are in the ikle, so we have cells with only two point, they are removed
     for r in range(0, nb_reach):
-        coord_c = list(coord_c_all[r])
-        ikle = list(ikle_all[r])
-        xy = list(point_all[r])
-
-        nbtime = len(v)
-        # now create the triangular grid
-        likle = len(ikle)
-        to_be_delete = []
-        len_c = []
-        for c in range(0, likle):
-            ikle[c] = [item for item in ikle[c] if item >= 0]  # get rid of the minus 1 in ikle
-            ikle_c = ikle[c]
-
-            # in hec-ras, the permieter cells are in the ikle, so we have cells with only two point
-            if len(ikle_c) < 3:
-                len_c.append(0)
-                to_be_delete.append(c)
-            if len(ikle_c) == 3:
-                len_c.append(1)
-            # we neglect it here
-            if len(ikle_c) > 3:
-                # the new cell is compose of triangle where one point is the centroid and two points are side of
-                # the polygon which composed the cells before. The first new triangular cell take the place of the
-                # old one (to avoid changing the order of ikle), the other are added at the end
-                # no change to v and h for the first triangular data, change afterwards
-                xy.append(coord_c[c])
-                # first triangular cell (erase the old one)
-                ikle[c] = [ikle_c[0], ikle_c[1], len(xy) - 1]
-                p1 = xy[len(xy)-1]
-                coord_c[c] = (xy[ikle_c[0]] + xy[ikle_c[1]] + p1)/3
-                len_c.append(len(ikle_c) - 1)
-                # next triangular cell
-                for s in range(1, len(ikle_c)-1):
-                    ikle.append([ikle_c[s], ikle_c[s+1], len(xy) - 1])
-                    coord_c.append((xy[ikle_c[s]] + xy[ikle_c[s+1]] + p1) / 3)
-                    # for t in range(0, nbtime):
-                    #     v2[t].append(v[t][r][c])
-                    #     h2[t].append(h[t][r][c])
-                # last triangular cells
-                ikle.append([ikle_c[-1], ikle_c[0], len(xy) - 1])
-                coord_c.append((xy[ikle_c[-1]] + xy[ikle_c[0]] + p1) / 3)
-                # for t in range(0, nbtime):
-                #     v2[t].append(v[t][r][c])
-                #     h2[t].append(h[t][r][c])
-
-        # no empty cell
-        for i in sorted(to_be_delete, reverse=True):
-            del ikle[i]
-            del coord_c[i]
-
-        # add grid by reach
-        ikle_all[r] = np.array(ikle)
-        point_all[r] = np.array(xy)
-        coord_c_all[r] = np.array(coord_c)
-
-        # put the data in the new cells (np.array to save memeory if a lot of time step)
-        h2 = np.zeros((nbtime, len(ikle)))
-        v2 = np.zeros((nbtime, len(ikle)))
-
-        h = np.array(h)
-        v = np.array(v)
-
-        m = likle - len(to_be_delete)
-        for c in range(0, likle):
-            if len_c[c] > 0.5:
-                h2[:, c] = h[:, r, c]
-                v2[:, c] = v[:, r, c]
-                if len_c[c] >1:
-                    for s in range(1, len_c[c]):
-                        h2[:, m] = h[:, r, c]
-                        v2[:, m] = v[:, r, c]
-                        m += 1
-                    h2[:, m] = h[:, r, c]
-                    v2[:, m] = v[:, r, c]
-                    m += 1
-
-        # add data by time step
+        [ikle_all[r], coord_c_all[r], point_all[r], parent] = fan_triangulation.split_cells(ikle_all[r],
+                                                                                            coord_c_all[r],
+                                                                                            point_all[r])
+
+        # put the data in the new cells (list of np.array by time step)
         for t in range(0, nbtime):
-            v_all[t][r] = v2[t, :] # list of np.array
-            h_all[t][r] = h2[t, :]
+            v_all[t][r] = np.asarray(v[t][r])[parent]
+            h_all[t][r] = np.asarray(h[t][r])[parent]
 
     return ikle_all, coord_c_all, point_all, v_all, h_all
 
@@ -437,6 +414,7 @@ def figure_hec_ras2d(v_all, h_all, elev_all, coord_p_all, coord_c_all, ikle_all,
     The first figure is used to plot the gird. If we would plot the grid by drawing one side of each triangle
     separately, it would be very long to draw. To optimize the process, we use the prepare_grid function.
     """
+    import matplotlib.pyplot as plt
     # figure size
     #plt.close()
     fig_size_inch = (8,6)
@@ -460,8 +438,8 @@ def figure_hec_ras2d(v_all, h_all, elev_all, coord_p_all, coord_c_all, ikle_all,
         plt.xlabel('x coord []')
         plt.ylabel('y coord []')
         plt.title('Grid ')
-        plt.savefig(os.path.join(path_im, "HEC2D_grid_"+ time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-        plt.savefig(os.path.join(path_im, "HEC2D_grid" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+        plt.savefig(os.path.join(path_im, "HEC2D_grid_"+ fig_option.get_time_stamp() + '.png'))
+        plt.savefig(os.path.join(path_im, "HEC2D_grid" + fig_option.get_time_stamp() + '.pdf'))
         #plt.close()
 
         # size of the marker (to avoid having to pale, unclear figure)
@@ -482,8 +460,8 @@ def figure_hec_ras2d(v_all, h_all, elev_all, coord_p_all, coord_c_all, ikle_all,
         # plt.xlabel('x coord []')
         # plt.ylabel('y coord []')
         # plt.title('Elevation above sea level')
-        # plt.savefig(os.path.join(path_im, "HEC2D_elev_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-        # plt.savefig(os.path.join(path_im, "HEC2D_elev_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+        # plt.savefig(os.path.join(path_im, "HEC2D_elev_" + fig_option.get_time_stamp() + '.png'))
+        # plt.savefig(os.path.join(path_im, "HEC2D_elev_" + fig_option.get_time_stamp() + '.pdf'))
         # #plt.close()
 
         # for each chosen time step
@@ -493,15 +471,15 @@ def figure_hec_ras2d(v_all, h_all, elev_all, coord_p_all, coord_c_all, ikle_all,
             # plot water depth
             #water_deptht = np.squeeze(water_depth[t, :])
             scatter_plot(coord_c, water_depth, 'Water Depth [m]', 'terrain', 8, t)
-            plt.savefig(os.path.join(path_im, "HEC2D_waterdepth_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-            plt.savefig(os.path.join(path_im, "HEC2D_waterdepth_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+            plt.savefig(os.path.join(path_im, "HEC2D_waterdepth_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
+            plt.savefig(os.path.join(path_im, "HEC2D_waterdepth_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
             #plt.close()
 
              # plot velocity
             #vel_c0 = vel_c[:, t]
             scatter_plot(coord_c,vel_c, 'Vel. [m3/sec]', 'gist_ncar', 8, t)
-            plt.savefig(os.path.join(path_im, "HEC2D_vel_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-            plt.savefig(os.path.join(path_im, "HEC2D_vel_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+            plt.savefig(os.path.join(path_im, "HEC2D_vel_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
+            plt.savefig(os.path.join(path_im, "HEC2D_vel_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
             #plt.close()
 
     plt.show()
@@ -562,6 +540,7 @@ def scatter_plot(coord, data, data_name, my_cmap, s1, t):
     :param s1: the size of the dot for the scatter
     :param t: the time step being plotted
     """
+    import matplotlib.pyplot as plt
     s2 = s1/10
     fig = plt.figure()
     cm = plt.cm.get_cmap(my_cmap)
@@ -368,7 +368,8 @@ def polyLinesToVTK(path, x, y, z, pointsPerLine, cellData = None, pointData = No
     return w.getFileName()
 
 # ==============================================================================
-def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, cellData = None, pointData = None):
+def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, cellData = None, pointData = None,
+                          compression = False):
     """
         Export unstructured grid and associated data.
 
@@ -390,6 +391,7 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, cell
             pointData: Dictionary with variables associated to each vertex.
                        Keys should be the names of the variable stored in each array.
                        All arrays must have the same number of elements.
+            compression: If True, the binary data is compressed with zlib.
 
         RETURNS:
             Full path to saved file.
@@ -400,7 +402,7 @@ def unstructuredGridToVTK(path, x, y, z, connectivity, offsets, cell_types, cell
     ncells = cell_types.size
     assert (offsets.size == ncells)
     
-    w = vtk.VtkFile(path, vtk.VtkUnstructuredGrid)
+    w = vtk.VtkFile(path, vtk.VtkUnstructuredGrid, compression = compression)
     w.openGrid()
     w.openPiece(ncells = ncells, npoints = npoints)
     
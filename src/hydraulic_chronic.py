@@ -18,7 +18,8 @@ import numpy as np
 import bisect
 from src import load_hdf5
 from src import manage_grid_8
-import scipy.interpolate
+from src import calcul_hab
+from scipy.spatial import cKDTree
 
 
 def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
@@ -55,89 +56,17 @@ def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
     """
     failload = [-99]
     warn1 = True
-    sim_name_all = []
-    ikle_full = []
-    point_all_full = []
-    inter_vel_full = []
-    inter_height_full = []
-    substrate_pg_full = []
-    substrate_dom_full = []
 
     # load all merge
-    if len(merge_files) != len(path_merges):
-        print("Error: the name of the hydraulic\
-         files and their paths is not coherent. \n")
-        return failload
-
-    if len(discharge_input) < 2:
-        print('Error: at least two discharge needed as input\n')
+    data_chronic = load_merge_chronic(merge_files, path_merges,
+                                      discharge_input)
+    if data_chronic == failload:
         return failload
-
-    ikle_all_m = []
-    point_all_m = []
-    inter_vel_all_m = []
-    inter_height_all_m = []
-    substrate_pg_all_m = []
-    substrate_dom_all_m = []
-
-    for i in range(0, len(merge_files)):
-        [ikle_all, point_all, inter_vel_all, inter_height_all,
-         substrate_all_pg, substrate_all_dom] = \
-            load_hdf5.load_hdf5_hyd(merge_files[i], path_merges[i], True)
-        # special cases and checks
-        if len(ikle_all) == 1 and ikle_all[0] == [-99]:
-            print('Error: hydrological data could not be loaded.')
-            return failload
-        if not ikle_all:
-            print('Error: no connectivity table found for the hydrology.\
-             Check the format of the hdf5 file. \n')
-            return failload
-        # add hydro data to list
-        ikle_all_m.extend(ikle_all[1:])
-        # first profile is full profile without water
-        point_all_m.extend(point_all[1:])
-        inter_vel_all_m.extend(inter_vel_all[1:])
-        inter_height_all_m.extend(inter_height_all[1:])
-        substrate_pg_all_m.extend(substrate_all_pg[1:])
-        substrate_dom_all_m.extend(substrate_all_dom[1:])
-
-        # simulation name
-        sim_name = load_hdf5.load_timestep_name(merge_files[i], path_merges[i])
-        sim_name_all.extend(sim_name)
-
-        # one full, uncut, dry profile (if more than one, take the first one)
-        if i == 0:
-            ikle_full = ikle_all[0]
-            point_all_full = point_all[0]
-            inter_vel_full = inter_vel_all[0]
-            inter_height_full = inter_height_all[0]
-            substrate_pg_full = substrate_all_pg[0]
-            substrate_dom_full = substrate_all_dom[0]
-
-    if len(merge_files) == 0:
-        print('Error: no merge files given \n')
-        return
-
-    # check if discharge in put is coherent with merge
-    if len(discharge_input) != len(ikle_all_m):
-        print('Error: The number of discharge inputs is not equal to\
-         the number of timesteps in the merge files \n')
-        return failload
-    if len(list(set(discharge_input))) != len(discharge_input):
-        print('Error: Two identical discharges in the input data \n')
-        return failload
-
-    # order discharge and data so it goes from the lower dicharge
-    # to the highest
-    ind = np.argsort(discharge_input)
-
-    discharge_input = [discharge_input[i] for i in ind]
-    ikle_all_m = [ikle_all_m[i] for i in ind]
-    point_all_m = [point_all_m[i] for i in ind]
-    inter_vel_all_m = [inter_vel_all_m[i] for i in ind]
-    inter_height_all_m = [inter_height_all_m[i] for i in ind]
-    substrate_pg_all_m = [substrate_pg_all_m[i] for i in ind]
-    substrate_dom_all_m = [substrate_dom_all_m[i] for i in ind]
+    [discharge_input, data_m, data_full] = data_chronic
+    [ikle_all_m, point_all_m, inter_vel_all_m, inter_height_all_m,
+     substrate_pg_all_m, substrate_dom_all_m] = data_m[:6]
+    [ikle_full, point_all_full, inter_vel_full, inter_height_full,
+     substrate_pg_full, substrate_dom_full] = data_full
 
     # for each discharge output, we calculate the new height and velocity
     dmax = max(discharge_input)
@@ -150,10 +79,11 @@ def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
     inter_height_all_new = [inter_height_full]
     substrate_pg_all_new = [substrate_pg_full]
     substrate_dom_all_new = [substrate_dom_full]
-    # the interpolation on the original discharge should be kept
-    # aswe might re-use more than once
-    vel_base_inter = [[] for i in range(0, len(discharge_input))]
-    height_base_inter = [[] for i in range(0, len(discharge_input))]
+    # the nearest neighbours between the grids of each pair of discharges
+    # (see get_interpolated_grid())
+    cache = create_chronic_cache(len(discharge_input))
+    # the same discharge output gives the same result
+    result_d = {}
 
     for idx, d in enumerate(discharge_output):
 
@@ -169,12 +99,19 @@ def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
                 print('Warning: One or more output are neglected as\
                  they are outside of the modelling range. \n')
                 warn1 = False
+        elif d in result_d:
+            [ikle_here_all_r, point_here_all_r, vel_here, height_here,
+             sub_pg_all_r, sub_dom_all_r] = result_d[d]
+            ikle_all_new.append(ikle_here_all_r)
+            point_all_new.append(point_here_all_r)
+            inter_vel_all_new.append(vel_here)
+            inter_height_all_new.append(height_here)
+            substrate_pg_all_new.append(sub_pg_all_r)
+            substrate_dom_all_new.append(sub_dom_all_r)
         else:
             # if yes, find the two discharge inputs close to
             # the discharge output
-            indh = bisect.bisect(discharge_input, d) - 1  # dicharge min
-            if indh == len(discharge_input) - 1:
-                indh -= 1
+            indh = get_discharge_pair(discharge_input, d)
             dis_min = discharge_input[indh]
             dis_max = discharge_input[indh + 1]
 
@@ -213,107 +150,9 @@ def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
 
             # normal case, calculation should be done
             else:
-                # we use the grid of the higher discharge
-                # (often the bigger one even if not true everywhere)
-                ikle_here_all_r = ikle_all_m[indh+1]
-                point_here_all_r = point_all_m[indh+1]
-                vel_base_here_high = inter_vel_all_m[indh + 1]
-                height_base_here_high = inter_height_all_m[indh + 1]
-                substrate_pg_base_here_high = substrate_pg_all_m[indh+1]
-                substrate_dom_base_here_high = substrate_dom_all_m[indh + 1]
-
-                # check if an interpolation between these two discharges exists
-                if len(vel_base_inter[indh]) > 0:
-                    vel_base_here = vel_base_inter[indh]
-                    height_base_here = height_base_inter[indh]
-
-                else:
-                    # if not found, interpolate the lower discharge
-                    # to the grid of the higher dicharge
-                    point_old_all_r = point_all_m[indh]
-                    vel_old_all_r = inter_vel_all_m[indh]
-                    height_old_all_r = inter_height_all_m[indh]
-
-                    # The mean of vel_base_here will be lower than the mean
-                    # of vel_old_all_r as we add area with 0
-                    # [vel_base_here, height_base_here, blob, blob] =
-                    # manage_grid_8.pass_grid_cell_to_node_lin(
-                    #     point_here_all_r, point_old_all_r, vel_old_all_r,
-                    # height_old_all_r, False)
-                    vel_base_here = []
-                    height_base_here = []
-                    for r in range(0, len(vel_base_here_high)):
-                        # linear interpolation is not a good choice here
-                        inter_vel = scipy.interpolate.griddata(
-                            point_old_all_r[r], vel_old_all_r[r],
-                            point_here_all_r[r], method='nearest')
-                        inter_vel[np.isnan(inter_vel)] = 0
-                        inter_h = scipy.interpolate.griddata(
-                            point_old_all_r[r], height_old_all_r[r],
-                            point_here_all_r[r], method='nearest')
-                        inter_h[np.isnan(inter_h)] = 0
-                        vel_base_here.append(inter_vel)
-                        height_base_here.append(inter_h)
-
-                    # figures to debug the interpolation
-                    # ikle_old_all_r = ikle_all_m[indh]
-                    # manage_grid_8.plot_grid_simple(point_old_all_r,
-                    # ikle_old_all_r, {},vel_old_all_r, height_old_all_r,
-                    #                                path_prj)
-                    # manage_grid_8.plot_grid_simple(point_here_all_r,
-                    # ikle_here_all_r, {}, vel_base_here, height_base_here,
-                    #                                path_prj)
-                    # import matplotlib.pyplot as plt
-                    # plt.show()
-
-                # for each point of the grid of the higher discharge,
-                # get the velocity and the heigth data
-                # data = (1_x)* data_low + x * data_low where x
-                # depends on the dicharge d
-                x = (d-dis_min)/(dis_max - dis_min)
-                if x > 1 or x < 0:
-                    x = 0.0
-                vel_here = []
-                height_here = []
-                for r in range(0, len(vel_base_here)):
-                    vel_here_r = (1-x) * vel_base_here[r]\
-                        + x * vel_base_here_high[r]
-                    height_here_r = (1-x) * height_base_here[r]\
-                        + x * height_base_here_high[r]
-                    vel_here.append(vel_here_r)
-                    height_here.append(height_here_r)
-
-                # figures to debug cutting
-                # manage_grid_8.plot_grid_simple(point_here_all_r,
-                # ikle_here_all_r, {}, vel_here, height_here,path_prj)
-
-                # figure of the old input (high - low )
-                # ikle_old_all_r = ikle_all_m[indh]
-                # manage_grid_8.plot_grid_simple(point_here_all_r,
-                # ikle_here_all_r, {}, vel_base_here_high,
-                #                            height_base_here_high, path_prj)
-                # manage_grid_8.plot_grid_simple(point_old_all_r,
-                # ikle_old_all_r, {}, vel_old_all_r, height_old_all_r,
-                # path_prj)
-
-                # # cut the new grid to the water height is zeros
                 [ikle_here_all_r, point_here_all_r, height_here,
-                 vel_here, ind_new_all] = \
-                    manage_grid_8.cut_2d_grid_all_reach(
-                    ikle_here_all_r, point_here_all_r, height_here, vel_here,
-                    min_height, True)
-
-                # figures to debug cutting
-                # manage_grid_8.plot_grid_simple(point_here_all_r,
-                # ikle_here_all_r, {}, vel_here, height_here, path_prj)
-                # import matplotlib.pyplot as plt
-                # plt.show()
-
-                # figure to debug the result
-                # manage_grid_8.plot_grid_simple(point_here_all_r,
-                # ikle_here_all_r, {}, vel_here, height_here, path_prj)
-                # import matplotlib.pyplot as plt
-                # plt.show()
+                 vel_here, ind_new_all] = get_interpolated_grid(
+                    d, indh, discharge_input, data_m, cache, min_height)
 
                 # save data for this discharge
                 ikle_all_new.append(ikle_here_all_r)
@@ -321,18 +160,15 @@ def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
                 inter_vel_all_new.append(vel_here)
                 inter_height_all_new.append(height_here)
                 # substrate data
-                sub_pg_all_r = []
-                sub_dom_all_r = []
-                for r in range(0, len(ikle_here_all_r)):
-                    sub_pg_here =\
-                     [substrate_pg_base_here_high[r][i] for i in ind_new_all[r]]
-                    sub_dom_here =\
-                     [substrate_dom_base_here_high[r][i] for i in ind_new_all[r]]
-                    sub_pg_all_r.append(sub_pg_here)
-                    sub_dom_all_r.append(sub_dom_here)
+                sub_pg_all_r = pass_cell_data(substrate_pg_all_m[indh + 1],
+                                              ind_new_all)
+                sub_dom_all_r = pass_cell_data(substrate_dom_all_m[indh + 1],
+                                               ind_new_all)
                 substrate_pg_all_new.append(sub_pg_all_r)
                 # updated based on the cut_2d_grid
                 substrate_dom_all_new.append(sub_dom_all_r)
+                result_d[d] = [ikle_here_all_r, point_here_all_r, vel_here,
+                               height_here, sub_pg_all_r, sub_dom_all_r]
 
     # save in a new merge file
     discharge_output_str = list(map(str, discharge_output))
@@ -345,6 +181,521 @@ def chronic_hydro(merge_files, path_merges, discharge_input, discharge_output,
                         sim_name=discharge_output_str)
 
 
+def chronic_habitat(merge_files, path_merges, discharge_input,
+                    discharge_output, bio_names, stages, path_bio, run_choice,
+                    name_fish, path_txt, min_height=0.0, spu_tol=-1,
+                    lang=0, erase_id=True):
+    """
+    This function estimates the habitat (SPU and area by reach) for a
+    discharge chronicle without creating a new merge file. The habitat is
+    calculated only once for each modelled discharge (each time step in the
+    merge files). The SPU and the area at the discharges in discharge_output
+    are then linearly interpolated between the two closest modelled
+    discharges. The result is written in a text file in the same form than
+    the SPU text file of the habitat calculation (one line by output
+    discharge and by reach, see calcul_hab.save_spu_txt()).
+
+    As in chronic_hydro(), the outputs outside of the modelled range are
+    neglected (the SPU is NaN) and the substrate is assumed to be constant.
+
+    :param merge_files: A list with the name of the file merged
+    :param path_merges: the paths to these files
+    :param discharge_input: the discharge for each time steps in the merges
+           files
+    :param discharge_output: a list with the discharges of the chronicle
+    :param bio_names: the name of the xml biological data
+    :param stages: the stage chosen (youngs, adults, etc.). List with the same
+           length as bio_names.
+    :param path_bio: The path to the biological folder
+    :param run_choice: the substrate used (see calcul_hab.calc_hab()):
+           0 -> coarser, 1 -> dominant, 2 -> percentage, 3 -> no substrate
+    :param name_fish: the name of the chosen fish (one by stage)
+    :param path_txt: the path where to save the text file
+    :param min_height: the minimum water height acceptable to be accounted
+           for (only used for the refined outputs)
+    :param spu_tol: If positive, the pairs of modelled discharges where the
+           SPU (of one stage and one reach) changes by more than this relative
+           amount are refined: for the output discharges between them,
+           the habitat is calculated on the interpolated grid as done by
+           chronic_hydro(). If negative (the default), only the interpolation
+           of the SPU is used.
+    :param lang: an int which indicates the chosen language (0 is english)
+    :param erase_id: If True, we erase old text file from identical
+           hydraulic model
+    :return: the area by reach and the spu by stage for each output discharge
+             (in the form used by calcul_hab.save_spu_txt())
+
+    **Technical comments**
+
+    The interpolation along the discharge axis is done for all outputs
+    together on arrays of the form (output, stage, reach). For the refined
+    outputs, the nearest neighbours between the grids are kept for all the
+    calculation (see get_interpolated_grid()) and each output discharge is
+    only calculated once, even if it is repeated in the chronicle.
+    """
+    failload = [-99], [-99]
+
+    if run_choice not in [0, 1, 2, 3]:
+        print('Error: the calculation method is not found. \n')
+        return failload
+    if len(bio_names) != len(stages) or len(bio_names) == 0:
+        print('Error: Number of stage and species is not coherent. \n')
+        return failload
+
+    # preference curves
+    [pref_height_all, pref_vel_all, pref_sub_all] = \
+        calcul_hab.load_pref_all(bio_names, stages, path_bio)
+    if pref_height_all == [-99]:
+        return failload
+    nb_sp = len(pref_vel_all)
+
+    # load all merge
+    percent = run_choice == 2
+    take_sub = run_choice != 3
+    data_chronic = load_merge_chronic(merge_files, path_merges,
+                                      discharge_input, percent)
+    if data_chronic == [-99]:
+        return failload
+    [discharge_input, data_m, data_full] = data_chronic
+    if run_choice == 0:
+        sub_m = data_m[4]
+    elif run_choice == 2:
+        sub_m = data_m[6]
+    else:
+        sub_m = data_m[5]
+    nb_q = len(discharge_input)
+    nb_reach = len(data_m[3][0])
+
+    # habitat at the modelled discharges (time step 0 is whole profile)
+    [vh_all_t, vel_c_all_t, height_c_all_t, area_all_t, spu_all_t,
+     area_c_all_t] = calcul_hab.calc_hab_norm_multi(
+        [[]] + data_m[0], [[]] + data_m[1], [[]] + data_m[2],
+        [[]] + data_m[3], [[]] + sub_m, pref_vel_all, pref_height_all,
+        pref_sub_all, percent, take_sub)
+    if vh_all_t == [-99]:
+        print('Error: the habitat could not be calculated at the modelled '
+              'discharges. \n')
+        return failload
+    spu_m = np.full((nb_q, nb_sp, nb_reach), np.nan)
+    area_m = np.full((nb_q, nb_reach), np.nan)
+    for q in range(0, nb_q):
+        [spu_m[q], area_m[q]] = get_spu_array(spu_all_t[q + 1],
+                                              area_all_t[q + 1], nb_sp,
+                                              nb_reach)
+
+    # interpolation along the discharge axis
+    discharge_input = np.array(discharge_input, dtype=np.float64)
+    d_out = np.array(discharge_output, dtype=np.float64).ravel()
+    in_range = (d_out >= discharge_input[0]) & (d_out <= discharge_input[-1])
+    if not np.all(in_range):
+        print('Warning: One or more output are neglected as they are outside '
+              'of the modelling range. \n')
+    indh = np.searchsorted(discharge_input, d_out, side='right') - 1
+    indh = np.clip(indh, 0, nb_q - 2)
+    x = (d_out - discharge_input[indh]) / \
+        (discharge_input[indh + 1] - discharge_input[indh])
+    x[~in_range] = 0.0
+    spu_out = (1 - x)[:, np.newaxis, np.newaxis] * spu_m[indh] \
+        + x[:, np.newaxis, np.newaxis] * spu_m[indh + 1]
+    area_out = (1 - x)[:, np.newaxis] * area_m[indh] \
+        + x[:, np.newaxis] * area_m[indh + 1]
+    # the modelled discharges are given as they are
+    spu_out[x == 0] = spu_m[indh[x == 0]]
+    area_out[x == 0] = area_m[indh[x == 0]]
+    spu_out[x == 1] = spu_m[indh[x == 1] + 1]
+    area_out[x == 1] = area_m[indh[x == 1] + 1]
+    spu_out[~in_range] = np.nan
+    area_out[~in_range] = np.nan
+
+    # habitat on the interpolated grid where the SPU changes too much
+    if spu_tol >= 0:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            diff_spu = np.abs(spu_m[1:] - spu_m[:-1]) / \
+                np.maximum(np.abs(spu_m[1:]), np.abs(spu_m[:-1]))
+        refine_pair = np.any(diff_spu > spu_tol, axis=(1, 2))
+        to_refine = in_range & (x > 0) & (x < 1) & refine_pair[indh]
+        d_refine = np.unique(d_out[to_refine])
+        if len(d_refine) > 0:
+            print('# ' + str(len(d_refine)) + ' output discharges are '
+                  'calculated on the interpolated grid. \n')
+        cache = create_chronic_cache(nb_q)
+        for d in d_refine:
+            is_d = d_out == d
+            indh_d = indh[is_d][0]
+            [ikle_here_all_r, point_here_all_r, height_here, vel_here,
+             ind_new_all] = get_interpolated_grid(
+                d, indh_d, discharge_input, data_m, cache, min_height)
+            sub_here = pass_cell_data(sub_m[indh_d + 1], ind_new_all)
+            [vh_d, vel_c_d, height_c_d, area_d, spu_d, area_c_d] = \
+                calcul_hab.calc_hab_norm_multi(
+                    [[], ikle_here_all_r], [[], point_here_all_r],
+                    [[], vel_here], [[], height_here], [[], sub_here],
+                    pref_vel_all, pref_height_all, pref_sub_all, percent,
+                    take_sub)
+            if vh_d == [-99]:
+                continue
+            [spu_out[is_d], area_out[is_d]] = get_spu_array(
+                spu_d[1], area_d[1], nb_sp, nb_reach)
+
+    # text output (in the form of calcul_hab.save_spu_txt(), time step 0 is
+    # the whole profile)
+    area_all = [[]] + [a for a in area_out]
+    spu_all = []
+    name_fish_stage = []
+    for sp in range(0, nb_sp):
+        spu_all.append([[]] + [s for s in spu_out[:, sp, :]])
+    all_name = ''
+    for id, n in enumerate(name_fish):
+        name_fish_stage.append(n + '_' + stages[id])
+        all_name += n
+    if len(merge_files[0]) > 25:
+        name_base = 'Chronic_' + merge_files[0][:25] + '_' + all_name
+    else:
+        name_base = 'Chronic_' + merge_files[0][:-3] + '_' + all_name
+    sim_name = list(map(str, discharge_output))
+    calcul_hab.save_spu_txt(area_all, spu_all, name_fish_stage, path_txt,
+                            name_base, sim_name, lang, erase_id)
+
+    return area_all, spu_all
+
+
+def load_merge_chronic(merge_files, path_merges, discharge_input,
+                       percent=False):
+    """
+    This function loads the hydraulic and substrate data of the merge files
+    used by the chronicle and orders the time steps from the lower discharge
+    to the highest. The first time step of each merge file is the whole
+    profile and is not kept, except the one of the first file which is
+    returned separately.
+
+    :param merge_files: A list with the name of the file merged
+    :param path_merges: the paths to these files
+    :param discharge_input: the discharge for each time steps in the merges
+           files
+    :param percent: If True, the substrate in percentage form is also loaded
+    :return: the ordered discharges, the data by discharge (connectivity
+             table, points, velocity, height, coarser substrate, dominant
+             substrate and, if percent is True, the substrate in percentage)
+             and the whole profile of the first file.
+    """
+    failload = [-99]
+    sim_name_all = []
+    ikle_full = []
+    point_all_full = []
+    inter_vel_full = []
+    inter_height_full = []
+    substrate_pg_full = []
+    substrate_dom_full = []
+
+    # load all merge
+    if len(merge_files) != len(path_merges):
+        print("Error: the name of the hydraulic\
+         files and their paths is not coherent. \n")
+        return failload
+
+    if len(discharge_input) < 2:
+        print('Error: at least two discharge needed as input\n')
+        return failload
+
+    ikle_all_m = []
+    point_all_m = []
+    inter_vel_all_m = []
+    inter_height_all_m = []
+    substrate_pg_all_m = []
+    substrate_dom_all_m = []
+    substrate_per_all_m = []
+
+    for i in range(0, len(merge_files)):
+        [ikle_all, point_all, inter_vel_all, inter_height_all,
+         substrate_all_pg, substrate_all_dom] = \
+            load_hdf5.load_hdf5_hyd(merge_files[i], path_merges[i], True)
+        # special cases and checks
+        if len(ikle_all) == 1 and ikle_all[0] == [-99]:
+            print('Error: hydrological data could not be loaded.')
+            return failload
+        if not ikle_all:
+            print('Error: no connectivity table found for the hydrology.\
+             Check the format of the hdf5 file. \n')
+            return failload
+        # add hydro data to list
+        ikle_all_m.extend(ikle_all[1:])
+        # first profile is full profile without water
+        point_all_m.extend(point_all[1:])
+        inter_vel_all_m.extend(inter_vel_all[1:])
+        inter_height_all_m.extend(inter_height_all[1:])
+        substrate_pg_all_m.extend(substrate_all_pg[1:])
+        substrate_dom_all_m.extend(substrate_all_dom[1:])
+        if percent:
+            substrate_per_all = load_hdf5.load_sub_percent(merge_files[i],
+                                                           path_merges[i])
+            if len(substrate_per_all) == 1:
+                print('Error: Substrate data in percentage form is not '
+                      'found. \n')
+                return failload
+            substrate_per_all_m.extend(substrate_per_all[1:])
+
+        # simulation name
+        sim_name = load_hdf5.load_timestep_name(merge_files[i], path_merges[i])
+        sim_name_all.extend(sim_name)
+
+        # one full, uncut, dry profile (if more than one, take the first one)
+        if i == 0:
+            ikle_full = ikle_all[0]
+            point_all_full = point_all[0]
+            inter_vel_full = inter_vel_all[0]
+            inter_height_full = inter_height_all[0]
+            substrate_pg_full = substrate_all_pg[0]
+            substrate_dom_full = substrate_all_dom[0]
+
+    if len(merge_files) == 0:
+        print('Error: no merge files given \n')
+        return failload
+
+    # check if discharge in put is coherent with merge
+    if len(discharge_input) != len(ikle_all_m):
+        print('Error: The number of discharge inputs is not equal to\
+         the number of timesteps in the merge files \n')
+        return failload
+    if len(list(set(discharge_input))) != len(discharge_input):
+        print('Error: Two identical discharges in the input data \n')
+        return failload
+
+    # order discharge and data so it goes from the lower dicharge
+    # to the highest
+    ind = np.argsort(discharge_input)
+
+    discharge_input = [discharge_input[i] for i in ind]
+    data_m = [ikle_all_m, point_all_m, inter_vel_all_m, inter_height_all_m,
+              substrate_pg_all_m, substrate_dom_all_m]
+    if percent:
+        data_m.append(substrate_per_all_m)
+    data_m = [[data[i] for i in ind] for data in data_m]
+    data_full = [ikle_full, point_all_full, inter_vel_full, inter_height_full,
+                 substrate_pg_full, substrate_dom_full]
+
+    return [discharge_input, data_m, data_full]
+
+
+def get_discharge_pair(discharge_input, d):
+    """
+    This function finds the two modelled discharges around the discharge d.
+
+    :param discharge_input: the modelled discharges (ordered)
+    :param d: the discharge
+    :return: the index of the lower discharge (the higher is the next one)
+    """
+    indh = bisect.bisect(discharge_input, d) - 1  # dicharge min
+    if indh == len(discharge_input) - 1:
+        indh -= 1
+    return indh
+
+
+def create_chronic_cache(nb_q):
+    """
+    This function creates the data kept between the calls to
+    get_interpolated_grid(): the nearest neighbours for each pair of
+    discharges and the lower discharge passed on the grid of the higher
+    discharge for the last pair used (the discharge outputs are often
+    close to each other in a chronicle).
+
+    :param nb_q: the number of modelled discharges
+    :return: the cache (dict)
+    """
+    cache = dict()
+    cache['ind_near'] = [[] for i in range(0, nb_q)]
+    cache['indh'] = -1
+    cache['vel'] = []
+    cache['height'] = []
+    return cache
+
+
+def get_interpolated_grid(d, indh, discharge_input, data_m, cache,
+                          min_height):
+    """
+    This function estimates the velocity and the height at the discharge d
+    on the grid of the higher discharge of the pair indh and cut this grid
+    where it is dry. The data of the lower discharge is passed to this grid
+    using the nearest points (the mean of vel_base_here will be lower than
+    the mean of the old data as we add area with 0).
+
+    :param d: the discharge
+    :param indh: the index of the lower discharge (see get_discharge_pair())
+    :param discharge_input: the modelled discharges (ordered)
+    :param data_m: the data by modelled discharge (see load_merge_chronic())
+    :param cache: the nearest neighbours (see create_chronic_cache()),
+           updated here
+    :param min_height: the minimum water height acceptable to be accounted
+           for
+    :return: the connectivity table, the points, the height, the velocity and
+             the indices of the cells of the higher discharge (one by reach)
+    """
+    [ikle_all_m, point_all_m, inter_vel_all_m, inter_height_all_m] = \
+        data_m[:4]
+    dis_min = discharge_input[indh]
+    dis_max = discharge_input[indh + 1]
+
+    # we use the grid of the higher discharge
+    # (often the bigger one even if not true everywhere)
+    ikle_here_all_r = ikle_all_m[indh+1]
+    point_here_all_r = point_all_m[indh+1]
+    vel_base_here_high = inter_vel_all_m[indh + 1]
+    height_base_here_high = inter_height_all_m[indh + 1]
+
+    # pass the lower discharge to the grid of the higher discharge
+    # (a linear interpolation is not a good choice here, so the
+    # value of the nearest point is used)
+    if indh != cache['indh']:
+        if len(cache['ind_near'][indh]) == 0:
+            cache['ind_near'][indh] = get_nearest_index(point_all_m[indh],
+                                                        point_here_all_r)
+        cache['vel'] = pass_nearest(inter_vel_all_m[indh],
+                                    cache['ind_near'][indh])
+        cache['height'] = pass_nearest(inter_height_all_m[indh],
+                                       cache['ind_near'][indh])
+        cache['indh'] = indh
+
+        # figures to debug the interpolation
+        # ikle_old_all_r = ikle_all_m[indh]
+        # manage_grid_8.plot_grid_simple(point_all_m[indh],
+        # ikle_old_all_r, {}, inter_vel_all_m[indh],
+        # inter_height_all_m[indh], path_prj)
+        # manage_grid_8.plot_grid_simple(point_here_all_r,
+        # ikle_here_all_r, {}, cache['vel'], cache['height'], path_prj)
+        # import matplotlib.pyplot as plt
+        # plt.show()
+    vel_base_here = cache['vel']
+    height_base_here = cache['height']
+
+    # for each point of the grid of the higher discharge,
+    # get the velocity and the heigth data
+    # data = (1_x)* data_low + x * data_low where x
+    # depends on the dicharge d
+    x = (d-dis_min)/(dis_max - dis_min)
+    if x > 1 or x < 0:
+        x = 0.0
+    vel_here = []
+    height_here = []
+    for r in range(0, len(vel_base_here)):
+        vel_here_r = (1-x) * vel_base_here[r]\
+            + x * vel_base_here_high[r]
+        height_here_r = (1-x) * height_base_here[r]\
+            + x * height_base_here_high[r]
+        vel_here.append(vel_here_r)
+        height_here.append(height_here_r)
+
+    # figures to debug cutting
+    # manage_grid_8.plot_grid_simple(point_here_all_r,
+    # ikle_here_all_r, {}, vel_here, height_here,path_prj)
+
+    # # cut the new grid to the water height is zeros
+    return manage_grid_8.cut_2d_grid_all_reach(
+        ikle_here_all_r, point_here_all_r, height_here, vel_here,
+        min_height, True)
+
+
+def pass_cell_data(data_all_r, ind_new_all):
+    """
+    This function gives the data by cell (the substrate) to the cells of a
+    cut grid using the indices given by manage_grid_8.cut_2d_grid_all_reach().
+
+    :param data_all_r: the data by cell on the grid before the cut (one list
+           or array by reach)
+    :param ind_new_all: the indices of the old cells in the order of the new
+           cells (one array by reach)
+    :return: the data on the cut grid (one array by reach)
+    """
+    data_new_all_r = []
+    for r in range(0, len(ind_new_all)):
+        ind_new = np.asarray(ind_new_all[r], dtype=np.int64)
+        data_new_all_r.append(np.asarray(data_all_r[r])[ind_new])
+    return data_new_all_r
+
+
+def get_spu_array(spu, area, nb_sp, nb_reach):
+    """
+    This function takes the spu and the area of one time step as given by
+    calcul_hab.calc_hab_norm_multi() and gives them as arrays of float. The
+    reaches without valid data are NaN.
+
+    :param spu: the spu of one time step (array stages x reaches)
+    :param area: the area by reach of one time step
+    :param nb_sp: the number of stages
+    :param nb_reach: the number of reaches
+    :return: the spu (array stages x reaches) and the area (array by reach)
+    """
+    spu_new = np.full((nb_sp, nb_reach), np.nan)
+    area_new = np.full((nb_reach,), np.nan)
+    spu = np.asarray(spu, dtype=np.float64)
+    if spu.shape == (nb_sp, nb_reach):
+        spu_new[:] = spu
+    for r in range(0, min(len(area), nb_reach)):
+        if np.ndim(area[r]) == 0:
+            area_new[r] = area[r]
+    invalid = (spu_new == -99) | np.isnan(area_new)[np.newaxis, :]
+    spu_new[invalid] = np.nan
+    area_new[np.all(invalid, axis=0)] = np.nan
+    return spu_new, area_new
+
+
+def get_nearest_index(point_old_all_r, point_new_all_r):
+    """
+    This function finds, for each point of a new grid, the nearest point of an
+    old grid. It is done by reach with one kd-tree by reach, so that the data
+    of the old grid can then be passed to the new grid for all variables and
+    all time steps with pass_nearest().
+
+    :param point_old_all_r: the coordinates of the points of the old grid
+           (one array by reach)
+    :param point_new_all_r: the coordinates of the points of the new grid
+           (one array by reach)
+    :return: the indices of the nearest old point of each new point (one array
+             by reach). If the reach of the old grid is empty (or missing),
+             the index is the number of old points of this reach (so zero),
+             which is the index of the value added by pass_nearest() for the
+             points without neighbour.
+    """
+    ind_near_all_r = []
+    for r in range(0, len(point_new_all_r)):
+        point_new = np.asarray(point_new_all_r[r], dtype=np.float64)
+        if r < len(point_old_all_r):
+            nb_old = len(point_old_all_r[r])
+        else:
+            nb_old = 0
+        if nb_old == 0:
+            ind_near_all_r.append(np.full((len(point_new),), nb_old, dtype=np.int64))
+            continue
+        tree = cKDTree(np.asarray(point_old_all_r[r], dtype=np.float64))
+        [dist, ind_near] = tree.query(point_new)
+        ind_near_all_r.append(ind_near)
+    return ind_near_all_r
+
+
+def pass_nearest(data_all_r, ind_near_all_r):
+    """
+    This function passes the data of the points of an old grid to the points
+    of a new grid using the nearest points found by get_nearest_index().
+    The nan values (and the points without neighbour) are replaced by zero.
+
+    :param data_all_r: the data on the old grid (one array by reach)
+    :param ind_near_all_r: the indices of the nearest old points (one array
+           by reach)
+    :return: the data on the new grid (one array by reach)
+    """
+    data_new_all_r = []
+    for r in range(0, len(ind_near_all_r)):
+        if r < len(data_all_r):
+            data_r = np.asarray(data_all_r[r], dtype=np.float64).ravel()
+        else:
+            data_r = np.zeros((0,))
+        # the last value (index: number of old points) is used for the points
+        # without neighbour
+        data_r = np.append(data_r, 0.0)
+        data_new = data_r[np.minimum(ind_near_all_r[r], len(data_r) - 1)]
+        data_new[np.isnan(data_new)] = 0
+        data_new_all_r.append(data_new)
+    return data_new_all_r
+
+
 def main():
     """
     Used to test this module
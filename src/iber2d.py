@@ -19,7 +19,7 @@ import sys
 import os
 from io import StringIO
 from src import manage_grid_8
-from src_GUI import output_fig_GUI
+from src import fig_option
 from src import load_hdf5
 from src import rubar
 
@@ -63,7 +63,7 @@ def load_iber2d_and_modify_grid(name_hdf5, geom_iber2d_file,
     """
     # get minimum water height
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     minwh = fig_opt['min_height_hyd']
 
     # find where we should send the error (cmd or GUI)
@@ -154,7 +154,8 @@ def load_iber2d_and_modify_grid(name_hdf5, geom_iber2d_file,
                 manage_grid_8.pass_grid_cell_to_node_lin([coord_p],
                                                          [coord_c],
                                                          vel_cell[t],
-                                                         height_cell[t], warn1)
+                                                         height_cell[t], warn1,
+                                                         path_cache=path_hdf5)
         else:
             [vel_node, height_node, vtx_all, wts_all] = \
                 manage_grid_8.pass_grid_cell_to_node_lin([coord_p], [coord_c],
@@ -0,0 +1,378 @@
+"""
+This file is part of the free software:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+import os
+import sys
+import time
+import itertools
+import threading
+from multiprocessing.connection import Listener, Client, AuthenticationError, deliver_challenge, answer_challenge
+# only the python standard library is used by fig_option (the client starts quickly)
+from src import fig_option
+
+# the local port used by default by the server
+default_port = 6581
+# the commands which cannot be sent to the server (they are not managed by func_for_cmd.all_command())
+command_not_server = ['ALL', 'RESTART', 'SERVER', 'STOP_SERVER']
+# the time (in seconds) given to a client to send its command after the connection
+client_timeout = 60
+
+
+def serve(name_prj, path_prj, path_bio, port=default_port, workers=2):
+    """
+    This function starts the HABBY server. The server waits for the commands sent by the client (see submit()) on a
+    local socket and executes them with func_for_cmd.all_command() in a pool of workers processes. The python modules
+    (numpy, scipy, h5py, matplotlib, etc.) are loaded only once by each worker and the preference files are kept in
+    memory (see bio_info.keep_pref()), so that many small commands can be executed without starting python each time.
+
+    The commands are executed on the project given to the server. At most "workers" commands are executed at the
+    same time, the other commands wait for a free worker. The output of each command is written in a log file in
+    the folder log_server of the project and it is sent back to the client while the command runs. The server runs
+    until the command STOP_SERVER is sent by a client (see stop_server()).
+
+    A random key is created when the server starts and it is written in a file which can only be read by the user
+    (see get_key_file()). A client must give this key to connect, so only the user who started the server can send
+    commands to it.
+
+    :param name_prj: the name of the project
+    :param path_prj: the path to the project
+    :param path_bio: the path to the biological files
+    :param port: the local port on which the server waits for the commands
+    :param workers: the number of commands executed at the same time
+    """
+    from multiprocessing import Pool, Lock
+
+    # the commands are executed in the folder of the client
+    path_prj = os.path.abspath(path_prj)
+    path_bio = os.path.abspath(path_bio)
+    path_log = os.path.join(path_prj, 'log_server')
+    if not os.path.isdir(path_log):
+        os.makedirs(path_log)
+
+    authkey = os.urandom(32)
+    try:
+        # the key is checked in the thread of each client (see handle_client()), so that a slow client does not
+        # block the other clients
+        listener = Listener(('localhost', port), backlog=64)
+    except OSError:
+        print('Error: the port ' + str(port) + ' cannot be used. Is a HABBY server already running? \n')
+        return
+    # the key is only written when the port is free (not to replace the key of a running server)
+    try:
+        write_key(port, authkey)
+    except OSError:
+        print('Error: the key of the HABBY server could not be written in ' + get_key_file(port) + '\n')
+        listener.close()
+        return
+
+    # the xml project file is modified by the commands, one process at the time
+    lock = Lock()
+    pool = Pool(processes=workers, initializer=init_worker, initargs=(lock,))
+    counter = itertools.count()
+    # the threads of the clients which sent a command and if the server is stopped (see handle_client())
+    state = {'lock': threading.Lock(), 'jobs': [], 'stop': False}
+    print('HABBY server ready on port ' + str(port) + ' with ' + str(workers) + ' workers. Project: '
+          + os.path.join(path_prj, name_prj + '.xml'))
+    sys.stdout.flush()
+
+    # only the connections are accepted here, the clients are managed by their thread
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            continue
+        with state['lock']:
+            if state['stop']:
+                conn.close()
+                break
+        n = next(counter)
+        thread = threading.Thread(target=handle_client, args=(conn, n, authkey, state, port, pool, name_prj,
+                                                              path_prj, path_bio, path_log))
+        thread.daemon = True
+        thread.start()
+
+    # wait for the commands which are still running (not for the clients which did not send a command)
+    listener.close()
+    try:
+        os.remove(get_key_file(port))
+    except OSError:
+        pass
+    with state['lock']:
+        jobs = list(state['jobs'])
+    for thread in jobs:
+        thread.join()
+    pool.close()
+    pool.join()
+    print('HABBY server stopped.')
+
+
+def init_worker(lock):
+    """
+    This function is called when a worker of the server starts. It loads the modules of HABBY (and matplotlib
+    with the backend agg, as no figure is shown) and keeps the preference files in memory.
+
+    :param lock: the lock of the xml project file (see fig_option.set_prj_lock())
+    """
+    import matplotlib
+    matplotlib.use('agg')
+    import matplotlib.pyplot
+    from src import func_for_cmd
+    from src import fig_option
+    from src import bio_info
+    fig_option.set_prj_lock(lock)
+    bio_info.keep_pref(True)
+
+
+def run_job(task, cwd):
+    """
+    This function executes one command in a worker of the server (see func_for_cmd.run_all_job()). The command is
+    executed in the folder of the client, so that the relative paths of the command are the same as on the client.
+
+    :param task: the task given to func_for_cmd.run_all_job()
+    :param cwd: the current folder of the client
+    :return: the output of func_for_cmd.run_all_job()
+    """
+    from src import func_for_cmd
+    os.chdir(cwd)
+    return func_for_cmd.run_all_job(task)
+
+
+def handle_client(conn, n, authkey, state, port, pool, name_prj, path_prj, path_bio, path_log):
+    """
+    This function checks the key of a client and receives its command. It is executed in a thread of the server
+    (one thread by client), so that a client which is slow to send its command does not block the other clients. If
+    the command is STOP_SERVER, the server is stopped. Otherwise, the command is executed by handle_job().
+
+    :param conn: the connection with the client (not authenticated yet)
+    :param n: the number of the connection for this server
+    :param authkey: the key of the server (see serve())
+    :param state: a dictionary with a lock, the threads which execute a command ('jobs') and True if the server is
+           stopped ('stop')
+    :param port: the local port of the server
+    :param pool: the pool of workers
+    :param name_prj: the name of the project
+    :param path_prj: the path to the project
+    :param path_bio: the path to the biological files
+    :param path_log: the folder of the log files
+    """
+    try:
+        deliver_challenge(conn, authkey)
+        answer_challenge(conn, authkey)
+        if not conn.poll(client_timeout):
+            conn.close()
+            return
+        job = conn.recv()
+    except (OSError, EOFError, AuthenticationError):
+        conn.close()
+        return
+
+    with state['lock']:
+        stopped = state['stop']
+        if job == 'STOP_SERVER':
+            state['stop'] = True
+        elif not stopped:
+            state['jobs'] = [th for th in state['jobs'] if th.is_alive()] + [threading.current_thread()]
+    if stopped:
+        try:
+            conn.send(('log', 'Error: the HABBY server is stopped.\n'))
+            conn.send(('end', False, 0, 1, ''))
+            conn.close()
+        except OSError:
+            pass
+        return
+    if job == 'STOP_SERVER':
+        try:
+            conn.send(('end', True, 0, 0, ''))
+            conn.close()
+        except OSError:
+            pass
+        # wake up the server, which waits for a new connection
+        try:
+            Client(('localhost', port)).close()
+        except OSError:
+            pass
+        return
+    handle_job(conn, job, n, pool, name_prj, path_prj, path_bio, path_log)
+
+
+def handle_job(conn, job, n, pool, name_prj, path_prj, path_bio, path_log):
+    """
+    This function gives one command to the pool of workers and sends the log of the command to the client until
+    the command is finished. It is executed in the thread of the client (see handle_client()). If the client is
+    disconnected, the command is still executed.
+
+    :param conn: the connection with the client
+    :param job: a dictionary with the arguments of the command ('arg', as sys.argv) and the folder of the client
+           ('cwd')
+    :param n: the number of the command for this server (used in the name of the log and of the outputs)
+    :param pool: the pool of workers
+    :param name_prj: the name of the project
+    :param path_prj: the path to the project
+    :param path_bio: the path to the biological files
+    :param path_log: the folder of the log files
+    """
+    try:
+        all_arg = list(job['arg'])
+        cwd = job['cwd']
+    except (TypeError, KeyError):
+        all_arg = []
+        cwd = '.'
+    if len(all_arg) < 2 or all_arg[1] in command_not_server:
+        try:
+            conn.send(('log', 'Error: this command cannot be executed by the HABBY server.\n'))
+            conn.send(('end', False, 0, 1, ''))
+            conn.close()
+        except OSError:
+            pass
+        return
+
+    # the log of a server started again in the same second must not be over-written
+    name_log = os.path.join(path_log, fig_option.create_run_id('job' + str(n) + '_' + fig_option.get_time_stamp())
+                            + '.log')
+    open(name_log, 'wt').close()
+    task = (n, all_arg, all_arg[2:], name_prj, path_prj, path_bio, False, name_log)
+    result = pool.apply_async(run_job, (task, cwd))
+
+    # send the log while the command runs
+    connected = True
+    with open(name_log, 'rt') as f:
+        while True:
+            done = result.ready()
+            text = f.read()
+            if text and connected:
+                try:
+                    conn.send(('log', text))
+                except OSError:
+                    connected = False
+            if done:
+                break
+            time.sleep(0.05)
+
+    try:
+        [i, ok, t, nb_error, name_log] = result.get()
+    except Exception as e:
+        [ok, t, nb_error] = [False, 0, 1]
+        print('Error: the command ' + str(n) + ' could not be executed (' + str(e) + ').')
+    if connected:
+        try:
+            conn.send(('end', ok, t, nb_error, name_log))
+            conn.close()
+        except OSError:
+            pass
+
+
+def submit(all_arg, port=default_port):
+    """
+    This function sends a command to the HABBY server (see serve()) and prints the log of the command while it runs.
+    This is the client of the server: it only loads modules from the python standard library, so it starts quickly.
+
+    :param all_arg: the arguments of the command, as for func_for_cmd.all_command() (so [name_of_script,
+           command, arg1, arg2, etc.])
+    :param port: the local port of the server
+    :return: True if the command was executed without exception and without error in the log
+    """
+    authkey = read_key(port)
+    if authkey is None:
+        print('Error: No HABBY server found on the port ' + str(port) + '. Start it with the command SERVER. \n')
+        return False
+    try:
+        conn = Client(('localhost', port), authkey=authkey)
+    except (OSError, AuthenticationError):
+        print('Error: No HABBY server found on the port ' + str(port) + '. Start it with the command SERVER. \n')
+        return False
+    conn.send({'arg': list(all_arg), 'cwd': os.getcwd()})
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            print('Error: the connection with the HABBY server was lost. \n')
+            return False
+        if msg[0] == 'log':
+            sys.stdout.write(msg[1])
+            sys.stdout.flush()
+        else:
+            [ok, t, nb_error, name_log] = msg[1:]
+            conn.close()
+            if name_log:
+                print('Command executed by the server in ' + str(round(t, 3)) + ' sec. Log: ' + name_log)
+            return ok and nb_error == 0
+
+
+def stop_server(port=default_port):
+    """
+    This function stops the HABBY server. The commands which are running are finished before the server stops.
+
+    :param port: the local port of the server
+    """
+    authkey = read_key(port)
+    if authkey is None:
+        print('Error: No HABBY server found on the port ' + str(port) + '. \n')
+        return
+    try:
+        conn = Client(('localhost', port), authkey=authkey)
+    except (OSError, AuthenticationError):
+        print('Error: No HABBY server found on the port ' + str(port) + '. \n')
+        return
+    conn.send('STOP_SERVER')
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+    conn.close()
+
+
+def get_key_file(port):
+    """
+    This function gives the name of the file with the key of the HABBY server which uses the given port. The file is
+    in the folder .habby of the home directory of the user.
+
+    :param port: the local port of the server
+    :return: the name of the file (with the path)
+    """
+    return os.path.join(os.path.expanduser('~'), '.habby', 'server_' + str(port) + '.key')
+
+
+def write_key(port, authkey):
+    """
+    This function writes the key of the HABBY server in the key file (see get_key_file()). The folder and the file
+    can only be read by the user (permissions 0700 and 0600).
+
+    :param port: the local port of the server
+    :param authkey: the key (bytes)
+    """
+    filename = get_key_file(port)
+    path_key = os.path.dirname(filename)
+    if not os.path.isdir(path_key):
+        os.makedirs(path_key, mode=0o700)
+    fd = os.open(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    # the file could exist before with other permissions
+    os.chmod(filename, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(authkey)
+
+
+def read_key(port):
+    """
+    This function reads the key of the HABBY server (see write_key()).
+
+    :param port: the local port of the server
+    :return: the key (bytes) or None if the key file is not found
+    """
+    try:
+        with open(get_key_file(port), 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
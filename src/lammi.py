@@ -17,15 +17,12 @@ https://github.com/YannIrstea/habby
 import os
 import sys
 import numpy as np
-import matplotlib.pyplot as plt
-import time
 from io import StringIO
 from collections import OrderedDict
-from src_GUI import output_fig_GUI
+from src import fig_option
 from src import substrate
 from src import manage_grid_8
 from src import load_hdf5
-import matplotlib as mpl
 
 
 def open_lammi_and_create_grid(facies_path, transect_path, path_im, name_hdf5, name_prj, path_prj, path_hdf5,
@@ -195,7 +192,7 @@ def load_lammi(facies_path, transect_path, path_im, new_dir, fig_opt, savefig1d,
     failload = [-99], [-99], [-99], [-99], [-99], [-99]
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
 
     # get the filename of the transect by facies
     [length_all, fac_filename_all] = get_transect_filename(facies_path, facies_name, transect_path, transect_name,
@@ -228,6 +225,7 @@ def load_lammi(facies_path, transect_path, path_im, new_dir, fig_opt, savefig1d,
     if savefig1d:
         fig_lammi(vh_pro, coord_pro, nb_pro_reach, [0, 1, 2], 0, fig_opt, path_im)
         # plt.show()
+        import matplotlib.pyplot as plt
         plt.close()  # avoid problem with matplotlib
 
     return coord_pro, vh_pro, nb_pro_reach, sub_pro, div, q_step
@@ -781,6 +779,8 @@ def fig_lammi(vh_pro, coord_pro, nb_pro_reach, pro_num, sim_num, fig_opt, path_i
     :param fig_opt: the option for the figure
     :param path_im: path path where to save the figure
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
@@ -832,13 +832,13 @@ def fig_lammi(vh_pro, coord_pro, nb_pro_reach, pro_num, sim_num, fig_opt, path_i
         # save
         if formate == 0 or formate == 1:
             plt.savefig(os.path.join(path_im, "LAMMI_profile_" + str(i) + '_day' +
-                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'), dpi=fig_opt['resolution'], transparent=True)
+                        fig_option.get_time_stamp() + '.png'), dpi=fig_opt['resolution'], transparent=True)
         if formate == 0 or formate == 3:
             plt.savefig(os.path.join(path_im, "LAMMI_profile_" + str(i) + '_day' +
-                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'), dpi=fig_opt['resolution'], transparent=True)
+                        fig_option.get_time_stamp() + '.pdf'), dpi=fig_opt['resolution'], transparent=True)
         if formate == 2:
             plt.savefig(os.path.join(path_im, "LAMMI_profile_" + str(i) + '_day' +
-                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.jpg'), dpi=fig_opt['resolution'], transparent=True)
+                        fig_option.get_time_stamp() + '.jpg'), dpi=fig_opt['resolution'], transparent=True)
 
     # get an (x,y) view of the progile position
     plt.figure(len(pro_num))
@@ -867,13 +867,13 @@ def fig_lammi(vh_pro, coord_pro, nb_pro_reach, pro_num, sim_num, fig_opt, path_i
     by_label = OrderedDict(zip(labels, handles))
     plt.legend(by_label.values(), by_label.keys(),bbox_to_anchor=(1.1, 1), prop={'size': 10})
     if formate == 0 or formate == 1:
-        plt.savefig(os.path.join(path_im, "LAMMI_all_pro_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"),
+        plt.savefig(os.path.join(path_im, "LAMMI_all_pro_" + fig_option.get_time_stamp() + ".png"),
                     dpi=fig_opt['resolution'], transparent=True)
     if formate == 0 or formate == 3:
-        plt.savefig(os.path.join(path_im, "LAMMI_all_pro_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"),
+        plt.savefig(os.path.join(path_im, "LAMMI_all_pro_" + fig_option.get_time_stamp() + ".pdf"),
                     dpi=fig_opt['resolution'], transparent=True)
     if formate == 2:
-        plt.savefig(os.path.join(path_im, "LAMMI_all_pro_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"),
+        plt.savefig(os.path.join(path_im, "LAMMI_all_pro_" + fig_option.get_time_stamp() + ".jpg"),
                     dpi=fig_opt['resolution'], transparent=True)
 
     # plt.show()
@@ -888,6 +888,8 @@ def compare_lammi(filename_habby, filename_lammi, filename_lammi_sur):
     :param filename_lammi:  the name and the file of the lammi spu (FaciesTRF.txt)
     :param filename_lammi_sur: the name and the file of the lammi surface
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     mpl.rcParams['ps.fonttype'] = 42
     mpl.rcParams['pdf.fonttype'] = 42
     plt.rcParams['legend.loc'] = 'best'
@@ -17,28 +17,33 @@ https://github.com/YannIrstea/habby
 import h5py
 import os
 import numpy as np
-import time
 import shutil
-import shapefile
+from src import shapefile_bulk
 try:
     import xml.etree.cElementTree as ET
 except ImportError:
     import xml.etree.ElementTree as ET
-from src_GUI import output_fig_GUI
+from src import fig_option
 
 
-def open_hdf5(hdf5_name):
+def open_hdf5(hdf5_name, mode='r'):
     """
     This is a function which opens an hdf5 file and check that it exists. It does not load the data. It only opens the
-    files.
+    files. The file is opened in read-only mode by default. If the file is opened to be modified, the handle shared by
+    an hdf5 session on the same file is closed first (see open_hdf5_session()), as h5py cannot open the same file
+    twice with different modes.
+
     :param hdf5_name: the path and name of the hdf5 file (string)
+    :param mode: the mode used to open the file ('r' for reading, 'r+' to modify an existing file)
     """
     blob, ext = os.path.splitext(hdf5_name)
     if ext != '.h5':
         print('Warning: the file should be of hdf5 type. \n')
     if os.path.isfile(hdf5_name):
+        if mode != 'r':
+            close_hdf5_session(hdf5_name, force=True)
         try:
-            file = h5py.File(hdf5_name, 'r+')
+            file = h5py.File(hdf5_name, mode)
         except OSError:
             print('Error: the hdf5 file could not be loaded.\n')
             return None
@@ -50,12 +55,315 @@ def open_hdf5(hdf5_name):
     return file
 
 
+# the hdf5 files shared during a pipeline, by absolute path: [HydroHdf5 object, number of users]
+hdf5_session = dict()
+
+
+def get_session_key(hdf5_name, path_hdf5=''):
+    """
+    This function gets the name used to find an hdf5 file in the hdf5 session (the absolute path of the file).
+
+    :param hdf5_name: the name of the hdf5 file (if it is not an absolute path, path_hdf5 is used)
+    :param path_hdf5: the path to the hdf5 file
+    :return: the absolute path of the file
+    """
+    return os.path.normcase(os.path.abspath(os.path.join(path_hdf5, hdf5_name)))
+
+
+def open_hdf5_session(hdf5_name, path_hdf5=''):
+    """
+    This function opens an hdf5 file (read-only) for all the functions of a pipeline. As long as the session is not
+    closed, get_hydro_hdf5() gives the same HydroHdf5 object for this file, so that the file is opened only once even
+    if it is read by many functions (calc_hab(), save_hab_txt(), save_hab_shape(), etc.). The close() method of the
+    shared object does nothing, the file is closed by close_hdf5_session().
+
+    Sessions can be nested: the file is closed when close_hdf5_session() has been called as many times as
+    open_hdf5_session().
+
+    :param hdf5_name: the name of the hdf5 file (if it is not an absolute path, path_hdf5 is used)
+    :param path_hdf5: the path to the hdf5 file
+    :return: the shared HydroHdf5 object (its attribute file is None if the file could not be opened)
+    """
+    key = get_session_key(hdf5_name, path_hdf5)
+    if key in hdf5_session:
+        hdf5_session[key][1] += 1
+        return hdf5_session[key][0]
+
+    hdf5 = HydroHdf5(hdf5_name, path_hdf5)
+    if hdf5.file is not None:
+        hdf5.shared = True
+        hdf5_session[key] = [hdf5, 1]
+    return hdf5
+
+
+def close_hdf5_session(hdf5_name, path_hdf5='', force=False):
+    """
+    This function closes an hdf5 session opened by open_hdf5_session(). Nothing is done if the file is not in the
+    session.
+
+    :param hdf5_name: the name of the hdf5 file (if it is not an absolute path, path_hdf5 is used)
+    :param path_hdf5: the path to the hdf5 file
+    :param force: If True, the file is closed even if the session was opened more than once (used before writing
+           into the file)
+    """
+    key = get_session_key(hdf5_name, path_hdf5)
+    if key not in hdf5_session:
+        return
+    hdf5_session[key][1] -= 1
+    if hdf5_session[key][1] <= 0 or force:
+        hdf5 = hdf5_session.pop(key)[0]
+        hdf5.shared = False
+        hdf5.close()
+
+
+def get_hydro_hdf5(hdf5_name, path_hdf5=''):
+    """
+    This function gives the HydroHdf5 object to read an hdf5 file. If the file is in the hdf5 session, the shared
+    object is given. Otherwise, the file is opened. In both cases, the caller should call the close() method of the
+    object when it has finished to read the file.
+
+    :param hdf5_name: the name of the hdf5 file (if it is not an absolute path, path_hdf5 is used)
+    :param path_hdf5: the path to the hdf5 file
+    :return: a HydroHdf5 object (its attribute file is None if the file could not be opened)
+    """
+    key = get_session_key(hdf5_name, path_hdf5)
+    if key in hdf5_session:
+        return hdf5_session[key][0]
+    return HydroHdf5(hdf5_name, path_hdf5)
+
+
+class HydroHdf5:
+    """
+    A lazy access to the data of an hydrological or merge hdf5 file created by HABBY. The file is opened when the
+    object is created, but the data of the grid is only read when it is asked, for one time step and one reach at the
+    time (h5py only reads the dataset which is asked). So the memory used stays bounded by one time step if the caller
+    does not keep the data of the other time steps.
+
+    Both layouts of the 2D data are read (see save_hdf5()). The time steps are numbered as in the outputs of
+    load_hdf5_hyd(): t=0 is the whole profile and t=1 is the first time step (Timestep_0 in the hdf5 file). There
+    are thus nb_timestep + 1 time steps available. Negative time steps are counted from the end (t=-1 is the last
+    time step).
+
+    If the file could not be opened, self.file is None. If the number of time steps or reaches is missing,
+    they are equal to -99. The file is opened in read-only mode. If the object is shared by an hdf5 session
+    (see open_hdf5_session()), close() does not close the file.
+
+    :param hdf5_name: the name of the hdf5 file (if it is not an absolute path, path_hdf5 is used)
+    :param path_hdf5: the path to the hdf5 file
+    """
+
+    def __init__(self, hdf5_name, path_hdf5=''):
+        self.hdf5_name = hdf5_name
+        self.file = None  # the h5py file
+        self.nb_timestep = -99  # the number of time steps (without the whole profile)
+        self.nb_reach = -99  # the number of reaches
+        self.shared = False  # True if the object is shared by an hdf5 session
+        self.layout = 1  # the version of the layout of the 2D data (see save_hdf5())
+        self.index = dict()  # the index of the stacked datasets (layout 2), loaded when needed
+
+        # open the file with checking for the path
+        if os.path.isabs(hdf5_name):
+            self.file = open_hdf5(hdf5_name)
+        else:
+            if path_hdf5:
+                self.file = open_hdf5(os.path.join(path_hdf5, hdf5_name))
+            else:
+                print('Error" No path to the project given although a relative path was provided')
+                return
+        if self.file is None:
+            print('Error: hdf5 file could not be open. \n')
+            return
+
+        # load the layout, the number of time steps and reaches
+        if 'Layout_version' in self.file.attrs:
+            self.layout = int(self.file.attrs['Layout_version'])
+        self.nb_timestep = self.get_gen_data('Nb_timestep')
+        self.nb_reach = self.get_gen_data('Nb_reach')
+
+    def get_gen_data(self, name):
+        """
+        This function reads an integer in the general data of the hdf5 (Data_gen), as the number of time steps.
+
+        :param name: the name of the data (Nb_timestep or Nb_reach)
+        :return: the data as an int (-99 if not found)
+        """
+        try:
+            gen_dataset = self.file['Data_gen/' + name]
+            data = int(np.array(list(gen_dataset.values())[0]))
+        except (KeyError, IndexError, ValueError, TypeError):
+            return -99
+        return data
+
+    def get_data(self, t, r, name):
+        """
+        This function reads one dataset of the 2D data for one time step and one reach.
+
+        :param t: the time step (0 is the whole profile)
+        :param r: the reach
+        :param name: the name of the dataset (ikle, point_all, inter_vel_all, inter_h_all, data_substrate_pg, ...)
+        :return: the data as a np.array or None if the data is not in the file
+        """
+        if t < 0:
+            t = self.nb_timestep + 1 + t
+        if t < 0 or t > self.nb_timestep:
+            return None
+        if self.layout == 2:
+            return self.get_stacked_data(t, r, name)
+        if t == 0:
+            name_dataset = 'Data_2D/Whole_Profile/Reach_' + str(r) + '/' + name
+        else:
+            name_dataset = 'Data_2D/Timestep_' + str(t - 1) + '/Reach_' + str(r) + '/' + name
+        try:
+            gen_dataset = self.file[name_dataset]
+        except KeyError:
+            return None
+        dataset = list(gen_dataset.values())
+        if len(dataset) == 0:
+            return None
+        return np.array(dataset[0])
+
+    def get_stacked_data(self, t, r, name):
+        """
+        This function reads one dataset of the 2D data for one time step and one reach in the layout 2 of the hdf5
+        file, where the data of all time steps and reaches is stacked (see save_hdf5_2d_stacked()).
+
+        :param t: the time step (0 is the whole profile, no negative values)
+        :param r: the reach
+        :param name: the name of the dataset
+        :return: the data as a np.array or None if the data is not in the file
+        """
+        if name not in self.index:
+            try:
+                self.index[name] = np.array(self.file['Data_2D/' + name + '_index'])
+            except KeyError:
+                self.index[name] = None
+        index = self.index[name]
+        if index is None or t >= index.shape[0] or r >= index.shape[1] or index[t, r, 0] < 0:
+            return None
+        return np.array(self.file['Data_2D/' + name][index[t, r, 0]:index[t, r, 1]])
+
+    def ikle(self, t, r):
+        """
+        The connectivity table for one time step and one reach (None if not found).
+        """
+        return self.get_data(t, r, 'ikle')
+
+    def point_all(self, t, r):
+        """
+        The coordinates of the points for one time step and one reach (None if not found).
+        """
+        return self.get_data(t, r, 'point_all')
+
+    def vel(self, t, r):
+        """
+        The velocity on the nodes for one time step and one reach (None if not found).
+        """
+        return self.get_flat_data(t, r, 'inter_vel_all')
+
+    def height(self, t, r):
+        """
+        The water height on the nodes for one time step and one reach (None if not found).
+        """
+        return self.get_flat_data(t, r, 'inter_h_all')
+
+    def sub_pg(self, t, r):
+        """
+        The coarser substrate by cell for one time step and one reach (merge file, None if not found).
+        """
+        return self.get_flat_data(t, r, 'data_substrate_pg')
+
+    def sub_dom(self, t, r):
+        """
+        The dominant substrate by cell for one time step and one reach (merge file, None if not found).
+        """
+        return self.get_flat_data(t, r, 'data_substrate_dom')
+
+    def sub_percent(self, t, r):
+        """
+        The substrate in percentage by cell (8 classes) for one time step and one reach (merge file, None if not
+        found).
+        """
+        sub_per = self.get_flat_data(t, r, 'data_substrate_percentage')
+        if sub_per is not None:
+            sub_per = np.reshape(sub_per, (int(len(sub_per) / 8), 8))
+        return sub_per
+
+    def get_flat_data(self, t, r, name):
+        """
+        This function reads a dataset with one value by node or by cell and flattens it.
+
+        :param t: the time step (0 is the whole profile)
+        :param r: the reach
+        :param name: the name of the dataset
+        :return: the data as a one-dimensional np.array or None if the data is not in the file
+        """
+        data = self.get_data(t, r, name)
+        if data is not None:
+            data = data.flatten()
+        return data
+
+    def get_timestep(self, t, merge=False):
+        """
+        This function reads all the data of one time step (all reaches).
+
+        :param t: the time step (0 is the whole profile, which has no velocity and height data)
+        :param merge: If True, the substrate data is also read
+        :return: a dict with the keys ikle, point_all, vel, height (and sub_pg, sub_dom if merge). Each value is a list
+                 by reach. Data which is not found is None. If the time step does not exist, None is returned.
+        """
+        if t < 0:
+            t = self.nb_timestep + 1 + t
+        if t < 0 or t > self.nb_timestep:
+            return None
+        data_t = dict(ikle=[], point_all=[], vel=[], height=[])
+        if merge:
+            data_t['sub_pg'] = []
+            data_t['sub_dom'] = []
+        for r in range(0, self.nb_reach):
+            data_t['ikle'].append(self.ikle(t, r))
+            data_t['point_all'].append(self.point_all(t, r))
+            if t > 0:
+                data_t['vel'].append(self.vel(t, r))
+                data_t['height'].append(self.height(t, r))
+                if merge:
+                    data_t['sub_pg'].append(self.sub_pg(t, r))
+                    data_t['sub_dom'].append(self.sub_dom(t, r))
+        return data_t
+
+    def iter_timestep(self, merge=False, whole_profile=False):
+        """
+        An iterator over the time steps. Only one time step is read at the time.
+
+        :param merge: If True, the substrate data is also read
+        :param whole_profile: If True, the whole profile (t=0) is also given
+        :return: the time step and the data of this time step (see get_timestep())
+        """
+        if whole_profile:
+            t0 = 0
+        else:
+            t0 = 1
+        for t in range(t0, self.nb_timestep + 1):
+            yield t, self.get_timestep(t, merge)
+
+    def close(self):
+        """
+        Close the hdf5 file (if the file is not shared by an hdf5 session).
+        """
+        if self.shared:
+            return
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
 def load_hdf5_hyd(hdf5_name_hyd, path_hdf5='', merge=False):
     """
     A function to load the 2D hydrological data contained in the hdf5 file in the form required by HABBY. If
     hdf5_name_sub is an absolute path, the path_prj is not used. If hdf5_name_sub is a relative path, the path is
     composed of the path to the project (path_prj) composed with hdf5_name_sub.
 
+    All time steps are loaded in memory. Use the class HydroHdf5 to read the data of one time step at the time.
+
     :param hdf5_name_hyd: filename of the hdf5 file (string)
     :param path_hdf5: the path to the hdf5 file
     :param merge: If merge is True. this is a merge file with substrate data added
@@ -76,120 +384,50 @@ def load_hdf5_hyd(hdf5_name_hyd, path_hdf5='', merge=False):
         failload = [[-99]], [[-99]], [[-99]], [[-99]],[[-99]],[[-99]]
 
     # open the file with checking for the path
-    if os.path.isabs(hdf5_name_hyd):
-        file_hydro = open_hdf5(hdf5_name_hyd)
-    else:
-        if path_hdf5:
-            file_hydro = open_hdf5(os.path.join(path_hdf5, hdf5_name_hyd))
-        else:
-            print('Error" No path to the project given although a relative path was provided')
-            return failload
-    if file_hydro is None:
-        print('Error: hdf5 file could not be open. \n')
+    hdf5 = get_hydro_hdf5(hdf5_name_hyd, path_hdf5)
+    if hdf5.file is None:
         return failload
 
-    # load the number of time steps
-    basename1 = 'Data_gen'
-    try:
-        gen_dataset = file_hydro[basename1 + "/Nb_timestep"]
-    except KeyError:
+    # the number of time steps and reaches
+    nb_t = hdf5.nb_timestep
+    if nb_t == -99:
         print('Error: the number of time step is missing from the hdf5 file. Is ' + hdf5_name_hyd
-            + ' an hydrological input? \n')
+              + ' an hydrological input? \n')
+        hdf5.close()
         return failload
-    try:
-        nb_t = list(gen_dataset.values())[0]
-    except IndexError:
-        print('Error: Time step are not found')
+    nb_r = hdf5.nb_reach
+    if nb_r == -99:
+        print('Error: the number of reach is missing from the hdf5 file. \n')
+        hdf5.close()
         return failload
-    nb_t = np.array(nb_t)
-    nb_t = int(nb_t)
-
-    # load the number of reach
-    try:
-        gen_dataset = file_hydro[basename1 + "/Nb_reach"]
-    except KeyError:
-        print(
-            'Error: the number of time step is missing from the hdf5 file. \n')
-        return failload
-    nb_r = list(gen_dataset.values())[0]
-    nb_r = np.array(nb_r)
-    nb_r = int(nb_r)
-
-    # load ikle
-    basename1 = 'Data_2D'
-    ikle_whole_all = []
-
-    # ikle whole profile
-    for r in range(0, nb_r):
-        name_ik = basename1 + "/Whole_Profile/Reach_" + str(r) + "/ikle"
-        try:
-            gen_dataset = file_hydro[name_ik]
-        except KeyError:
-            print(
-                'Error: the dataset for ikle (1) is missing from the hdf5 file. \n')
-            return failload
-        try:
-            ikle_whole = list(gen_dataset.values())[0]
-        except IndexError:
-            print('Error: the dataset for ikle (3) is missing from the hdf5 file. \n')
-            return failload
-        ikle_whole = np.array(ikle_whole)
-        ikle_whole_all.append(ikle_whole)
-    ikle_all_t.append(ikle_whole_all)
 
-    # ikle by time step
-    for t in range(0, nb_t):
+    # ikle for the whole profile and by time step
+    for t in range(0, nb_t + 1):
         ikle_whole_all = []
         for r in range(0, nb_r):
-            name_ik = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/ikle"
-            try:
-                gen_dataset = file_hydro[name_ik]
-            except KeyError:
-                print('Warning: the dataset for ikle (2) is missing from the hdf5 file for one time step. \n')
-                return failload
-            try:
-                ikle_whole = list(gen_dataset.values())[0]
-            except IndexError:
-                print('Error: the dataset for ikle (4) is missing from the hdf5 file for one time step. \n')
+            ikle_whole = hdf5.ikle(t, r)
+            if ikle_whole is None:
+                if t == 0:
+                    print('Error: the dataset for ikle (1) is missing from the hdf5 file. \n')
+                else:
+                    print('Warning: the dataset for ikle (2) is missing from the hdf5 file for one time step. \n')
+                hdf5.close()
                 return failload
-            ikle_whole = np.array(ikle_whole)
             ikle_whole_all.append(ikle_whole)
         ikle_all_t.append(ikle_whole_all)
 
-    # coordinate of the point for the  whole profile
-    point_whole_all = []
-    for r in range(0, nb_r):
-        name_pa = basename1 + "/Whole_Profile/Reach_" + str(r) + "/point_all"
-        try:
-            gen_dataset = file_hydro[name_pa]
-        except KeyError:
-            print(
-                'Error: the dataset for coordinates of the points (1) is missing from the hdf5 file. \n')
-            return failload
-        try:
-            point_whole = list(gen_dataset.values())[0]
-        except IndexError:
-            print('Error: the dataset for coordinates of the points (3) is missing from the hdf5 file. \n')
-            return failload
-        point_whole = np.array(point_whole)
-        point_whole_all.append(point_whole)
-    point_all.append(point_whole_all)
-    # coordinate of the point by time step
-    for t in range(0, nb_t):
+    # coordinate of the point for the  whole profile and by time step
+    for t in range(0, nb_t + 1):
         point_whole_all = []
         for r in range(0, nb_r):
-            name_pa = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/point_all"
-            try:
-                gen_dataset = file_hydro[name_pa]
-            except KeyError:
-                print('Error: the dataset for coordinates of the points (2) is missing from the hdf5 file. \n')
-                return failload
-            try:
-                point_whole = list(gen_dataset.values())[0]
-            except IndexError:
-                print('Error: the dataset for coordinates of the points (4) is missing from the hdf5 file. \n')
+            point_whole = hdf5.point_all(t, r)
+            if point_whole is None:
+                if t == 0:
+                    print('Error: the dataset for coordinates of the points (1) is missing from the hdf5 file. \n')
+                else:
+                    print('Error: the dataset for coordinates of the points (2) is missing from the hdf5 file. \n')
+                hdf5.close()
                 return failload
-            point_whole = np.array(point_whole)
             point_whole_all.append(point_whole)
         point_all.append(point_whole_all)
 
@@ -199,62 +437,35 @@ def load_hdf5_hyd(hdf5_name_hyd, path_hdf5='', merge=False):
     if merge:
         substrate_all_pg.append([])
         substrate_all_dom.append([])
-    for t in range(0, nb_t):
+    for t in range(1, nb_t + 1):
         h_all = []
         vel_all = []
         if merge:
             sub_pg_all = []
             sub_dom_all = []
         for r in range(0, nb_r):
-            name_vel = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/inter_vel_all"
-            name_he = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/inter_h_all"
-            if merge:
-                name_pg = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/data_substrate_pg"
-                name_dom = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/data_substrate_dom"
             #velocity
-            try:
-                gen_dataset = file_hydro[name_vel]
-            except KeyError:
-                print('Error: the dataset for velocity is missing from the hdf5 file. \n')
-                return failload
-            if len(list(gen_dataset.values())) ==0:
+            vel = hdf5.vel(t, r)
+            if vel is None:
                 print('Error: No velocity found in the hdf5 file. \n')
+                hdf5.close()
                 return failload
-            vel = list(gen_dataset.values())[0]
-            vel = np.array(vel).flatten()
             vel_all.append(vel)
             #height
-            try:
-                gen_dataset = file_hydro[name_he]
-            except KeyError:
-                print('Error: the dataset for water height is missing from the hdf5 file. \n')
-                return failload
-            if len(list(gen_dataset.values())) == 0:
+            heigh = hdf5.height(t, r)
+            if heigh is None:
                 print('Error: No height found in the hdf5 file. \n')
+                hdf5.close()
                 return failload
-            heigh = list(gen_dataset.values())[0]
-            heigh = np.array(heigh).flatten()
             h_all.append(heigh)
             #substrate
             if merge:
-                try:
-                    gen_datasetpg = file_hydro[name_pg]
-                    gen_datasetdom = file_hydro[name_dom]
-                except KeyError:
+                subpg = hdf5.sub_pg(t, r)
+                subdom = hdf5.sub_dom(t, r)
+                if subpg is None or subdom is None:
                     print('Error: the dataset for substrate is missing from the hdf5 file. \n')
+                    hdf5.close()
                     return failload
-                try:
-                    subpg = list(gen_datasetpg.values())[0]
-                except IndexError:
-                    print('Error: the dataset for substrate is missing from the hdf5 file (2). \n')
-                    return failload
-                subpg = np.array(subpg).flatten()
-                try:
-                    subdom = list(gen_datasetdom.values())[0]
-                except IndexError:
-                    print('Error: the dataset for substrate is missing from the hdf5 file (3). \n')
-                    return failload
-                subdom = np.array(subdom).flatten()
                 sub_pg_all.append(subpg)
                 sub_dom_all.append(subdom)
         inter_vel_all.append(vel_all)
@@ -262,6 +473,7 @@ def load_hdf5_hyd(hdf5_name_hyd, path_hdf5='', merge=False):
         if merge:
             substrate_all_dom.append(sub_dom_all)
             substrate_all_pg.append(sub_pg_all)
+    hdf5.close()
 
     if not merge:
         return ikle_all_t, point_all, inter_vel_all, inter_height_all
@@ -281,23 +493,16 @@ def load_timestep_name(hdf5_name, path_hdf5=''):
     failload = []
 
     # open the file with checking for the path
-    if os.path.isabs(hdf5_name):
-        file_hydro = open_hdf5(hdf5_name)
-    else:
-        if path_hdf5:
-            file_hydro = open_hdf5(os.path.join(path_hdf5, hdf5_name))
-        else:
-            print('Error" No path to the project given although a relative path was provided')
-            return failload
-    if file_hydro is None:
-        print('Error: hdf5 file could not be open. \n')
+    hdf5 = get_hydro_hdf5(hdf5_name, path_hdf5)
+    if hdf5.file is None:
         return failload
 
     # get the name of the time steps
     basename1 = 'Data_2D'
     try:
-        gen_dataset = file_hydro[basename1 + "/timestep_name"]
+        gen_dataset = hdf5.file[basename1 + "/timestep_name"]
     except KeyError:   # in this case it happens often, it is not really an error
+        hdf5.close()
         return []
     sim_name1 = list(gen_dataset.values())[0]
 
@@ -306,6 +511,7 @@ def load_timestep_name(hdf5_name, path_hdf5=''):
     for i in range(0, len(sim_name1)):
         sim_name.append(bytes(sim_name1[i]).decode('utf-8'))
         sim_name[i] = sim_name[i].replace('\x00', '')  # why empty byte?
+    hdf5.close()
 
     return sim_name
 
@@ -321,33 +527,14 @@ def get_timestep_number(hdf5_name, path_hdf5):
 
     failload = -99
 
-    # open the file with checking for the path
-    if os.path.isabs(hdf5_name):
-        file_hydro = open_hdf5(hdf5_name)
-    else:
-        if path_hdf5:
-            file_hydro = open_hdf5(os.path.join(path_hdf5, hdf5_name))
-        else:
-            print('Error" No path to the project given although a relative path was provided')
-            return failload
-    if file_hydro is None:
-        print('Error: hdf5 file could not be open. \n')
+    hdf5 = get_hydro_hdf5(hdf5_name, path_hdf5)
+    if hdf5.file is None:
         return failload
-
-    # get timestep number
-    basename1 = 'Data_gen'
-    try:
-        gen_dataset = file_hydro[basename1 + "/Nb_timestep"]
-    except KeyError:
+    timestep = hdf5.nb_timestep
+    hdf5.close()
+    if timestep == -99:
         print('The number of time step was not found (1)')
         return failload
-    nb_timestep = list(gen_dataset.values())[0]
-    try:
-        timestep = np.array(nb_timestep)
-        timestep = int(timestep)
-    except ValueError:
-        print('The number of time step was not found (2)')
-        return failload
     return timestep
 
 
@@ -364,66 +551,28 @@ def load_sub_percent(hdf5_name_hyd, path_hdf5=''):
     sub_per_all_t = []
 
     # open the file with checking for the path
-    if os.path.isabs(hdf5_name_hyd):
-        file_hydro = open_hdf5(hdf5_name_hyd)
-    else:
-        if path_hdf5:
-            file_hydro = open_hdf5(os.path.join(path_hdf5, hdf5_name_hyd))
-        else:
-            print('Error" No path to the project given although a relative path was provided')
-            return failload
-    if file_hydro is None:
-        print('Error: hdf5 file could not be open. \n')
+    hdf5 = get_hydro_hdf5(hdf5_name_hyd, path_hdf5)
+    if hdf5.file is None:
         return failload
-
-    # load the number of time steps
-    basename1 = 'Data_gen'
-    try:
-        gen_dataset = file_hydro[basename1 + "/Nb_timestep"]
-    except KeyError:
+    if hdf5.nb_timestep == -99 or hdf5.nb_reach == -99:
         print('Error: the number of time step is missing from the hdf5 file. Is ' + hdf5_name_hyd
               + ' an hydrological input? \n')
+        hdf5.close()
         return failload
-    try:
-        nb_t = list(gen_dataset.values())[0]
-    except IndexError:
-        print('Error: Time step are not found')
-        return failload
-    nb_t = np.array(nb_t)
-    nb_t = int(nb_t)
-
-    # load the number of reach
-    try:
-        gen_dataset = file_hydro[basename1 + "/Nb_reach"]
-    except KeyError:
-        print(
-            'Error: the number of time step is missing from the hdf5 file. \n')
-        return failload
-    nb_r = list(gen_dataset.values())[0]
-    nb_r = np.array(nb_r)
-    nb_r = int(nb_r)
 
     # load the data of substrate in percentage
-    basename1 = 'Data_2D'
     sub_per_all_t.append([])
-    for t in range(0, nb_t):
+    for t in range(1, hdf5.nb_timestep + 1):
         sub_per_all = []
-        for r in range(0, nb_r):
-            name_per = basename1 + "/Timestep_" + str(t) + "/Reach_" + str(r) + "/data_substrate_percentage"
-            try:
-                gen_datasetpg = file_hydro[name_per]
-            except KeyError:
+        for r in range(0, hdf5.nb_reach):
+            sub_per = hdf5.sub_percent(t, r)
+            if sub_per is None:
                 print('Error: the dataset for substrate in percentage form is missing from the hdf5 file. \n')
+                hdf5.close()
                 return failload
-            try:
-                sub_per = list(gen_datasetpg.values())[0]
-            except IndexError:
-                print('Error: the dataset for substrate in precentage is missing from the hdf5 file (2). \n')
-                return failload
-            sub_per = np.array(sub_per).flatten()
-            sub_per = np.reshape(sub_per, (int(len(sub_per)/8), 8))
             sub_per_all.append(sub_per)
         sub_per_all_t.append(sub_per_all)
+    hdf5.close()
 
     return sub_per_all_t
 
@@ -528,15 +677,79 @@ def get_all_filename(dirname, ext):
 
     :param dirname: the path to the directory (string)
     :param ext: the extension (.txt for example). It is a string, the point needs to be the first character.
-    :return: a list with the filename (filename no dir) for each extension
+    :return: a list with the filename (filename no dir) for each extension, in alphabetical order
     """
     filenames = []
-    for file in os.listdir(dirname):
+    for file in sorted(os.listdir(dirname)):
         if file.endswith(ext):
             filenames.append(file)
     return filenames
 
 
+def get_timestep_selection(nb_timestep, timestep_sel='', time_sel='', time_value=[]):
+    """
+    This function gives the time steps chosen by the user, so that the hydraulic loaders only read, cut and save
+    these time steps.
+
+    :param nb_timestep: the number of time steps in the hydraulic file
+    :param timestep_sel: the chosen time steps as a string. The time steps are given by their index (the first time
+           step is 0) separated by commas. A range of time steps can be given in the python form start:stop or
+           start:stop:step. For example, 0,5,10:20 or ::5 for one time step every five time steps. Negative index
+           are counted from the end (-1 is the last time step). If empty, all time steps are chosen.
+    :param time_sel: a range of time given as tmin:tmax (in the unit of the model). Only the time steps with a time
+           between tmin and tmax (both included) are chosen. tmin or tmax can be omitted (:tmax or tmin:).
+    :param time_value: the time of each time step (only used with time_sel)
+    :return: the list of the chosen time steps (sorted) or [-99] if the selection is not valid
+    """
+    ind_t = np.arange(nb_timestep)
+    chosen = np.zeros((nb_timestep,), dtype=bool)
+
+    # by index
+    if timestep_sel:
+        for item in timestep_sel.split(','):
+            try:
+                if ':' in item:
+                    limits = [int(l) if l.strip() else None for l in item.split(':')]
+                    if len(limits) > 3:
+                        raise ValueError
+                    chosen[ind_t[slice(*limits)]] = True
+                else:
+                    i = int(item)
+                    if not -nb_timestep <= i < nb_timestep:
+                        print('Error: The time step ' + item + ' does not exist. There are ' + str(nb_timestep)
+                              + ' time steps.\n')
+                        return [-99]
+                    chosen[i] = True
+            except ValueError:
+                print('Error: The chosen time steps should be of the form 0,2,5:10 or ::5.\n')
+                return [-99]
+    else:
+        chosen[:] = True
+
+    # by time
+    if time_sel:
+        if len(time_value) != nb_timestep:
+            print('Error: The time of the time steps is not known. Choose the time steps by index.\n')
+            return [-99]
+        limits = time_sel.split(':')
+        try:
+            if len(limits) != 2:
+                raise ValueError
+            time_value = np.array(time_value, dtype=np.float64)
+            if limits[0].strip():
+                chosen[time_value < float(limits[0])] = False
+            if limits[1].strip():
+                chosen[time_value > float(limits[1])] = False
+        except ValueError:
+            print('Error: The time range should be of the form tmin:tmax.\n')
+            return [-99]
+
+    ind_t = list(map(int, ind_t[chosen]))
+    if not ind_t:
+        print('Warning: No time step was chosen.\n')
+    return ind_t
+
+
 def get_hdf5_name(model_name, name_prj, path_prj):
     """
     This function get the name of the hdf5 file containg the hydrological data for an hydrological model of type
@@ -636,6 +849,7 @@ def get_initial_files(path_hdf5, hdf5_name):
         hydro_ini = file.attrs['hydro_ini_name']
     except KeyError:
         hydro_ini = ''
+    file.close()
 
     return sub_ini, hydro_ini
 
@@ -655,10 +869,10 @@ def add_habitat_to_merge(hdf5_name, path_hdf5, vh_cell, h_cell, v_cell, fish_nam
 
     # open the file with checking for the path
     if os.path.isabs(hdf5_name):
-        file_hydro = open_hdf5(hdf5_name)
+        file_hydro = open_hdf5(hdf5_name, 'r+')
     else:
         if path_hdf5:
-            file_hydro = open_hdf5(os.path.join(path_hdf5, hdf5_name))
+            file_hydro = open_hdf5(os.path.join(path_hdf5, hdf5_name), 'r+')
         else:
             print('Error" No path to the project given although a relative path was provided')
             return
@@ -701,7 +915,14 @@ def add_habitat_to_merge(hdf5_name, path_hdf5, vh_cell, h_cell, v_cell, fish_nam
     ascii_str = [n.strip().encode("ascii", "ignore") for n in fish_name]  # unicode is not ok with hdf5
     # not too pratical but rewriting hdf5 is really annoying
     # to load use list(for.keys()) and use all the one starting with data_habitat
-    data_all = file_hydro.create_group('Data_habitat' + time.strftime("%d_%m_%Y_at_%H_%M_%S"))
+    # the name of the group is made unique in the file (no need to wait a second between two calls)
+    name_group = 'Data_habitat' + fig_option.get_time_stamp()
+    i = 1
+    while name_group + ('_' + str(i) if i > 1 else '') in file_hydro:
+        i += 1
+    if i > 1:
+        name_group += '_' + str(i)
+    data_all = file_hydro.create_group(name_group)
     name_fishg = data_all.create_group('Fish_name')
     name_fishg.create_dataset(hdf5_name, (len(fish_name), 1), data=ascii_str, maxshape=None)
 
@@ -738,13 +959,12 @@ def add_habitat_to_merge(hdf5_name, path_hdf5, vh_cell, h_cell, v_cell, fish_nam
                                     maxshape=None)
 
     file_hydro.close()
-    time.sleep(1)  # as we need to insure different group of name
 
 
 def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle_all_t, point_all_t, point_c_all_t,
               inter_vel_all_t, inter_h_all_t, xhzv_data=[], coord_pro=[], vh_pro=[], nb_pro_reach=[], merge=False,
               sub_pg_all_t=[], sub_dom_all_t=[], sub_per_all_t=[], sim_name=[], sub_ini_name='', hydro_ini_name='',
-              save_option=None, version=0):
+              save_option=None, version=0, layout=2, compression='gzip'):
     """
     This function save the hydrological data in the hdf5 format.
 
@@ -773,6 +993,9 @@ def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle
     :param save_option: If save_option is not none, the variable erase_idem which is usually given in the figure option
            is overwritten by save_option which is boolean. This is useful for habby cmd.
     :param version: The version number of HABBY
+    :param layout: the version of the layout of the 2D data in the hdf5 file. 1 -> one group by time step, reach and
+           variable. 2 -> one stacked dataset by variable (see save_hdf5_2d_stacked()). 2 by default.
+    :param compression: the compression of the stacked datasets ('gzip', 'lzf' or None). Only used if layout is 2.
 
 
     **Technical comments**
@@ -796,7 +1019,9 @@ def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle
         *   Dats_gen:  number of time step and number of reach
         *   Data_1D:  xhzv_data_all (given profile by profile)
         *   Data_15D :  vh_pro, coord_pro (given profile by profile in a dict) and nb_pro_reach.
-        *   Data_2D : For each time step, for each reach: ikle, point, point_c, inter_h, inter_vel
+        *   Data_2D : For each time step, for each reach: ikle, point, point_c, inter_h, inter_vel. With the
+            layout 2, the data of all time steps and reaches is stacked in one dataset by variable, with an index
+            (see save_hdf5_2d_stacked()).
 
     If a list has elements with a changing number of variables, it is necessary to create a dictionary to save
     this list in hdf5. For example, a dictionary will be needed to save the following list: [[1,2,3,4], [1,2,3]].
@@ -811,46 +1036,15 @@ def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle
     Hdf5 file do not support unicode. It is necessary to encode string to write them.
 
     """
-    # to know if we have to save a new hdf5
-
-
-    if save_option is None:
-        save_opt = output_fig_GUI.load_fig_option(path_prj, name_prj)
-        if save_opt['erase_id'] == 'True':  # xml is all in string
-            erase_idem = True
-        else:
-            erase_idem = False
-    else:
-        erase_idem = save_option
-
     # create hdf5 name if we keep all files (nned a time stamp)
-    if not erase_idem:
-        h5name = name_hdf5 + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.h5'
-    else:
-        if name_hdf5[-3:] != '.h5':
-            h5name = name_hdf5 + '.h5'
-        else:
-            h5name = name_hdf5
-        if os.path.isfile(os.path.join(path_hdf5, h5name)):
-            try:
-                os.remove(os.path.join(path_hdf5, h5name))
-            except PermissionError:
-                    print("Could not save hdf5 file. It might be used by another program \n")
-                    return
+    [h5name, erase_idem] = get_hdf5_name_to_save(name_hdf5, name_prj, path_prj, path_hdf5, save_option)
+    if not h5name:
+        return
 
     # create a new hdf5
     fname = os.path.join(path_hdf5, h5name)
     file = h5py.File(fname, 'w')
-
-    # create attributes
-    file.attrs['Software'] = 'HABBY'
-    file.attrs['Software_version'] = str(version)
-    file.attrs['path_projet'] = path_prj
-    file.attrs['name_projet'] = name_prj
-    file.attrs['HDF5_version'] = h5py.version.hdf5_version
-    file.attrs['h5py_version'] = h5py.version.version
-    file.attrs['sub_ini_name'] = sub_ini_name
-    file.attrs['hydro_ini_name'] = hydro_ini_name
+    save_hdf5_attrs(file, name_prj, path_prj, version, layout, sub_ini_name, hydro_ini_name)
 
     # create all datasets and group
     data_all = file.create_group('Data_gen')
@@ -884,7 +1078,47 @@ def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle
         nbproreachg = Data_15D.create_group('Number_profile_by_reach')
         nb_pro_reach2 = list(map(float, nb_pro_reach))
         nbproreachg.create_dataset(h5name, [len(nb_pro_reach2), 1], data=nb_pro_reach2)
-    if nb_dim <= 2:
+    if nb_dim <= 2 and layout == 2:
+        Data_2D = file.create_group('Data_2D')
+        # get the data which is there for each time step (the same one than in the layout 1)
+        data_2d = dict(ikle=[], point_all=[], point_c_all=[], inter_vel_all=[], inter_h_all=[])
+        if merge:
+            data_2d['data_substrate_dom'] = []
+            data_2d['data_substrate_pg'] = []
+            data_2d['data_substrate_percentage'] = []
+        warn_dry = True
+        for t in range(0, len(ikle_all_t)):
+            for r in range(0, len(ikle_all_t[t])):
+                if len(ikle_all_t[t][r]) == 0 and warn_dry:
+                    print('Warning: Reach number ' + str(r) + ' has an empty grid. It might be entierely dry.')
+                    warn_dry = False
+            data_2d['ikle'].append(ikle_all_t[t])
+            data_2d['point_all'].append(point_all_t[t])
+            for name, data_all_t in [('point_c_all', point_c_all_t), ('inter_vel_all', inter_vel_all_t),
+                                     ('inter_h_all', inter_h_all_t), ('data_substrate_dom', sub_dom_all_t),
+                                     ('data_substrate_pg', sub_pg_all_t)]:
+                if name in data_2d:
+                    if len(data_all_t) > 0 and len(data_all_t[t]) > 0 and not isinstance(data_all_t[t][0], float):
+                        data_2d[name].append(data_all_t[t])
+                    else:
+                        data_2d[name].append(None)
+            if merge:
+                if sub_per_all_t and len(sub_per_all_t[t]) > 0:
+                    data_2d['data_substrate_percentage'].append(sub_per_all_t[t])
+                else:
+                    data_2d['data_substrate_percentage'].append(None)
+        ncol = dict(point_all=2, point_c_all=2, inter_vel_all=1, inter_h_all=1, data_substrate_dom=1,
+                    data_substrate_pg=1, data_substrate_percentage=8)
+        for name in data_2d:
+            save_hdf5_2d_stacked(Data_2D, name, data_2d[name], ncol.get(name, 0), compression)
+
+        # save the name of the simulation/time steps if they exist
+        if sim_name:
+            ascii_str = [n.strip().encode("ascii", "ignore") for n in sim_name]  # unicode is not ok with hdf5
+            tname_typeg = Data_2D.create_group('timestep_name')
+            tname_typeg.create_dataset(h5name, (len(sim_name), 1), data=ascii_str)
+
+    elif nb_dim <= 2:
         warn_dry = True
         Data_2D = file.create_group('Data_2D')
         for t in range(0, len(ikle_all_t)):
@@ -954,6 +1188,83 @@ def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle
     file.close()
 
     # save the file to the xml of the project
+    save_hdf5_name_in_xml(h5name, name_prj, path_prj, model_type, merge, erase_idem)
+
+    return
+
+
+def get_hdf5_name_to_save(name_hdf5, name_prj, path_prj, path_hdf5, save_option=None):
+    """
+    This function gives the name of a new hydrological hdf5 file. If the files with the same name are not erased
+    (option erase_id of the figure options), a time stamp is added to the name. Otherwise, the old file is removed.
+
+    :param name_hdf5: the base name for the hdf5 file to be created (string)
+    :param name_prj: the name of the project (string)
+    :param path_prj: the path of the project
+    :param path_hdf5: the folder in which to save the hdf5
+    :param save_option: If not None, it overwrites the option erase_id of the figure options (boolean)
+    :return: the name of the hdf5 file (an empty string if the old file could not be removed) and erase_idem
+    """
+    if save_option is None:
+        save_opt = fig_option.load_fig_option(path_prj, name_prj)
+        if save_opt['erase_id'] == 'True':  # xml is all in string
+            erase_idem = True
+        else:
+            erase_idem = False
+    else:
+        erase_idem = save_option
+
+    # create hdf5 name if we keep all files (nned a time stamp)
+    if not erase_idem:
+        h5name = name_hdf5 + fig_option.get_time_stamp() + '.h5'
+    else:
+        if name_hdf5[-3:] != '.h5':
+            h5name = name_hdf5 + '.h5'
+        else:
+            h5name = name_hdf5
+        if os.path.isfile(os.path.join(path_hdf5, h5name)):
+            try:
+                os.remove(os.path.join(path_hdf5, h5name))
+            except PermissionError:
+                print("Could not save hdf5 file. It might be used by another program \n")
+                return '', erase_idem
+    return h5name, erase_idem
+
+
+def save_hdf5_attrs(file, name_prj, path_prj, version=0, layout=2, sub_ini_name='', hydro_ini_name=''):
+    """
+    This function writes the attributes of a new hydrological hdf5 file (software, project, versions, etc.).
+
+    :param file: the hdf5 file (open with h5py)
+    :param name_prj: the name of the project (string)
+    :param path_prj: the path of the project
+    :param version: The version number of HABBY
+    :param layout: the version of the layout of the 2D data (see save_hdf5())
+    :param sub_ini_name: The name of the substrate hdf5 file from which the data originates
+    :param hydro_ini_name: the name of the hydraulic hdf5 file from which the data originates
+    """
+    file.attrs['Software'] = 'HABBY'
+    file.attrs['Software_version'] = str(version)
+    file.attrs['path_projet'] = path_prj
+    file.attrs['name_projet'] = name_prj
+    file.attrs['HDF5_version'] = h5py.version.hdf5_version
+    file.attrs['h5py_version'] = h5py.version.version
+    file.attrs['sub_ini_name'] = sub_ini_name
+    file.attrs['hydro_ini_name'] = hydro_ini_name
+    file.attrs['Layout_version'] = layout
+
+
+def save_hdf5_name_in_xml(h5name, name_prj, path_prj, model_type, merge=False, erase_idem=True):
+    """
+    This function adds the name of a new hydrological or merge hdf5 file to the xml project file.
+
+    :param h5name: the name of the hdf5 file
+    :param name_prj: the name of the project (string)
+    :param path_prj: the path of the project
+    :param model_type: the name of the model such as Rubar, hec-ras, etc. (string)
+    :param merge: If True, the file is a merge file
+    :param erase_idem: If False, the name is added even if the same name is already in the xml file
+    """
     if merge:
         type_hdf5 =  "hdf5_mergedata"
     else:
@@ -964,39 +1275,261 @@ def save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle
         print('Error: No project saved. Please create a project first in the General tab.\n')
         return
     else:
-        doc = ET.parse(filename_prj)
-        root = doc.getroot()
-        child = root.find(".//" + model_type)
-        # if the xml attribute do not exist yet, xml name should be saved
-        if child is None:
-            here_element = ET.SubElement(root, model_type)
-            hdf5file = ET.SubElement(here_element, type_hdf5)
-            hdf5file.text = h5name
-        else:
-            # if we save all files even identical file, we need to save xml
-            if not erase_idem:
-                hdf5file = ET.SubElement(child, type_hdf5)
+        with fig_option.lock_prj():
+            doc = ET.parse(filename_prj)
+            root = doc.getroot()
+            child = root.find(".//" + model_type)
+            # if the xml attribute do not exist yet, xml name should be saved
+            if child is None:
+                here_element = ET.SubElement(root, model_type)
+                hdf5file = ET.SubElement(here_element, type_hdf5)
                 hdf5file.text = h5name
-            # if the xml attribute exist and we do not save all file, we should only save attribute if new
             else:
-                child2s = root.findall(".//" + model_type + "/" + type_hdf5)
-                if child2s is not None:
-                    found_att_text = False
-                    for c in child2s:
-                            if c.text == h5name:
-                                found_att_text = True
-                    if not found_att_text:
-                        hdf5file = ET.SubElement(child, type_hdf5)
-                        hdf5file.text = h5name
-                else:
+                # if we save all files even identical file, we need to save xml
+                if not erase_idem:
                     hdf5file = ET.SubElement(child, type_hdf5)
                     hdf5file.text = h5name
+                # if the xml attribute exist and we do not save all file, we should only save attribute if new
+                else:
+                    child2s = root.findall(".//" + model_type + "/" + type_hdf5)
+                    if child2s is not None:
+                        found_att_text = False
+                        for c in child2s:
+                                if c.text == h5name:
+                                    found_att_text = True
+                        if not found_att_text:
+                            hdf5file = ET.SubElement(child, type_hdf5)
+                            hdf5file.text = h5name
+                    else:
+                        hdf5file = ET.SubElement(child, type_hdf5)
+                        hdf5file.text = h5name
 
-        doc.write(filename_prj)
+            fig_option.write_prj(doc, filename_prj)
 
     return
 
 
+def save_hdf5_2d_stacked(data_2d, name, data_all_t, ncol, compression='gzip'):
+    """
+    This function saves one variable of the 2D data in the layout 2 of the hdf5 file. The data of all time steps and
+    all reaches is stacked along the first axis in one dataset (Data_2D/name). The dataset is chunked by time step
+    and compressed (with the shuffle filter). The position of the data of each time step and reach is given in
+    the dataset Data_2D/name_index, which has the shape (nb_timestep + 1, nb_reach, 2) and contains the first and
+    last (excluded) row of the data. The index is -1 if there is no data for this time step and reach (for example,
+    the velocity of the whole profile).
+
+    This layout gives far less groups and datasets than the layout 1 (one group by time step, reach and variable),
+    which gives smaller files and faster loading when there are many time steps. The data is read by
+    HydroHdf5.get_data().
+
+    :param data_2d: the group Data_2D of the hdf5 file
+    :param name: the name of the variable (ikle, point_all, inter_vel_all, etc.)
+    :param data_all_t: the data by time step and by reach. If the data of a time step is None, there is no data
+           for this time step.
+    :param ncol: the number of columns of the data (the data is saved as [n, ncol]). If 0, the number of columns
+           is the one of the data (used for ikle).
+    :param compression: the compression filter ('gzip', 'lzf' or None)
+    """
+    nb_t = len(data_all_t)
+    nb_r = max([len(d) for d in data_all_t if d is not None] + [0])
+    index = -np.ones((nb_t, nb_r, 2), dtype=np.int64)
+
+    # get the data as arrays with two dimensions
+    data_array = []
+    for t in range(0, nb_t):
+        if data_all_t[t] is None:
+            continue
+        for r in range(0, len(data_all_t[t])):
+            data_array.append(np.asarray(data_all_t[t][r]))
+    no_empty = [d for d in data_array if d.size > 0]
+    if ncol == 0:
+        if no_empty:
+            ncol = int(no_empty[0].size / len(no_empty[0]))
+        else:
+            ncol = 3
+    if no_empty:
+        dtype = no_empty[0].dtype
+    else:
+        dtype = np.float64
+    data_array = [np.reshape(d, (len(d), ncol)) if d.size > 0 else np.zeros((0, ncol), dtype=dtype)
+                  for d in data_array]
+
+    # index (first and last row by time step and reach) and size of a time step
+    m = 0
+    i = 0
+    nb_row_t = 1
+    for t in range(0, nb_t):
+        if data_all_t[t] is None:
+            continue
+        m_t = m
+        for r in range(0, len(data_all_t[t])):
+            index[t, r] = [m, m + len(data_array[i])]
+            m += len(data_array[i])
+            i += 1
+        nb_row_t = max(nb_row_t, m - m_t)
+
+    if data_array:
+        data_stack = np.concatenate(data_array)
+    else:
+        data_stack = np.zeros((0, ncol), dtype=dtype)
+
+    # chunk by time step (but not more than about 1MB by chunk)
+    if len(data_stack) > 0:
+        nb_row_chunk = min(nb_row_t, max(1, 2**20 // (ncol * data_stack.dtype.itemsize)))
+        data_2d.create_dataset(name, data=data_stack, chunks=(nb_row_chunk, ncol), compression=compression,
+                               shuffle=compression is not None)
+    else:
+        data_2d.create_dataset(name, data=data_stack)
+    data_2d.create_dataset(name + '_index', data=index)
+
+
+class HydroHdf5Writer:
+    """
+    A writer of hydrological hdf5 files, where the data is added one time step at the time. The file is written with
+    the layout 2 of save_hdf5(): the stacked datasets are resizable and the data of each time step is appended to
+    them, so only one time step has to be in memory. The first time step added is the whole profile (t=0). The
+    hdf5 file is only complete (number of time steps, index, name of the time steps) after a call to close().
+
+    This is used by the hydraulic loaders which read the time steps one by one (see for example
+    selafin_habby1.load_telemac_and_cut_grid()). The file is read as the files created by save_hdf5().
+
+    If the file could not be created, self.file is None.
+
+    :param name_hdf5: the base name for the hdf5 file to be created (string)
+    :param name_prj: the name of the project (string)
+    :param path_prj: the path of the project
+    :param model_type: the name of the model such as Rubar, hec-ras, etc. (string)
+    :param path_hdf5: the folder in which to save the hdf5
+    :param save_option: If not None, it overwrites the option erase_id of the figure options (boolean)
+    :param version: The version number of HABBY
+    :param compression: the compression of the stacked datasets ('gzip', 'lzf' or None)
+    """
+
+    def __init__(self, name_hdf5, name_prj, path_prj, model_type, path_hdf5, save_option=None, version=0,
+                 compression='gzip'):
+        self.name_prj = name_prj
+        self.path_prj = path_prj
+        self.model_type = model_type
+        self.compression = compression
+        self.file = None  # the h5py file
+        self.nb_timestep = 0  # the number of time steps added (with the whole profile)
+        self.nb_reach = 0
+        self.index = dict(ikle=[], point_all=[], point_c_all=[], inter_vel_all=[], inter_h_all=[])
+        self.ncol = dict(ikle=0, point_all=2, point_c_all=2, inter_vel_all=1, inter_h_all=1)
+        self.nb_row = dict()  # the number of rows written in each dataset
+        self.warn_dry = True
+
+        [self.h5name, self.erase_idem] = get_hdf5_name_to_save(name_hdf5, name_prj, path_prj, path_hdf5,
+                                                               save_option)
+        if not self.h5name:
+            return
+        try:
+            self.file = h5py.File(os.path.join(path_hdf5, self.h5name), 'w')
+        except OSError:
+            print('Error: the hdf5 file could not be created.\n')
+            return
+        save_hdf5_attrs(self.file, name_prj, path_prj, version, 2)
+        self.data_2d = self.file.create_group('Data_2D')
+
+    def add_timestep(self, ikle_all, point_all, point_c_all=[], inter_vel_all=[], inter_h_all=[]):
+        """
+        This function adds the data of one time step (all reaches) to the hdf5 file. The data is given in the same
+        form than one time step of the inputs of save_hdf5().
+
+        :param ikle_all: the connectivity table by reach
+        :param point_all: the coordinates of the points by reach
+        :param point_c_all: the coordinates of the center of the cells by reach (can be empty)
+        :param inter_vel_all: the velocity by node by reach (empty for the whole profile)
+        :param inter_h_all: the height by node by reach (empty for the whole profile)
+        """
+        if self.nb_timestep == 0:
+            self.nb_reach = len(ikle_all)
+        for r in range(0, len(ikle_all)):
+            if len(ikle_all[r]) == 0 and self.warn_dry:
+                print('Warning: Reach number ' + str(r) + ' has an empty grid. It might be entierely dry.')
+                self.warn_dry = False
+
+        for name, data_t in [('ikle', ikle_all), ('point_all', point_all), ('point_c_all', point_c_all),
+                             ('inter_vel_all', inter_vel_all), ('inter_h_all', inter_h_all)]:
+            index_t = []
+            if name in ['ikle', 'point_all'] or (len(data_t) > 0 and not isinstance(data_t[0], float)):
+                for r in range(0, len(data_t)):
+                    index_t.append(self.append_data(name, np.asarray(data_t[r])))
+            self.index[name].append(index_t)
+        self.nb_timestep += 1
+
+    def append_data(self, name, data):
+        """
+        This function appends the data of one reach to a stacked dataset. The dataset is created when the first data
+        which is not empty is added. It is chunked by time step (but not more than about 1MB by chunk).
+
+        :param name: the name of the dataset
+        :param data: the data of one reach and one time step
+        :return: the first and last (excluded) row of the data in the dataset
+        """
+        m = self.nb_row.get(name, 0)
+        if data.size == 0:
+            return [m, m]
+        if self.ncol[name] == 0:
+            self.ncol[name] = int(data.size / len(data))
+        ncol = self.ncol[name]
+        data = np.reshape(data, (len(data), ncol))
+        if name not in self.data_2d:
+            # the next time steps could have another type (float32 and float64 for example)
+            if data.dtype.kind == 'f':
+                dtype = np.float64
+            elif data.dtype.kind in 'iu':
+                dtype = np.int64
+            else:
+                dtype = data.dtype
+            nb_row_chunk = min(len(data), max(1, 2**20 // (ncol * np.dtype(dtype).itemsize)))
+            self.data_2d.create_dataset(name, shape=(0, ncol), maxshape=(None, ncol), dtype=dtype,
+                                        chunks=(nb_row_chunk, ncol), compression=self.compression,
+                                        shuffle=self.compression is not None)
+        dataset = self.data_2d[name]
+        dataset.resize((m + len(data), ncol))
+        dataset[m:] = data
+        self.nb_row[name] = m + len(data)
+        return [m, m + len(data)]
+
+    def close(self, sim_name=[]):
+        """
+        This function writes the number of time steps and reaches, the index of the stacked datasets and the name
+        of the time steps. Then, it closes the hdf5 file and adds it to the xml project file.
+
+        :param sim_name: the name of the time steps (without the whole profile)
+        """
+        if self.file is None:
+            return
+        data_all = self.file.create_group('Data_gen')
+        timeg = data_all.create_group('Nb_timestep')
+        timeg.create_dataset(self.h5name, data=self.nb_timestep - 1)  # the first time step is for the whole profile
+        nreachg = data_all.create_group('Nb_reach')
+        nreachg.create_dataset(self.h5name, data=self.nb_reach)
+
+        for name in self.index:
+            nb_r = max([len(index_t) for index_t in self.index[name]] + [0])
+            index = -np.ones((self.nb_timestep, nb_r, 2), dtype=np.int64)
+            for t in range(0, self.nb_timestep):
+                for r in range(0, len(self.index[name][t])):
+                    index[t, r] = self.index[name][t][r]
+            if name not in self.data_2d:
+                if self.ncol[name] == 0:
+                    self.ncol[name] = 3
+                self.data_2d.create_dataset(name, data=np.zeros((0, self.ncol[name]), dtype=np.float64))
+            self.data_2d.create_dataset(name + '_index', data=index)
+
+        # save the name of the simulation/time steps if they exist
+        if sim_name:
+            ascii_str = [n.strip().encode("ascii", "ignore") for n in sim_name]  # unicode is not ok with hdf5
+            tname_typeg = self.data_2d.create_group('timestep_name')
+            tname_typeg.create_dataset(self.h5name, (len(sim_name), 1), data=ascii_str)
+
+        self.file.close()
+        self.file = None
+        save_hdf5_name_in_xml(self.h5name, self.name_prj, self.path_prj, self.model_type, False, self.erase_idem)
+
+
 def save_hdf5_sub(path_hdf5, path_prj, name_prj, sub_pg, sub_dom, ikle_sub=[], coord_p=[], name_hdf5 ='', constsub=False,
                   model_type='SUBSTRATE', return_name=False):
     """
@@ -1018,7 +1551,7 @@ def save_hdf5_sub(path_hdf5, path_prj, name_prj, sub_pg, sub_dom, ikle_sub=[], c
     """
 
     # to know if we have to save a new hdf5
-    save_opt = output_fig_GUI.load_fig_option(path_prj, name_prj)
+    save_opt = fig_option.load_fig_option(path_prj, name_prj)
     if save_opt['erase_id'] == 'True':  # xml is all in string
         erase_idem = True
     else:
@@ -1033,9 +1566,9 @@ def save_hdf5_sub(path_hdf5, path_prj, name_prj, sub_pg, sub_dom, ikle_sub=[], c
         # create hdf5 name if we keep all the files (need a time stamp)
         if not erase_idem:
             if name_hdf5:
-                h5name = name_hdf5 + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.h5'
+                h5name = name_hdf5 + fig_option.get_time_stamp() + '.h5'
             else:
-                h5name = 'Substrate_CONST_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.h5'
+                h5name = 'Substrate_CONST_' + fig_option.get_time_stamp() + '.h5'
         # create hdf5 name if we erase identical files
         else:
             if name_hdf5:
@@ -1080,9 +1613,9 @@ def save_hdf5_sub(path_hdf5, path_prj, name_prj, sub_pg, sub_dom, ikle_sub=[], c
         # create hdf5 name
         if not erase_idem:
             if name_hdf5:
-                h5name = name_hdf5 + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.h5'
+                h5name = name_hdf5 + fig_option.get_time_stamp() + '.h5'
             else:
-                h5name = 'Substrate_VAR_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.h5'
+                h5name = 'Substrate_VAR_' + fig_option.get_time_stamp() + '.h5'
         # create hdf5 name if we erase identical files
         else:
             if name_hdf5:
@@ -1139,17 +1672,18 @@ def save_hdf5_sub(path_hdf5, path_prj, name_prj, sub_pg, sub_dom, ikle_sub=[], c
         return
     else:
         if save_xml:
-            doc = ET.parse(filename_prj)
-            root = doc.getroot()
-            child = root.find(".//" + model_type)
-            if child is None:
-                stathab_element = ET.SubElement(root, model_type)
-                hdf5file = ET.SubElement(stathab_element, "hdf5_substrate")
-                hdf5file.text = h5name
-            else:
-                hdf5file = ET.SubElement(child, "hdf5_substrate")
-                hdf5file.text = h5name
-            doc.write(filename_prj)
+            with fig_option.lock_prj():
+                doc = ET.parse(filename_prj)
+                root = doc.getroot()
+                child = root.find(".//" + model_type)
+                if child is None:
+                    stathab_element = ET.SubElement(root, model_type)
+                    hdf5file = ET.SubElement(stathab_element, "hdf5_substrate")
+                    hdf5file.text = h5name
+                else:
+                    hdf5file = ET.SubElement(child, "hdf5_substrate")
+                    hdf5file.text = h5name
+                fig_option.write_prj(doc, filename_prj)
 
     if return_name:
         return h5name
@@ -1329,7 +1863,7 @@ def create_shapfile_hydro(name_hdf5, path_hdf5, path_shp, merge=True, erase_id=T
                 height_data_here.append(h_cell)
             except IndexError:
                 vel_data_here.append([])
-                vel_data_here.append([])
+                height_data_here.append([])
         vel_data.append(vel_data_here)
         height_data.append(height_data_here)
 
@@ -1340,54 +1874,37 @@ def create_shapfile_hydro(name_hdf5, path_hdf5, path_shp, merge=True, erase_id=T
         if len(ikle_here) < 2:
             print('Warning: One time step failed. \n')
         else:
-            w = shapefile.Writer(shapefile.POLYGON)
-            w.autoBalance = 1
-
-            # get the triangle
+            # attribute (one array by field, for all reaches)
             nb_reach = len(ikle_all_t[t])
+            field_names = ['velocity', 'water heig', 'conveyance']
+            if merge:
+                field_names += ['sub_coarser', 'sub_dom']
+            field_data = [[] for f in field_names]
             for r in range(0, nb_reach):
-                ikle_r = ikle_all_t[t][r]
-                point_here = point_all_t[t][r]
-                for i in range(0, len(ikle_r)):
-                    p1 = list(point_here[ikle_r[i][0]])
-                    p2 = list(point_here[ikle_r[i][1]])
-                    p3 = list(point_here[ikle_r[i][2]])
-                    w.poly(parts=[[p1, p2, p3, p1]])  # the double [[]] is important or it bugs, but why?
-
-            if t > 0:
-                # attribute
-                w.field('velocity', 'F')
-                w.field('water heig', 'F')
-                w.field('conveyance', 'F')
+                nb_cell = len(ikle_all_t[t][r])
+                vel = np.asarray(vel_data[t][r])[:nb_cell]
+                height = np.asarray(height_data[t][r])[:nb_cell]
+                if len(vel) == len(height):
+                    conveyance = vel * height
+                else:
+                    conveyance = []
+                data_r = [vel, height, conveyance]
                 if merge:
-                    w.field('sub_coarser', 'F')
-                    w.field('sub_dom', 'F')
-
-                # fill attribute
-                for r in range(0, nb_reach):
-                    vel = vel_data[t][r]
-                    height = height_data[t][r]
-                    sub_pg = sub_pg_data[t][r]
-                    sub_dom = sub_dom_data[t][r]
-                    ikle_r = ikle_all_t[t][r]
-                    for i in range(0, len(ikle_r)):
-                        data_here = ()
-                        if merge:
-                            data_here += vel[i], height[i], vel[i] * height[i], sub_pg[i], sub_dom[i]
-                        else:
-                            data_here += vel[i], height[i], vel[i] * height[i]
-                        # the * pass tuple to function argument
-                        w.record(*data_here)
-
-            w.autoBalance = 1
+                    data_r += [sub_pg_data[t][r][:nb_cell], sub_dom_data[t][r][:nb_cell]]
+                if any([len(d) != nb_cell for d in data_r]):
+                    print('Error: Results could not be written to shape file \n')
+                    return
+                for j in range(0, len(field_names)):
+                    field_data[j].append(data_r[j])
+            field_data = [np.concatenate(d) for d in field_data]
 
             # save
             name_base = name_hdf5[:-3]
             if not erase_id:
                 if not sim_name:
-                    name1 = name_base + '_t_' + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.shp'
+                    name1 = name_base + '_t_' + str(t) + '_' + fig_option.get_time_stamp() + '.shp'
                 else:
-                    name1 = name_base + '_t_' + sim_name[t - 1] + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.shp'
+                    name1 = name_base + '_t_' + sim_name[t - 1] + '_' + fig_option.get_time_stamp() + '.shp'
             else:
                 if not sim_name:
                     name1 = name_base + '_t_' + str(t) + '.shp'
@@ -1400,4 +1917,5 @@ def create_shapfile_hydro(name_hdf5, path_hdf5, path_shp, merge=True, erase_id=T
                         print('Error: The shapefile is currently open in an other program. Could not be re-written \n')
                         return
 
-            w.save(os.path.join(path_shp, name1))
+            shapefile_bulk.write_tri_shapefile(os.path.join(path_shp, name1), ikle_all_t[t], point_all_t[t],
+                                               field_names, field_data)
@@ -16,21 +16,25 @@ https://github.com/YannIrstea/habby
 """
 import numpy as np
 import triangle
-import matplotlib.pyplot as plt
-import matplotlib as mpl
 import time
-import scipy.interpolate
 import scipy.spatial.qhull as qhull
 import itertools
 import copy
 import os
 import bisect
 import sys
-from src_GUI import output_fig_GUI
+import hashlib
+import errno
+import h5py
+from src import fig_option
 from src import calcul_hab
 from src import substrate
 #np.set_printoptions(threshold=np.inf)
 
+# the file of the cache of the interpolation weights (see get_interp_weights()) and its maximum number of grids
+INTERP_CACHE_NAME = 'interpolation_weights.h5'
+INTERP_CACHE_MAX = 20
+
 
 def grid_and_interpo(vh_pro, coord_pro, nb_pro_reach, interpo_choice,  pro_add=1):
     """
@@ -1054,156 +1058,131 @@ def cut_2d_grid(ikle, point_all, water_height,velocity, min_height=0.001, get_in
              the new cell orders.
     """
     # prep
-    warn_cut = True
-    c_dry = []
-    ind_new = []
-    water_height = np.array(water_height)
-    ikle = np.array(ikle)
-    # get all cells with at least one node with h < 0
-    ind_neg = set(np.where(water_height < min_height)[0])  # set because it is quicker to search in a set
-    for c in range(0, len(ikle)):
-        iklec = ikle[c, :]
-        if iklec[0] in ind_neg or iklec[1] in ind_neg or iklec[2] in ind_neg:
-            c_dry.append(c)
-
-    # find the intersection point for cells particlally dry
-    pc_all = []
-    which_side = []
-    double_neg = []
-    for c in c_dry:
-        pc_c = []
-        which_side_c = []
-        a = ikle[c, 0]
-        b = ikle[c, 1]
-        c = ikle[c, 2]
-        p1a = point_all[a]
-        p1b = point_all[b]
-        p1c = point_all[c]
-        ha = water_height[a]
-        hb = water_height[b]
-        hc = water_height[c]
-        pc = linear_h_cross(p1a, p1b, ha, hb, min_height)
-        if len(pc) > 0:
-            pc_c.append(pc)
-            which_side_c.append([0])
-        pc = linear_h_cross(p1b, p1c, hb, hc, min_height)
-        if len(pc) > 0:
-            pc_c.append(pc)
-            which_side_c.append([1])
-        pc = linear_h_cross(p1c, p1a, hc, ha, min_height)
-        if len(pc) > 0:
-            pc_c.append(pc)
-            which_side_c.append([2])
-        pc_all.append(pc_c)
-        which_side.append(which_side_c)
-        # let check if we have on or two value under min_height
-        if (hc < min_height and ha < min_height) or (hb < min_height and ha < min_height) or (
-                        hb < min_height and hc < min_height):
-            double_neg.append(True)
-        else:
-            double_neg.append(False)
-
-    # create new cells
-    which_side = np.array(which_side)
-    i = 0
-    # list is more efficient
-    ikle = list(ikle)
-    point_all = list(point_all)
-    water_height = list(water_height)
-    velocity = list(velocity)
-    if get_ind_new:
-        ind_new = list(range(0, len(ikle)))
-    for c in c_dry:
-        if len(pc_all[i]) == 2:  # if intersection
-            # add new point
-            pc1 = pc_all[i][0]
-            pc2 = pc_all[i][1]
-            point_all.append(pc2)  # order matters
-            point_all.append(pc1)
-            lenp = len(point_all)
-            water_height.extend([min_height, min_height])
-            velocity.extend([0, 0])
-            iklec = ikle[c]
-            # seg1 = [0,1] and seg2 = [1,2] in ikle order
-            if np.sum(which_side[i]) == 1:
-                if double_neg[i]:
-                    ikle.append([lenp - 1, lenp - 2, iklec[1]])
-                    if get_ind_new:
-                        ind_new.append(c)
-                else:
-                    if which_side[i][1] == 1:  # seg = [1, 2]
-                        ikle.append([lenp - 1, lenp - 2, iklec[0]])
-                        ikle.append([lenp - 2, iklec[2], iklec[0]])
-                    else:
-                        ikle.append([lenp - 1, lenp - 2,iklec[2]])
-                        ikle.append([lenp - 1, iklec[2], iklec[0]])  # not understood why not lenp-2
-                    if get_ind_new:
-                        ind_new.append(c)
-                        ind_new.append(c)
-            # seg1 = [0,1] and seg2 = [0,2]
-            if np.sum(which_side[i]) == 2:
-                if double_neg[i]:
-                    ikle.append([lenp - 1, lenp - 2, iklec[0]])
-                    if get_ind_new:
-                        ind_new.append(c)
-                else:
-                    if which_side[i][1] == 0:  # seg = [1, 0]
-                        ikle.append([lenp - 1, lenp - 2, iklec[2]])
-                        ikle.append([lenp - 2, iklec[1], iklec[2]])
-                    else:
-                        ikle.append([lenp - 1, lenp - 2, iklec[1]])
-                        ikle.append([lenp - 2, iklec[1], iklec[2]])
-                    if get_ind_new:
-                        ind_new.append(c)
-                        ind_new.append(c)
-            # seg1 = [2,1] and seg2 = [0,2]
-            if np.sum(which_side[i]) == 3:
-                if double_neg[i]:
-                    ikle.append([lenp - 1, lenp - 2, iklec[2]])
-                    if get_ind_new:
-                        ind_new.append(c)
-                else:
-                    if which_side[i][1] == 2:  # seg = [2, 0]
-                        ikle.append([lenp - 1, lenp - 2, iklec[1]])
-                        ikle.append([lenp - 2, iklec[1], iklec[0]])
-                    else:
-                        ikle.append([lenp - 1, lenp - 2, iklec[0]])
-                        ikle.append([lenp - 1, iklec[1], iklec[0]])  #?
-                    if get_ind_new:
-                        ind_new.append(c)
-                        ind_new.append(c)
-        elif len(pc_all[i]) !=0:
-            if warn_cut:
-                print('Warning: One triangle found which touches only one point. The grid was not cut on '
-                      'this triangle \n')
-                warn_cut = False
-        i += 1
     ikle = np.array(ikle)
     point_all = np.array(point_all)
     water_height = np.array(water_height)
     velocity = np.array(velocity)
+    if len(ikle) == 0:
+        water_height[water_height < 0] = 0
+        if get_ind_new:
+            return np.array([]), point_all, water_height, velocity, np.array([])
+        else:
+            return np.array([]), point_all, water_height, velocity
+    nb_p = len(point_all)
+    nb_cell = len(ikle)
+
+    # get all cells with at least one node with h < min_height
+    dry_node = water_height < min_height
+    c_dry = np.where(np.any(dry_node[ikle[:, :3]], axis=1))[0]
+    a = ikle[c_dry, 0]
+    b = ikle[c_dry, 1]
+    c = ikle[c_dry, 2]
+
+    # find the intersection point for cells particlally dry (side 0: a-b, side 1: b-c, side 2: c-a)
+    side_cross = [linear_h_cross_all(point_all[a], point_all[b], water_height[a], water_height[b], min_height),
+                  linear_h_cross_all(point_all[b], point_all[c], water_height[b], water_height[c], min_height),
+                  linear_h_cross_all(point_all[c], point_all[a], water_height[c], water_height[a], min_height)]
+    is_cross = np.array([side_cross[0][0], side_cross[1][0], side_cross[2][0]])
+    nb_cross = np.sum(is_cross, axis=0)
+    if np.any((nb_cross != 0) & (nb_cross != 2)):
+        print('Warning: One triangle found which touches only one point. The grid was not cut on '
+              'this triangle \n')
+    # let check if we have on or two value under min_height
+    double_neg = np.sum(dry_node[ikle[c_dry, :3]], axis=1) >= 2
+
+    # the two crossing points of the cut cells (pc1 on the first side, pc2 on the second side)
+    cut = nb_cross == 2
+    first_side = np.argmax(is_cross[:, cut], axis=0)
+    second_side = 2 - np.argmax(is_cross[::-1, cut], axis=0)
+    pc_side = np.array([side_cross[0][1][cut], side_cross[1][1][cut], side_cross[2][1][cut]])
+    ind_cut = np.arange(np.sum(cut))
+    pc1 = pc_side[first_side, ind_cut]
+    pc2 = pc_side[second_side, ind_cut]
+
+    # add the new points (pc2 then pc1 for each cut cell, order matters)
+    if len(ind_cut) > 0:
+        point_new = np.zeros((2 * len(ind_cut), point_all.shape[1]), dtype=pc_side.dtype)
+        point_new[0::2] = pc2
+        point_new[1::2] = pc1
+        point_all = np.concatenate((point_all, point_new))
+        water_height = np.concatenate((water_height, np.zeros((2 * len(ind_cut),)) + min_height))
+        velocity = np.concatenate((velocity, np.zeros((2 * len(ind_cut),), dtype=velocity.dtype)))
+
+    # create new cells
+    # seg1 = [0,1] and seg2 = [1,2] -> 1, seg1 = [0,1] and seg2 = [0,2] -> 2, seg1 = [2,1] and seg2 = [0,2] -> 3
+    sum_side = first_side + second_side
+    double_neg = double_neg[cut]
+    p1 = nb_p + 2 * ind_cut + 1  # pc1
+    p2 = nb_p + 2 * ind_cut  # pc2
+    a = a[cut]
+    b = b[cut]
+    c = c[cut]
+    # in the wet quadrilateral, the diagonal used by the old version of this function depended on the type of
+    # np.array(which_side): it was an array of list if one or more cells of c_dry were not cut. Keep it.
+    all_cut = np.all(cut)
+    tri1 = np.zeros((len(ind_cut), 3), dtype=np.int64)
+    tri2 = np.zeros((len(ind_cut), 3), dtype=np.int64)
+    tri1[:, 0] = p1
+    tri1[:, 1] = p2
+    tri1[:, 2] = np.where(sum_side == 1, b, np.where(sum_side == 2, a, c))  # double_neg
+    if all_cut:
+        tri1[~double_neg, 2] = np.where(sum_side == 1, a, b)[~double_neg]
+        tri2[:, 0] = p2
+        tri2[:, 1] = np.where(sum_side == 1, c, b)
+        tri2[:, 2] = np.where(sum_side == 1, a, np.where(sum_side == 2, c, a))
+    else:
+        tri1[~double_neg, 2] = np.where(sum_side == 1, c, np.where(sum_side == 2, b, a))[~double_neg]
+        tri2[:, 0] = np.where(sum_side == 2, p2, p1)
+        tri2[:, 1] = np.where(sum_side == 1, c, b)
+        tri2[:, 2] = np.where(sum_side == 2, c, a)
+
+    # one new cell if two dry nodes, two new cells otherwise (in the order of c_dry)
+    nb_new = 2 - double_neg
+    first_new = np.cumsum(nb_new) - nb_new
+    ikle_new = np.zeros((np.sum(nb_new), 3), dtype=np.int64)
+    ikle_new[first_new] = tri1
+    ikle_new[first_new[~double_neg] + 1] = tri2[~double_neg]
+    if len(ikle_new) == 0:
+        ikle_new = ikle_new.astype(ikle.dtype)
 
     # should not be used anymore, but who knows?
     water_height[water_height < 0] = 0
     velocity[water_height < 0] = 0
 
     # erease the old cells
-    ikle = np.delete(ikle, c_dry, axis=0)
-
-    if get_ind_new:
-        ind_new = np.array(ind_new)
-        ind_new = np.delete(ind_new, c_dry, axis=0)
+    ikle = np.concatenate((np.delete(ikle, c_dry, axis=0), ikle_new))
 
     if get_ind_new:
+        ind_new = np.concatenate((np.delete(np.arange(nb_cell), c_dry), np.repeat(c_dry[cut], nb_new)))
         return ikle, point_all, water_height, velocity, ind_new
     else:
         return ikle, point_all, water_height, velocity
 
 
+def linear_h_cross_all(p1, p2, h1, h2, minwh=0.0):
+    """
+    This function is the same than linear_h_cross(), but for many sides at once. It is called by cut_2D_grid.
+
+    :param p1: the coordinate (x,y) of the first point of each side
+    :param p2: the coordinate (x,y) of the second point of each side
+    :param h1: the water height at p1 (might be negative or positive)
+    :param h2: the water height at p2 (might be negative or positive)
+    :param minwh: the minimum water height
+    :return: a boolean array (True if there is an intersection on this side) and the intersection points
+    """
+    is_cross = (h1 <= minwh) != (h2 <= minwh)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mix1 = (h1 - minwh) / (h1 - h2)
+        mix2 = (h2 - minwh) / (h2 - h1)
+        pc = np.where((h1 > h2)[:, np.newaxis], p1 + mix1[:, np.newaxis] * (p2 - p1),
+                      p2 + mix2[:, np.newaxis] * (p1 - p2))
+    return is_cross, pc
+
+
 def linear_h_cross(p1,p2,h1,h2, minwh=0.0):
     """
-    This function is called by cut_2D_grid. It find the intersection point along a side of the triangle if part of a
-    cells is dry.
+    This function find the intersection point along a side of the triangle if part of a cells is dry. The array
+    version linear_h_cross_all() is used by cut_2D_grid.
 
     :param p1: the coordinate (x,y) of the first point
     :param p2: the coordinate (x,y) of the first point
@@ -1640,6 +1619,7 @@ def interpo_linear(point_all, coord_pro, vh_pro_t):
     :param vh_pro_t: for each profile, dist along the profile, water height and velocity at a particular time step
     :return: the new interpolated data for velocity and water height
     """
+    import scipy.interpolate
 
     inter_vel_all = []
     inter_height_all = []
@@ -1700,6 +1680,7 @@ def interpo_nearest(point_all, coord_pro, vh_pro_t):
     :param vh_pro_t: for each profile, dist along the profile, water height and velocity at a particular time step
     :return: the new interpolated data for velocity and water height
     """
+    import scipy.interpolate
 
     inter_vel_all = []
     inter_height_all = []
@@ -1748,7 +1729,8 @@ def interpo_nearest(point_all, coord_pro, vh_pro_t):
     return inter_vel_all, inter_height_all
 
 
-def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True, vtx_all=[], wts_all=[]):
+def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True, vtx_all=[], wts_all=[],
+                               path_cache=''):
     """
     HABBY uses nodal information. Some hydraulic models have only ouput on the cells. This function pass
     from cells information to nodal information. The interpolation is linear and the cell centroid is used as the
@@ -1766,6 +1748,8 @@ def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True
            speed up the interpolation of mulitple time step. (optional, need wts)
     :param wts_all: if it exists it means than the same grid was interpolated before. This info can be reused to
            speed up the interpolation of mulitple time step. (optional, need vtx)
+    :param path_cache: the folder of the cache of the interpolation weights (usually the folder of the hdf5 files of
+           the project), see get_interp_weights(). If empty, the weights are not saved.
     :return: velocity and height data by node
 
     **Technical Comment**
@@ -1775,13 +1759,14 @@ def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True
     http://stackoverflow.com/questions/20915502/speedup-scipy-griddata-for-multiple-
     interpolations-between-two-irregular-grids
 
+    The weights are also kept between two loadings of the same grid (see get_interp_weights()).
+
     """
 
     vel_node = []
     height_node = []
     vtx_new = []
     wts_new = []
-    print(len(point_all))
 
     for r in range(0, len(point_all)):  # reaches
 
@@ -1789,7 +1774,7 @@ def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True
         # -for-multiple-interpolations-between-two-irregular-grids. No sure on how it works
         # if no interpolation info was sent, re-start the whole interpolatin on a new grid
         if vtx_all == [] and wts_all == []:
-            vtx, wts = interp_weights(coord_c[r], point_all[r])
+            vtx, wts = get_interp_weights(coord_c[r], point_all[r], path_cache)
         else:
             vtx = vtx_all[r]
             wts = wts_all[r]
@@ -1797,7 +1782,7 @@ def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True
         wts_new.append(wts)
 
         # velocity
-        max_vel = max(vel_in[r])
+        max_vel = np.max(vel_in[r])
         inter_vel = interpolate_opti(vel_in[r], vtx, wts)
         # sometime value like -1e17 is added because of the machine precision, we do no want this
         inter_vel[np.isnan(inter_vel)] = 0
@@ -1806,7 +1791,7 @@ def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True
         vel_node.append(inter_vel)
 
         # height
-        max_height = max(height_in[r])
+        max_height = np.max(height_in[r])
         inter_height = interpolate_opti(height_in[r], vtx, wts)
         # sometime value like -1e17 is added because of the machine precision, we do no want this
         inter_height[np.isnan(inter_height)] = 0
@@ -1820,6 +1805,83 @@ def pass_grid_cell_to_node_lin(point_all, coord_c, vel_in, height_in, warn1=True
     return vel_node, height_node, vtx_new, wts_new
 
 
+def get_interp_weights(xyz, uvw, path_cache=''):
+    """
+    This function gives the interpolation weights from the points xyz (the centers of the cells) to the points uvw
+    (the nodes of the grid), see interp_weights(). If path_cache is given, the weights are saved in the hdf5 file
+    INTERP_CACHE_NAME in this folder with a hash of the coordinates as key. When the same grid is loaded again (for
+    example, another result file on the same geometry), the weights are read in this file and the triangulation is
+    not done. Only the INTERP_CACHE_MAX last used grids are kept in the file.
+
+    :param xyz: the coordinates of the cell centers
+    :param uvw: the coordinates of the nodes
+    :param path_cache: the folder of the cache file. If empty, the cache is not used.
+    :return: vertices and weights (as interp_weights())
+    """
+    xyz = np.ascontiguousarray(xyz, dtype=np.float64)
+    uvw = np.ascontiguousarray(uvw, dtype=np.float64)
+    if not path_cache or not os.path.isdir(path_cache):
+        return interp_weights(xyz, uvw)
+
+    # the key is the hash of both grids
+    hash_grid = hashlib.sha1()
+    for coord in (xyz, uvw):
+        hash_grid.update(str(coord.shape).encode('utf-8'))
+        hash_grid.update(coord.tobytes())
+    key = 'weights_' + hash_grid.hexdigest()
+    filename = os.path.join(path_cache, INTERP_CACHE_NAME)
+
+    # read the weights in the cache. The file is used by one process at the time (ALL jobs=x, HABBY server)
+    with fig_option.lock_prj():
+        if os.path.isfile(filename):
+            try:
+                with h5py.File(filename, 'a') as file:
+                    if key in file:
+                        vtx = file[key]['vtx'][:]
+                        wts = file[key]['wts'][:]
+                        file[key].attrs['last_use'] = time.time()
+                        return vtx, wts
+            except (OSError, KeyError) as e:
+                if isinstance(e, OSError) and is_lock_error(e):
+                    # the file is used by another HABBY (not damaged), the cache is not used this time
+                    return interp_weights(xyz, uvw)
+                # a damaged cache is erased, a new one is created below
+                print('Warning: The cache of the interpolation weights could not be read. It is created again.\n')
+                try:
+                    os.remove(filename)
+                except OSError:
+                    pass
+
+    # or calculate and save them
+    vtx, wts = interp_weights(xyz, uvw)
+    with fig_option.lock_prj():
+        try:
+            with h5py.File(filename, 'a') as file:
+                # erase the grids which were not used for the longest time
+                old_key = sorted(file.keys(), key=lambda k: file[k].attrs.get('last_use', 0))
+                for k in old_key[:max(len(old_key) - INTERP_CACHE_MAX + 1, 0)]:
+                    del file[k]
+                weights = file.create_group(key)
+                weights.create_dataset('vtx', data=vtx, compression='gzip')
+                weights.create_dataset('wts', data=wts, compression='gzip')
+                weights.attrs['last_use'] = time.time()
+        except (OSError, ValueError) as e:
+            if not (isinstance(e, OSError) and is_lock_error(e)):
+                print('Warning: The interpolation weights could not be saved in the cache.\n')
+    return vtx, wts
+
+
+def is_lock_error(err):
+    """
+    This function checks if an error raised when an hdf5 file is opened comes from the lock of the file (the file is
+    opened by another process) and not from a damaged file.
+
+    :param err: the OSError raised by h5py.File()
+    :return: True if the file is locked
+    """
+    return err.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EACCES) or 'lock' in str(err).lower()
+
+
 def interp_weights(xyz, uvw):
     """
     This fucntion is used by the function pass_grid_cell_to_node_lin(). To optimize the interpolation when more than one time step
@@ -2211,9 +2273,11 @@ def plot_grid_simple(point_all_reach, ikle_all, fig_opt, inter_vel_all=[], inter
     :param sub_pg: coarser data from the subtrate
     :param sub_dom: doominat data from the subtrate
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
 
     # plot the grid, the velcoity and the water height
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
@@ -2291,13 +2355,13 @@ def plot_grid_simple(point_all_reach, ikle_all, fig_opt, inter_vel_all=[], inter
         suffix = 'Hydro_grid_t' + str(time_step) + '_'
     if not erase1:
         if format1 == 0 or format1 == 1:
-            plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"),
+            plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".png"),
                         dpi=fig_opt['resolution'], transparent=True)
         if format1 == 0 or format1 == 3:
-            plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"),
+            plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".pdf"),
                         dpi=fig_opt['resolution'], transparent=True)
         if format1 == 2:
-            plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"),
+            plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".jpg"),
                         dpi=fig_opt['resolution'], transparent=True)
     else:
         test = calcul_hab.remove_image(suffix, path_im, format1)
@@ -2381,13 +2445,13 @@ def plot_grid_simple(point_all_reach, ikle_all, fig_opt, inter_vel_all=[], inter
             suffix = 'Velocity_t' + str(time_step) + '_'
         if not erase1:
             if format1 == 0 or format1 == 1:
-                plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"),
+                plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".png"),
                             dpi=fig_opt['resolution'], transparent=True)
             if format1 == 0 or format1 == 3:
-                plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"),
+                plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".pdf"),
                             dpi=fig_opt['resolution'], transparent=True)
             if format1 == 2:
-                plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"),
+                plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".jpg"),
                             dpi=fig_opt['resolution'], transparent=True)
         else:
             test = calcul_hab.remove_image(suffix, path_im, format1)
@@ -2459,13 +2523,13 @@ def plot_grid_simple(point_all_reach, ikle_all, fig_opt, inter_vel_all=[], inter
             suffix = 'Water_height_t'+str(time_step) + '_'
         if not erase1:
             if format1 == 0 or format1 == 1:
-                plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"),
+                plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".png"),
                             dpi=fig_opt['resolution'], transparent=True)
             if format1 == 0 or format1 == 3:
-                plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"),
+                plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".pdf"),
                             dpi=fig_opt['resolution'], transparent=True)
             if format1 == 2:
-                plt.savefig(os.path.join(path_im, suffix + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"),
+                plt.savefig(os.path.join(path_im, suffix + fig_option.get_time_stamp() + ".jpg"),
                             dpi=fig_opt['resolution'], transparent=True)
         else:
             test = calcul_hab.remove_image(suffix, path_im, format1)
@@ -2508,6 +2572,8 @@ def plot_grid(point_all_reach, ikle_all, lim_by_reach, hole_all, overlap, point_
     :param inter_h_all: the interpolated height
     :param path_im: the path where to save the image
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     mpl.rcParams['ps.fonttype'] = 42
     mpl.rcParams['pdf.fonttype'] = 42
@@ -2571,8 +2637,8 @@ def plot_grid(point_all_reach, ikle_all, lim_by_reach, hole_all, overlap, point_
     #        plt.plot(coord_pro2[p][0], coord_pro2[p][1], 'b.', markersize=2)
     #plt.axis('equal')
     plt.title('Computational Grid')
-    plt.savefig(os.path.join(path_im, "Grid_new_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"), transparent=True)
-    plt.savefig(os.path.join(path_im, "Grid_new_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"), transparent=True)
+    plt.savefig(os.path.join(path_im, "Grid_new_" + fig_option.get_time_stamp() + ".png"), transparent=True)
+    plt.savefig(os.path.join(path_im, "Grid_new_" + fig_option.get_time_stamp() + ".pdf"), transparent=True)
     #plt.close()
     plt.show()
 
@@ -2595,8 +2661,8 @@ def plot_grid(point_all_reach, ikle_all, lim_by_reach, hole_all, overlap, point_
         plt.xlabel('x coord []')
         plt.ylabel('y coord []')
         plt.title('Interpolated velocity')
-        #plt.savefig(os.path.join(path_im, "Vel_inter_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"))
-        #plt.savefig(os.path.join(path_im, "Vel_inter_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"))
+        #plt.savefig(os.path.join(path_im, "Vel_inter_" + fig_option.get_time_stamp() + ".png"))
+        #plt.savefig(os.path.join(path_im, "Vel_inter_" + fig_option.get_time_stamp() + ".pdf"))
         #plt.close()
 
     # plot the interpolated height
@@ -2618,8 +2684,8 @@ def plot_grid(point_all_reach, ikle_all, lim_by_reach, hole_all, overlap, point_
         plt.xlabel('x coord []')
         plt.ylabel('y coord []')
         plt.title('Interpolated water height')
-        #plt.savefig(os.path.join(path_im, "Water_height_inter_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"))
-        #plt.savefig(os.path.join(path_im, "Water_height_inter_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"))
+        #plt.savefig(os.path.join(path_im, "Water_height_inter_" + fig_option.get_time_stamp() + ".png"))
+        #plt.savefig(os.path.join(path_im, "Water_height_inter_" + fig_option.get_time_stamp() + ".pdf"))
         #plt.close()
         #plt.show()
 
@@ -2630,6 +2696,7 @@ def main():
     """
     Used to test this module
     """
+    import matplotlib.pyplot as plt
 
 
     # #create grid mascaret
@@ -19,16 +19,13 @@ import sys
 import re
 from io import StringIO
 import numpy as np
-import matplotlib.pyplot as plt
-import time
 from struct import unpack
 from struct import error as errstruct
 from src import Hec_ras06
 from src import manage_grid_8
 from src import load_hdf5
 from src import dist_vistess2
-from src_GUI import output_fig_GUI
-import matplotlib as mpl
+from src import fig_option
 
 
 def load_mascaret_and_create_grid(name_hdf5, path_hdf5,name_prj, path_prj,model_type,namefile,pathfile, interpo_choice
@@ -79,7 +76,7 @@ def load_mascaret_and_create_grid(name_hdf5, path_hdf5,name_prj, path_prj,model_
 
     # image if necessary
     if show_fig_1D:
-        fig_opt = output_fig_GUI.load_fig_option(path_prj, name_prj)
+        fig_opt = fig_option.load_fig_option(path_prj, name_prj)
         pro = [0, 1, 2]
         reach = [0]
         if fig_opt['time_step'][0] == -99:
@@ -1116,6 +1113,8 @@ def figure_mascaret(coord_pro, coord_r, xhzv_data, on_profile, nb_pro_reach, fig
     :param reach_plot: the reach to be plotted for the river view
     :param path_im: the path where to save the figure
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -1175,15 +1174,15 @@ def figure_mascaret(coord_pro, coord_r, xhzv_data, on_profile, nb_pro_reach, fig
                 plt.xlabel('Distance le long de la rivière [m]')
                 plt.ylabel('Vitesse [m/sec]')
             if format == 1 or format == 0:
-                plt.savefig(os.path.join(path_im, "mascaret_riv_" + name_reach[r] + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                plt.savefig(os.path.join(path_im, "mascaret_riv_" + name_reach[r] + fig_option.get_time_stamp()
                                          + ".png"), dpi = fig_opt['resolution'])
             if format == 0 or format ==3:
                 plt.savefig(os.path.join(path_im, "masacret_riv_" +
-                                         name_reach[r] + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                                         name_reach[r] + fig_option.get_time_stamp()
                                      + ".pdf"),dpi = fig_opt['resolution'])
             if format == 3:
                 plt.savefig(
-                    os.path.join(path_im, "masacret_riv_" + name_reach[r] + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+                    os.path.join(path_im, "masacret_riv_" + name_reach[r] + fig_option.get_time_stamp()
                                  + ".jpg"), dpi=fig_opt['resolution'])
 
     # (x,y) coordinates view
@@ -1208,13 +1207,13 @@ def figure_mascaret(coord_pro, coord_r, xhzv_data, on_profile, nb_pro_reach, fig
     plt.axis('equal')
     plt.legend(bbox_to_anchor=(1.1, 1), prop={'size': 10})
     if format == 1 or format == 0:
-        plt.savefig(os.path.join(path_im, "mascaret_xy_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"),
+        plt.savefig(os.path.join(path_im, "mascaret_xy_" + fig_option.get_time_stamp() + ".png"),
                 dpi=fig_opt['resolution'], transparent=True)
     if format == 0 or format == 3:
-        plt.savefig(os.path.join(path_im, "masacret_xy_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"),
+        plt.savefig(os.path.join(path_im, "masacret_xy_" + fig_option.get_time_stamp() + ".pdf"),
                 dpi=fig_opt['resolution'], transparent=True)
     if format == 2:
-        plt.savefig(os.path.join(path_im, "masacret_xy_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"),
+        plt.savefig(os.path.join(path_im, "masacret_xy_" + fig_option.get_time_stamp() + ".jpg"),
                     dpi=fig_opt['resolution'], transparent=True)
     # profiles (h, x) with water levels
     for p in pro:
@@ -1243,13 +1242,13 @@ def figure_mascaret(coord_pro, coord_r, xhzv_data, on_profile, nb_pro_reach, fig
             plt.title('Profil ' + name_pro[p] + ' au temps t=' + str(t))
         if format == 1 or format == 0:
             plt.savefig(os.path.join(path_im, "mascaret_pro_" + str(p) + '_time' +
-                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"), dpi=fig_opt['resolution'], transparent=True)
+                        fig_option.get_time_stamp() + ".png"), dpi=fig_opt['resolution'], transparent=True)
         if format == 0 or format == 3:
             plt.savefig(os.path.join(path_im, "masacret_pro_" + str(p) + '_time' +
-                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"), dpi=fig_opt['resolution'], transparent=True)
+                        fig_option.get_time_stamp() + ".pdf"), dpi=fig_opt['resolution'], transparent=True)
         if format == 2:
             plt.savefig(os.path.join(path_im, "mascaret_pro_" + str(p) + '_time'+
-                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".jpg"), dpi=fig_opt['resolution'], transparent=True)
+                        fig_option.get_time_stamp() + ".jpg"), dpi=fig_opt['resolution'], transparent=True)
 
 
 def flat_coord_pro(coord_pro):
@@ -18,15 +18,17 @@ from io import StringIO
 import sys
 import os
 from src import load_hdf5
+from src import fig_option
+from src import spatial_index
+from src import fan_triangulation
 import time
 from copy import deepcopy
 import numpy as np
 import triangle
-import matplotlib.pyplot as plt
 
 
 def merge_grid_and_save(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, name_prj, path_prj, model_type,
-                        q=[], print_cmd=False, path_shp='', erase_id=False):
+                        q=[], print_cmd=False, path_shp='', erase_id=False, incremental=False):
     """
     This function call the merging of the grid between the grid from the hydrological data and the substrate data.
     It then save the merged data and the substrate data in a common hdf5 file. This function is called in a second
@@ -46,6 +48,8 @@ def merge_grid_and_save(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, n
     :param print_cmd: If False, print to the GUI (usually False)
     :param path_shp: the path where to save the shp file with hydro and subtrate. If empty, the shp file is not saved.
     :param: erase_id should we erase old shapefile from the same model or not.
+    :param incremental: If True, the merge of the time steps is based on the merge of the whole profile
+           (see merge_grid_hydro_sub()).
     """
 
     if not print_cmd:
@@ -53,7 +57,7 @@ def merge_grid_and_save(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, n
 
     # merge the grid
     [ikle_both, point_all_both, sub_pg_all_t, sub_dom_all_t, inter_vel_all_both, inter_h_all_both] = \
-        merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data)
+        merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, incremental=incremental)
     if ikle_both == [-99]:
         print('Error: data not merged.\n')
         if q:
@@ -89,17 +93,23 @@ def merge_grid_and_save(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data, n
         return
 
 
-def merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data=1, path_prj=''):
+def merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data=1, path_prj='', incremental=False):
     """
     After the data for the substrate and the hydrological data are loaded, they are still in different grids.
     This functions will merge both grid together. This is done for all time step and all reaches. If a
     constant substrate is there, the hydrological hdf5 is just copied.
 
+    In the incremental mode, the intersections between the substrate and the whole profile (time step 0) are
+    found once. For the other time steps, the grid is usually the whole profile cut by cut_2d_grid(), so only the
+    cells created by cut_2d_grid() are intersected with the substrate (see find_sub_and_cross_incremental()).
+    The result is the same than in the normal mode.
+
     :param hdf5_name_hyd: the name of the hdf5 file with the hydrological data
     :param hdf5_name_sub: the name of the hdf5 with the substrate data
     :param path_hdf5: the path to the hdf5 data
     :param default_data: The substrate data given in the region of the hydrological grid where no substrate is given
     :param path_prj: the path to the project
+    :param incremental: If True, the intersections found on the whole profile are re-used for the other time steps
     :return: the connectivity table, the coordinates, the substrated data, the velocity and height data all in a merge form.
 
     """
@@ -188,6 +198,7 @@ def merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data=1
     # merge the grid for each time step (the time step 0 is the full profile)
     warn_inter = True
     no_inter = False
+    cross_whole = []  # the intersection with the whole profile by reach (incremental mode)
     for t in range(0, len(ikle_all)): # len(ikle_all)
 
         ikle_all2 = []
@@ -227,9 +238,23 @@ def merge_grid_hydro_sub(hdf5_name_hyd, hdf5_name_sub, path_hdf5, default_data=1
                         first_time = False
 
                     # find intersection betweeen hydrology and substrate
-                    [ikle_sub, point_all_sub, data_sub_pg,  data_sub_dom, data_crossing, sub_cell] = \
-                        find_sub_and_cross(ikle_sub, point_all_sub, ikle_before, point_before, data_sub_pg, data_sub_dom,
-                                           first_time)
+                    if incremental and t > 0 and r < len(cross_whole):
+                        if cross_whole[r] is None:  # the substrate grid was modified by the next reaches
+                            cross_here = find_sub_and_cross(ikle_sub, point_all_sub, ikle_all[0][r], point_all[0][r],
+                                                            data_sub_pg, data_sub_dom)
+                            cross_whole[r] = [cross_here[4], cross_here[5]]
+                        [ikle_sub, point_all_sub, data_sub_pg, data_sub_dom, data_crossing, sub_cell] = \
+                            find_sub_and_cross_incremental(ikle_sub, point_all_sub, ikle_before, point_before,
+                                                           data_sub_pg, data_sub_dom, ikle_all[0][r], point_all[0][r],
+                                                           cross_whole[r])
+                    else:
+                        [ikle_sub, point_all_sub, data_sub_pg,  data_sub_dom, data_crossing, sub_cell] = \
+                            find_sub_and_cross(ikle_sub, point_all_sub, ikle_before, point_before, data_sub_pg,
+                                               data_sub_dom, first_time)
+                    if incremental and t == 0:
+                        # the substrate grid was adapted to this reach, the older intersections cannot be re-used
+                        cross_whole = [None] * len(cross_whole)
+                        cross_whole.append([data_crossing, sub_cell])
 
                 # if no intersection found at t==0
                 if len(data_crossing[0]) < 1 or no_inter:
@@ -297,7 +322,8 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
     A function which find where the crossing points are. Crossing points are the points on the triangular side of the
     hydrological grid which cross with a side of the substrate grid. The algo based on finding if points of one elements
     are in the same polygon using a ray casting method. We assume that the polygon forming the subtrate grid are convex.
-    Otherwise it would not work in all cases.
+    Otherwise it would not work in all cases. The substrate cells tested for each point or each side are found
+    with the spatial index of spatial_index.py, so we do not need to look at the whole substrate grid.
     We also neglect the case where a substrate cell at the border of the subtrate grid is fully in a hydrological cell.
 
     IMPORTANT: polygon should be convex.
@@ -317,7 +343,6 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
     """
 
     # preparation
-    ikle_sub = np.array(ikle_sub)
     ikle = np.array(ikle)
     sub_cell = np.zeros((len(ikle),)) -99  # the link between substrate cell and hydro cell
     el_cross = []
@@ -331,56 +356,33 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
     if first_time:
 
         # get triangle substrate grid substrate grid (finally it is easier, even if part of merge grid function with
-        # a polygon convex substrate)
-        xy_new = list(coord_p_sub)
-        ikle_new = []
-        data_sub_pg_new = []
-        data_sub_dom_new = []
-        for idc, c in enumerate(ikle_sub):
-            if len(c) > 3:
-                c_center = (1 / len(c)) * sum(coord_p_sub[c])
-                xy_new.append(c_center)
-                for ind in range(0, len(c) - 1):
-                    ikle_new.append([len(xy_new) - 1, c[ind], c[ind + 1]])
-                    data_sub_pg_new.append(data_sub_pg[idc])
-                    data_sub_dom_new.append(data_sub_dom[idc])
-                ikle_new.append([len(xy_new) - 1, c[ind + 1], c[0]])
-                data_sub_pg_new.append(data_sub_pg[idc])
-                data_sub_dom_new.append(data_sub_dom[idc])
-            else:
-                ikle_new.append(c)
-                data_sub_pg_new.append(data_sub_pg[idc])
-                data_sub_dom_new.append(data_sub_dom[idc])
-
-        coord_p_sub = np.array(xy_new)
-        ikle_sub = ikle_new
-        data_sub_pg = data_sub_pg_new
-        data_sub_dom = data_sub_dom_new
+        # a polygon convex substrate). The new point of each polygon is the mean of its points.
+        [ind_p, nb_p] = fan_triangulation.get_ragged_table(ikle_sub)
+        coord_p_sub = np.array(coord_p_sub)
+        [ikle_sub, parent, poly] = fan_triangulation.fan_triangles(ind_p, nb_p, len(coord_p_sub),
+                                                                   first_in_place=False, center_first=True)
+        c_center = fan_triangulation.get_cell_center(ind_p, nb_p, coord_p_sub)[poly]
+        coord_p_sub = np.concatenate((coord_p_sub[:, :2], c_center))
+        data_sub_pg = np.asarray(data_sub_pg)[parent]
+        data_sub_dom = np.asarray(data_sub_dom)[parent]
 
         # erase substrate cell which are outside of the hydrological grid (to optimize)
         # the full time is the bigger grid
-        data_sub_pg2 = []
-        data_sub_dom2 = []
-        ikle_sub2 = []
         xhydmax = max(coord_p[:, 0])
         yhydmax = max(coord_p[:, 1])
         xhydmin = min(coord_p[:, 0])
         yhydmin = min(coord_p[:, 1])
-        i = 0
-        for k in ikle_sub:
-            coord_x_sub = np.array([coord_p_sub[int(k[0]), 0], coord_p_sub[int(k[1]), 0], coord_p_sub[int(k[2]), 0]])
-            coord_y_sub = np.array([coord_p_sub[int(k[0]), 1], coord_p_sub[int(k[1]), 1], coord_p_sub[int(k[2]), 1]])
-            if xhydmax >= min(coord_x_sub) and xhydmin <= max(coord_x_sub) and \
-                            yhydmax >= min(coord_y_sub) and yhydmin <= max(coord_y_sub):
-                ikle_sub2.append(k)
-                data_sub_pg2.append(data_sub_pg[i])
-                data_sub_dom2.append(data_sub_dom[i])
-            i += 1
-        ikle_sub = np.array(ikle_sub2)
+        coord_x_sub = coord_p_sub[ikle_sub, 0]
+        coord_y_sub = coord_p_sub[ikle_sub, 1]
+        in_hyd = (xhydmax >= np.min(coord_x_sub, axis=1)) & (xhydmin <= np.max(coord_x_sub, axis=1)) & \
+                 (yhydmax >= np.min(coord_y_sub, axis=1)) & (yhydmin <= np.max(coord_y_sub, axis=1))
+        ikle_sub = ikle_sub[in_hyd]
         if len(ikle_sub) < 1:
             return ikle_sub, coord_p_sub, data_sub_pg,  data_sub_dom, [[]], sub_cell
-        data_sub_pg = np.copy(data_sub_pg2)
-        data_sub_dom = np.copy(data_sub_dom2)
+        data_sub_pg = data_sub_pg[in_hyd]
+        data_sub_dom = data_sub_dom[in_hyd]
+    else:
+        ikle_sub = np.array(ikle_sub)
 
     # preparation 2
     nb_poly = len(ikle_sub)
@@ -397,8 +399,8 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
     min_px = np.min(px, 0)
     max_py = np.max(py, 0)
     min_py = np.min(py, 0)
-    # order it along xmin
-    indmin = np.argsort(min_px)
+    # order it along xmin (stable, so that an ordered substrate grid is not changed in the next calls)
+    indmin = np.argsort(min_px, kind='mergesort')
     max_px = max_px[indmin]
     min_px = min_px[indmin]
     max_py = max_py[indmin]
@@ -407,6 +409,10 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
     data_sub_pg = data_sub_pg[indmin]
     data_sub_dom = data_sub_dom[indmin]
 
+    # spatial index over the substrate cells to find in which substrate cell are the hydrological points
+    tri_index = spatial_index.build_tri_index(ikle_sub, coord_p_sub)
+    [start_in, tri_in] = spatial_index.points_in_triangles(tri_index, ikle_sub, coord_p_sub, coord_hyd_x, coord_hyd_y)
+
     # for each hydrological cell
     for e in range(0, nb_tri):
 
@@ -418,88 +424,35 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
         i = np.searchsorted(min_px, xhyd, side='right') + 2
         if i > len(ikle_sub) - 1:
             i = len(ikle_sub) - 1
-        while i > 1 and (max_px[i] < xhyd or min_py[i] > yhyd or max_py[i] < yhyd):
-            i -= 1
 
         # for each points in this triangle
         for p in range(0, 3):
 
             # go to the next triangle
             if p > 0:
-                xhyd = coord_hyd_x[ikle[e, p]]
-                yhyd = coord_hyd_y[ikle[e, p]]
                 if i < nb_poly-4:
                     i += 4
-            find_sub = False
-            j = 0
-            # i = 0 debug
-
-            while not find_sub:
-
-                # find if this point is in a polygon
-                # using to send a ray outside of the polygon
-                # idea from http://geomalgorithms.com/a03-_inclusion.html
-                # the number of time a particular point intersect with a segments
-                intersect = 0.0
-                # find the "substrate" point of this polygon
-                poly_i = ikle_sub[i]
-                # for each side of the substrate polygon
-                xsub0 = coord_p_subx[poly_i[0]]
-                ysub0 = coord_p_suby[poly_i[0]]
-                coord_old0 = [xsub0, ysub0]
-                coord_old = coord_old0
-                lenpoly = len(poly_i)
-                for i2 in range(0, lenpoly):
-                    if i2 == lenpoly - 1:
-                        [x1sub, y1sub] = coord_old  # coord_p_sub[int(poly_i[i2])]
-                        [x2sub, y2sub] = coord_old0  # coord_p_sub[int(poly_i[0])]
-                    else:
-                        [x1sub, y1sub] = coord_old
-                        x2sub = coord_p_subx[poly_i[i2 + 1]]  # quicker when coord_p_sub is in x and y
-                        y2sub = coord_p_suby[poly_i[i2 + 1]]
-                        coord_old = [x2sub, y2sub]
-                    # send ray is along the x direction, positif y = const
-                    # check if it is possible to have an interesection using <>
-                    if xhyd <= max(x1sub, x2sub) and min(y1sub, y2sub) <= yhyd <= max(y1sub, y2sub):
-                        # find the possible intersection
-                        if x1sub != x2sub:
-                            # case where the side of the triangle is on the "wrong side"
-                            # of xhyd even if xhyd <= max(x1sub,x2sub)
-                            if y1sub != y2sub:
-                                a = (y1sub - y2sub) / (x1sub - x2sub)
-                                x_int = (yhyd - y1sub) / a + x1sub  # (yhyd - (y1sub - x1sub *a)) / a
-                            else:
-                                x_int = xhyd + 1000  # crossing if horizontal
-                        else:
-                            x_int = xhyd  # x1sub
-                        # if we have interesection
-                        if xhyd <= x_int:
-                            # manage the case where the yhyd is at the same height than subtrate
-                            if yhyd == y1sub:
-                                if y2sub < yhyd:
-                                    intersect += 1
-                            elif yhyd == y2sub:
-                                if y1sub < yhyd:
-                                    intersect += 1
-                            # normal case
-                            else:
-                                intersect += 1
-                # if number of intersection is odd, then point inside
-                if intersect % 2 == 1:
-                    find_sub = True
-                    sub_num[p] = i
-                    # if p == 0:
-                    #     print('new')
-                    # print(j)
-
-                # get to the next polygon
-                i -= 1
-                j += 1
+
+            # the substrate cells which contains this point (more than one if the point is on a side)
+            cand = tri_in[start_in[ikle[e, p]]:start_in[ikle[e, p] + 1]]
+            if len(cand) > 0:
+                # the polygons are searched backward from i, take the first one found
+                sub_num[p] = int(cand[np.argmin((i - cand) % nb_poly)])
+                i = sub_num[p] - 1
                 if i < 0:
                     i = nb_poly - 1
-                if j == nb_poly+3:
-                    find_sub = True
-                    sub_num[p] = -1
+            else:
+                # skip the polygons which cannot contain the point (only needed to know where to start next time)
+                if p == 0 and i > 1:
+                    ok = np.nonzero((max_px[2:i + 1] >= xhyd) & (min_py[2:i + 1] <= yhyd)
+                                    & (max_py[2:i + 1] >= yhyd))[0]
+                    if len(ok) > 0:
+                        i = ok[-1] + 2
+                    else:
+                        i = 1
+                # all polygons were tested
+                sub_num[p] = -1
+                i = (i - 3) % nb_poly
 
         # if no intersection was found
         # the hypothesis that substrate in convex is imporant here, it would not work otherwise
@@ -602,8 +555,9 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
                             del point_cross_el_here[-1]
                             lenp = len(point_cross_here)
 
-                            elhere = 0
-                            for a1 in ikle_sub:
+                            for elhere in spatial_index.query_segment(tri_index, hyd1, hyd2):
+                                elhere = int(elhere)
+                                a1 = ikle_sub[elhere]
                                 len_k = len(a1)
                                 for seg in range(0, len_k):
                                     if seg < len_k - 1:
@@ -629,7 +583,6 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
                                         if inside2:
                                             sub_point_in_cross_here.append(sub2)
                                             sub_point_in_el_here.append(elhere)
-                                elhere += 1
 
                             if len(point_cross_here) > 0:
                                 point_cross_here_this_s = point_cross_here[lenp:]
@@ -689,6 +642,85 @@ def find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_s
     return ikle_sub, coord_p_sub, data_sub_pg,  data_sub_dom, data_crossing, sub_cell
 
 
+def find_sub_and_cross_incremental(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_sub_dom, ikle_whole,
+                                   coord_p_whole, cross_whole):
+    """
+    This function gives the same results than find_sub_and_cross() (with first_time = False), but it re-uses the
+    intersections found on the whole profile. The grid of a time step is usually the whole profile cut by
+    cut_2d_grid(): the points of the whole profile are kept at the start of the point list, the wet cells of the
+    whole profile are kept and new cells are added along the wetted limit. As the results of find_sub_and_cross()
+    for one hydrological cell only depends on this cell, the results of the whole profile are copied for the kept
+    cells and find_sub_and_cross() is called only for the new cells.
+
+    If the grid of the time step is not based on the whole profile, find_sub_and_cross() is called on all the grid.
+
+    :param ikle_sub: the connectivity table for the substrate (as returned by find_sub_and_cross() for the whole
+           profile)
+    :param coord_p_sub: the coordinates of the poitn forming the subtrate
+    :param ikle: the connectivity table for the hydrology (this time step)
+    :param coord_p: the coordinate of the hydrology (this time step)
+    :param data_sub_pg: the substrate data by substrate cell (coarser)
+    :param data_sub_dom: the subtrate data by subtrate cell (dominant)
+    :param ikle_whole: the connectivity table of the whole profile
+    :param coord_p_whole: the coordinate of the whole profile
+    :param cross_whole: the data for the crossing point and sub_cell found by find_sub_and_cross() for the whole
+           profile with this substrate grid (a list with two elements)
+    :return: the same outputs than find_sub_and_cross()
+    """
+    ikle = np.array(ikle)
+    coord_p = np.array(coord_p)
+    ikle_whole = np.array(ikle_whole)
+    coord_p_whole = np.array(coord_p_whole)
+    [data_crossing_whole, sub_cell_whole] = cross_whole
+    nb_p_whole = len(coord_p_whole)
+
+    # check that the grid is based on the whole profile and find the kept cells of the whole profile
+    derived = len(ikle) > 0 and len(data_crossing_whole) == 7 and len(coord_p) >= nb_p_whole \
+        and np.array_equal(coord_p[:nb_p_whole], coord_p_whole)
+    if derived:
+        kept = np.all(ikle < nb_p_whole, axis=1)
+        ind_kept = np.where(kept)[0]
+        rows = np.concatenate((ikle_whole, ikle[ind_kept]))
+        [rows_u, ind_u] = np.unique(rows, axis=0, return_inverse=True)
+        ind_u = ind_u.ravel()
+        whole_u = np.zeros((len(rows_u),), dtype=np.int64) - 1
+        whole_u[ind_u[:len(ikle_whole)]] = np.arange(len(ikle_whole))
+        ind_whole = whole_u[ind_u[len(ikle_whole):]]
+        derived = np.all(ind_whole >= 0)
+    if not derived:
+        return find_sub_and_cross(ikle_sub, coord_p_sub, ikle, coord_p, data_sub_pg, data_sub_dom)
+
+    # kept cells: copy the results of the whole profile
+    sub_cell = np.zeros((len(ikle),)) - 99
+    sub_cell[ind_kept] = sub_cell_whole[ind_whole]
+    cross_here = dict()
+    cross_ind = np.zeros((len(ikle_whole),), dtype=np.int64) - 1
+    cross_ind[data_crossing_whole[0]] = np.arange(len(data_crossing_whole[0]))
+    for e, c in zip(ind_kept, cross_ind[ind_whole]):
+        if c > -1:
+            cross_here[e] = [data_crossing_whole[k][c] for k in range(1, 7)]
+
+    # new cells: find the intersection with the substrate
+    ind_new = np.where(~kept)[0]
+    ikle_sub = np.array(ikle_sub)
+    if len(ind_new) > 0:
+        p_new = np.unique(ikle[ind_new])
+        ikle_new = np.searchsorted(p_new, ikle[ind_new])
+        [ikle_sub, coord_p_sub, data_sub_pg, data_sub_dom, data_crossing_new, sub_cell_new] = \
+            find_sub_and_cross(ikle_sub, coord_p_sub, ikle_new, coord_p[p_new], data_sub_pg, data_sub_dom)
+        sub_cell[ind_new] = sub_cell_new
+        for c, e in enumerate(data_crossing_new[0]):
+            cross_here[ind_new[e]] = [data_crossing_new[k][c] for k in range(1, 7)]
+
+    # crossing data in the order of the cells
+    el_cross = sorted(cross_here.keys())
+    data_crossing = [[int(e) for e in el_cross]]
+    for k in range(0, 6):
+        data_crossing.append([cross_here[e][k] for e in el_cross])
+
+    return ikle_sub, coord_p_sub, data_sub_pg, data_sub_dom, data_crossing, sub_cell
+
+
 def inside_trigon(pt, p0, p1, p2):
     """
     This function check if a point is in a triangle using the barycentric coordinates.
@@ -972,22 +1004,20 @@ def create_merge_grid(ikle, coord_p, data_sub_pg, data_sub_dom, vel, height,ikle
 
     # create the new substrate data
     print('create the new substrate data')
-    data_sub_dom_ok = np.zeros((len(sub_cell),))
-    data_sub_pg_ok = np.zeros((len(sub_cell),))
-    for i,s in enumerate(sub_cell):
-        if s == -99 or s == -1:
-            data_sub_dom_ok[i] = default_data
-            data_sub_pg_ok[i] = default_data
-        else:
-            data_sub_dom_ok[i] = data_sub_dom[int(s)]
-            data_sub_pg_ok[i] = data_sub_pg[int(s)]
+    sub_cell = np.array(sub_cell, dtype=np.int64)
+    no_sub = (sub_cell == -99) | (sub_cell == -1)
+    data_sub_dom_ok = np.zeros((len(sub_cell),)) + default_data
+    data_sub_pg_ok = np.zeros((len(sub_cell),)) + default_data
+    if np.any(~no_sub):
+        data_sub_dom_ok[~no_sub] = np.asarray(data_sub_dom)[sub_cell[~no_sub]]
+        data_sub_pg_ok[~no_sub] = np.asarray(data_sub_pg)[sub_cell[~no_sub]]
 
     # remove element from ikle and new_data_sub
-    # ikle = [i for j, i in enumerate(ikle) if j not in to_delete]  # slow
-    for d in reversed(to_delete):  # to_delete is ordered
-        del ikle[d]
-    data_sub_pg_ok = np.delete(data_sub_pg_ok, to_delete)
-    data_sub_dom_ok = np.delete(data_sub_dom_ok, to_delete)
+    keep = np.ones((len(ikle),), dtype=bool)
+    keep[to_delete] = False
+    ikle = [k for k, ok in zip(ikle, keep) if ok]
+    data_sub_pg_ok = data_sub_pg_ok[keep]
+    data_sub_dom_ok = data_sub_dom_ok[keep]
 
     return ikle, coord_p, data_sub_pg_ok, data_sub_dom_ok, vel, height
 
@@ -1058,6 +1088,7 @@ def fig_merge_grid(point_all_both_t, ikle_both_t, path_im, name_add='', ikle_orr
     :param ikle_orr: the orginial ikle
     :param point_all_orr: the orginal point_all
     """
+    import matplotlib.pyplot as plt
     if not os.path.isdir(path_im):
         print('Error: No directory found to save the figures \n')
         return
@@ -1097,9 +1128,9 @@ def fig_merge_grid(point_all_both_t, ikle_both_t, path_im, name_add='', ikle_orr
     plt.xlabel('x coordinate')
     plt.ylabel('y coordinate')
     #plt.show()
-    plt.savefig(os.path.join(path_im, "Grid_merge_" + name_add + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".png"),
+    plt.savefig(os.path.join(path_im, "Grid_merge_" + name_add + '_' + fig_option.get_time_stamp() + ".png"),
                 dpi=1000)
-    plt.savefig(os.path.join(path_im, "Grid_merge_" + name_add + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + ".pdf"),
+    plt.savefig(os.path.join(path_im, "Grid_merge_" + name_add + '_' + fig_option.get_time_stamp() + ".pdf"),
                 dpi=1000)
 
 
@@ -1107,6 +1138,7 @@ def main():
     """
     Used to test this module.
     """
+    import matplotlib.pyplot as plt
 
     path = r'D:\Diane_work\output_hydro\substrate'
 
@@ -16,15 +16,16 @@ https://github.com/YannIrstea/habby
 """
 import os
 from src import load_hdf5
+from src import fig_option
 import numpy as np
+import h5py
 # from src import calcul_hab  useful to test, but do not work with the whole programm
 from src import hl
-import time
 import xml.dom.minidom
 
 
 def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp, height_c_data, vel_c_data, name_fish,
-                   erase_id):
+                   erase_id, vtk_format='vtu'):
     """
     This function creates paraview input in the new, non-legacy xml format. This function called the evtk class
     written by Paulo Herrera, which is available at https://bitbucket.org/pauloh/pyevtk/downloads/
@@ -37,7 +38,11 @@ def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp,
     More info: http://www.earthmodels.org/software/vtk-and-paraview/vtk-file-formats.
 
     Paraview can handle a group of file which compose an output with than one time step. This is the reason to create a
-    pwd files which list the files composing all the time steps (one file by time step)
+    pwd files which list the files composing all the time steps (one file by time step). The binary data of the vtu
+    files is compressed (zlib).
+
+    If vtk_format is 'vtkhdf', one file by reach is created with all time steps (see habitat_to_vtkhdf()). The
+    geometry is then written only once if the grid does not change between time steps.
 
     :param file_name_base: the base to create the name of the vtu file
     :param path_hdf5: the path to the hdf5 hydro file (to load the grid)
@@ -48,8 +53,13 @@ def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp,
     :param name_fish: the name of fish and stage
     :param path_out: the path where to save the data
     :param erase_id: if True, previous paraview file from identical merge file are erased
+    :param vtk_format: 'vtu' (one vtu file by time step and a pvd file) or 'vtkhdf' (one file with all time steps)
 
     """
+    if vtk_format == 'vtkhdf':
+        habitat_to_vtkhdf(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp, height_c_data, vel_c_data,
+                          name_fish, erase_id)
+        return
 
     file_names_all = []
     if len(file_name_base)>60:
@@ -60,40 +70,37 @@ def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp,
     for id, n in enumerate(name_fish):
         name_fish[id] = n.replace('_', ' ')
 
-    # load grid (could also be used if velcoity and height point data is needed)
-    [ikle_all_t, point_all_t, blob, blob, sub_pg_data, sub_dom_data] = \
-        load_hdf5.load_hdf5_hyd(name_hdf5, path_hdf5, True)
-    if ikle_all_t == [-99]:
+    # the grid is read one time step at the time (could also be used if velcoity and height point data is needed)
+    hdf5 = load_hdf5.get_hydro_hdf5(name_hdf5, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99:
         return
-    nb_time = len(ikle_all_t)
+    nb_time = hdf5.nb_timestep + 1
 
-    for r in range(0, len(ikle_all_t[-1])):
+    for r in range(0, hdf5.nb_reach):
         if not erase_id:
-            fileName = file_name_base + '_' + 'Reach' + str(r) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S")
+            fileName = file_name_base + '_' + 'Reach' + str(r) + '_' + fig_option.get_time_stamp()
         else:
             fileName = file_name_base + '_' + 'Reach' + str(r)
 
         # create one vtu file by time step
         # for the moment we do not show the time step zero with the full profile without data
         for t in range(1, nb_time):
-            ikle = ikle_all_t[t][r]
-            if len(ikle) < 3 or t > len(height_c_data):  # if something is wrong
+            ikle = hdf5.ikle(t, r)
+            if ikle is None or len(ikle) < 3 or t > len(height_c_data):  # if something is wrong
                 pass
                 # print('Error: Connectivity table missing or illogical. One time step not created. \n')
             else:
 
                 # grid data preparation for vtk
-                point = np.array(point_all_t[t][r])
+                point = hdf5.point_all(t, r)
 
                 x = np.array(point[:, 0])
                 y = np.array(point[:, 1])
                 z = np.zeros(len(x), )
                 connectivity = np.reshape(ikle, (len(ikle) * 3,))
 
-                offsets = np.arange(3, len(ikle) * 3 + 3, 3)
-                offsets = np.array(list(map(int, offsets)))
-                cell_types = np.zeros(len(ikle), ) + 5  # triangle
-                cell_types = np.array(list((map(int, cell_types))))
+                offsets = np.arange(3, len(ikle) * 3 + 3, 3, dtype=np.int64)
+                cell_types = np.full((len(ikle),), 5, dtype=np.uint8)  # triangle
 
                 # data creation
                 cellData = {}
@@ -103,8 +110,8 @@ def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp,
 
                 cellData['height'] = height_c_data[t][r]
                 cellData['velocity'] = vel_c_data[t][r]
-                cellData['coarser sub'] = sub_pg_data[t][r]
-                cellData['dominant sub'] = sub_dom_data[t][r]
+                cellData['coarser sub'] = hdf5.sub_pg(t, r)
+                cellData['dominant sub'] = hdf5.sub_dom(t, r)
 
                 # create the grid and the vtu files
                 name_here = fileName + '_t' + str(t) + '.vtu'
@@ -112,7 +119,8 @@ def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp,
                     if os.path.isfile(name_here):
                         os.remove(name_here)
                 file_names_all.append(name_here)
-                hl.unstructuredGridToVTK(fileName + '_t' + str(t), x, y, z, connectivity, offsets, cell_types, cellData)
+                hl.unstructuredGridToVTK(fileName + '_t' + str(t), x, y, z, connectivity, offsets, cell_types, cellData,
+                                         compression=True)
 
 
         # create the "grouping" file to read all time step together
@@ -122,6 +130,140 @@ def habitat_to_vtu(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp,
                 os.remove(name_here)
         writePVD(name_here, file_names_all)
         file_names_all = []
+    hdf5.close()
+
+
+def habitat_to_vtkhdf(file_name_base, path_out, path_hdf5, name_hdf5, vh_all_t_sp, height_c_data, vel_c_data,
+                      name_fish, erase_id, compression='gzip'):
+    """
+    This function creates the paraview input in the VTKHDF format (an hdf5 file which can be opened by paraview 5.12
+    and later). There is one file by reach, which contains all the time steps. The grid is only written again when
+    it changes from one time step to the next one. Otherwise, the time steps point to the grid already written. The
+    data is written one time step and one variable at the time in compressed and chunked datasets.
+
+    The format is described at https://docs.vtk.org/en/latest/design_documents/VTKFileFormats.html (VTKHDF, transient
+    unstructured grid).
+
+    :param file_name_base: the base to create the name of the vtkhdf file
+    :param path_out: the path where to save the data
+    :param path_hdf5: the path to the hdf5 hydro file (to load the grid)
+    :param name_hdf5: the name of the hdf5 containing the grid
+    :param vh_all_t_sp: the habitat data by reach, time step, species
+    :param height_c_data: the height by cell by reach by time step
+    :param vel_c_data: the velocity by cell by reach by time step
+    :param name_fish: the name of fish and stage
+    :param erase_id: if True, previous paraview file from identical merge file are erased
+    :param compression: the compression of the datasets ('gzip', 'lzf' or None)
+    """
+
+    if len(file_name_base) > 60:
+        file_name_base = os.path.join(path_out, file_name_base)[:-25]
+    else:
+        file_name_base = os.path.join(path_out, file_name_base)
+    # format the name of species and stage
+    for id, n in enumerate(name_fish):
+        name_fish[id] = n.replace('_', ' ')
+
+    hdf5 = load_hdf5.get_hydro_hdf5(name_hdf5, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99:
+        return
+
+    for r in range(0, hdf5.nb_reach):
+        if not erase_id:
+            fileName = file_name_base + '_' + 'Reach' + str(r) + '_' + fig_option.get_time_stamp()
+        else:
+            fileName = file_name_base + '_' + 'Reach' + str(r)
+        name_here = fileName + '.vtkhdf'
+        if erase_id and os.path.isfile(name_here):
+            try:
+                os.remove(name_here)
+            except PermissionError:
+                print('Error: The paraview file is currently open in an other program. Could not be re-written \n')
+                continue
+
+        with h5py.File(name_here, 'w') as file:
+            root = file.create_group('VTKHDF')
+            root.attrs['Version'] = np.array([2, 0], dtype=np.int64)
+            root.attrs['Type'] = np.bytes_('UnstructuredGrid')
+            steps = root.create_group('Steps')
+            ikle_old = None
+            point_old = None
+            nb_step = 0
+            nb_part = 0  # the number of grids written
+            nb_point = 0  # the number of points written (all grids)
+            nb_cell = 0
+            nb_conn = 0
+
+            for t in range(1, hdf5.nb_timestep + 1):
+                ikle = hdf5.ikle(t, r)
+                if ikle is None or len(ikle) < 3 or t > len(height_c_data):  # if something is wrong
+                    continue
+                point = hdf5.point_all(t, r)
+
+                # the grid (only if it changed)
+                if ikle_old is None or not (np.array_equal(ikle, ikle_old) and np.array_equal(point, point_old)):
+                    point_offset = nb_point
+                    cell_offset = nb_cell
+                    conn_offset = nb_conn
+                    part_offset = nb_part
+                    point3 = np.zeros((len(point), 3))
+                    point3[:, :2] = point[:, :2]
+                    append_vtkhdf(root, 'Points', point3, compression)
+                    append_vtkhdf(root, 'Connectivity', np.reshape(ikle, (len(ikle) * 3,)).astype(np.int64),
+                                  compression)
+                    append_vtkhdf(root, 'Offsets', np.arange(0, len(ikle) * 3 + 1, 3, dtype=np.int64), compression)
+                    append_vtkhdf(root, 'Types', np.full((len(ikle),), 5, dtype=np.uint8), compression)  # triangle
+                    append_vtkhdf(root, 'NumberOfPoints', np.array([len(point)], dtype=np.int64))
+                    append_vtkhdf(root, 'NumberOfCells', np.array([len(ikle)], dtype=np.int64))
+                    append_vtkhdf(root, 'NumberOfConnectivityIds', np.array([len(ikle) * 3], dtype=np.int64))
+                    nb_point += len(point)
+                    nb_cell += len(ikle)
+                    nb_conn += len(ikle) * 3
+                    nb_part += 1
+                    ikle_old = ikle
+                    point_old = point
+
+                # the time step
+                append_vtkhdf(steps, 'Values', np.array([t], dtype=np.float64))
+                append_vtkhdf(steps, 'PartOffsets', np.array([part_offset], dtype=np.int64))
+                append_vtkhdf(steps, 'NumberOfParts', np.array([1], dtype=np.int64))
+                append_vtkhdf(steps, 'PointOffsets', np.array([point_offset], dtype=np.int64))
+                append_vtkhdf(steps, 'CellOffsets', np.array([[cell_offset]], dtype=np.int64))
+                append_vtkhdf(steps, 'ConnectivityIdOffsets', np.array([[conn_offset]], dtype=np.int64))
+
+                # the data by cell, one variable at the time
+                cell_data = [("HSI " + name_fish[sp], vh_all_t_sp[sp][t][r]) for sp in range(0, len(vh_all_t_sp))]
+                cell_data += [('height', height_c_data[t][r]), ('velocity', vel_c_data[t][r]),
+                              ('coarser sub', hdf5.sub_pg(t, r)), ('dominant sub', hdf5.sub_dom(t, r))]
+                for name_data, data in cell_data:
+                    data_offset = append_vtkhdf(root.require_group('CellData'), name_data,
+                                                np.asarray(data, dtype=np.float64), compression)
+                    append_vtkhdf(steps.require_group('CellDataOffsets'), name_data,
+                                  np.array([data_offset], dtype=np.int64))
+                nb_step += 1
+            steps.attrs['NSteps'] = nb_step
+    hdf5.close()
+
+
+def append_vtkhdf(group, name, data, compression=None):
+    """
+    This function adds data at the end of a dataset of a VTKHDF file. The dataset is created (resizable and chunked)
+    if it does not exist.
+
+    :param group: the hdf5 group containing the dataset
+    :param name: the name of the dataset
+    :param data: the data to add (np.array)
+    :param compression: the compression of the dataset ('gzip', 'lzf' or None)
+    :return: the length of the dataset before the new data was added
+    """
+    if name not in group:
+        group.create_dataset(name, shape=(0,) + data.shape[1:], maxshape=(None,) + data.shape[1:], dtype=data.dtype,
+                             chunks=True, compression=compression, shuffle=compression is not None)
+    dataset = group[name]
+    start = dataset.shape[0]
+    dataset.resize(start + len(data), axis=0)
+    dataset[start:] = data
+    return start
 
 
 def writePVD(fileName, fileNames):
@@ -170,16 +312,13 @@ def save_slf(name_hdf5, path_hdf5, path_slf, merge, output_name='', habitat = []
     """
     print('export here')
 
-    # load hdf5
-    if not merge:
-        [ikle_all_t, point_all, inter_vel_all, inter_height_all] = load_hdf5.load_hdf5_hyd(name_hdf5,
-                                                                                           path_hdf5, merge)
-    else:
-        [ikle_all_t, point_all, inter_vel_all, inter_height_all, substrate_all_pg, substrate_all_dom] \
-            = load_hdf5.load_hdf5_hyd(name_hdf5, path_hdf5, merge)
-    if isinstance(ikle_all_t[0][0], int) and  ikle_all_t[0][0]== -99:
+    # open hdf5 (the data is read by time step when needed)
+    hdf5 = load_hdf5.get_hydro_hdf5(name_hdf5, path_hdf5)
+    if hdf5.file is None or hdf5.nb_timestep == -99 or hdf5.nb_reach == -99:
         print('Error: Hdf5 file not loaded \n')
+        hdf5.close()
         return
+    hdf5.close()
 
     #print(ikle_all_t[1][0])
     if not output_name:
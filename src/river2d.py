@@ -18,23 +18,23 @@ import os
 import re
 import numpy as np
 import sys
-import matplotlib.pyplot as plt
-import matplotlib as mpl
 from src import hec_ras2D
-import time
 from src import manage_grid_8
 from src import load_hdf5
 from io import StringIO
-from src_GUI import output_fig_GUI
+from src import fig_option
 
 
 def load_river2d_and_cut_grid(name_hdf5,namefiles, paths, name_prj, path_prj, model_type, nb_dim, path_hdf5, q=[],
-                              print_cmd=False, fig_opt={}):
+                              print_cmd=False, fig_opt={}, timestep_sel=''):
     """
     This function loads the river2d data and cut the grid to the wet area. Originally, this function was in the class
     River2D() in hydro_GUI_2. This function was added as it was practical to have a second thread to avoid freezing
     the GUI.
 
+    River2D gives one cdg file by time step. The chosen files are read, cut and saved in the hdf5 file one by one
+    (see load_hdf5.HydroHdf5Writer), so only one time step is in memory at the time.
+
     :param name_hdf5: the base name of the created hdf5 (string)
     :param namefiles: the names of all the cdg file (list of string)
     :param paths: the path to the files (list of string).
@@ -46,30 +46,39 @@ def load_river2d_and_cut_grid(name_hdf5,namefiles, paths, name_prj, path_prj, mo
     :param q: used to send the error back from the second thread (can be used to send other variable too)
     :param print_cmd: if True the print command is directed in the cmd, False if directed to the GUI
     :param fig_opt: the figure option, used here to get the minimum water height to have a wet node (can be > 0)
+    :param timestep_sel: the chosen time steps (index of the files in namefiles, see
+           load_hdf5.get_timestep_selection()). All by default.
     """
 
     # minimum water height
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     minwh = fig_opt['min_height_hyd']
 
-    # creation of array
-    xyzhv = []
-    ikle_all_t = []
-    point_c_all_t = []
-    point_all_t = []
-    inter_h_all_t = []
-    inter_vel_all_t = []
-
-    # for all time step
+    # the chosen time steps
     if not print_cmd:
         sys.stdout = mystdout = StringIO()
-    for i in range(0, len(namefiles)):
+    ind_t = load_hdf5.get_timestep_selection(len(namefiles), timestep_sel)
+    hdf5 = None
+    if ind_t != [-99]:
+        hdf5 = load_hdf5.HydroHdf5Writer(name_hdf5, name_prj, path_prj, model_type, path_hdf5)
+    if hdf5 is None or hdf5.file is None:
+        print('Error: River2D data could not be loaded')
+        if q:
+            sys.stdout = sys.__stdout__
+            q.put(mystdout)
+            return
+        else:
+            return
+
+    # for all time step
+    for i in ind_t:
         # load river 2d data
         [xyzhv_i, ikle_i, coord_c] = load_river2d_cdg(namefiles[i], paths[i])
         if isinstance(xyzhv_i[0], int):
             if xyzhv_i[0] == -99:
                 print('Error: River2D data could not be loaded')
+                hdf5.file.close()
                 if q:
                     sys.stdout = sys.__stdout__
                     q.put(mystdout)
@@ -82,23 +91,13 @@ def load_river2d_and_cut_grid(name_hdf5,namefiles, paths, name_prj, path_prj, mo
                                                                                 xyzhv_i[:, 4], minwh)
 
         #mimic empty grid for t = 0 for 1 D model
-        if i == 0:
-            point_all_t.append([point_all])
-            ikle_all_t.append([ikle_i])
-            point_c_all_t.append([coord_c])
-            inter_h_all_t.append([])
-            inter_vel_all_t.append([])
-        point_all_t.append([point_all])
-        ikle_all_t.append([ikle_i])
-        point_c_all_t.append([[]])
-        inter_h_all_t.append([water_height])
-        inter_vel_all_t.append([velocity])
+        if hdf5.nb_timestep == 0:
+            hdf5.add_timestep([ikle_i], [point_all], [coord_c])
+        hdf5.add_timestep([ikle_i], [point_all], [[]], [velocity], [water_height])
 
     # save data
-    namefiles2 = [x[:-4] for x in namefiles] # no need of the .cdg to name the time step
-
-    load_hdf5.save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle_all_t, point_all_t, point_c_all_t,
-                        inter_vel_all_t, inter_h_all_t, sim_name=namefiles2)
+    namefiles2 = [namefiles[i][:-4] for i in ind_t]  # no need of the .cdg to name the time step
+    hdf5.close(sim_name=namefiles2)
     if not print_cmd:
         sys.stdout = sys.__stdout__
 
@@ -287,6 +286,8 @@ def figure_river2d(xyzhv, ikle, path_im, t=0):
     :param t: the time step which is being plotted
     :return:
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
     plt.rcParams['font.size'] = 10
     mpl.rcParams['ps.fonttype'] = 42
     mpl.rcParams['pdf.fonttype'] = 42
@@ -299,20 +300,20 @@ def figure_river2d(xyzhv, ikle, path_im, t=0):
     plt.xlabel('x coord []')
     plt.ylabel('y coord []')
     plt.title('Grid ')
-    plt.savefig(os.path.join(path_im, "river2D_grid_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-    plt.savefig(os.path.join(path_im, "river2D_grid_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+    plt.savefig(os.path.join(path_im, "river2D_grid_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
+    plt.savefig(os.path.join(path_im, "river2D_grid_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
     plt.close()
 
     hec_ras2D.scatter_plot(xyzhv[:, :2], xyzhv[:, 3], 'Water Depth [m]', 'terrain', 8, 0)
     #plt.savefig(
-      #  os.path.join(path_im, "river2D_waterdepth_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
+      #  os.path.join(path_im, "river2D_waterdepth_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
    # plt.savefig(
-      #  os.path.join(path_im, "river2D_waterdepth_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+      #  os.path.join(path_im, "river2D_waterdepth_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
     #plt.close()
 
     hec_ras2D.scatter_plot(xyzhv[:, :2], xyzhv[:, 4], 'Vel. [m3/sec]', 'gist_ncar', 8, 0)
-    plt.savefig(os.path.join(path_im, "river2D_vel_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-    plt.savefig(os.path.join(path_im, "river2D_vel_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+    plt.savefig(os.path.join(path_im, "river2D_vel_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
+    plt.savefig(os.path.join(path_im, "river2D_vel_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
 
 
 
@@ -16,17 +16,17 @@ https://github.com/YannIrstea/habby
 """
 import os
 import sys
+import warnings
 import numpy as np
-import matplotlib.pyplot as plt
 import time
 from src import hec_ras2D
 from io import StringIO
 from src import load_hdf5
 from src import manage_grid_8
+from src import fan_triangulation
 import xml.etree.ElementTree as Etree
 from src import dist_vistess2
-from src_GUI import output_fig_GUI
-import matplotlib as mpl
+from src import fig_option
 
 
 def load_rubar1d_and_create_grid(name_hdf5, path_hdf5,name_prj, path_prj,model_type,namefile,pathfile, interpo_choice
@@ -64,10 +64,11 @@ def load_rubar1d_and_create_grid(name_hdf5, path_hdf5,name_prj, path_prj,model_t
     if not print_cmd:
        sys.stdout = mystdout = StringIO()
 
-    fig_opt = output_fig_GUI.load_fig_option(path_prj, name_prj)
+    fig_opt = fig_option.load_fig_option(path_prj, name_prj)
     [xhzv_data, coord_pro, lim_riv, timestep] = load_rubar1d(namefile[0],namefile[1], pathfile[0], pathfile[1], path_im,
                                                    show_fig_1D, fig_opt)
     if show_fig_1D:
+        import matplotlib.pyplot as plt
         plt.close() # just save the figure do not show them
 
     if xhzv_data == [-99]:
@@ -624,9 +625,11 @@ def figure_rubar1d(coord_pro, lim_riv, data_xhzv,  name_profile, path_im, pro, p
     :param fig_opt: the dictionnary with the figure option
     :return: none
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
 
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -662,13 +665,13 @@ def figure_rubar1d(coord_pro, lim_riv, data_xhzv,  name_profile, path_im, pro, p
         plt.title("Position des profils")
     # plt.axis('equal') # if right angle are needed
     if format == 0 or format == 1:
-        plt.savefig(os.path.join(path_im, "rubar1D_profile_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "rubar1D_profile_" + fig_option.get_time_stamp() +
                                  '.png'), dpi=fig_opt['resolution'], transparent=True)
     if format == 0 or format == 3:
-        plt.savefig(os.path.join(path_im, "rubar1D_profile_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "rubar1D_profile_" + fig_option.get_time_stamp() +
                                  '.pdf'), dpi=fig_opt['resolution'], transparent=True)
     if format == 2:
-        plt.savefig(os.path.join(path_im, "rubar1D_profile_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "rubar1D_profile_" + fig_option.get_time_stamp() +
                                  '.jpg'), dpi=fig_opt['resolution'], transparent=True)
 
     # plot speeed and height
@@ -712,11 +715,11 @@ def figure_rubar1d(coord_pro, lim_riv, data_xhzv,  name_profile, path_im, pro, p
                     plt.ylabel('Vitesse [m/sec]')
                 if format == 0 or format == 1:
                     plt.savefig(os.path.join(path_im, "rubar1D_vh_t" + str(t) + '_' + str(r) + '_' +
-                                time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'), dpi=fig_opt['resolution'],
+                                fig_option.get_time_stamp() + '.png'), dpi=fig_opt['resolution'],
                                 transparent=True)
                 if format == 0 or format == 3:
                     plt.savefig(os.path.join(path_im, "rubar1D_vh_t" + str(t) + '_' + str(r) + '_' +
-                                time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'), dpi=fig_opt['resolution'],
+                                fig_option.get_time_stamp() + '.pdf'), dpi=fig_opt['resolution'],
                                 transparent=True)
                 if format == 2:
                     plt.savefig(os.path.join(path_im, "rubar1D_vh_t" + str(t) + '_' + str(r) + '_' + time.strftime(
@@ -729,11 +732,14 @@ def figure_rubar1d(coord_pro, lim_riv, data_xhzv,  name_profile, path_im, pro, p
 
 
 def load_rubar2d_and_create_grid(name_hdf5, geofile, tpsfile, pathgeo, pathtps, path_im,  name_prj, path_prj, model_type,
-                                 nb_dim, path_hdf5, q=[], print_cmd =False, fig_opt={}):
+                                 nb_dim, path_hdf5, q=[], print_cmd =False, fig_opt={}, timestep_sel='', time_sel=''):
     """
     This is the function used to load the RUBAR data in 2D, to pass the data from the cell to the node using
     interpolation and to save the whole in an hdf5 format
 
+    The chosen time steps are read, cut and saved in the hdf5 file one by one (see iter_tps_2d() and
+    load_hdf5.HydroHdf5Writer), so only one time step is in memory at the time.
+
     :param name_hdf5: the base name of the created hdf5 (string)
     :param geofile: the name of the .mai or .dat file which contains the connectivity table and the coordinates (string)
     :param tpsfile: the name of the .tps file (string)
@@ -748,27 +754,32 @@ def load_rubar2d_and_create_grid(name_hdf5, geofile, tpsfile, pathgeo, pathtps,
     :param q: used by the second thread to get the error back to the GUI at the end of the thread
     :param print_cmd: if True the print command is directed in the cmd, False if directed to the GUI
     :param fig_opt: the figure option, used here to get the minimum water height to have a wet node (can be > 0)
+    :param timestep_sel: the chosen time steps by index (see load_hdf5.get_timestep_selection()). All by default.
+    :param time_sel: the chosen range of time as tmin:tmax (see load_hdf5.get_timestep_selection())
     """
 
     # minimum water height
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     minwh = fig_opt['min_height_hyd']
 
-    # create the empy output
-    inter_vel_all_t = []
-    inter_h_all_t = []
-    ikle_all_t = []
-    point_all_t = []
-    point_c_all_t = []
-
-    # load data
+    # load the grid
     if not print_cmd:
         sys.stdout = mystdout = StringIO()
-    [vel_cell, height_cell, coord_p, coord_c, ikle_base, timestep] \
-        = load_rubar2d(geofile, tpsfile, pathgeo, pathtps, path_im, False)  # True to get figure
-
-    if vel_cell == [-99]:
+    [ikle_base, coord_p, coord_c, ind_cell, nb_cell] = load_rubar2d_grid(geofile, pathgeo)
+
+    # the chosen time steps (the .tps file is read a first time to get the time only if needed)
+    ind_t = None
+    if nb_cell == [-99]:
+        ind_t = [-99]
+    elif timestep_sel or time_sel:
+        timestep = get_tps_2d_time(tpsfile, pathtps, nb_cell)
+        ind_t = load_hdf5.get_timestep_selection(len(timestep), timestep_sel, time_sel, timestep)
+    hdf5 = None
+    if ind_t != [-99]:
+        hdf5 = load_hdf5.HydroHdf5Writer(name_hdf5, name_prj, path_prj, model_type, path_hdf5)
+
+    if hdf5 is None or hdf5.file is None:
         print('Error: Rubar data not loaded.')
         sys.stdout = sys.__stdout__
         if q:
@@ -780,37 +791,29 @@ def load_rubar2d_and_create_grid(name_hdf5, geofile, tpsfile, pathgeo, pathtps,
     # create grid
     # first, the grid for the whole profile (no velcoity or height data)
     # because we have a "whole" grid for 1D model before the actual time step
-    inter_h_all_t.append([[]])
-    inter_vel_all_t.append([[]])
-    point_all_t.append([coord_p])
-    point_c_all_t.append([coord_c])
-    ikle_all_t.append([ikle_base])
+    hdf5.add_timestep([ikle_base], [coord_p], [coord_c], [[]], [[]])
 
     # the grid data for each time step
     warn1 = False
-    for t in range(0, len(vel_cell)):
+    vtx_all = []
+    wts_all = []
+    timestep_str = []
+    for [t, timestep_t, height_cell, vel_cell] in iter_tps_2d(tpsfile, pathtps, nb_cell, ind_t):
         # get data no the node (and not on the cells) by linear interpolation
-        if t == 0:
-            [vel_node, height_node, vtx_all, wts_all] = manage_grid_8.pass_grid_cell_to_node_lin([coord_p],
-                                                                        [coord_c], vel_cell[t],height_cell[t], warn1)
-        else:
-            [vel_node, height_node, vtx_all, wts_all] = manage_grid_8.pass_grid_cell_to_node_lin([coord_p], [coord_c],
-                                                                 vel_cell[t], height_cell[t], warn1, vtx_all, wts_all)
+        [vel_node, height_node, vtx_all, wts_all] = manage_grid_8.pass_grid_cell_to_node_lin([coord_p], [coord_c],
+                                    [vel_cell[ind_cell]], [height_cell[ind_cell]], warn1, vtx_all, wts_all,
+                                    path_hdf5)
         # cut the grid to the water limit
         [ikle, point_all, water_height, velocity] = manage_grid_8.cut_2d_grid(ikle_base, coord_p, height_node[0],
                                                                               vel_node[0], minwh)
-
-        inter_h_all_t.append([water_height])
-        inter_vel_all_t.append([velocity])
-        point_all_t.append([point_all])
-        point_c_all_t.append([[]])
-        ikle_all_t.append([ikle])
+        hdf5.add_timestep([ikle], [point_all], [[]], [velocity], [water_height])
+        timestep_str.append(str(timestep_t))
         warn1 = False
+    if not timestep_str:
+        print('Error: No time step was loaded from the .tps file.\n')
 
     # save data
-    timestep_str = list(map(str, timestep))
-    load_hdf5.save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle_all_t, point_all_t, point_c_all_t,
-                        inter_vel_all_t, inter_h_all_t, sim_name=timestep_str)
+    hdf5.close(sim_name=timestep_str)
 
     if not print_cmd:
         sys.stdout = sys.__stdout__
@@ -833,6 +836,33 @@ def load_rubar2d(geofile, tpsfile, pathgeo, pathtps, path_im, save_fig):
     :return: velocity and height at the center of the cells, the coordinate of the point of the cells,
              the coordinates of the center of the cells and the connectivity table.
     """
+    [ikle, xy, coord_c, ind_cell, nb_cell] = load_rubar2d_grid(geofile, pathgeo)
+    if nb_cell == [-99]:
+        return [-99], [-99], [-99], [-99], [-99], [-99]
+    [timestep, h, v] = load_tps_2d(tpsfile, pathtps, nb_cell)
+    if timestep == [-99]:
+        return [-99], [-99], [-99], [-99], [-99], [-99]
+    # there is an extra [] for the case where we more than one reach
+    h = [[h_t[ind_cell]] for h_t in h]
+    v = [[v_t[ind_cell]] for v_t in v]
+    if save_fig:
+        figure_rubar2d(xy, coord_c, ikle, v, h, path_im, [-1])
+
+    return v, h, xy, coord_c, ikle, timestep
+
+
+def load_rubar2d_grid(geofile, pathgeo):
+    """
+    This function loads the grid of the RUBAR data in 2D (from the .mai or .dat file) and makes it triangular
+    (see get_triangular_grid()).
+
+    :param geofile: the name of the .mai or .dat file which contains the connectivity table and the coordinates (string)
+    :param pathgeo: path to the geo file (string)
+    :return: the triangular connectivity table, the coordinate of the points, the coordinates of the center of the
+             cells, the original cell of each triangular cell (to get the data by cell on the new grid) and the
+             number of original cells. The last output is [-99] if the grid could not be loaded.
+    """
+    failload = [-99], [-99], [-99], [-99], [-99]
 
     blob, ext = os.path.splitext(geofile)
     if ext == '.mai':
@@ -840,13 +870,19 @@ def load_rubar2d(geofile, tpsfile, pathgeo, pathtps, path_im, save_fig):
     elif ext == '.dat':
         [ikle, xy, coord_c, nb_cell] = load_dat_2d(geofile, pathgeo)
     else:
-        return [-99], [-99], [-99], [-99], [-99], [-99]
-    [timestep, h, v] = load_tps_2d(tpsfile, pathtps, nb_cell)
-    [ikle, coord_c, xy, h, v] = get_triangular_grid(ikle, coord_c, xy, h, v)
-    if save_fig:
-        figure_rubar2d(xy, coord_c, ikle, v, h, path_im, [-1])
+        print('Error: The geometry file of Rubar 2D should be a .mai or a .dat file.\n')
+        return failload
+    if nb_cell == [-99]:
+        return failload
 
-    return v, h, xy, coord_c, ikle, timestep
+    # the data of the original cells is given to the new cells with ind_cell (one "time step" with the cell numbers)
+    ind_cell = [np.arange(nb_cell)]
+    [ikle, coord_c, xy, ind_cell, blob] = get_triangular_grid(ikle, coord_c, xy, ind_cell, ind_cell)
+    if isinstance(xy, list):
+        return failload
+    ind_cell = np.array(ind_cell[0][0], dtype=np.int64)
+
+    return ikle, xy, coord_c, ind_cell, nb_cell
 
 
 def load_mai_2d(geofile, path):
@@ -854,6 +890,8 @@ def load_mai_2d(geofile, path):
     The function to load the geomtery info for the 2D case when we use the .mai file. It would also be possible
     to use the .dat file. In fact, it is advised to use the dat file when possible as there are more info in the .dat file.
 
+    The numbers are converted with numpy by block (see get_number() and get_fixed_width_number()) and not one by one.
+
     :param geofile: the .mai file which contain the connectivity table and the (x,y)
     :param path: the path to this file
     :return: connectivity table, point coordinates, coordinates of the cell centers
@@ -877,65 +915,46 @@ def load_mai_2d(geofile, path):
     data_geo2d = data_geo2d.splitlines()
     # extract nb cells
     try:
-        nb_cell = np.int(data_geo2d[0])
+        nb_cell = int(data_geo2d[0])
     except ValueError:
         print('Error: Could not extract the number of cells from the .mai file.\n')
         return [-99], [-99], [-99], [-99]
-        nb_cell = 0
     # extract connectivity table, not always triangle
-    data_l = data_geo2d[1].split()
-    m = 0
-    ikle = []
-    while len(data_l) > 1:
-        m += 1
-        if m == len(data_geo2d):
-            print('Error: Could not extract the connectivity table from the .mai file.\n')
-            return [-99], [-99], [-99], [-99]
-        data_l = data_geo2d[m].split()
-        ind_l = np.zeros(len(data_l)-1, dtype=np.int)
-        for i in range(0, len(data_l)-1):
-            try:
-                ind_l[i] = int(data_l[i+1]) - 1
-            except ValueError:
-                print('Error: Could not extract the connectivity table from the .mai file.\n')
-                return [-99], [-99], [-99], [-99]
-        ikle.append(ind_l)
+    # the table stops at the first line with less than two numbers (the number of coordinates)
+    nb_by_line = get_number_by_line(data_geo2d[1:])
+    ind_end = np.flatnonzero(nb_by_line <= 1)
+    if len(ind_end) == 0:
+        print('Error: Could not extract the connectivity table from the .mai file.\n')
+        return [-99], [-99], [-99], [-99]
+    m = ind_end[0] + 1
+    try:
+        [ikle, nb_p] = get_connectivity_table(data_geo2d[1:m], nb_by_line[:m - 1])
+    except ValueError:
+        print('Error: Could not extract the connectivity table from the .mai file.\n')
+        return [-99], [-99], [-99], [-99]
 
-    if len(ikle) != nb_cell+1:
+    if len(nb_p) != nb_cell:
         print('Warning: some cells might be missing.\n')
     # nb coordinates
     try:
-        nb_coord = np.int(data_geo2d[m])
+        nb_coord = int(data_geo2d[m])
     except ValueError:
         print('Error: Could not extract the number of coordinates from the .mai file.\n')
         nb_coord = 0
     # extract coordinates
-    data_f = []
-    m += 1
-    for mi in range(m, len(data_geo2d)):
-        data_str = data_geo2d[mi]
-        l = 0
-        while l < len(data_str):
-            try:
-                data_f.append(float(data_str[l:l + 8]))  # the length of number is eight.
-                l += 8
-            except ValueError:
-                print('Error: Could not extract the coordinates from the .mai file.\n')
-                return [-99], [-99], [-99], [-99]
+    try:
+        data_f = get_fixed_width_number(data_geo2d[m + 1:])  # the length of number is eight.
+    except ValueError:
+        print('Error: Could not extract the coordinates from the .mai file.\n')
+        return [-99], [-99], [-99], [-99]
     # separe x and z
     x = data_f[0:nb_coord]  # choose every 2 float
     y = data_f[nb_coord:]
     xy = np.column_stack((x, y))
 
-    # find the center point of each cellss
-    # slow because number of point of a cell changes
-    coord_c = []
-    for c in range(0, nb_cell):
-        ikle_c = ikle[c]
-        xy_c = [0, 0]
-        for i in range(0, len(ikle_c)):
-            xy_c += xy[ikle_c[i]]
-        coord_c.append(xy_c/len(ikle_c))
+    # find the center point of each cells
+    coord_c = list(fan_triangulation.get_cell_center(ikle, nb_p, xy))
+    ikle = np.split(ikle, np.cumsum(nb_p)[:-1])
 
     return ikle, xy, coord_c, nb_cell
 
@@ -946,6 +965,9 @@ def load_dat_2d(geofile, path):
        The .dat file has the same role than the .mai file but with more information (number of side and more
        complicated connectivity table).
 
+       The numbers are converted with numpy by block (see get_number() and get_fixed_width_number()) and not one by
+       one.
+
        :param geofile: the .dat file which contain the connectivity table and the (x,y)
        :param path: the path to this file
        :return: connectivity table, point coordinates, coordinates of the cell centers
@@ -969,89 +991,215 @@ def load_dat_2d(geofile, path):
     data_geo2d = data_geo2d.splitlines()
     # extract nb cells
     try:
-        nb_cell = np.int(data_geo2d[0])
+        nb_cell = int(data_geo2d[0])
     except ValueError:
         print('Error: Could not extract the number of cells from the .dat file.\n')
         return [-99], [-99], [-99], [-99]
-        nb_cell = 0
     # extract connectivity table, not always triangle
     # in the .dat file we want only one line out for three
-    data_l = data_geo2d[1].split()
-    m2 = 2
-    m = 1
-    ikle = []
-    while m < nb_cell*3:
-        if m >= len(data_geo2d):
-            print('Error: Could not extract the connectivity table from the .dat file.\n')
-            return [-99], [-99], [-99], [-99]
-        data_l = data_geo2d[m].split()
-        if m2 == m:
-            ind_l = np.zeros(len(data_l) - 1, dtype=np.int)
-            for i in range(0, len(data_l) - 1):
-                try:
-                    ind_l[i] = int(data_l[i + 1]) - 1
-                except ValueError:
-                    print('Error: Could not extract the connectivity table from the .dat file.\n')
-                    return [-99], [-99], [-99], [-99]
-            ikle.append(ind_l)
-            m2 += 3
-        m += 1
-
-    if len(ikle) != nb_cell:
-        print('Warning: some cells might be missing.\n')
+    if len(data_geo2d) < nb_cell * 3:
+        print('Error: Could not extract the connectivity table from the .dat file.\n')
+        return [-99], [-99], [-99], [-99]
+    data_l = data_geo2d[2:nb_cell * 3:3]
+    try:
+        [ikle, nb_p] = get_connectivity_table(data_l, get_number_by_line(data_l))
+    except ValueError:
+        print('Error: Could not extract the connectivity table from the .dat file.\n')
+        return [-99], [-99], [-99], [-99]
 
     # extract the number of side (not needed)
-    m +=1
+    m = nb_cell * 3 + 1
     nb_side = int(data_geo2d[m])
     # and directly go to coordinate
-    m += nb_side * 2 +1
+    m += nb_side * 2 + 1
 
     # nb coordinates
     try:
-        nb_coord = np.int(data_geo2d[m])
+        nb_coord = int(data_geo2d[m])
     except ValueError:
         print('Error: Could not extract the number of coordinates from the .dat file.\n')
         nb_coord = 0
-    # extract coordinates
-    data_f = []
+    # extract coordinates (the lines are read until there is 2*nb_coord numbers)
     m += 1
-    c = 0
-    while c< 2*nb_coord and c < 10**8:
-        data_str = data_geo2d[m]
-        l = 0
-        while l < len(data_str):
-            try:
-                data_f.append(float(data_str[l:l + 8]))  # the length of number is eight.
-                l += 8
-                c +=1
-            except ValueError:
-                print('Error: Could not extract the coordinates from the .dat file.\n')
-                print(data_geo2d[mi])
-                return [-99], [-99], [-99], [-99]
-        m += 1
+    nb_by_line = np.cumsum([-(-len(data_str) // 8) for data_str in data_geo2d[m:]])  # the length of number is eight.
+    m_end = m + np.searchsorted(nb_by_line, 2 * nb_coord) + 1
+    if nb_coord <= 0:
+        m_end = m
+    elif m_end > len(data_geo2d):
+        print('Error: Could not extract the coordinates from the .dat file.\n')
+        return [-99], [-99], [-99], [-99]
+    try:
+        data_f = get_fixed_width_number(data_geo2d[m:m_end])
+    except ValueError:
+        print('Error: Could not extract the coordinates from the .dat file.\n')
+        return [-99], [-99], [-99], [-99]
     # separe x and z
     x = data_f[0:nb_coord]  # choose every 2 float
     y = data_f[nb_coord:]
     xy = np.column_stack((x, y))
 
-    # find the center point of each cellss
-    # slow because number of point of a cell changes
-    coord_c = []
-
-    for c in range(0, nb_cell):
-        ikle_c = ikle[c]
-        xy_c = [0, 0]
-        for i in range(0, len(ikle_c)):
-            xy_c += xy[ikle_c[i]]
-        coord_c.append(xy_c / len(ikle_c))
+    # find the center point of each cells
+    coord_c = list(fan_triangulation.get_cell_center(ikle, nb_p, xy))
+    ikle = np.split(ikle, np.cumsum(nb_p)[:-1])
 
     return ikle, xy, coord_c, nb_cell
 
 
+def get_number_by_line(lines):
+    """
+    This function counts the numbers (in fact, the words separated by white spaces) on each line.
+
+    :param lines: the lines of text (list of string)
+    :return: the number of words by line (np.array)
+    """
+    data = np.frombuffer('\n'.join(lines).encode('utf-8'), dtype=np.uint8)
+    # the line of a word is the number of newline before its start
+    line_of_word = np.cumsum(data == 10)[get_number_start(data, data <= 32)]
+    return np.bincount(line_of_word, minlength=len(lines))
+
+
+def get_connectivity_table(lines, nb_by_line):
+    """
+    This function reads the connectivity table of the .mai or .dat file of rubar 2D. There is one cell by line and
+    each line is the number of points of the cell followed by the points of the cell (starting at one).
+
+    :param lines: the lines of the file with the connectivity table (one by cell)
+    :param nb_by_line: the number of numbers on each line (see get_number_by_line())
+    :return: the points of all cells one after the other (starting at zero) and the number of points by cell.
+             A ValueError is raised if the table can not be read.
+    """
+    nb_by_line = np.asarray(nb_by_line, dtype=np.int64)
+    if np.any(nb_by_line < 1):
+        raise ValueError('A line of the connectivity table is empty.')
+    ikle = get_number('\n'.join(lines), np.sum(nb_by_line), dtype=np.int64)
+    # remove the first number of each line, the number of points is known with nb_by_line
+    ikle = np.delete(ikle, np.cumsum(nb_by_line) - nb_by_line) - 1
+    return ikle, nb_by_line - 1
+
+
+def get_number_start(data, is_sp=None):
+    """
+    This function finds the start of each number (or each word) in a text. The words are separated by white spaces
+    or control characters (all bytes smaller or equal to 32).
+
+    :param data: the text (bytes)
+    :param is_sp: the white spaces in data if already known (np.array of bool)
+    :return: the index of the first byte of each word (np.array)
+    """
+    if is_sp is None:
+        is_sp = np.frombuffer(data, dtype=np.uint8) <= 32
+    return np.flatnonzero(~is_sp & np.concatenate(([True], is_sp[:-1])))
+
+
+def get_number(data, nb, dtype=np.float64):
+    """
+    This function converts a text with numbers separated by white spaces into a np.array. The conversion is done
+    by numpy in one go, which is much faster than float() on each word.
+
+    :param data: the text (string or bytes)
+    :param nb: the expected number of numbers in the text
+    :param dtype: the type of the numbers
+    :return: the numbers (np.array). A ValueError is raised if the text can not be converted.
+    """
+    try:
+        with warnings.catch_warnings():
+            # old numpy version only warns when the text is not all converted
+            warnings.simplefilter('error', DeprecationWarning)
+            values = np.fromstring(data, dtype=dtype, sep=' ')
+    except DeprecationWarning:
+        raise ValueError('The text could not be converted to numbers.')
+    if len(values) != nb:
+        raise ValueError('The text could not be converted to numbers.')
+    return values
+
+
+def get_fixed_width_number(lines, width=8):
+    """
+    This function converts lines of numbers with a fixed width (and possibly no space between them) into a
+    np.array, as float(line[l:l + width]) would do for each number. The last number of a line can be shorter.
+
+    :param lines: the lines of text (list of string)
+    :param width: the number of characters by number
+    :return: the numbers (np.array). A ValueError is raised if the text can not be converted.
+    """
+    data = ''.join([data_str.ljust(-(-len(data_str) // width) * width) for data_str in lines])
+    return np.frombuffer(data.encode('ascii'), dtype='S' + str(width)).astype(np.float64)
+
+
+def iter_number_block(filename_path, nb_value, ind_block=None, nb_keep=None, chunk_size=2**24):
+    """
+    A generator which reads a text file made of blocks of numbers with a fixed size (such as the time steps of
+    the .tps file of rubar 2D). The file is read by chunk and each block is converted directly in a np.array, so that
+    only one chunk and one block is in memory at the time. The numbers of the blocks which are not chosen are
+    counted but not converted and the reading stops after the last chosen block.
+
+    :param filename_path: the name of the file with the path
+    :param nb_value: the number of numbers by block
+    :param ind_block: the chosen blocks (list of index). If None, all blocks are given.
+    :param nb_keep: only the first nb_keep numbers of each block are converted and given. If None, all numbers.
+    :param chunk_size: the number of bytes read together
+    :return: the index of the block and its numbers (np.array). An IOError is raised if the file can not be open
+             and a ValueError if the numbers can not be converted.
+    """
+    if nb_keep is None or nb_keep > nb_value:
+        nb_keep = nb_value
+    if ind_block is not None:
+        ind_block = set(ind_block)
+        if not ind_block:
+            return
+        b_max = max(ind_block)
+    b = 0
+    filled = 0
+    block = None
+    rest = b''
+    with open(filename_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            data = rest + chunk
+            rest = b''
+            is_sp = np.frombuffer(data, dtype=np.uint8) <= 32
+            if chunk:
+                # the last number could be cut, it is kept for the next chunk
+                ind_sp = np.flatnonzero(is_sp)
+                cut = ind_sp[-1] + 1 if len(ind_sp) > 0 else 0
+                rest = data[cut:]
+                data = data[:cut]
+                is_sp = is_sp[:cut]
+            start = get_number_start(data, is_sp)
+            nb_data = len(start)
+            i = 0
+            while i < nb_data:
+                nb = min(nb_value - filled, nb_data - i)
+                chosen = ind_block is None or b in ind_block
+                if chosen:
+                    if filled == 0:
+                        block = np.empty((nb_keep,))
+                    nb_conv = min(filled + nb, nb_keep) - filled
+                    if nb_conv > 0:
+                        end = start[i + nb_conv] if i + nb_conv < nb_data else len(data)
+                        block[filled:filled + nb_conv] = get_number(data[start[i]:end], nb_conv)
+                filled += nb
+                i += nb
+                if filled == nb_value:
+                    if chosen:
+                        yield b, block
+                    b += 1
+                    filled = 0
+                    if ind_block is not None and b > b_max:
+                        return
+            if not chunk:
+                break
+    if filled > 0:
+        print('Warning: The last block of numbers of the file ' + os.path.basename(filename_path) +
+              ' is not complete. It is not loaded.\n')
+
+
 def load_tps_2d(tpsfile, path, nb_cell):
     """
     The function to load the output data in the 2D rubar case. The geometry file (.mai or .dat) should be loaded before.
 
+    The file is read time step by time step with iter_number_block().
+
     :param tpsfile: the name of the file with the data for the 2d case
     :param path: the path to the tps file.
     :param nb_cell: the number of cell extracted from the .mai file
@@ -1062,54 +1210,103 @@ def load_tps_2d(tpsfile, path, nb_cell):
     blob, ext = os.path.splitext(tpsfile)
     if ext != '.tps':
         print('Warning: The fils does not seem to be of .tps type.\n')
-    # open file
-    try:
-        with open(filename_path, 'rt') as f:
-            data_tps = f.read()
-    except IOError:
-        print('Error: The .tps file does not exist.\n')
-        return [-99], [-99], [-99]
-    data_tps = data_tps.split()
     # get data and transform into float
-    i = 0
     t = []
     h = []
     v = []
-    while i < len(data_tps):
-        try:
-            # time
-            ti = np.float(data_tps[i])
-            t.append(ti)
-            i += 1
-            hi = np.array(list(map(float, data_tps[i:i+nb_cell])))
+    try:
+        for [i, data_t] in iter_number_block(filename_path, 1 + 3 * nb_cell):
+            [hi, vi] = get_tps_2d_data(data_t, nb_cell)
+            t.append(float(data_t[0]))
             h.append(hi)
-            i += nb_cell
-            qve = np.array(list(map(float, data_tps[i:i+nb_cell])))
-            i += nb_cell
-            que = np.array(list(map(float, data_tps[i:i + nb_cell])))
-            i += nb_cell
-            # velocity
-            hiv = np.copy(hi)
-            hiv[hiv == 0] = -99  # avoid division by zeros
-            if len(que) != len(qve):
-                np.set_printoptions(threshold=np.inf)
-            vi = np.sqrt((que/hiv)**2 + (qve/hiv)**2)
-            vi[hi == 0] = 0  # get realistic again
             v.append(vi)
-        except ValueError:
-            print('Error: the data could not be extracted from the .tps file. Error at number ' + str(i) + '.\n')
-            return [-99], [-99], [-99]
+    except IOError:
+        print('Error: The .tps file does not exist.\n')
+        return [-99], [-99], [-99]
+    except ValueError:
+        print('Error: the data could not be extracted from the .tps file. Error at time step ' + str(len(t)) + '.\n')
+        return [-99], [-99], [-99]
 
     return t, h, v
 
 
+def get_tps_2d_data(data_t, nb_cell):
+    """
+    This function gets the water height and the velocity by cell from the data of one time step of the .tps file
+    (time, h, qve and que by cell).
+
+    :param data_t: the data of the time step (np.array)
+    :param nb_cell: the number of cell extracted from the .mai file
+    :return: h and v by cell (np.array)
+    """
+    hi = np.array(data_t[1:1 + nb_cell])
+    qve = data_t[1 + nb_cell:1 + 2 * nb_cell]
+    que = data_t[1 + 2 * nb_cell:]
+    # velocity
+    hiv = np.copy(hi)
+    hiv[hiv == 0] = -99  # avoid division by zeros
+    vi = np.sqrt((que / hiv) ** 2 + (qve / hiv) ** 2)
+    vi[hi == 0] = 0  # get realistic again
+    return hi, vi
+
+
+def get_tps_2d_time(tpsfile, path, nb_cell):
+    """
+    This function reads the time of each time step in the .tps file of rubar 2D (without the data).
+
+    :param tpsfile: the name of the file with the data for the 2d case
+    :param path: the path to the tps file.
+    :param nb_cell: the number of cell extracted from the .mai file
+    :return: the time of each time step (list)
+    """
+    filename_path = os.path.join(path, tpsfile)
+    timestep = []
+    try:
+        for [i, data_t] in iter_number_block(filename_path, 1 + 3 * nb_cell, nb_keep=1):
+            timestep.append(float(data_t[0]))
+    except IOError:
+        print('Error: The .tps file does not exist.\n')
+        return []
+    except ValueError:
+        print('Error: the time could not be extracted from the .tps file.\n')
+        return []
+    return timestep
+
+
+def iter_tps_2d(tpsfile, path, nb_cell, ind_t=None):
+    """
+    A generator which gives the data of the chosen time steps of the .tps file of rubar 2D, one time step at the
+    time. The other time steps are skipped without being converted to float (see iter_number_block()). The reading
+    stops after the last chosen time step.
+
+    :param tpsfile: the name of the file with the data for the 2d case
+    :param path: the path to the tps file.
+    :param nb_cell: the number of cell extracted from the .mai file
+    :param ind_t: the chosen time steps (list of index). If None, all time steps are given.
+    :return: the index of the time step, the time, h and v by cell (np.array)
+    """
+    filename_path = os.path.join(path, tpsfile)
+    # check extension
+    blob, ext = os.path.splitext(tpsfile)
+    if ext != '.tps':
+        print('Warning: The fils does not seem to be of .tps type.\n')
+    t = 0
+    try:
+        for [t, data_t] in iter_number_block(filename_path, 1 + 3 * nb_cell, ind_t):
+            [hi, vi] = get_tps_2d_data(data_t, nb_cell)
+            yield t, float(data_t[0]), hi, vi
+    except IOError:
+        print('Error: The .tps file does not exist.\n')
+    except ValueError:
+        print('Error: the data could not be extracted from the .tps file. Error after time step ' + str(t) + '.\n')
+
+
 def get_triangular_grid(ikle, coord_c, xy, h, v):
     """
     In Rubar, it is possible to have non-triangular cells. It is possible to have a grid composed of a mix
     of pentagonal, 4-sided and triangualr cells. This function transform the "mixed" grid to a triangular grid. For this,
     it uses the centroid of each cell with more than three side and it create a triangle by side (linked with the
-    center of the cell). A similar function exists in hec-ras2D.py, but, as there is only one reach in rubar
-    and because ikle is different in hec-ras, it was hard to marge both functions together.
+    center of the cell). The triangulation is done in fan_triangulation.py, which is also used for hec-ras 2D.
 
     :param ikle: the connectivity table (list)
     :param coord_c: the coordinate of the centroid of the cell (list)
@@ -1117,60 +1314,28 @@ def get_triangular_grid(ikle, coord_c, xy, h, v):
     :param h: data on water height
     :param v: data on velocity
     :return: the updated ikle, coord_c (the center of the cell , must be updated ) and xy (the grid coordinate)
-    """
 
-    # this is important for speed. np.array are slow to append value
-    xy = list(xy)
-    h2 = []
-    v2 = []
-    nbtime = len(v)
-    for t in range(0, nbtime):
-        h2.append(list(h[t]))
-        v2.append(list(v[t]))
+    **Technical comments**
 
-    # now create the triangular grid
-    likle = len(ikle)
-    for c in range(0, likle):
-        ikle_c = ikle[c]
-        if len(ikle_c) == 0:
-            del ikle[c]
-        elif len(ikle_c) < 3:
+    The data of the new cells is the data of the original cell. The original cell of each new cell is given by
+    fan_triangulation.split_cells() and the data of all time steps is then taken with this index array, so that the
+    data is not copied value by value for each time step.
+    """
+
+    # cells with one or two points
+    for ikle_c in ikle:
+        if 0 < len(ikle_c) < 3:
             print('Error: A cell with an area of 0 is found.\n')
             print(ikle_c)
             return [-99], [-99], [-99], [-99], [-99]
 
-        elif len(ikle_c) > 3:
-            # the new cell is compose of triangle where one point is the centroid and two points are side of
-            # the polygon which composed the cells before. The first new triangular cell take the place of the old one
-            # (to avoid changing the order of ikle), the other are added at the end
-            # no change to v and h for the first triangular data, change afterwards
-            xy.append(coord_c[c])
-            # first triangular cell
-            ikle[c] = [ikle_c[0], ikle_c[1], len(xy) - 1]
-            p1 = xy[len(xy)-1]
-            coord_c[c] = (xy[ikle_c[0]] + xy[ikle_c[1]] + p1)/3
-            # next triangular cell
-            for s in range(1, len(ikle_c)-1):
-                ikle.append([ikle_c[s], ikle_c[s+1], len(xy) - 1])
-                coord_c.append((xy[ikle_c[s]] + xy[ikle_c[s+1]] + p1) / 3)
-                for t in range(0, nbtime):
-                    v2[t].append(v[t][c])
-                    h2[t].append(h[t][c])
-            # last triangular cells
-            ikle.append([ikle_c[-1], ikle_c[0], len(xy) - 1])
-            coord_c.append((xy[ikle_c[-1]] + xy[ikle_c[0]] + p1) / 3)
-            for t in range(0, nbtime):
-                v2[t].append(v[t][c])
-                h2[t].append(h[t][c])
-
-    xy = np.array(xy)
-    v = []
-    h = []
-    for t in range(0, nbtime):
-        # there is an extra [] for the case where we more than one reach
-        # to be corrected if we get multi-reach RUBAR simulation
-        h.append([np.array(h2[t])])
-        v.append([np.array(v2[t])])
+    # now create the triangular grid
+    [ikle, coord_c, xy, parent] = fan_triangulation.split_cells(ikle, coord_c, xy)
+
+    # there is an extra [] for the case where we more than one reach
+    # to be corrected if we get multi-reach RUBAR simulation
+    h = [[np.asarray(h_t)[parent]] for h_t in h]
+    v = [[np.asarray(v_t)[parent]] for v_t in v]
 
     return ikle, coord_c, xy, v, h
 
@@ -1187,6 +1352,7 @@ def figure_rubar2d(xy, coord_c, ikle, v, h, path_im, time_step=[-1]):
     :param path_im: the path where to save the figure
     :param time_step: The time step which will be plotted
     """
+    import matplotlib.pyplot as plt
     coord_p = np.array(xy)
     coord_c = np.array(coord_c)
     #plt.close()
@@ -1219,8 +1385,8 @@ def figure_rubar2d(xy, coord_c, ikle, v, h, path_im, time_step=[-1]):
     plt.xlabel('x coord []')
     plt.ylabel('y coord []')
     plt.title('Grid ')
-    plt.savefig(os.path.join(path_im, "RUBAR_grid_" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
-    plt.savefig(os.path.join(path_im, "RUBAR_grid" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+    plt.savefig(os.path.join(path_im, "RUBAR_grid_" + fig_option.get_time_stamp() + '.png'))
+    plt.savefig(os.path.join(path_im, "RUBAR_grid" + fig_option.get_time_stamp() + '.pdf'))
     #plt.close()  # do not forget to close or the program crash
 
     for t in time_step:
@@ -1228,18 +1394,18 @@ def figure_rubar2d(xy, coord_c, ikle, v, h, path_im, time_step=[-1]):
         h_t = np.array(h[t][0])  # 0 in case we have more than one reach
         hec_ras2D.scatter_plot(coord_c, h_t, 'Water Depth [m]', 'terrain', 8, t)
         plt.savefig(
-            os.path.join(path_im, "rubar2D_waterdepth_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
+            os.path.join(path_im, "rubar2D_waterdepth_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
         plt.savefig(
-            os.path.join(path_im, "rubar2D_waterdepth_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+            os.path.join(path_im, "rubar2D_waterdepth_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
         #plt.close()
 
         # plot velocity
         vel_c0 = np.array(v[t][0])
         hec_ras2D.scatter_plot(coord_c, vel_c0, 'Vel. [m/sec]', 'gist_ncar', 8, t)
         plt.savefig(
-                os.path.join(path_im, "rubar2D_vel_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'))
+                os.path.join(path_im, "rubar2D_vel_t" + str(t) + '_' + fig_option.get_time_stamp() + '.png'))
         plt.savefig(
-                os.path.join(path_im, "rubar2D_vel_t" + str(t) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'))
+                os.path.join(path_im, "rubar2D_vel_t" + str(t) + '_' + fig_option.get_time_stamp() + '.pdf'))
         #plt.close()
 
     # plt.show()
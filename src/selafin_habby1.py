@@ -19,21 +19,22 @@ import numpy as np
 import os
 import sys
 import warnings
-import matplotlib.pyplot as plt
-import time
 from io import StringIO
 from src import load_hdf5
-from src_GUI import output_fig_GUI
+from src import fig_option
 from src import manage_grid_8
 
 
 def load_telemac_and_cut_grid(name_hdf5, namefilet, pathfilet, name_prj, path_prj, model_type, nb_dim, path_hdf5, q=[],
-                              print_cmd=False, fig_opt={}):
+                              print_cmd=False, fig_opt={}, timestep_sel='', time_sel=''):
     """
     This function calls the function load_telemac and call the function cut_2d_grid(). Orginally, this function
     was part of the TELEMAC class in Hydro_GUI_2.py but it was separated to be able to have a second thread, which
     is useful to avoid freezing the GUI.
 
+    The chosen time steps are read, cut and saved in the hdf5 file one by one (see load_hdf5.HydroHdf5Writer), so
+    only one time step is in memory at the time.
+
     :param name_hdf5: the base name of the created hdf5 (string)
     :param namefilet: the name of the selafin file (string)
     :param pathfilet: the path to this file (string)
@@ -45,19 +46,26 @@ def load_telemac_and_cut_grid(name_hdf5, namefilet, pathfilet, name_prj, path_pr
     :param q: used by the second thread to get the error back to the GUI at the end of the thread
     :param print_cmd: if True the print command is directed in the cmd, False if directed to the GUI
     :param fig_opt: the figure option, used here to get the minimum water height to have a wet node (can be > 0)
+    :param timestep_sel: the chosen time steps by index (see load_hdf5.get_timestep_selection()). All by default.
+    :param time_sel: the chosen range of time as tmin:tmax (see load_hdf5.get_timestep_selection())
     """
     if not print_cmd:
         sys.stdout = mystdout = StringIO()
 
     # minimum water height
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     minwh = fig_opt['min_height_hyd']
 
-    # load data
-    [v, h, coord_p, ikle, coord_c, timestep] = load_telemac(namefilet, pathfilet)
+    # open the file and load the grid
+    [telemac_data, var_ind, coord_p, ikle, coord_c] = open_telemac(namefilet, pathfilet)
+    timestep = []
+    ind_t = [-99]
+    if not isinstance(telemac_data, list):
+        timestep = telemac_data.tags['times']
+        ind_t = load_hdf5.get_timestep_selection(len(timestep), timestep_sel, time_sel, timestep)
 
-    if isinstance(v,int) and v == [-99]:
+    if ind_t == [-99]:
         print('Error: Telemac data not loaded.')
         if q:
             sys.stdout = sys.__stdout__
@@ -66,24 +74,28 @@ def load_telemac_and_cut_grid(name_hdf5, namefilet, pathfilet, name_prj, path_pr
         else:
             return
 
-    # cut the grid to have the precise wet area and put data in new form
-    point_all_t = [[coord_p]]
-    ikle_all_t = [[ikle]]
-    point_c_all_t = [[coord_c]]
-    inter_h_all_t = [[]]
-    inter_vel_all_t = [[]]
-    for t in range(0, len(v)):
-        [ikle2, point_all, water_height, velocity] = manage_grid_8.cut_2d_grid(ikle, coord_p, h[t], v[t], minwh)
-        point_all_t.append([point_all])  # only one reach
-        ikle_all_t.append([ikle2])
-        point_c_all_t.append([[]])
-        inter_vel_all_t.append([velocity])
-        inter_h_all_t.append([water_height])
+    # the whole profile
+    hdf5 = load_hdf5.HydroHdf5Writer(name_hdf5, name_prj, path_prj, model_type, path_hdf5)
+    if hdf5.file is None:
+        print('Error: Telemac data not saved.')
+        if q:
+            sys.stdout = sys.__stdout__
+            q.put(mystdout)
+            return
+        else:
+            return
+    hdf5.add_timestep([ikle], [coord_p], [coord_c])
+
+    # cut the grid to have the precise wet area and save the data, time step by time step
+    for t in ind_t:
+        [v, h] = get_telemac_timestep(telemac_data, var_ind, t)
+        [ikle2, point_all, water_height, velocity] = manage_grid_8.cut_2d_grid(ikle, coord_p, h, v, minwh)
+        hdf5.add_timestep([ikle2], [point_all], [[]], [velocity], [water_height])  # only one reach
 
     # save data
-    timestep_str = list(map(str, timestep))
-    load_hdf5.save_hdf5(name_hdf5, name_prj, path_prj, model_type, nb_dim, path_hdf5, ikle_all_t, point_all_t, point_c_all_t,
-                        inter_vel_all_t, inter_h_all_t, sim_name=timestep_str)
+    timestep_str = [str(timestep[t]) for t in ind_t]
+    hdf5.close(sim_name=timestep_str)
+    del telemac_data
 
     if not print_cmd:
         sys.stdout = sys.__stdout__
@@ -104,6 +116,39 @@ def load_telemac(namefilet, pathfilet):
     """
     faiload = [-99], [-99], [-99], [-99], [-99], [-99]
 
+    [telemac_data, var_ind, coord_p, ikle, coord_c] = open_telemac(namefilet, pathfilet)
+    if isinstance(telemac_data, list):
+        return faiload
+
+    # time step name
+    nbtimes = telemac_data.tags['times'].size
+    timestep = telemac_data.tags['times']
+
+    # put the velocity and height data in the array and list
+    # only the needed variables are read, the height (and mean velocity) are views on the file
+    v = []
+    h = []
+    for t in range(0, nbtimes):
+        [vt, ht] = get_telemac_timestep(telemac_data, var_ind, t)
+        v.append(vt)
+        h.append(ht)
+
+    del telemac_data
+    return v, h, coord_p, ikle, coord_c, timestep
+
+
+def open_telemac(namefilet, pathfilet):
+    """
+    This function opens a selafin file with the Selafin class, finds the velocity and height variables and loads
+    the grid. The data of the time steps is read afterwards with get_telemac_timestep().
+
+    :param namefilet: the name of the selafin file (string)
+    :param pathfilet: the path to this file (string)
+    :return: the Selafin object, the index of the variables (mean velocity, velocity u, velocity v, water depth),
+             the coordinate of the points of the grid, the connectivity table and the center of the cells.
+    """
+    faiload = [-99], [-99], [-99], [-99], [-99]
+
     filename_path_res = os.path.join(pathfilet, namefilet)
     # load the data and do some test
     if not os.path.isfile(filename_path_res):
@@ -118,46 +163,18 @@ def load_telemac(namefilet, pathfilet):
         print('Error: The telemac file cannot be loaded.')
         return faiload
 
-    # time step name
-    nbtimes = telemac_data.tags['times'].size
-    timestep = telemac_data.tags['times']
+    # find the velocity and height variables based on their name (english or french)
+    var_ind = telemac_data.getvarindexes([['VITESSE MOY', 'MEAN VELOCITY'], ['VITESSE U', 'VELOCITY U'],
+                                          ['VITESSE V', 'VELOCITY V'], ['WATER DEPTH', "HAUTEUR D'EAU"]])
+    if var_ind[1] >= 0 and var_ind[2] >= 0:
+        var_ind[0] = -1
+    elif var_ind[0] < 0:
+        print('Error: The variable name of the telemec file were not recognized. (1) \n')
+        return faiload
+    if var_ind[3] < 0:
+        print('Error: The variable name of the telemec file were not recognized. (2) \n')
+        return faiload
 
-    # put the velocity and height data in the array and list
-    v = []
-    h = []
-    for t in range(0, nbtimes):
-        foundu = foundv = False
-        val_all = telemac_data.getvalues(t)
-        vt = []
-        ht = []
-
-        # load variable based on their name (english or french)
-        for id,n in enumerate(telemac_data.varnames):
-            n = n.decode('utf-8')
-            if 'VITESSE MOY' in n or 'MEAN VELOCITY' in n:
-                vt = val_all[:, id]
-            if 'VITESSE U' in n or 'VELOCITY U' in n:
-                vu = val_all[:, id]
-                foundu = True
-            if 'VITESSE V' in n or 'VELOCITY V' in n:
-                vv = val_all[:, id]
-                foundv = True
-            if 'WATER DEPTH' in n or "HAUTEUR D'EAU" in n:
-                ht = val_all[:, id]
-            if 'FOND' in n or 'BOTTOM' in n:
-                bt = val_all[:, id]
-
-        if foundu and foundv:
-            vt = np.sqrt(vu**2 + vv**2)
-
-        if len(vt) == 0:
-            print('Error: The variable name of the telemec file were not recognized. (1) \n')
-            return faiload
-        if len(ht) == 0:
-            print('Error: The variable name of the telemec file were not recognized. (2) \n')
-            return faiload
-        v.append(vt)
-        h.append(ht)
     coord_p = np.array([telemac_data.meshx, telemac_data.meshy])
     coord_p = coord_p.T
     ikle = telemac_data.ikle2
@@ -171,8 +188,25 @@ def load_telemac(namefilet, pathfilet):
     coord_c_y = 1.0 / 3.0 * (p1[:, 1] + p2[:, 1] + p3[:, 1])
     coord_c = np.array([coord_c_x, coord_c_y]).T
 
-    del telemac_data
-    return v, h, coord_p, ikle, coord_c, timestep
+    return telemac_data, var_ind, coord_p, ikle, coord_c
+
+
+def get_telemac_timestep(telemac_data, var_ind, t):
+    """
+    This function reads the velocity and the height of one time step of a selafin file. Only the needed variables
+    are read. The height (and the mean velocity) are read-only views on the file.
+
+    :param telemac_data: the Selafin object (see open_telemac())
+    :param var_ind: the index of the variables (see open_telemac())
+    :param t: the time step
+    :return: the velocity and the height by node
+    """
+    if var_ind[0] >= 0:
+        [vt, ht] = telemac_data.getvariablesview(t, [var_ind[0], var_ind[3]])
+    else:
+        [vu, vv, ht] = telemac_data.getvariablesview(t, [var_ind[1], var_ind[2], var_ind[3]])
+        vt = np.sqrt(vu**2 + vv**2)
+    return vt, ht
 
 
 def plot_vel_h(coord_p2, h, v, path_im, timestep=[-1]):
@@ -186,6 +220,7 @@ def plot_vel_h(coord_p2, h, v, path_im, timestep=[-1]):
      :param path_im: the path where the image should be saved (string)
      :param timestep: which time step should be plotted
     """
+    import matplotlib.pyplot as plt
     #plt.rcParams['figure.figsize'] = 7, 3
     #plt.close()
     plt.rcParams['font.size'] = 10
@@ -201,9 +236,9 @@ def plot_vel_h(coord_p2, h, v, path_im, timestep=[-1]):
         plt.title('Telemac data - water height at time step '+str(i))
         cbar = plt.colorbar()
         cbar.ax.set_ylabel('Water height [m]')
-        plt.savefig(os.path.join(path_im, "telemac_height_t" + str(i) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "telemac_height_t" + str(i) + '_' + fig_option.get_time_stamp() +
                                  '.png'))
-        plt.savefig(os.path.join(path_im, "telemac_height_t" + str(i) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "telemac_height_t" + str(i) + '_' + fig_option.get_time_stamp() +
                                  '.pdf'))
         #plt.close()
 
@@ -217,9 +252,9 @@ def plot_vel_h(coord_p2, h, v, path_im, timestep=[-1]):
         plt.title('Telemac data - velocity at time step '+str(i))
         cbar = plt.colorbar()
         cbar.ax.set_ylabel('Velocity [m/s]')
-        plt.savefig(os.path.join(path_im, "telemac_vel_t" + str(i) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "telemac_vel_t" + str(i) + '_' + fig_option.get_time_stamp() +
                                  '.png'))
-        plt.savefig(os.path.join(path_im, "telemac_vel_t" + str(i) + '_' + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+        plt.savefig(os.path.join(path_im, "telemac_vel_t" + str(i) + '_' + fig_option.get_time_stamp() +
                                  '.pdf'))
         #plt.close()
     #plt.show()
@@ -326,6 +361,7 @@ class Selafin(object):
             self.meshx = []
             self.meshy = []
             self.tags = {'cores':[], 'times':[]}
+            self.frames = None
         self.fole = {}
         self.fole.update({'name': ''})
         self.fole.update({'endian': self.file['endian']})
@@ -390,8 +426,8 @@ class Selafin(object):
             self.ndp2 = self.ndp3 / 2
         # ~~ Read the IKLE array ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         fileslf.seek(4, 1)
-        self.ikle3 = np.array(unpack(endian + str(self.nelem3 * self.ndp3)\
-                + 'i', fileslf.read(4 * self.nelem3 * self.ndp3))) - 1
+        self.ikle3 = np.frombuffer(fileslf.read(4 * self.nelem3 * self.ndp3), dtype=endian + 'i4')\
+            .astype(np.int64) - 1
         fileslf.seek(4, 1)
         self.ikle3 = self.ikle3.reshape((self.nelem3, self.ndp3))
         if self.nplan > 1:
@@ -401,8 +437,7 @@ class Selafin(object):
             self.ikle2 = self.ikle3
         # ~~ Read the IPOBO array ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
         fileslf.seek(4, 1)
-        self.ipob3 = np.asarray(unpack(endian + str(self.npoin3) + 'i', \
-            fileslf.read(4 * self.npoin3)))
+        self.ipob3 = np.frombuffer(fileslf.read(4 * self.npoin3), dtype=endian + 'i4').astype(np.int64)
         fileslf.seek(4, 1)
         self.ipob2 = self.ipob3[0:self.npoin2]
 
@@ -415,45 +450,86 @@ class Selafin(object):
         # ~~ Read the x-coordinates of the nodes ~~~~~~~~~~~~~~~~~~
         ftype, fsize = self.file['float']
         fileslf.seek(4, 1)
-        self.meshx = np.asarray(unpack(endian + str(self.npoin3) + ftype, \
-            fileslf.read(fsize * self.npoin3))[0:self.npoin2])
+        self.meshx = np.frombuffer(fileslf.read(fsize * self.npoin3), dtype=endian + ftype)\
+            .astype(np.float64)[0:self.npoin2]
         fileslf.seek(4, 1)
         # ~~ Read the y-coordinates of the nodes ~~~~~~~~~~~~~~~~~~
         fileslf.seek(4, 1)
-        self.meshy = np.asarray(unpack(endian + str(self.npoin3) + ftype, \
-            fileslf.read(fsize * self.npoin3))[0:self.npoin2])
+        self.meshy = np.frombuffer(fileslf.read(fsize * self.npoin3), dtype=endian + ftype)\
+            .astype(np.float64)[0:self.npoin2]
         fileslf.seek(4, 1)
 
     def gettimehistoryslf(self):
         """
-        Get the timesteps
+        Get the timesteps. All frames have the same size, so their positions are computed from the header and the
+        size of the file. The frames are then memory-mapped with numpy (self.frames) and the times are read from
+        this map without reading the values of the variables.
         """
         fileslf = self.file['hook']
         endian = self.file['endian']
         ftype, fsize = self.file['float']
-        ats = []
-        att = []
-        while True:
-            try:
-                att.append(fileslf.tell())
-                # ~~ Read AT ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-                fileslf.seek(4, 1)
-                ats.append(unpack(endian + ftype, fileslf.read(fsize))[0])
-                fileslf.seek(4, 1)
-                # ~~ Skip Values ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-                fileslf.seek(self.nvar * (4 + fsize * self.npoin3 + 4), 1)
-            except:
-                att.pop(len(att) - 1)   # since the last record failed the try
-                break
+        start = fileslf.tell()
+        fileslf.seek(0, 2)
+        file_size = fileslf.tell()
+        fileslf.seek(start)
+
+        # ~~ Structure of one frame: AT, then the values of each variable ~~
+        float_dtype = np.dtype(endian + ftype)
+        var_dtype = np.dtype({'names': ['val'], 'formats': [(float_dtype, (self.npoin3,))], 'offsets': [4],
+                              'itemsize': 4 + fsize * self.npoin3 + 4})
+        frame_size = 4 + fsize + 4 + self.nvar * var_dtype.itemsize
+        frame_dtype = np.dtype({'names': ['at', 'var'], 'formats': [float_dtype, (var_dtype, (self.nvar,))],
+                                'offsets': [4, 4 + fsize + 4], 'itemsize': frame_size})
+
+        # an incomplete last frame is ignored
+        nb_frame = (file_size - start) // frame_size
+        if nb_frame > 0:
+            self.frames = np.memmap(self.file['name'], dtype=frame_dtype, mode='r', offset=start,
+                                    shape=(nb_frame,))
+            ats = np.array(self.frames['at'], dtype=np.float64)
+        else:
+            self.frames = None
+            ats = np.array([])
+        att = [start + frame_size * i for i in range(0, nb_frame)]
         self.tags.update({'cores': att})
-        self.tags.update({'times': np.asarray(ats)})
+        self.tags.update({'times': ats})
+
+    def getvarindexes(self, names):
+        """
+        Get the index of the variables based on their names. A variable is found if one of the given names is in
+        its name (so that both english and french names can be given).
+
+        :param names: a list of names for each variable, for example [['VELOCITY U', 'VITESSE U'], ['WATER DEPTH']]
+        :return: the index of each variable or -1 if the variable is not found
+        """
+        varnames = [n.decode('utf-8', 'replace') for n in self.varnames]
+        varindexes = []
+        for names_v in names:
+            ind = -1
+            for id, n in enumerate(varnames):
+                if any(name_v in n for name_v in names_v):
+                    ind = id
+            varindexes.append(ind)
+        return varindexes
+
+    def getvariablesview(self, frame, varindexes):
+        """
+        Get the values of some variables at a particular time step, without copy. The arrays are read-only views
+        on the memory-mapped file, in the endianness and float size of the file. Only the pages of the requested
+        variables are read from the disk when the arrays are used.
+
+        :param frame: the time step
+        :param varindexes: the index of the variables
+        :return: a list with one array by variable
+        """
+        if self.frames is None or frame >= len(self.tags['cores']) or frame < 0:
+            return []
+        return [self.frames['var']['val'][frame, ivar] for ivar in varindexes]
 
     def getvariablesat(self, frame, varindexes):
         """
         Get the values for the variables at a particular time step
         """
-        fileslf = self.file['hook']
-        endian = self.file['endian']
         ftype, fsize = self.file['float']
         if fsize == 4:
             z = np.zeros((len(varindexes), self.npoin3), dtype=np.float32)
@@ -462,24 +538,15 @@ class Selafin(object):
         # if tags has 31 frames, len(tags)=31 from 0 to 30,
         # then frame should be >= 0 and < len(tags)
         if frame < len(self.tags['cores']) and frame >= 0:
-            fileslf.seek(self.tags['cores'][frame])
-            fileslf.seek(4 + fsize + 4, 1)
-            for ivar in range(self.nvar):
-                fileslf.seek(4, 1)
-                if ivar in varindexes:
-                    z[varindexes.index(ivar)] = unpack(endian + \
-                        str(self.npoin3) + ftype, \
-                        fileslf.read(fsize * self.npoin3))
-                else:
-                    fileslf.seek(fsize * self.npoin3, 1)
-                fileslf.seek(4, 1)
+            for i, val in enumerate(self.getvariablesview(frame, varindexes)):
+                z[i] = val
         return z
 
     def getvalues(self, t):
         """
         Get the values for the variables at time t
         """
-        varsor = self.getvariablesat(t, self.varindex)
+        varsor = self.getvariablesat(t, list(self.varindex))
         return varsor.transpose()
 
     def appendheaderslf(self):
@@ -0,0 +1,154 @@
+"""
+This file is part of the free software:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+import os
+import time
+from struct import pack
+import numpy as np
+
+# the record of one triangle in the shp file (polygon with one part and four points, the first point is repeated)
+SHP_TRI_DTYPE = np.dtype([('num', '>i4'), ('length', '>i4'), ('type', '<i4'), ('bbox', '<f8', (4,)),
+                          ('nb_part', '<i4'), ('nb_point', '<i4'), ('part', '<i4'), ('point', '<f8', (4, 2))])
+# the record of one triangle in the shx file
+SHX_TRI_DTYPE = np.dtype([('offset', '>i4'), ('length', '>i4')])
+# the size of the fields in the dbf file (the default size of pyshp)
+DBF_FIELD_SIZE = 50
+
+
+def write_tri_shapefile(name_shp, ikle_all, point_all, field_names=[], field_data=[], chunk_size=100000):
+    """
+    This function writes a shapefile of polygons with a triangular grid. It gives the same files than the
+    shapefile.Writer of pyshp (version 1.2) used with one w.poly(parts=[[p1, p2, p3, p1]]) by triangle, one
+    w.field(name, 'F') by field and one w.record() by triangle. However, the records are created from the arrays
+    with numpy and written by chunks, so that it is much faster for large grids.
+
+    :param name_shp: the name of the shapefile (with the path). The extension is replaced by .shp, .shx and .dbf.
+    :param ikle_all: the connectivity table of the triangles by reach
+    :param point_all: the coordinates of the points of the grid by reach
+    :param field_names: the names of the fields of the attribute table (float fields)
+    :param field_data: the data of each field for all triangles of all reaches (the reaches are given in the same
+           order than in ikle_all). One array by field.
+    :param chunk_size: the number of triangles written together
+    """
+    base = os.path.splitext(name_shp)[0]
+    ikle_all = [np.asarray(ikle_r, dtype=np.int64).reshape(-1, 3) if len(ikle_r) > 0 else np.zeros((0, 3), np.int64)
+                for ikle_r in ikle_all]
+    point_all = [np.asarray(point_r, dtype=np.float64) for point_r in point_all]
+    nb_tri = sum([len(ikle_r) for ikle_r in ikle_all])
+    rec_size = SHP_TRI_DTYPE.itemsize
+
+    # the bounding box of all triangles
+    bbox = [0.0] * 4
+    if nb_tri > 0:
+        xy = np.concatenate([point_all[r][ikle_all[r].flatten(), :2] for r in range(0, len(ikle_all))])
+        bbox = [np.min(xy[:, 0]), np.min(xy[:, 1]), np.max(xy[:, 0]), np.max(xy[:, 1])]
+        del xy
+
+    with open(base + '.shp', 'wb') as f_shp, open(base + '.shx', 'wb') as f_shx, open(base + '.dbf', 'wb') as f_dbf:
+        f_shp.write(shapefile_header((100 + nb_tri * rec_size) // 2, bbox))
+        f_shx.write(shapefile_header((100 + nb_tri * 8) // 2, bbox))
+        if field_names:
+            f_dbf.write(dbf_header(field_names, nb_tri))
+        else:
+            f_dbf.write(dbf_header(field_names, 0))
+
+        m = 0
+        for r in range(0, len(ikle_all)):
+            for i in range(0, len(ikle_all[r]), chunk_size):
+                ikle_c = ikle_all[r][i:i + chunk_size]
+                n = len(ikle_c)
+                rec_num = np.arange(m + 1, m + n + 1)
+
+                # shp
+                rec = np.zeros((n,), dtype=SHP_TRI_DTYPE)
+                rec['num'] = rec_num
+                rec['length'] = (rec_size - 8) // 2
+                rec['type'] = 5
+                rec['nb_part'] = 1
+                rec['nb_point'] = 4
+                p = point_all[r][ikle_c[:, [0, 1, 2, 0]], :2]
+                rec['point'] = p
+                rec['bbox'] = np.column_stack((np.min(p[:, :3, 0], axis=1), np.min(p[:, :3, 1], axis=1),
+                                               np.max(p[:, :3, 0], axis=1), np.max(p[:, :3, 1], axis=1)))
+                f_shp.write(rec.tobytes())
+
+                # shx
+                rec = np.zeros((n,), dtype=SHX_TRI_DTYPE)
+                rec['offset'] = (100 + (rec_num - 1) * rec_size) // 2
+                rec['length'] = (rec_size - 8) // 2
+                f_shx.write(rec.tobytes())
+
+                # dbf
+                if field_names:
+                    f_dbf.write(dbf_records([np.asarray(d)[m:m + n] for d in field_data]))
+                m += n
+
+
+def shapefile_header(file_length, bbox, shape_type=5):
+    """
+    This function creates the header of the shp and shx files.
+
+    :param file_length: the length of the file in 16-bit words
+    :param bbox: the bounding box of the shapes (xmin, ymin, xmax, ymax)
+    :param shape_type: the type of the shapes (5 is polygon)
+    :return: the header (100 bytes)
+    """
+    header = pack(">6i", 9994, 0, 0, 0, 0, 0)
+    header += pack(">i", file_length)
+    header += pack("<2i", 1000, shape_type)
+    header += pack("<4d", *bbox)
+    header += pack("<4d", 0, 0, 0, 0)  # elevation and measure
+    return header
+
+
+def dbf_header(field_names, nb_record):
+    """
+    This function creates the header of the dbf file and the descriptions of the fields (float fields of 50
+    characters). The spaces in the name of the fields are replaced by underscores.
+
+    :param field_names: the names of the fields
+    :param nb_record: the number of records
+    :return: the header
+    """
+    year, month, day = time.localtime()[:3]
+    header = pack('<BBBBLHH20x', 3, year - 1900, month, day, nb_record, len(field_names) * 32 + 33,
+                  len(field_names) * DBF_FIELD_SIZE + 1)
+    for name in field_names:
+        name = name.encode('utf-8').replace(b' ', b'_')
+        name = name.ljust(11).replace(b' ', b'\x00')
+        header += pack('<11sc4xBB14x', name, b'F', DBF_FIELD_SIZE, 0)
+    header += b'\r'
+    return header
+
+
+def dbf_records(field_data):
+    """
+    This function creates the records of the dbf file. As in pyshp (version 1.2), the values are written as
+    str(value), left-justified and cut to the size of the field.
+
+    :param field_data: the data of each field (one array by field, all arrays have the same length)
+    :return: the records as bytes
+    """
+    n = len(field_data[0])
+    rec = np.empty((n, len(field_data) * DBF_FIELD_SIZE + 1), dtype=np.uint8)
+    rec[:, 0] = ord(' ')  # deletion flag
+    for j, data in enumerate(field_data):
+        # the strings are cut to the size of the field and padded with null bytes, replaced by spaces below
+        value = np.asarray(data).astype('S' + str(DBF_FIELD_SIZE))
+        rec[:, 1 + j * DBF_FIELD_SIZE:1 + (j + 1) * DBF_FIELD_SIZE] = \
+            np.frombuffer(value.tobytes(), dtype=np.uint8).reshape(n, DBF_FIELD_SIZE)
+    rec[rec == 0] = ord(' ')
+    return rec.tobytes()
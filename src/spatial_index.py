@@ -0,0 +1,221 @@
+"""
+This file is part of the free software:
+ _   _   ___  ______________   __
+| | | | / _ \ | ___ \ ___ \ \ / /
+| |_| |/ /_\ \| |_/ / |_/ /\ V /
+|  _  ||  _  || ___ \ ___ \ \ /
+| | | || | | || |_/ / |_/ / | |
+\_| |_/\_| |_/\____/\____/  \_/
+
+Copyright (c) IRSTEA-EDF-AFB 2017-2018
+
+Licence CeCILL v2.1
+
+https://github.com/YannIrstea/habby
+
+"""
+import numpy as np
+
+
+def build_tri_index(ikle_sub, coord_p_sub, cell_size=None):
+    """
+    This function creates a spatial index over a triangular grid (usually the substrate grid). The index is a
+    uniform bucketed grid: each triangle is registered in every bucket touched by its bounding box. It is then
+    possible to find quickly the triangles which could contain a point or cross a segment without looking at the
+    whole grid.
+
+    :param ikle_sub: the connectivity table of the triangular grid (three points by cell)
+    :param coord_p_sub: the coordinates of the points of the grid
+    :param cell_size: the size of the buckets. If None, it is based on the median size of the triangles.
+    :return: a dict with the bounding boxes of the triangles (min_x, max_x, min_y, max_y) and the bucket grid
+             (x0, y0, size, nx, ny, bucket_start, bucket_tri)
+
+    **Technical comments**
+
+    The triangles of bucket b are bucket_tri[bucket_start[b]:bucket_start[b+1]]. They are in increasing order in
+    each bucket, so that the results of the queries are given in the order of the connectivity table.
+    """
+    ikle_sub = np.array(ikle_sub, dtype=np.int64)
+    coord_p_sub = np.array(coord_p_sub, dtype=np.float64)
+    nb_tri = len(ikle_sub)
+
+    px = coord_p_sub[ikle_sub[:, :3], 0]
+    py = coord_p_sub[ikle_sub[:, :3], 1]
+    min_x = np.min(px, axis=1)
+    max_x = np.max(px, axis=1)
+    min_y = np.min(py, axis=1)
+    max_y = np.max(py, axis=1)
+
+    x0 = np.min(min_x)
+    y0 = np.min(min_y)
+    width = np.max(max_x) - x0
+    height = np.max(max_y) - y0
+
+    # size of the buckets
+    if cell_size is None or cell_size <= 0:
+        cell_size = max(np.median(max_x - min_x), np.median(max_y - min_y))
+        if cell_size <= 0:
+            cell_size = np.sqrt(width * height / nb_tri)
+        if cell_size <= 0:
+            cell_size = max(width, height, 1.0)
+    # do not create (much) more buckets than triangles
+    while (int(width / cell_size) + 1) * (int(height / cell_size) + 1) > 4 * nb_tri + 16:
+        cell_size *= 2
+    nx = int(width / cell_size) + 1
+    ny = int(height / cell_size) + 1
+
+    # buckets touched by each triangle
+    ix0 = bucket_coord(min_x, x0, cell_size, nx)
+    ix1 = bucket_coord(max_x, x0, cell_size, nx)
+    iy0 = bucket_coord(min_y, y0, cell_size, ny)
+    iy1 = bucket_coord(max_y, y0, cell_size, ny)
+    wx = ix1 - ix0 + 1
+    nb_bucket_tri = wx * (iy1 - iy0 + 1)
+    tri_rep = np.repeat(np.arange(nb_tri), nb_bucket_tri)
+    first = np.cumsum(nb_bucket_tri) - nb_bucket_tri
+    off = np.arange(len(tri_rep)) - np.repeat(first, nb_bucket_tri)
+    bucket = (iy0[tri_rep] + off // wx[tri_rep]) * nx + ix0[tri_rep] + off % wx[tri_rep]
+
+    # stable sort: triangle are kept in increasing order in each bucket
+    order = np.argsort(bucket, kind='mergesort')
+    bucket_tri = tri_rep[order]
+    bucket_start = np.zeros((nx * ny + 1,), dtype=np.int64)
+    bucket_start[1:] = np.cumsum(np.bincount(bucket, minlength=nx * ny))
+
+    tri_index = dict(min_x=min_x, max_x=max_x, min_y=min_y, max_y=max_y, x0=x0, y0=y0, size=cell_size, nx=nx, ny=ny,
+                     bucket_start=bucket_start, bucket_tri=bucket_tri)
+    return tri_index
+
+
+def bucket_coord(v, v0, cell_size, n):
+    """
+    This function gets the bucket number along one axis for a list of coordinates.
+
+    :param v: the coordinates (x or y)
+    :param v0: the minimum coordinate of the index along this axis
+    :param cell_size: the size of the bucket
+    :param n: the number of bucket along this axis
+    :return: the bucket number (between 0 and n-1)
+    """
+    iv = np.floor((np.asarray(v, dtype=np.float64) - v0) / cell_size).astype(np.int64)
+    return np.clip(iv, 0, n - 1)
+
+
+def query_points(tri_index, x, y):
+    """
+    This function finds all the triangles whose bounding box contains a point, for a list of points.
+
+    :param tri_index: the spatial index from build_tri_index()
+    :param x: the x coordinates of the points
+    :param y: the y coordinates of the points
+    :return: two arrays with the same length (point number, triangle number), ordered by point and then triangle
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ix = np.floor((x - tri_index['x0']) / tri_index['size'])
+    iy = np.floor((y - tri_index['y0']) / tri_index['size'])
+    in_grid = (ix >= 0) & (ix < tri_index['nx']) & (iy >= 0) & (iy < tri_index['ny'])
+    ind_p = np.where(in_grid)[0]
+    bucket = iy[ind_p].astype(np.int64) * tri_index['nx'] + ix[ind_p].astype(np.int64)
+
+    start = tri_index['bucket_start'][bucket]
+    nb_cand = tri_index['bucket_start'][bucket + 1] - start
+    pt = np.repeat(ind_p, nb_cand)
+    first = np.cumsum(nb_cand) - nb_cand
+    off = np.arange(len(pt)) - np.repeat(first, nb_cand)
+    tri = tri_index['bucket_tri'][np.repeat(start, nb_cand) + off]
+
+    # bounding box test
+    inbox = (tri_index['min_x'][tri] <= x[pt]) & (x[pt] <= tri_index['max_x'][tri]) & \
+            (tri_index['min_y'][tri] <= y[pt]) & (y[pt] <= tri_index['max_y'][tri])
+    return pt[inbox], tri[inbox]
+
+
+def points_in_triangles(tri_index, ikle_sub, coord_p_sub, x, y):
+    """
+    This function finds in which triangles are a list of points. The bounding boxes are first found with the
+    spatial index, then the ray casting test is done on all the candidates at once. The ray casting is the same
+    than the one used in mesh_grid2.find_sub_and_cross(), so points on the side of a triangle are treated in
+    the same way. A point can be in more than one triangle (on a side or a vertex) or in none.
+
+    :param tri_index: the spatial index from build_tri_index()
+    :param ikle_sub: the connectivity table of the triangular grid
+    :param coord_p_sub: the coordinates of the points of the grid
+    :param x: the x coordinates of the points
+    :param y: the y coordinates of the points
+    :return: an array start and an array tri. The triangles containing the point i are tri[start[i]:start[i+1]]
+             in increasing order.
+    """
+    ikle_sub = np.asarray(ikle_sub)
+    coord_p_sub = np.asarray(coord_p_sub, dtype=np.float64)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    [pt, tri] = query_points(tri_index, x, y)
+    xp = x[pt]
+    yp = y[pt]
+
+    # send a ray along the x direction and count the intersection with the sides of the triangle
+    intersect = np.zeros((len(pt),), dtype=np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for s in range(0, 3):
+            s2 = s + 1
+            if s == 2:
+                s2 = 0
+            x1 = coord_p_sub[ikle_sub[tri, s], 0]
+            y1 = coord_p_sub[ikle_sub[tri, s], 1]
+            x2 = coord_p_sub[ikle_sub[tri, s2], 0]
+            y2 = coord_p_sub[ikle_sub[tri, s2], 1]
+            possible = (xp <= np.maximum(x1, x2)) & (np.minimum(y1, y2) <= yp) & (yp <= np.maximum(y1, y2))
+            a = (y1 - y2) / (x1 - x2)
+            x_int = np.where(y1 != y2, (yp - y1) / a + x1, xp + 1000)
+            x_int = np.where(x1 != x2, x_int, xp)
+            cross = possible & (xp <= x_int)
+            # manage the case where the point is at the same height than a vertex
+            count = np.where(yp == y1, y2 < yp, np.where(yp == y2, y1 < yp, True))
+            intersect += cross & count
+
+    inside = intersect % 2 == 1
+    pt = pt[inside]
+    tri = tri[inside]
+    start = np.zeros((len(x) + 1,), dtype=np.int64)
+    start[1:] = np.cumsum(np.bincount(pt, minlength=len(x)))
+    return start, tri
+
+
+def query_segment(tri_index, p1, p2, wig=1e-5):
+    """
+    This function finds the triangles whose bounding box could cross a segment. The bounding boxes are enlarged
+    to account for the tolerance used by mesh_grid2.intersec_cross(), so no crossing can be missed.
+
+    :param tri_index: the spatial index from build_tri_index()
+    :param p1: the first point of the segment
+    :param p2: the second point of the segment
+    :param wig: the relative tolerance on the crossing
+    :return: the triangles which could cross the segment, in increasing order
+    """
+    margin_s = 2 * wig * (abs(p2[0] - p1[0]) + abs(p2[1] - p1[1]))
+    sxmin = min(p1[0], p2[0]) - margin_s
+    sxmax = max(p1[0], p2[0]) + margin_s
+    symin = min(p1[1], p2[1]) - margin_s
+    symax = max(p1[1], p2[1]) + margin_s
+
+    # the sides of the triangles can be longer than the bucket size, use the largest tolerance
+    margin_t = 2 * wig * np.max(tri_index['max_x'] - tri_index['min_x'] + tri_index['max_y'] - tri_index['min_y'])
+    ix = bucket_coord([sxmin - margin_t, sxmax + margin_t], tri_index['x0'], tri_index['size'], tri_index['nx'])
+    iy = bucket_coord([symin - margin_t, symax + margin_t], tri_index['y0'], tri_index['size'], tri_index['ny'])
+    bucket_start = tri_index['bucket_start']
+    cand = [tri_index['bucket_tri'][bucket_start[j * tri_index['nx'] + ix[0]]:
+                                    bucket_start[j * tri_index['nx'] + ix[1] + 1]] for j in range(iy[0], iy[1] + 1)]
+    if len(cand) == 0:
+        return np.array([], dtype=np.int64)
+    cand = np.unique(np.concatenate(cand))
+
+    # bounding box test, with the tolerance of each triangle
+    min_x = tri_index['min_x'][cand]
+    max_x = tri_index['max_x'][cand]
+    min_y = tri_index['min_y'][cand]
+    max_y = tri_index['max_y'][cand]
+    margin_c = 2 * wig * (max_x - min_x + max_y - min_y)
+    ok = (min_x - margin_c <= sxmax) & (max_x + margin_c >= sxmin) & \
+         (min_y - margin_c <= symax) & (max_y + margin_c >= symin)
+    return cand[ok]
@@ -16,21 +16,14 @@ https://github.com/YannIrstea/habby
 """
 import os
 import numpy as np
-from scipy import stats
-from scipy import optimize
-from scipy import interpolate
 import re
-import time
-import matplotlib.pyplot as plt
 import h5py
 try:
     import xml.etree.cElementTree as ET
 except ImportError:
     import xml.etree.ElementTree as ET
-from src_GUI import output_fig_GUI
-from src_GUI import estimhab_GUI
+from src import fig_option
 from src import load_hdf5
-import matplotlib as mpl
 
 
 class Stathab:
@@ -226,6 +219,7 @@ class Stathab:
 
         # load the h5 file
         fname_h5 = child.text
+        from src_GUI import estimhab_GUI
         blob = estimhab_GUI.StatModUseful()
         blob.path_prj = self.path_prj
         blob.name_prj = self.name_prj
@@ -444,23 +438,24 @@ class Stathab:
             print('Error: No project saved. Please create a project first in the Start tab.\n')
             return
         else:
-            doc = ET.parse(filename_prj)
-            root = doc.getroot()
-            child = root.find(".//Stathab")
-            if child is None:
-                stathab_element = ET.SubElement(root, "Stathab")
-                hdf5file = ET.SubElement(stathab_element, "hdf5Stathab")
-                hdf5file.text = fname_no_path
-                hdf5file.set('riverint', str(self.riverint))  # attribute
-            else:
-                hdf5file = root.find(".//hdf5Stathab")
-                if hdf5file is None:
-                    hdf5file = ET.SubElement(child, "hdf5Stathab")
+            with fig_option.lock_prj():
+                doc = ET.parse(filename_prj)
+                root = doc.getroot()
+                child = root.find(".//Stathab")
+                if child is None:
+                    stathab_element = ET.SubElement(root, "Stathab")
+                    hdf5file = ET.SubElement(stathab_element, "hdf5Stathab")
                     hdf5file.text = fname_no_path
+                    hdf5file.set('riverint', str(self.riverint))  # attribute
                 else:
-                    hdf5file.text = fname_no_path
-                hdf5file.set('riverint', str(self.riverint))  # attribute
-            doc.write(filename_prj)
+                    hdf5file = root.find(".//hdf5Stathab")
+                    if hdf5file is None:
+                        hdf5file = ET.SubElement(child, "hdf5Stathab")
+                        hdf5file.text = fname_no_path
+                    else:
+                        hdf5file.text = fname_no_path
+                    hdf5file.set('riverint', str(self.riverint))  # attribute
+                fig_option.write_prj(doc, filename_prj)
 
     def stathab_calc(self, path_pref='.', name_pref='Pref_latin.txt'):
         """
@@ -669,6 +664,7 @@ class Stathab:
         :param path_bio:
         :return:
         """
+        from scipy import interpolate
 
         # various info
         self.load_ok = False
@@ -772,6 +768,7 @@ class Stathab:
         :param h0: the measured mean height
         :return: the optimized sh0
         """
+        from scipy import optimize
 
         bornhmes = np.arange(0, len(disthmesr)+1) * 5*h0  # in c code, bornes are 1:n, so if we divide by h -> 1:n * h
         # optimization by non-linear least square
@@ -788,6 +785,7 @@ class Stathab:
         :param h0: the measured mean height
         :return: the optimized sh0
         """
+        from scipy import stats
         nbclaemp = 20
         vraismax = -np.inf
         clmax = nbclaemp-1
@@ -823,6 +821,7 @@ class Stathab:
         :return: disth the distribution of heights across the river for the mean height h.
 
         """
+        from scipy import stats
         # sh
         # sh0 = 0.48
         sh = sh0 - 0.7 * np.log(h/h0)
@@ -891,6 +890,7 @@ class Stathab:
         :param v: the mean velocity
         :return: the distribution of velocity across the river
         """
+        from scipy import stats
         # sv
         fr = v/np.sqrt(9.81*h)
         relrough = d / h
@@ -1015,8 +1015,10 @@ class Stathab:
         figure only works when stathab1 for temperate river is used.
 
         """
+        import matplotlib as mpl
+        import matplotlib.pyplot as plt
         # figure option
-        self.fig_opt = output_fig_GUI.load_fig_option(self.path_prj, self.name_prj)
+        self.fig_opt = fig_option.load_fig_option(self.path_prj, self.name_prj)
         plt.rcParams['figure.figsize'] = self.fig_opt['width'], self.fig_opt['height']
         plt.rcParams['font.size'] = self.fig_opt['font_size']
         plt.rcParams['lines.linewidth'] = self.fig_opt['line_width']
@@ -1112,13 +1114,13 @@ class Stathab:
                 if not erase1:
                     if format == 0 or format == 1:
                         name_fig = os.path.join(self.path_im, self.name_reach[r] +
-                                                "_vel_h_gran_classes" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png')
+                                                "_vel_h_gran_classes" + fig_option.get_time_stamp() + '.png')
                     if format == 0 or format == 3:
                         name_fig = os.path.join(self.path_im, self.name_reach[r] +
-                                                "_vel_h_gran_classes" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf')
+                                                "_vel_h_gran_classes" + fig_option.get_time_stamp() + '.pdf')
                     if format == 2 or format > 2:
                         name_fig = os.path.join(self.path_im, self.name_reach[r] +
-                                                "_vel_h_gran_classes" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.jpg')
+                                                "_vel_h_gran_classes" + fig_option.get_time_stamp() + '.jpg')
                     fig.savefig(os.path.join(self.path_im, name_fig), bbox_extra_artists=(lgd,), bbox_inches='tight',
                                 dpi=self.fig_opt['resolution'])
                 else:
@@ -1155,13 +1157,13 @@ class Stathab:
             if not erase1:
                 if format == 0 or format == 1:
                     name_fig = os.path.join(self.path_im, self.name_reach[r] +
-                                            "_suitability_index" + time.strftime("%d_%m_%Y_at_%H_%M_%S")+'.png')
+                                            "_suitability_index" + fig_option.get_time_stamp()+'.png')
                 if format == 0 or format == 3:
                     name_fig = os.path.join(self.path_im, self.name_reach[r] +
-                                            "_suitability_index" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf')
+                                            "_suitability_index" + fig_option.get_time_stamp() + '.pdf')
                 if format == 2:
                     name_fig = os.path.join(self.path_im, self.name_reach[r] +
-                                            "_suitability_index" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.jpg')
+                                            "_suitability_index" + fig_option.get_time_stamp() + '.jpg')
                 fig.savefig(name_fig, bbox_extra_artists=(lgd,), bbox_inches='tight',
                             dpi=self.fig_opt['resolution'], transparent=True)
             else:
@@ -1182,7 +1184,7 @@ class Stathab:
         A function to save the stathab result in .txt form
         """
         # to know if we kept the old file or we erase them
-        self.fig_opt = output_fig_GUI.load_fig_option(self.path_prj, self.name_prj)
+        self.fig_opt = fig_option.load_fig_option(self.path_prj, self.name_prj)
         erase1 = self.fig_opt['erase_id']
         if erase1 == 'True':  # xml in text
             erase1 = True
@@ -1211,7 +1213,7 @@ class Stathab:
                 data = np.hstack((np.log(qmod), dummy, hmod, wmod, vclass.T, hclass.T, rclass.T))
                 if not erase1:
                     namefile = os.path.join(self.path_txt, 'Stathab_' + self.name_reach[r] +
-                                            time.strftime("%d_%m_%Y_at_%H_%M_%S")+'rrd.txt')
+                                            fig_option.get_time_stamp()+'rrd.txt')
                 else:
                     namefile = os.path.join(self.path_txt, 'Stathab_' + self.name_reach[r] + 'rrd.txt')
                     if os.path.isfile(namefile):
@@ -1238,7 +1240,7 @@ class Stathab:
             # rre.txt
             if not erase1:
                 namefile = os.path.join(self.path_txt, 'Stathab_' + self.name_reach[r] +
-                                        time.strftime("%d_%m_%Y_at_%H_%M_%S") + 'rre.txt')
+                                        fig_option.get_time_stamp() + 'rre.txt')
             else:
                 namefile = os.path.join(self.path_txt, 'Stathab_' + self.name_reach[r] + 'rre.txt')
                 if os.path.isfile(namefile):
@@ -1278,6 +1280,7 @@ class Stathab:
 
         :param path_ori: the path to the files from stathab based on the c++ code
         """
+        import matplotlib.pyplot as plt
 
         # stathab.txt
         filename = os.path.join(path_ori, 'stathab.txt')
@@ -1362,6 +1365,7 @@ class Stathab:
         :param path_ori: the path to the output files from stathab based on the R code
 
         """
+        import matplotlib.pyplot as plt
 
         # load the R output data
         filename = os.path.join(path_ori, 'SIC_ind-vh.csv')
@@ -1390,6 +1394,7 @@ class Stathab:
         :param by_vel: If True, the velcoity-based vpu is used. Otherise, it is height-based spu
 
         """
+        import matplotlib.pyplot as plt
 
         # load the R output data
         if by_vel:
@@ -16,19 +16,16 @@ https://github.com/YannIrstea/habby
 """
 import shapefile
 import os
+import itertools
 import numpy as np
-from scipy.spatial import Voronoi, voronoi_plot_2d
+from scipy.spatial import Voronoi, voronoi_plot_2d, cKDTree
 from random import uniform
-import matplotlib.pyplot as plt
-from matplotlib.collections import PatchCollection
-from matplotlib.patches import Polygon
-import time
 import triangle
 from random import randrange
 from src import load_hdf5
 from src import calcul_hab
-from src_GUI import output_fig_GUI
-import matplotlib as mpl
+from src import fan_triangulation
+from src import fig_option
 
 
 def open_shp(filename, path):
@@ -165,7 +162,6 @@ def load_sub_shp(filename, path, code_type, dominant_case=0):
     """
     # initialization
     xy = []  # point
-    ikle = []  # connectivity table
     sub_dom = []  # dominant substrate
     sub_pg = []  # coarser substrate ("plus gros")
     ind = 0
@@ -175,17 +171,18 @@ def load_sub_shp(filename, path, code_type, dominant_case=0):
     sf = open_shp(filename, path)
 
     # get point coordinates and connectivity table in two lists
+    # the points are numbered in the order of their first appearance (see get_unique_point())
     shapes = sf.shapes()
-    for i in range(0,len(shapes)):
-        p_all = shapes[i].points
-        ikle_i = []
-        for j in range(0, len(p_all)-1):  # last point of sahpefile is the first point
-            try:
-                ikle_i.append(int(xy.index(p_all[j])))
-            except ValueError:
-                ikle_i.append(int(len(xy)))
-                xy.append(p_all[j])
-        ikle.append(ikle_i)
+    nb_p = [max(len(shape.points) - 1, 0) for shape in shapes]  # last point of sahpefile is the first point
+    p_all = [p for shape in shapes for p in shape.points[:-1]]
+    if p_all:
+        [xy, ind_p] = get_unique_point(p_all)
+        xy = xy.tolist()
+        ind_p = ind_p.tolist()
+        start = np.cumsum(nb_p) - nb_p
+        ikle = [ind_p[start[i]:start[i] + nb_p[i]] for i in range(0, len(shapes))]
+    else:
+        ikle = [[] for shape in shapes]
 
     # get all the attributes in the shape file
     fields = sf.fields
@@ -195,15 +192,16 @@ def load_sub_shp(filename, path, code_type, dominant_case=0):
     if attribute_type == -99:
         return failload
 
+    # the attribute table is read once for all fields
+    records = np.array(sf.records())
+
     # if percentage type
     if attribute_type == 1:
         record_all = []
         # get the data and pass it int
         for f in fields:
             if f[0] in attribute_name:
-                record_here = sf.records()
-                record_here = np.array(record_here)
-                record_here = record_here[:,ind]
+                record_here = records[:, ind]
                 try:
                     record_here = list(map(int, record_here))
                 except ValueError:
@@ -257,9 +255,7 @@ def load_sub_shp(filename, path, code_type, dominant_case=0):
             if f[0] == attribute_name[0] or f[0] == attribute_name[1]:  # [0] coarser and [1] pg
                 # read for all code type
                 a = int('2')
-                record_here = sf.records()
-                record_here = np.array(record_here)
-                record_here = record_here[:, ind-1]
+                record_here = records[:, ind-1]
                 try:
                     record_here = list(map(float, record_here))  # int('2.000' ) throw an error
                     record_here = list(map(int, record_here))
@@ -316,6 +312,25 @@ def load_sub_shp(filename, path, code_type, dominant_case=0):
     return xy, ikle, sub_dom, sub_pg, True
 
 
+def get_unique_point(point):
+    """
+    This function finds the points which are given more than once in a list of points (as the points of
+    neighbouring polygons in a shapefile). The points are sorted to find the identical points, so it is much faster
+    than looking for each point in the list of the points already found.
+
+    :param point: the coordinates of the points (list or np.array)
+    :return: the unique points in the order of their first appearance and the index of each original point in the
+             unique points
+    """
+    point = np.array(point, dtype=np.float64)
+    # +0.0 so that 0.0 and -0.0 are the same point
+    [blob, first, inverse] = np.unique(point + 0.0, axis=0, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    new_ind = np.empty((len(order),), dtype=np.int64)
+    new_ind[order] = np.arange(len(order))
+    return point[first[order]], new_ind[inverse.ravel()]
+
+
 def edf_to_cemagref(records):
     """
     This function passes the substrate data from the code type 'EDF" to the code type "Cemagref". As the code 1 from EDF
@@ -514,13 +529,13 @@ def load_sub_txt(filename, path, code_type, path_shp='.'):
     sub_pg = [data[i] for i in np.arange(2, len(data), 4)]
     sub_dom = [data[i] for i in np.arange(3, len(data), 4)]
     try:
-        x = list(map(float,x))
-        y = list(map(float,y))
-    except TypeError:
+        x = np.array(x, dtype=np.float64)
+        y = np.array(y, dtype=np.float64)
+    except (TypeError, ValueError):
         print("Error: Coordinates (x,y) could not be read as float. Check format of the file " + filename +'.\n')
         return failload
     # Voronoi
-    point_in = np.vstack((np.array(x), np.array(y))).T
+    point_in = np.vstack((x, y)).T
     vor = Voronoi(point_in)
     xy = vor.vertices
     xy = np.reshape(xy, (len(xy), len(xy[0])))
@@ -530,19 +545,15 @@ def load_sub_txt(filename, path, code_type, path_shp='.'):
     # because Qhul from Vornoi has strange results
     # it create element with a value -1. this is not the last point!
     # so we take out all element with -1
-    ikle = [var for var in ikle if len(var) == len([i for i in var if i>0])]
     # in addition it creates cells which are areally far away for the center
-    ind_bad = []
     maxxy = [max(x)*2, max(y)*2]
     minxy = [min(x)/2, min(y)/2]
-    i = 0
-    for xyi in xy:
-        if xyi[0] > maxxy[0] or xyi[1] > maxxy[1]:
-            ind_bad.append(i)
-        if xyi[0] < minxy[0] or xyi[1] < minxy[1]:
-            ind_bad.append(i)
-        i+=1
-    ikle = [var for var in ikle if len(var) == len([i for i in var if i not in ind_bad])]
+    bad_p = (xy[:, 0] > maxxy[0]) | (xy[:, 1] > maxxy[1]) | (xy[:, 0] < minxy[0]) | (xy[:, 1] < minxy[1])
+    nb_p = np.array([len(var) for var in ikle], dtype=np.int64)
+    ind_p = np.fromiter(itertools.chain.from_iterable(ikle), dtype=np.int64, count=np.sum(nb_p))
+    bad_p = (ind_p <= 0) | bad_p[np.maximum(ind_p, 0)]
+    bad_cell = np.bincount(np.repeat(np.arange(len(ikle)), nb_p), weights=bad_p, minlength=len(ikle)) > 0
+    ikle = [ikle[i] for i in np.flatnonzero(~bad_cell)]
 
     # we only want triangle but voronoi might do polygon
     # not necessary anymore
@@ -569,15 +580,12 @@ def load_sub_txt(filename, path, code_type, path_shp='.'):
     if len(ikle) == 0:
         print('Error the substrate does not create a meangiful grid. Please add more substrate points. \n')
         return failload
-    sub_dom2 = np.zeros(len(ikle),)
-    sub_pg2 = np.zeros(len(ikle), )
-    for e in range(0, len(ikle)):
-        ikle_i = ikle[e]
-        centerx = np.mean(xgrid[ikle_i])
-        centery = np.mean(ygrid[ikle_i])
-        nearest_ind = np.argmin(np.sqrt((x-centerx)**2 + (y-centery)**2))
-        sub_dom2[e] = sub_dom[nearest_ind]
-        sub_pg2[e] = sub_pg[nearest_ind]
+    # the nearest point of the center of each cell (with a kd-tree, not by looking at all points for each cell)
+    [ind_p, nb_p] = fan_triangulation.get_ragged_table(ikle)
+    center = fan_triangulation.get_cell_center(ind_p, nb_p, np.column_stack((xgrid, ygrid)))
+    [blob, nearest_ind] = cKDTree(point_in).query(center)
+    sub_dom2 = np.array(sub_dom)[nearest_ind].astype(np.float64)
+    sub_pg2 = np.array(sub_pg)[nearest_ind].astype(np.float64)
 
     # transform code for text case
     if code_type == 'Cemagref':
@@ -620,11 +628,7 @@ def load_sub_txt(filename, path, code_type, path_shp='.'):
     w = shapefile.Writer(shapefile.POLYGON)
     w.autoBalance = 1
     for i in range(0, len(ikle)):
-        p = []
-        for j in range(0, len(ikle[i])):
-            pi = list(xy[ikle[i][j]])
-            p.append(pi)
-        p.append(list(xy[ikle[i][0]]))
+        p = xy[ikle[i] + ikle[i][:1]].tolist()
         w.poly(parts=[p])  # the double [[]] is important or it bugs, but why?
     w.field('sub_dom', 'F')
     w.field('sub_pg', 'F')
@@ -635,9 +639,9 @@ def load_sub_txt(filename, path, code_type, path_shp='.'):
     except IndexError:
         print('Error: Number of substrate entries and grid cells is not coherent \n')
         return failload
-    w.save(os.path.join(path_shp, 'substrate_text' + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.shp'))
+    w.save(os.path.join(path_shp, 'substrate_text' + fig_option.get_time_stamp() + '.shp'))
 
-    return xy, ikle, sub_dom2, sub_pg2, x, y, sub_dom, sub_pg
+    return xy, ikle, sub_dom2, sub_pg2, x.tolist(), y.tolist(), sub_dom, sub_pg
 
 
 def modify_grid_if_concave(ikle, point_all, sub_pg, sub_dom):
@@ -648,8 +652,9 @@ def modify_grid_if_concave(ikle, point_all, sub_pg, sub_dom):
 
     The algotithm is based on the idea that when you have a convex polygon you turn always in the same direction.
     When you have a concave polygon sometime you will turn left, sometime you will turn right. To check this,
-    we can take the determinant betwen each vector which compose the cells and check if they have the same sign.
-    Triangle are always convex.
+    we can take the determinant betwen each vector which compose the cells and check if they have the same sign
+    (a determinant of zero, for three points on a line, is not a change of direction). The determinants of all cells
+    are computed together and only the concave cells are triangulated one by one. Triangle are always convex.
 
     :param ikle: the connectivity table of the grid (one reach, one time step as substrate grid is constant)
     :param point_all: the point of the grid
@@ -660,67 +665,55 @@ def modify_grid_if_concave(ikle, point_all, sub_pg, sub_dom):
 
     point_alla = np.array(point_all)
 
+    # the sign of the turns of all cells (computed together)
+    [ind_p, nb_p] = fan_triangulation.get_ragged_table(ikle)
     to_delete = []
-    for ic, c in enumerate(ikle):
-        concave = False
+    if len(ind_p) > 0:
+        start = np.cumsum(nb_p) - nb_p
+        cell = np.repeat(np.arange(len(nb_p)), nb_p)
+        k = np.arange(len(ind_p)) - start[cell]
+        p0 = point_alla[ind_p]
+        p1 = point_alla[ind_p[start[cell] + (k + 1) % nb_p[cell]]]
+        p2 = point_alla[ind_p[start[cell] + (k + 2) % nb_p[cell]]]
+        v0 = p1 - p0
+        v1 = p2 - p1
+        # calulate deteminant (x0y1 - x1y0), the sides on a line (det = 0) do not change the direction
+        det = v0[:, 0] * v1[:, 1] - v1[:, 0] * v0[:, 1]
+        turn_left = np.bincount(cell, weights=det > 0, minlength=len(nb_p)) > 0
+        turn_right = np.bincount(cell, weights=det < 0, minlength=len(nb_p)) > 0
+        to_delete = np.flatnonzero((nb_p > 3) & turn_left & turn_right)  # triangle are convex
+
+    # if concave, correct the substrate grid
+    if len(to_delete) > 0:
+        point_all = list(point_all)
+        sub_pg = list(sub_pg)
+        sub_dom = list(sub_dom)
+    for ic in to_delete:
+        c = ikle[ic]
         lenc = len(c)
-        sign_old = 0
-        if lenc > 3: # triangle are convex
-            v00 = point_alla[c[1]] - point_alla[c[0]]
-            v0 = v00
-            for ind in range(0, lenc):
-                # find vector
-                if ind < lenc - 2:
-                    v1 = point_alla[c[ind+2]] - point_alla[c[ind+1]]
-                elif ind == lenc - 2:
-                    v1 = point_alla[c[0]] - point_alla[c[ind+1]]
-                elif ind == lenc -1:
-                    v1 = v00
-                # calulate deteminant (x0y1 - x1y0)
-                det = v0[0]*v1[1] - v1[0] * v0[1]
-                # check sign
-                if ind == 0:
-                    sign_old = np.sign(det)
-                else:
-                    sign = np.sign(det)
-                    if sign != sign_old:
-                        concave = True
-                    break
-                v0 = v1
-
-        # if concave, correct the substrate grid
-        if concave:
-            to_delete.append(ic)
-            # create triangle intput
-            point_cell = np.zeros((lenc, 2))
-            seg_cell = np.zeros((lenc, 2))
-            for ind in range(0, lenc):
-                point_cell[ind] = point_all[c[ind]]
-                if ind < lenc-1:
-                    seg_cell[ind] = [ind, ind+1]
-                else:
-                    seg_cell[ind] = [ind, 0]
-            # triangulate
-            try:
-                dict_point = dict(vertices=point_cell, segments=seg_cell)
-                grid_dict = triangle.triangulate(dict_point, 'p')
-            except:
-                # to be done: create a second threat so that the error management will function
-                print('Triangulation failed')
-                return
+        # create triangle intput
+        point_cell = point_alla[c, :2]
+        seg_cell = np.column_stack((np.arange(lenc), (np.arange(lenc) + 1) % lenc))
+        # triangulate
+        try:
+            dict_point = dict(vertices=point_cell, segments=seg_cell)
+            grid_dict = triangle.triangulate(dict_point, 'p')
+        except:
+            # to be done: create a second threat so that the error management will function
+            print('Triangulation failed')
+            return
 
-            try:
-                ikle_new = grid_dict['triangles']
-                point_new = grid_dict['vertices']
-                # add this triagulation to the ikle
-                ikle.extend(list(np.array(ikle_new) + len(point_all)))
-                point_all.extend(point_new)
-                for m in range(0, len(ikle_new)):
-                    sub_pg.append(sub_pg[ic])
-                    sub_dom.append(sub_dom[ic])
-            except KeyError:
-                # in case triangulation was not ok
-                print('Warning: A concave element of the substrate grid could not be corrected \n')
+        try:
+            ikle_new = grid_dict['triangles']
+            point_new = grid_dict['vertices']
+            # add this triagulation to the ikle
+            ikle.extend(list(np.array(ikle_new) + len(point_all)))
+            point_all.extend(point_new)
+            sub_pg.extend([sub_pg[ic]] * len(ikle_new))
+            sub_dom.extend([sub_dom[ic]] * len(ikle_new))
+        except KeyError:
+            # in case triangulation was not ok
+            print('Warning: A concave element of the substrate grid could not be corrected \n')
 
     # remove element
     if len(to_delete)>0:
@@ -888,8 +881,12 @@ def fig_substrate(coord_p, ikle, sub_pg, sub_dom, path_im, fig_opt={}, xtxt = [-
     :param path_im: the path where to save the figure
     :param reach_num: If we plot more than one reach, this is the reach number
     """
+    import matplotlib as mpl
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import PatchCollection
+    from matplotlib.patches import Polygon
     if not fig_opt:
-        fig_opt = output_fig_GUI.create_default_figoption()
+        fig_opt = fig_option.create_default_figoption()
     plt.rcParams['figure.figsize'] = fig_opt['width'], fig_opt['height']
     plt.rcParams['font.size'] = fig_opt['font_size']
     plt.rcParams['lines.linewidth'] = fig_opt['line_width']
@@ -1024,13 +1021,13 @@ def fig_substrate(coord_p, ikle, sub_pg, sub_dom, path_im, fig_opt={}, xtxt = [-
     # save the figure
     if not erase1:
         if format == 0 or format == 1:
-            plt.savefig(os.path.join(path_im, "substrate_dom" + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+            plt.savefig(os.path.join(path_im, "substrate_dom" + fig_option.get_time_stamp() +
                                      '.png'), dpi=fig_opt['resolution'], transparent=True)
         if format == 0 or format == 3:
-            plt.savefig(os.path.join(path_im, "substrate_dom" + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+            plt.savefig(os.path.join(path_im, "substrate_dom" + fig_option.get_time_stamp() +
                                      '.pdf'), dpi=fig_opt['resolution'], transparent=True)
         if format == 2:
-            plt.savefig(os.path.join(path_im, "substrate_dom" + time.strftime("%d_%m_%Y_at_%H_%M_%S") +
+            plt.savefig(os.path.join(path_im, "substrate_dom" + fig_option.get_time_stamp() +
                                      '.jpg'), dpi=fig_opt['resolution'], transparent=True)
     else:
         test = calcul_hab.remove_image("substrate_dom", path_im, format)
@@ -1068,9 +1065,9 @@ def fig_substrate(coord_p, ikle, sub_pg, sub_dom, path_im, fig_opt={}, xtxt = [-
         else:
             plt.title('Original Substrate Data (x,y)')
         if not erase1:
-            plt.savefig(os.path.join(path_im, "substrate_txtdata" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.png'),
+            plt.savefig(os.path.join(path_im, "substrate_txtdata" + fig_option.get_time_stamp() + '.png'),
                         fig_opt['resolution'], transparent=True)
-            plt.savefig(os.path.join(path_im, "substrate_txtdata" + time.strftime("%d_%m_%Y_at_%H_%M_%S") + '.pdf'),
+            plt.savefig(os.path.join(path_im, "substrate_txtdata" + fig_option.get_time_stamp() + '.pdf'),
                         fig_opt['resolution'], transparent=True)
         else:
             test = calcul_hab.remove_image("substrate_txtdata", path_im, format)
@@ -177,18 +177,23 @@ class VtkGroup:
 # ================================
 class VtkFile:
     
-    def __init__(self, filepath, ftype, largeFile = False):
+    def __init__(self, filepath, ftype, largeFile = False, compression = False):
         """
             PARAMETERS:
                 filepath: filename without extension.
                 ftype: file type, e.g. VtkImageData, etc.
                 largeFile: If size of the stored data cannot be represented by a UInt32.
+                compression: If True, the appended data is compressed with zlib (vtkZLibDataCompressor).
+                             The data is then compressed by addData() and written by appendData(), which
+                             must be called in the same order.
         """
         self.ftype = ftype
         self.filename = filepath + ftype.ext
         self.xml = xml_vk.XmlWriter(self.filename)
         self.offset = 0  # offset in bytes after beginning of binary section
         self.appendedDataIsOpen = False
+        self.compression = compression
+        self.compressedBlocks = []  # compressed data waiting to be appended
 #        self.largeFile = largeFile
 
 #       if largeFile == False:
@@ -201,6 +206,8 @@ class VtkFile:
                                                           version = "1.0",
                                                           byte_order = _get_byte_order(),
                                                           header_type = "UInt64")
+        if compression:
+            self.xml.addAttributes(compressor = "vtkZLibDataCompressor")
 
     def getFileName(self):
         """ Returns absolute path to this file. """
@@ -375,6 +382,9 @@ class VtkFile:
                       arrays must represent the components of a vector field.
                       All arrays must be one dimensional or three-dimensional.
         """
+        if self.compression:
+            self.addCompressedData(name, data)
+            return
         if type(data).__name__ == "tuple": # vector data
             assert (len(data) == 3)
             x = data[0]
@@ -387,6 +397,36 @@ class VtkFile:
         else:
             assert False, "Argument must be a Numpy array"
 
+    def addCompressedData(self, name, data):
+        """ Compresses the data and adds its description to xml header section. The compressed data is
+            kept to be written by the next call to appendData().
+
+             PARAMETERS:
+                name: data array name.
+                data: one numpy array or a tuple with 3 numpy arrays (see addData).
+        """
+        if type(data).__name__ == "tuple": # vector data
+            assert (len(data) == 3)
+            x = data[0]
+            ncomp = 3
+            block = evtk.compressBlock(evtk.arraysToBytes(data[0], data[1], data[2]))
+        elif type(data).__name__ == "ndarray" and (data.ndim == 1 or data.ndim == 3):
+            x = data
+            ncomp = 1
+            block = evtk.compressBlock(evtk.arrayToBytes(data))
+        else:
+            assert False, "Argument must be a Numpy array with one or three dimensions"
+
+        self.xml.openElement( "DataArray")
+        self.xml.addAttributes( Name = name,
+                                NumberOfComponents = ncomp,
+                                type = np_to_vtk[x.dtype.name].name,
+                                format = "appended",
+                                offset = self.offset)
+        self.xml.closeElement()
+        self.offset += len(block)
+        self.compressedBlocks.append(block)
+
     def appendHeader(self, dtype, nelem, ncomp):
         """ This function only writes the size of the data block that will be appended.
             The data itself must be written immediately after calling this function.
@@ -422,7 +462,10 @@ class VtkFile:
         """
         self.openAppendedData()
 
-        if type(data).__name__ == 'tuple': # 3 numpy arrays
+        if self.compression: # already compressed by addData
+            self.xml.stream.write(self.compressedBlocks.pop(0))
+
+        elif type(data).__name__ == 'tuple': # 3 numpy arrays
             ncomp = len(data)
             assert (ncomp == 3)
             dsize = data[0].dtype.itemsize
@@ -24,6 +24,7 @@ except ImportError:
     import xml.etree.ElementTree as ET
 import numpy as np
 import os
+from src.fig_option import set_lang_fig, load_fig_option, create_default_figoption
 
 
 class outputW(QWidget):
@@ -159,6 +160,13 @@ class outputW(QWidget):
         else:
             self.out1a.setChecked(False)
             self.out1b.setChecked(True)
+        self.out1f = QLabel(self.tr('Format of the detailed text file'))
+        self.out1c = QComboBox()
+        # txt: text files, npz: numpy files (one file by table and time step), hdf5: one file for all time steps
+        self.out1c.addItems(['txt', 'npz', 'hdf5'])
+        index = self.out1c.findText(fig_dict['text_format'])
+        if index >= 0:
+            self.out1c.setCurrentIndex(index)
         self.out2 = QLabel(self.tr('Shapefile'))
         self.out2a = QCheckBox(self.tr('Yes'))
         self.out2a.clicked.connect(lambda: self.check_uncheck(self.out2a, self.out2b))
@@ -181,6 +189,13 @@ class outputW(QWidget):
         else:
             self.out3a.setChecked(False)
             self.out3b.setChecked(True)
+        self.out3f = QLabel(self.tr('Format of the Paraview input'))
+        self.out3c = QComboBox()
+        # vtu: one file by time step, vtkhdf: one file for all time steps
+        self.out3c.addItems(['vtu', 'vtkhdf'])
+        index = self.out3c.findText(fig_dict['paraview_format'])
+        if index >= 0:
+            self.out3c.setCurrentIndex(index)
         self.out4 = QLabel(self.tr('Fish Information'))
         self.out4a = QCheckBox(self.tr('Yes'))
         self.out4a.clicked.connect(lambda: self.check_uncheck(self.out4a, self.out4b))
@@ -267,6 +282,10 @@ class outputW(QWidget):
         self.layout.addWidget(self.out4, 8, 3)
         self.layout.addWidget(self.out4a, 8, 4)
         self.layout.addWidget(self.out4b, 8, 5)
+        self.layout.addWidget(self.out1f, 9, 3)
+        self.layout.addWidget(self.out1c, 9, 4, 1, 2)
+        self.layout.addWidget(self.out3f, 10, 3)
+        self.layout.addWidget(self.out3c, 10, 4, 1, 2)
 
         self.layout.addItem(spacer,22,0)
         self.layout.addWidget(self.saveb, 21, 4, 1, 2)
@@ -372,6 +391,7 @@ class outputW(QWidget):
             fig_dict['text_output'] = True
         elif self.out1b.isChecked():
             fig_dict['text_output'] = False
+        fig_dict['text_format'] = str(self.out1c.currentText())
         if self.out2a.isChecked() and self.out2b.isChecked():
             self.send_log.emit('Error: Shapefile output cannot be on and off at the same time. \n')
         if self.out2a.isChecked():
@@ -384,6 +404,7 @@ class outputW(QWidget):
             fig_dict['paraview'] = True
         elif self.out3b.isChecked():
             fig_dict['paraview'] = False
+        fig_dict['paraview_format'] = str(self.out3c.currentText())
         if self.out4a.isChecked():
             fig_dict['fish_info'] = True
         elif self.out4b.isChecked():
@@ -428,8 +449,10 @@ class outputW(QWidget):
                 fish1 = root.find(".//FishNameType")
                 marker1 = root.find(".//Marker")
                 text1 = root.find(".//TextOutput")
+                textformat1 = root.find(".//TextFormat")
                 shape1 = root.find(".//ShapeOutput")
                 para1 = root.find(".//ParaviewOutput")
+                paraformat1 = root.find(".//ParaviewFormat")
                 langfig1 = root.find(".//LangFig")
                 hopt1 = root.find(".//MinHeight")
                 fishinfo1 = root.find(".//FishInfo")
@@ -450,8 +473,10 @@ class outputW(QWidget):
                 fish1 = ET.SubElement(child1, "FishNameType")
                 marker1 = ET.SubElement(child1,"Marker")
                 text1 = ET.SubElement(child1, "TextOutput")
+                textformat1 = ET.SubElement(child1, "TextFormat")
                 shape1 = ET.SubElement(child1, "ShapeOutput")
                 para1 = ET.SubElement(child1, "ParaviewOutput")
+                paraformat1 = ET.SubElement(child1, "ParaviewFormat")
                 langfig1 = ET.SubElement(child1, "LangFig")
                 hopt1 = ET.SubElement(child1, "MinHeight")
                 fishinfo1 = ET.SubElement(child1, "FishInfo")
@@ -476,8 +501,14 @@ class outputW(QWidget):
                 langfig1 = ET.SubElement(child1, "LangFig")
             langfig1.text = str(fig_dict['language'])
             text1.text = str(fig_dict['text_output'])
+            if textformat1 is None:
+                textformat1 = ET.SubElement(child1, "TextFormat")
+            textformat1.text = str(fig_dict['text_format'])
             shape1.text = str(fig_dict['shape_output'])
             para1.text = str(fig_dict['paraview'])
+            if paraformat1 is None:
+                paraformat1 = ET.SubElement(child1, "ParaviewFormat")
+            paraformat1.text = str(fig_dict['paraview_format'])
             hopt1.text = str(fig_dict['min_height_hyd'])
             fishinfo1.text = str(fig_dict['fish_info'])
             erase1.text = str(fig_dict['erase_id'])
@@ -488,161 +519,5 @@ class outputW(QWidget):
         # self.send_log.emit('restart     SAVE_OPTION_FIG')
 
 
-def set_lang_fig(nb_lang, path_prj, name_prj):
-    """
-    This function write in the xml file in which langugage the figures should be done. This is kept in the
-    group of attribute in the Figure_Option
-    :param lang: An int indicating the langugage (0 for english, 1 for french,...)
-    :param path_prj: the path to the project
-    :param name_prj: the name of the project
-    """
-
-    # save the data in the xml file
-    # open the xml project file
-    fname = os.path.join(path_prj, name_prj + '.xml')
-    # save the name and the path in the xml .prj file
-    if not os.path.isfile(fname):
-        #print('Error: project is not found \n')
-        return
-    else:
-        doc = ET.parse(fname)
-        root = doc.getroot()
-        child1 = root.find(".//Figure_Option")
-        if child1 is not None:  # modify existing option
-            langfig1 = root.find(".//LangFig")
-            if langfig1 is None:
-                langfig1 = ET.SubElement(child1, "LangFig")
-            langfig1.text = str(nb_lang)
-            doc.write(fname)
-
-
-def load_fig_option(path_prj, name_prj):
-    """
-    This function loads the figure option saved in the xml file and create a dictionnary will be given to the functions
-    which create the figures to know the different options chosen by the user. If the options are not written, this
-    function uses data by default which are in the fonction create_default_fig_options().
-
-    :param path_prj: the path to the xml project file
-    :param name_prj: the name to this file
-    :return: the dictionary containing the figure options
-
-    """
-
-    fig_dict = create_default_figoption()
-    fname = os.path.join(path_prj, name_prj + '.xml')
-    if not os.path.isfile(fname) and name_prj != '':  # no project exists
-        pass
-    elif name_prj == '':
-        pass
-    elif not os.path.isfile(fname):  # the project is not found
-        print('Warning: No project file (.xml) found.\n')
-    else:
-        doc = ET.parse(fname)
-        root = doc.getroot()
-        child1 = root.find(".//Figure_Option")
-        if child1 is not None:  # modify existing option
-            width1 = root.find(".//Width")
-            height1 = root.find(".//Height")
-            colormap1 = root.find(".//ColorMap1")
-            colormap2 = root.find(".//ColorMap2")
-            fontsize1 = root.find(".//FontSize")
-            linewidth1 = root.find(".//LineWidth")
-            grid1 = root.find(".//Grid")
-            time1 = root.find(".//TimeStep")
-            raw1 = root.find(".//PlotRawData")
-            format1 = root.find(".//Format")
-            marker1 = root.find(".//Marker")
-            reso1 = root.find(".//Resolution")
-            fish1 = root.find(".//FishNameType")
-            text1 = root.find(".//TextOutput")
-            shape1 = root.find(".//ShapeOutput")
-            para1 = root.find(".//ParaviewOutput")
-            langfig1 = root.find(".//LangFig")
-            hopt1 = root.find(".//MinHeight")
-            fishinfo1 = root.find(".//FishInfo")
-            erase1 = root.find(".//EraseId")
-            try:
-                if width1 is not None:
-                    fig_dict['width'] = float(width1.text)
-                if height1 is not None:
-                    fig_dict['height'] = float(height1.text)
-                if colormap1 is not None:
-                    fig_dict['color_map1'] = colormap1.text
-                if colormap2 is not None:
-                    fig_dict['color_map2'] = colormap2.text
-                if fontsize1 is not None:
-                    fig_dict['font_size'] = int(fontsize1.text)
-                if linewidth1 is not None:
-                    fig_dict['line_width'] = int(linewidth1.text)
-                if grid1 is not None:
-                    fig_dict['grid'] = grid1.text
-                if time1 is not None:
-                    fig_dict['time_step'] = time1.text # -99 is all
-                if raw1 is not None:
-                    fig_dict['raw_data'] = raw1.text
-                if format1 is not None:
-                    fig_dict['format'] = format1.text
-                if marker1 is not None:
-                    fig_dict['marker'] = marker1.text
-                if reso1 is not None:
-                    fig_dict['resolution'] = int(reso1.text)
-                if fish1 is not None:
-                    fig_dict['fish_name_type'] = fish1.text
-                if text1 is not None:
-                    fig_dict['text_output'] = text1.text
-                if shape1 is not None:
-                    fig_dict['shape_output'] = shape1.text
-                if para1 is not None:
-                    fig_dict['paraview'] = para1.text
-                if langfig1 is not None:
-                    fig_dict['language'] = int(langfig1.text)
-                if hopt1 is not None:
-                    fig_dict['min_height_hyd'] = float(hopt1.text)
-                if fish1 is not None:
-                    fig_dict['fish_info'] = fishinfo1.text
-                if erase1 is not None:
-                    fig_dict['erase_id'] = erase1.text
-            except ValueError:
-                print('Error: Figure Options are not of the right type.\n')
-
-    fig_dict['time_step'] = fig_dict['time_step'].split(',')
-    try:
-        fig_dict['time_step'] = list(map(int, fig_dict['time_step']))
-    except ValueError:
-        print('Error: Time step could not be read in the options')  # sendLog not read yet
-
-    return fig_dict
-
-
-def create_default_figoption():
-    """
-    This function creates the default dictionnary of option for the figure.
-    """
-    fig_dict = {}
-    fig_dict['height'] = 7
-    fig_dict['width'] = 10
-    fig_dict['color_map1'] = 'coolwarm'
-    fig_dict['color_map2'] = 'jet'
-    fig_dict['font_size'] = 12
-    fig_dict['line_width'] = 1
-    fig_dict['grid'] = 'False'
-    fig_dict['time_step'] = '1,-1'
-    fig_dict['raw_data'] = 'False'
-    fig_dict['format'] = 3
-    fig_dict['resolution'] = 800
-    fig_dict['fish_name_type'] = 0
-    fig_dict['text_output'] = 'False'
-    fig_dict['shape_output'] = 'False'
-    fig_dict['paraview'] = 'False'
-    fig_dict['fish_info'] = 'True'
-    # this is dependant on the language of the application not the user choice in the output tab
-    fig_dict['language'] = 0  # 0 english, 1 french
-    fig_dict['min_height_hyd'] = 0.001  # water height under 1mm is not accounted for
-    fig_dict['marker'] = 'False'
-    fig_dict['erase_id'] = 'True'
-
-    return fig_dict
-
-
 if __name__ == '__main__':
     pass